@@ -4,7 +4,7 @@ import gridfs
 import hashlib
 from datetime import datetime
 from typing import List, Optional, Dict
-from pymongo import MongoClient, ASCENDING, TEXT
+from pymongo import MongoClient, ASCENDING, TEXT, ReturnDocument
 from pymongo.errors import DuplicateKeyError
 from models import FileMeta, NodeInfo
 
@@ -25,6 +25,11 @@ def init_db():
     _db.files.create_index([("node_id", ASCENDING), ("path", ASCENDING)], unique=True, name="u_node_path")
     _db.files.create_index([("name", ASCENDING)], name="idx_files_name")
     _db.files.create_index([("content_hash", ASCENDING)], name="idx_files_content_hash")
+    # modified_at: marca de escritura del servidor para la sincronización incremental
+    _db.files.create_index([("modified_at", ASCENDING)], name="idx_files_modified_at")
+
+    # blobs: referencias por content_hash al almacén direccionado por contenido
+    # (el _id es el propio hash, no hace falta índice adicional)
 
     # nodes: index por node_id
     _db.nodes.create_index([("node_id", ASCENDING)], unique=True, name="u_node_id")
@@ -80,6 +85,7 @@ def register_file(file_meta: FileMeta):
         "node_id": file_meta.node_id,
         "last_updated": getattr(file_meta, "last_updated", datetime.utcnow()),
         "content_hash": getattr(file_meta, "content_hash", None),
+        "modified_at": datetime.utcnow(),
     }
 
     _db.files.update_one(
@@ -118,31 +124,126 @@ def register_file(file_meta: FileMeta):
             upsert=True
         )
 
-def search_files(query: str, file_type: Optional[str] = None, limit: int = 50) -> List[Dict]:
-    """Búsqueda híbrida con MongoDB text search y fallback a regex."""
+def index_replica_content(file_id: str, name: str, path: str,
+                          file_type: Optional[str] = None) -> None:
+    """Indexa el contenido de una réplica recibida de otro nodo.
+
+    file_contents tiene un documento por file_id: si ya hay texto
+    indexado (p.ej. el original vive en esta base) no se toca. Si no,
+    se indexa el texto del archivo recibido (solo documentos, hasta
+    GRIDFS_THRESHOLD_BYTES) para que la búsqueda por contenido del
+    shard funcione también en el nodo réplica.
+    """
+    existing = _db.file_contents.find_one({"file_id": file_id}, {"content": 1})
+    if existing and existing.get("content"):
+        return
+
+    content = ""
+    if file_type == "document":
+        try:
+            with open(path, "rb") as f:
+                content = f.read(USE_GRIDFS_THRESHOLD).decode("utf-8", errors="ignore")
+        except OSError:
+            pass
+
+    _db.file_contents.update_one(
+        {"file_id": file_id},
+        {"$set": {"file_id": file_id, "name": name, "content": content}},
+        upsert=True
+    )
+
+def get_content_holders(content_hash: str) -> List[str]:
+    """Nodos del cluster que ya guardan un contenido (por content_hash)."""
+    if not content_hash:
+        return []
+    return sorted(_db.files.distinct("node_id", {"content_hash": content_hash}))
+
+def add_blob_reference(content_hash: str, size: int) -> int:
+    """Suma una referencia a un blob del almacén por contenido; devuelve el total."""
+    doc = _db.blobs.find_one_and_update(
+        {"_id": content_hash},
+        {"$inc": {"refcount": 1},
+         "$setOnInsert": {"size": int(size), "created_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return int(doc["refcount"])
+
+def release_blob_reference(content_hash: str) -> int:
+    """Resta una referencia a un blob; al llegar a 0 borra su registro y devuelve 0."""
+    doc = _db.blobs.find_one_and_update(
+        {"_id": content_hash, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not doc:
+        return 0
+    if doc["refcount"] <= 0:
+        _db.blobs.delete_one({"_id": content_hash, "refcount": {"$lte": 0}})
+        return 0
+    return int(doc["refcount"])
+
+def search_files(query: str, file_type: Optional[str] = None, limit: int = 50,
+                 node_id: Optional[str] = None, replica_source: Optional[str] = None) -> List[Dict]:
+    """Búsqueda híbrida con MongoDB text search y fallback a regex.
+
+    Con `node_id` solo se devuelven las copias almacenadas en ese nodo y,
+    con `replica_source`, solo las réplicas del contenido de ese dueño.
+    Cada resultado lleva su `score` textual (0.0 en el fallback por nombre).
+    """
     q = (query or "").strip()
     if not q:
         return []
 
-    # Búsqueda textual
-    text_filter = {"$text": {"$search": q}}
+    files_filter = {}
     if file_type:
-        text_filter = {"$and": [text_filter, {"type": file_type}]}
-    projection = {"score": {"$meta": "textScore"}, "file_id": 1}
-    cursor = _db.file_contents.find(text_filter, projection).sort([("score", {"$meta": "textScore"})]).limit(limit)
-    file_ids = [doc["file_id"] for doc in cursor]
+        files_filter["type"] = file_type
+    if node_id:
+        files_filter["node_id"] = node_id
+    if replica_source:
+        files_filter["replica_source"] = replica_source
+
+    # Búsqueda textual
+    pipeline = [
+        {"$match": {"$text": {"$search": q}}},
+        {"$project": {"file_id": 1, "score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1}},
+    ]
+    if files_filter:
+        # file_contents tiene un documento por file_id y no sabe qué nodo
+        # guarda cada copia: filtrar por las copias de `files` antes del límite
+        pipeline += [
+            {"$lookup": {
+                "from": "files",
+                "let": {"fid": "$file_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$file_id", "$$fid"]}, **files_filter}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "copies",
+            }},
+            {"$match": {"copies": {"$ne": []}}},
+        ]
+    pipeline.append({"$limit": limit})
+    scores = {}
+    for doc in _db.file_contents.aggregate(pipeline):
+        scores.setdefault(doc["file_id"], float(doc.get("score", 0.0)))
+    file_ids = list(scores)
 
     # Fallback: regex
     if not file_ids:
-        regex = {"name": {"$regex": q, "$options": "i"}}
-        if file_type:
-            matches = _db.files.find({"name": {"$regex": q, "$options": "i"}, "type": file_type}).limit(limit)
-        else:
-            matches = _db.files.find(regex).limit(limit)
-        file_ids = [f["file_id"] for f in matches]
+        regex = {"name": {"$regex": q, "$options": "i"}, **files_filter}
+        matches = _db.files.find(regex).limit(limit)
+        file_ids = list(dict.fromkeys(f["file_id"] for f in matches))
 
     # Recuperar documentos completos
-    files_cursor = _db.files.find({"file_id": {"$in": file_ids}})
+    files_query = {"file_id": {"$in": file_ids}}
+    if node_id:
+        files_query["node_id"] = node_id
+    if replica_source:
+        files_query["replica_source"] = replica_source
+    files_cursor = _db.files.find(files_query)
     files_by_id = {}
     for f in files_cursor:
         files_by_id.setdefault(f["file_id"], []).append(f)
@@ -160,13 +261,48 @@ def search_files(query: str, file_type: Optional[str] = None, limit: int = 50) -
                 "type": d["type"],
                 "node_id": d["node_id"],
                 "last_updated": d["last_updated"],
-                "content_hash": d.get("content_hash")
+                "content_hash": d.get("content_hash"),
+                "replica_source": d.get("replica_source"),
+                "score": scores.get(fid, 0.0)
             })
         if len(results) >= limit:
             break
 
     return results
 
+def get_files_by_ids(file_ids: List[str], node_id: Optional[str] = None,
+                     file_type: Optional[str] = None) -> List[Dict]:
+    """Lookup por clave de file_ids concretos, con su contenido indexado."""
+    if not file_ids:
+        return []
+
+    query = {"file_id": {"$in": list(file_ids)}}
+    if node_id:
+        query["node_id"] = node_id
+    if file_type:
+        query["type"] = file_type
+
+    contents = {
+        c["file_id"]: c.get("content", "")
+        for c in _db.file_contents.find({"file_id": {"$in": list(file_ids)}}, {"file_id": 1, "content": 1})
+    }
+
+    results = []
+    for d in _db.files.find(query):
+        results.append({
+            "file_id": d["file_id"],
+            "name": d["name"],
+            "path": d["path"],
+            "size": d["size"],
+            "mime_type": d["mime_type"],
+            "type": d["type"],
+            "node_id": d["node_id"],
+            "last_updated": d["last_updated"],
+            "content_hash": d.get("content_hash"),
+            "content": contents.get(d["file_id"], "")
+        })
+    return results
+
 # --------------------- Nodos ---------------------
 def _convert_objectid(doc: Dict) -> Dict:
     """Convierte ObjectId de MongoDB a string para serialización JSON"""
@@ -4,7 +4,6 @@ from contextlib import asynccontextmanager
 import asyncio
 import logging
 import os
-import httpx
 from typing import Dict, Optional
 from datetime import datetime
 
@@ -19,7 +18,9 @@ import socket
 from services.reliability_metrics import get_reliability_metrics
 
 # Importar desde el nuevo módulo cluster
-from cluster import get_multicast_service, get_namespace, get_ip_cache
+from cluster import get_multicast_service, get_namespace, get_ip_cache, get_load_monitor
+from core.http_client import get_http_client_manager, close_http_clients
+from core.throttling import get_bandwidth_throttle
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -74,6 +75,9 @@ async def lifespan(app: FastAPI):
     # Inicializar métricas de confiabilidad
     reliability_metrics = get_reliability_metrics()
     
+    # El tráfico de replicación y checkpoints se frena si sube el p99 de las búsquedas
+    get_bandwidth_throttle().set_latency_provider(lambda: get_load_monitor().snapshot()["p99_ms"])
+    
     # Iniciar servicio de replicación dinámica
     repl_service = get_replication_service()
     
@@ -135,7 +139,7 @@ async def lifespan(app: FastAPI):
                             logger.error(f"Error recuperando {node['node_id']}: {e}")
                 
                 # Replicación preventiva
-                replication_service.replicate_missing_files(batch=50)
+                await replication_service.replicate_missing_files(batch=50)
                 
             except Exception as e:
                 logger.error(f"Error en mantenimiento: {e}")
@@ -167,14 +171,14 @@ async def lifespan(app: FastAPI):
         unknown_nodes = [n for n in database.get_all_nodes() 
                         if n.get("status") == "unknown"]
         
+        http = get_http_client_manager()
         for node in unknown_nodes:
             try:
-                async with httpx.AsyncClient(timeout=5) as client:
-                    url = f"http://{node['ip_address']}:{node['port']}/health"
-                    response = await client.get(url)
-                    if response.status_code == 200:
-                        node_service.update_node_heartbeat(node["node_id"])
-                        logger.info(f"Nodo {node['node_id']} descubierto como ONLINE")
+                url = f"http://{node['ip_address']}:{node['port']}/health"
+                response = await http.get(url, timeout=5)
+                if response.status_code == 200:
+                    node_service.update_node_heartbeat(node["node_id"])
+                    logger.info(f"Nodo {node['node_id']} descubierto como ONLINE")
             except Exception:
                 pass
 
@@ -246,6 +250,7 @@ async def lifespan(app: FastAPI):
     
     # Detener servicios del cluster
     await shutdown_cluster()
+    await close_http_clients()
 
     # Detener multicast
     multicast.stop()
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from typing import Optional
+from pydantic import BaseModel, Field
 from models import UserCreate, UserLogin, Token
 from auth import (
     authenticate_user,
@@ -11,6 +13,8 @@ from auth import (
 )
 import database
 from services.dynamic_replication import get_replication_service
+from core.config import get_config
+from core.throttling import get_bandwidth_throttle
 from security import require_api_key
 
 router = APIRouter(
@@ -93,8 +97,38 @@ async def get_replication_status(_: None = Depends(require_api_key)):
     return service.get_replication_status()
 
 @router.post("/replication/sync")
-async def trigger_sync(_: None = Depends(require_api_key)):
-    """Fuerza una sincronización inmediata"""
+async def trigger_sync(full: bool = False, _: None = Depends(require_api_key)):
+    """Fuerza una sincronización inmediata (full=true revisa todos los archivos)"""
     service = get_replication_service()
-    result = await service.synchronize_eventual_consistency()
-    return {"status": "completed", **result}
\ No newline at end of file
+    result = await service.synchronize_eventual_consistency(full=full)
+    return {"status": "completed", **result}
+
+class BandwidthLimits(BaseModel):
+    """Cambios en caliente de los límites de ancho de banda (bytes/s, 0 = sin límite)"""
+    node_bandwidth: Optional[int] = Field(None, ge=0)
+    link_bandwidth: Optional[int] = Field(None, ge=0)
+    checkpoint_bandwidth: Optional[int] = Field(None, ge=0)
+    foreground_p99_target_ms: Optional[float] = Field(None, ge=0)
+    throttle_min_fraction: Optional[float] = Field(None, gt=0, le=1)
+
+@router.get("/replication/throttle")
+async def get_bandwidth_limits(_: None = Depends(require_api_key)):
+    """Límites y estado del limitador de ancho de banda de replicación"""
+    return get_bandwidth_throttle().get_stats()
+
+@router.put("/replication/throttle")
+async def update_bandwidth_limits(limits: BandwidthLimits, _: None = Depends(require_api_key)):
+    """Actualiza ReplicationConfig y aplica los nuevos límites sin reiniciar"""
+    config = get_config().replication
+    for name, value in limits.dict(exclude_none=True).items():
+        setattr(config, name, value)
+    throttle = get_bandwidth_throttle()
+    throttle.configure(config)
+    return throttle.get_stats()
+
+@router.post("/replication/anti-entropy")
+async def trigger_anti_entropy(_: None = Depends(require_api_key)):
+    """Compara con árboles de Merkle cada origen con sus réplicas y repara las diferencias"""
+    service = get_replication_service()
+    results = await service.reconcile_replica_holders()
+    return {"status": "completed", "pairs": results}
\ No newline at end of file
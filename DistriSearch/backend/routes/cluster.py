@@ -8,14 +8,21 @@ Endpoints para comunicación entre nodos del cluster:
 - Replicación
 - Routing de queries
 """
+import asyncio
 import os
 import logging
-from typing import Optional, List, Dict, Any
+import mimetypes
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Body, Query
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 
+from cluster import get_load_monitor
+from core import wire
+from core.chunked_transfer import ChecksumMismatch, OffsetConflict, ReplicaReceiver
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/cluster", tags=["cluster"])
@@ -65,6 +72,23 @@ class QueryRequest(BaseModel):
     query: str
     limit: int = 10
     search_type: str = "semantic"  # semantic, filename, hybrid
+    priority: str = "interactive"  # interactive, batch (control de admisión)
+    filters: Dict[str, Any] = {}
+    shard: Optional[str] = None  # Dueño cuyo contenido se busca (si este nodo es réplica)
+    # Solo en el Master: scatter (búsqueda en Slaves) o locate (índice del Master + fetch)
+    mode: Literal["scatter", "locate"] = "scatter"
+
+
+class BatchQueryRequest(BaseModel):
+    """Batch de queries del Master hacia este nodo"""
+    queries: List[QueryRequest]
+
+
+class FetchRequest(BaseModel):
+    """Request de fetch por file_id (fase 2 de la búsqueda locate-then-fetch)"""
+    file_ids: List[str]
+    query: Optional[str] = None
+    filters: Dict[str, Any] = {}
 
 
 class QueryResponse(BaseModel):
@@ -74,6 +98,12 @@ class QueryResponse(BaseModel):
     query_time_ms: float
 
 
+class BatchQueryResponse(BaseModel):
+    """Una respuesta por query del batch, en el mismo orden"""
+    responses: List[Dict[str, Any]]
+    node_id: str
+
+
 class ReplicationRequest(BaseModel):
     """Request de replicación"""
     file_id: str
@@ -82,6 +112,23 @@ class ReplicationRequest(BaseModel):
     original_file_id: Optional[str] = None
 
 
+class ReplicaCommitRequest(BaseModel):
+    """Cierre de una réplica recibida por chunks"""
+    sha256: str
+    size: int
+    filename: Optional[str] = None
+    source_node: Optional[str] = None
+    original_file_id: Optional[str] = None
+
+
+class ReplicaLinkRequest(BaseModel):
+    """Réplica de un contenido que este nodo ya guarda (sin transferencia)"""
+    sha256: str
+    filename: Optional[str] = None
+    source_node: Optional[str] = None
+    original_file_id: Optional[str] = None
+
+
 class ClusterStatus(BaseModel):
     """Estado del cluster"""
     node_id: str
@@ -112,6 +159,9 @@ class ClusterState:
         self.election_service = None
         self.location_index = None
         self.load_balancer = None
+        self.query_router = None
+        self.admission_controller = None
+        self.replication_coordinator = None
 
 
 # Instancia global
@@ -133,8 +183,14 @@ async def register_node(registration: NodeRegistration):
     # Guardar peer
     cluster_state.peers[registration.node_id] = registration
     
-    # Si somos master, añadir al índice y balanceador
+    # Si somos master, añadir al router de queries, al coordinador de
+    # replicación y al balanceador
     if cluster_state.is_master:
+        base_url = f"http://{registration.ip_address}:{registration.http_port}"
+        if cluster_state.query_router:
+            cluster_state.query_router.register_node(registration.node_id, base_url)
+        if cluster_state.replication_coordinator:
+            cluster_state.replication_coordinator.register_node(registration.node_id, base_url)
         if cluster_state.load_balancer:
             from ..core.models import NodeInfo, NodeStatus
             node_info = NodeInfo(
@@ -161,8 +217,13 @@ async def unregister_node(node_id: str):
     if node_id in cluster_state.peers:
         del cluster_state.peers[node_id]
         
-        if cluster_state.is_master and cluster_state.load_balancer:
-            cluster_state.load_balancer.unregister_node(node_id)
+        if cluster_state.is_master:
+            if cluster_state.query_router:
+                cluster_state.query_router.unregister_node(node_id)
+            if cluster_state.replication_coordinator:
+                cluster_state.replication_coordinator.unregister_node(node_id)
+            if cluster_state.load_balancer:
+                cluster_state.load_balancer.unregister_node(node_id)
         
         return {"status": "unregistered", "node_id": node_id}
     
@@ -224,10 +285,13 @@ async def detailed_health():
 # ============================================================================
 
 @router.post("/register-content")
-async def register_content(content: ContentRegistration):
+async def register_content(http_request: Request):
     """
     Registra contenido en el índice de ubicación del Master.
     Llamado por Slaves después de subir un documento.
+    
+    Acepta JSON (ContentRegistration) o el formato binario de
+    core.wire, donde el embedding viaja como buffer float32.
     """
     if not cluster_state.is_master:
         raise HTTPException(
@@ -242,7 +306,18 @@ async def register_content(content: ContentRegistration):
         )
     
     import numpy as np
-    embedding = np.array(content.embedding)
+    
+    body = wire.decode_body(
+        await http_request.body(),
+        http_request.headers.get("content-type")
+    )
+    if wire.is_binary(http_request.headers.get("content-type")):
+        # El embedding ya llega como vector: validar solo el resto
+        embedding = np.asarray(body.get("embedding", []), dtype=np.float32)
+        content = ContentRegistration(**{**body, "embedding": []})
+    else:
+        content = ContentRegistration(**body)
+        embedding = np.array(content.embedding)
     
     cluster_state.location_index.register_document(
         file_id=content.file_id,
@@ -288,22 +363,93 @@ async def locate_content(file_id: str):
 # ============================================================================
 
 @router.post("/query", response_model=QueryResponse)
-async def distributed_query(request: QueryRequest):
+async def distributed_query(request: QueryRequest, http_request: Request):
     """
     Búsqueda distribuida desde el Master.
     Enruta la query a los Slaves más relevantes.
     """
-    from ..services.search_service import SearchService
+    return _wire_response(await _run_local_query(request), http_request)
+
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def batch_query(request: BatchQueryRequest, http_request: Request):
+    """
+    Ejecuta un batch de queries del Master en un único request.
+    Devuelve una respuesta por query en el mismo orden; un fallo
+    en una query se reporta en su respuesta sin afectar al resto.
+    """
     
-    start_time = datetime.utcnow()
+    outcomes = await asyncio.gather(
+        *(_run_local_query(query) for query in request.queries),
+        return_exceptions=True
+    )
     
-    # Búsqueda local en este nodo
-    search_service = SearchService()
-    results = await search_service.search(
-        query=request.query,
-        limit=request.limit,
-        search_type=request.search_type
+    responses = []
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            logger.error(f"Error en query del batch: {outcome}")
+            responses.append({"results": [], "error": str(outcome)})
+        else:
+            responses.append(outcome.dict())
+    
+    return _wire_response(
+        BatchQueryResponse(responses=responses, node_id=cluster_state.node_id),
+        http_request
+    )
+
+
+def _wire_response(response: BaseModel, http_request: Request):
+    """Devuelve la respuesta en formato binario si el cliente lo acepta"""
+    if not wire.accepts_binary(http_request.headers.get("accept")):
+        return response
+    return Response(
+        content=wire.encode(response.dict()),
+        media_type=wire.BINARY_MEDIA_TYPE
     )
+
+
+async def _run_local_query(request: QueryRequest) -> QueryResponse:
+    """
+    Búsqueda local en este nodo.
+    
+    La misma búsqueda atiende /cluster/query y cada query de
+    /cluster/query/batch, así ambos caminos del router devuelven
+    los mismos resultados.
+    """
+    import database
+    
+    start_time = datetime.utcnow()
+    
+    # Atendiendo como réplica: solo las copias del contenido de ese dueño
+    shard = request.shard if request.shard != cluster_state.node_id else None
+    
+    # Alimenta la cola y p50/p99 que viajan en los heartbeats
+    with get_load_monitor().track():
+        rows = await asyncio.to_thread(
+            database.search_files,
+            query=request.query,
+            file_type=request.filters.get("file_type"),
+            limit=request.limit,
+            node_id=cluster_state.node_id,
+            replica_source=shard
+        )
+    
+    results = [
+        {
+            "file_id": row["file_id"],
+            "filename": row["name"],
+            "score": row.get("score", 0.0),
+            "metadata": {
+                "path": row["path"],
+                "size": row["size"],
+                "mime_type": row["mime_type"],
+                "type": row["type"],
+                "content_hash": row.get("content_hash"),
+                "replica_source": row.get("replica_source")
+            }
+        }
+        for row in rows
+    ]
     
     elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
     
@@ -314,12 +460,117 @@ async def distributed_query(request: QueryRequest):
     )
 
 
+@router.post("/query/fetch", response_model=QueryResponse)
+async def fetch_documents(request: FetchRequest, http_request: Request):
+    """
+    Devuelve snippets y metadatos de file_ids concretos.
+    El Master ya resolvió los candidatos con su índice semántico,
+    así que este nodo solo hace un lookup por clave.
+    """
+    import database
+    
+    start_time = datetime.utcnow()
+    
+    with get_load_monitor().track():
+        docs = database.get_files_by_ids(
+            request.file_ids,
+            node_id=cluster_state.node_id,
+            file_type=request.filters.get("file_type")
+        )
+    
+    results = [
+        {
+            "file_id": doc["file_id"],
+            "filename": doc["name"],
+            "snippet": _make_snippet(doc.get("content"), request.query),
+            "metadata": {
+                "path": doc["path"],
+                "size": doc["size"],
+                "mime_type": doc["mime_type"],
+                "type": doc["type"],
+                "content_hash": doc.get("content_hash")
+            }
+        }
+        for doc in docs
+    ]
+    
+    elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
+    
+    return _wire_response(
+        QueryResponse(
+            results=results,
+            node_id=cluster_state.node_id,
+            query_time_ms=elapsed
+        ),
+        http_request
+    )
+
+
+def _make_snippet(content: Optional[str], query: Optional[str], width: int = 200) -> Optional[str]:
+    """Extrae un fragmento del contenido alrededor del primer término de la query"""
+    if not content:
+        return None
+    
+    start = 0
+    if query:
+        lowered = content.lower()
+        for term in query.lower().split():
+            pos = lowered.find(term)
+            if pos >= 0:
+                start = max(0, pos - width // 4)
+                break
+    
+    return content[start:start + width]
+
+
+@router.post("/query/explain")
+async def explain_query(request: QueryRequest):
+    """
+    Ejecuta una query trazada (solo en Master) y devuelve su plan:
+    nodos elegidos, scores de afinidad, tiempos por etapa y por nodo
+    y si se sirvió desde caché.
+    """
+    if not cluster_state.is_master:
+        raise HTTPException(status_code=400, detail="This node is not the master")
+    
+    if not cluster_state.query_router:
+        raise HTTPException(status_code=503, detail="Query router not initialized")
+    
+    return await cluster_state.query_router.explain(
+        query=request.query,
+        limit=request.limit,
+        search_type=request.search_type,
+        filters=request.filters,
+        mode=request.mode
+    )
+
+
+@router.get("/query/slow")
+async def slow_queries(limit: int = Query(20, ge=1, le=200)):
+    """Queries lentas recientes y percentiles de latencia por etapa (solo en Master)"""
+    if not cluster_state.is_master or not cluster_state.query_router:
+        raise HTTPException(status_code=400, detail="This node is not the master")
+    
+    tracer = cluster_state.query_router.tracer
+    return {
+        "slow_queries": tracer.get_slow_queries(limit),
+        "stages": tracer.stage_percentiles()
+    }
+
+
 @router.post("/search/distributed")
-async def search_distributed(request: QueryRequest):
+async def search_distributed(request: QueryRequest, http_request: Request):
     """
     Búsqueda distribuida completa (solo en Master).
     Consulta a múltiples Slaves y agrega resultados.
+    
+    Pasa por el control de admisión: el tenant se identifica por
+    X-API-KEY (o la IP del cliente) y la prioridad por el campo
+    priority o la cabecera X-Query-Priority. Si no hay capacidad
+    responde 429 con Retry-After.
     """
+    from master.admission_control import AdmissionRejected, QueryPriority
+    
     if not cluster_state.is_master:
         # Si no somos master, forward al master
         if cluster_state.current_master:
@@ -327,8 +578,67 @@ async def search_distributed(request: QueryRequest):
             pass
         raise HTTPException(status_code=400, detail="This node is not the master")
     
-    # TODO: Implementar búsqueda distribuida con QueryRouter
-    return {"error": "Not implemented yet"}
+    if not cluster_state.query_router:
+        raise HTTPException(status_code=503, detail="Query router not initialized")
+    
+    tenant = http_request.headers.get("X-API-KEY") or \
+        (http_request.client.host if http_request.client else "anonymous")
+    try:
+        priority = QueryPriority(
+            http_request.headers.get("X-Query-Priority", request.priority).lower()
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid priority: {request.priority}")
+    
+    async def _search():
+        return await cluster_state.query_router.search(
+            query=request.query,
+            limit=request.limit,
+            search_type=request.search_type,
+            filters=request.filters,
+            mode=request.mode
+        )
+    
+    try:
+        if cluster_state.admission_controller:
+            async with cluster_state.admission_controller.admit(tenant, priority):
+                result = await _search()
+        else:
+            result = await _search()
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e), "reason": e.reason},
+            headers={"Retry-After": e.retry_after_header}
+        )
+    
+    return {
+        "query_id": result.query_id,
+        "results": [
+            {
+                "file_id": r.file_id,
+                "filename": r.filename,
+                "score": r.score,
+                "node_id": r.node_id,
+                "snippet": r.snippet,
+                "metadata": r.metadata
+            }
+            for r in result.results
+        ],
+        "nodes_queried": result.nodes_queried,
+        "nodes_responded": result.nodes_responded,
+        "errors": result.errors,
+        "cache_hit": result.cache_hit,
+        "total_time_ms": result.total_time_ms
+    }
+
+
+@router.get("/search/admission")
+async def admission_stats():
+    """Métricas del control de admisión: cola, concurrencia y rechazos"""
+    if not cluster_state.admission_controller:
+        raise HTTPException(status_code=503, detail="Admission control not initialized")
+    return cluster_state.admission_controller.get_stats()
 
 
 # ============================================================================
@@ -351,6 +661,205 @@ async def receive_replica(request: ReplicationRequest):
     }
 
 
+_replica_receiver: Optional[ReplicaReceiver] = None
+
+
+def _get_replica_receiver() -> ReplicaReceiver:
+    """Receptor de réplicas en la carpeta de uploads de este nodo"""
+    global _replica_receiver
+    if _replica_receiver is None:
+        base_dir = os.getenv("REPLICA_DIR") or os.path.abspath(os.path.join(
+            os.path.dirname(__file__), "..", "uploads", cluster_state.node_id
+        ))
+        _replica_receiver = ReplicaReceiver(base_dir)
+    return _replica_receiver
+
+
+@router.get("/replica/{file_id}/offset")
+async def replica_offset(file_id: str):
+    """Bytes ya recibidos de una réplica en curso (para reanudar)"""
+    return {"file_id": file_id, "offset": _get_replica_receiver().offset(file_id)}
+
+
+@router.put("/replica/{file_id}/chunk")
+async def receive_replica_chunk(
+    file_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0)
+):
+    """
+    Anexa un chunk de una réplica en `offset`.
+    
+    Responde 409 con el offset actual si el chunk no es contiguo.
+    """
+    data = await request.body()
+    try:
+        # E/S de disco fuera del event loop: no frena queries ni heartbeats
+        new_offset = await asyncio.to_thread(
+            _get_replica_receiver().write_chunk, file_id, offset, data
+        )
+    except OffsetConflict as e:
+        return JSONResponse(status_code=409, content={"offset": e.offset})
+    return {"file_id": file_id, "offset": new_offset}
+
+
+@router.post("/replica/{file_id}/commit")
+async def commit_replica(file_id: str, request: ReplicaCommitRequest):
+    """
+    Verifica el SHA-256 de la réplica recibida y la registra.
+    
+    Responde 422 si el contenido no coincide (el parcial se descarta).
+    """
+    filename = request.filename or file_id
+    try:
+        # El SHA-256 del archivo completo se calcula en un hilo
+        path = await asyncio.to_thread(
+            _get_replica_receiver().commit,
+            file_id, request.sha256, request.size, filename
+        )
+    except ChecksumMismatch as e:
+        logger.warning(f"Réplica rechazada: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    await asyncio.to_thread(
+        _register_local_replica,
+        file_id, filename, path, request.size, request.sha256, request.source_node
+    )
+    
+    logger.info(f"Réplica recibida: {file_id} desde {request.source_node} ({request.size} bytes)")
+    return {"file_id": file_id, "sha256": request.sha256, "size": request.size}
+
+
+@router.post("/replica/{file_id}/link")
+async def link_replica(file_id: str, request: ReplicaLinkRequest):
+    """
+    Registra una réplica reutilizando bytes que este nodo ya tiene
+    (mismo content_hash), sin transferir el archivo.
+    
+    Responde 404 si el contenido no está aquí: el emisor debe transferirlo.
+    """
+    from services.content_service import get_content_store
+    
+    # Solo se enlazan blobs del almacén por contenido: la réplica toma su
+    # propia referencia, así el blob sobrevive aunque se borre el original
+    store = get_content_store()
+    if not store.has(request.sha256):
+        raise HTTPException(status_code=404, detail="Contenido no disponible en este nodo")
+    path = store.blob_path(request.sha256)
+    
+    await asyncio.to_thread(
+        _register_local_replica,
+        file_id, request.filename or file_id, path,
+        os.path.getsize(path), request.sha256, request.source_node,
+        cas_blob=True
+    )
+    logger.info(f"Réplica enlazada sin transferencia: {file_id} ({request.sha256[:16]})")
+    return {"file_id": file_id, "sha256": request.sha256, "deduplicated": True}
+
+
+def _register_local_replica(
+    file_id: str,
+    filename: str,
+    path: str,
+    size: int,
+    content_hash: str,
+    source_node: Optional[str],
+    cas_blob: bool = False
+) -> None:
+    """
+    Registra en MongoDB una réplica guardada en este nodo.
+    
+    Copia los metadatos completos del original (path, mime_type,
+    type...) como DynamicReplicationService._register_replica; si el
+    original no está en la base local se derivan del archivo recibido.
+    El contenido se indexa en file_contents para las búsquedas del shard.
+    Con `cas_blob` la réplica enlaza un blob del almacén por contenido
+    y toma (y marca) su propia referencia.
+    """
+    import database
+    from services.content_service import rebind_blob_reference
+    
+    key = {"file_id": file_id, "node_id": cluster_state.node_id}
+    previous = database._db.files.find_one(key, {"cas_blob": 1, "content_hash": 1})
+    original = database._db.files.find_one(
+        {"file_id": file_id, "is_replica": {"$ne": True}}
+    )
+    # Una réplica no posee referencia propia al almacén por contenido
+    replica_meta = {k: v for k, v in (original or {}).items() if k not in ('_id', 'cas_blob')}
+    now = datetime.utcnow()
+    if not original:
+        mime_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        replica_meta.update({
+            "path": path,
+            "mime_type": mime_type,
+            "type": _file_type_for(mime_type),
+            "last_updated": now
+        })
+    replica_meta.update({
+        "file_id": file_id,
+        "node_id": cluster_state.node_id,
+        "name": replica_meta.get("name") or filename,
+        "physical_path": path,
+        "size": size,
+        "content_hash": content_hash,
+        "is_replica": True,
+        "replica_source": source_node or (original or {}).get("node_id"),
+        "replicated_at": now,
+        "modified_at": now
+    })
+    
+    update = {"$set": replica_meta}
+    if cas_blob:
+        replica_meta["cas_blob"] = True
+    else:
+        update["$unset"] = {"cas_blob": ""}
+    
+    database._db.files.update_one(key, update, upsert=True)
+    rebind_blob_reference(previous, content_hash if cas_blob else None, size)
+    # Sin fila en file_contents la réplica solo casaría por nombre
+    database.index_replica_content(
+        file_id, replica_meta["name"], path, replica_meta.get("type")
+    )
+
+
+def _file_type_for(mime_type: str) -> str:
+    """Tipo de archivo a partir del MIME (mismo criterio que el registro de carpetas)"""
+    if mime_type.startswith('image'):
+        return 'image'
+    if mime_type.startswith('video'):
+        return 'video'
+    if mime_type.startswith('audio'):
+        return 'audio'
+    if mime_type.startswith('text') or 'document' in mime_type:
+        return 'document'
+    return 'other'
+
+
+class MerkleRequest(BaseModel):
+    """Direcciones del árbol de Merkle a describir ("" es la raíz)"""
+    source: Optional[str] = None  # Origen de los archivos (por defecto, este nodo)
+    paths: List[str] = Field(default_factory=lambda: [""])
+
+
+@router.post("/merkle")
+async def describe_merkle(request: MerkleRequest):
+    """
+    Describe nodos del árbol de Merkle (file_id, content_hash) de este
+    nodo: hashes de los hijos o, en las hojas, sus entradas.
+    
+    Un par compara un nivel por llamada y solo pide las ramas distintas.
+    """
+    from services.dynamic_replication import get_replication_service
+    
+    tree = get_replication_service().get_merkle_tree(
+        cluster_state.node_id, request.source or cluster_state.node_id
+    )
+    try:
+        return {"nodes": tree.describe(request.paths)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # ============================================================================
 # Endpoints de Estado del Cluster
 # ============================================================================
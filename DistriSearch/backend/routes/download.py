@@ -5,6 +5,8 @@ import socket
 from typing import Optional
 import httpx
 import database
+from core.http_client import get_http_client_manager
+from core.circuit_breaker import CircuitOpenError, get_circuit_breakers
 from models import DownloadRequest
 from services import node_service, index_service
 from auth import get_current_active_user
@@ -53,7 +55,7 @@ def get_public_base_url(request: Request) -> str:
     return base_url
 
 def _select_node_for_file(file_id: str, preferred_node_id: Optional[str] = None):
-    """Selecciona un nodo online que tenga el archivo."""
+    """Selecciona un nodo online (y no expulsado por su circuit breaker) que tenga el archivo."""
     # Buscar en MongoDB
     file_meta = database._db.files.find_one({"file_id": file_id})
     if not file_meta:
@@ -61,14 +63,15 @@ def _select_node_for_file(file_id: str, preferred_node_id: Optional[str] = None)
 
     candidate_node_id = preferred_node_id or file_meta["node_id"]
     node = node_service.get_node(candidate_node_id)
+    breakers = get_circuit_breakers()
 
-    if not node or node["status"] != "online":
+    if not node or node["status"] != "online" or not breakers.is_available(node["node_id"]):
         # Buscar otros nodos con el archivo
         other_files = list(database._db.files.find({"file_id": file_id}))
         online_nodes = []
         for f in other_files:
             n = database.get_node(f["node_id"])
-            if n and n["status"] == "online":
+            if n and n["status"] == "online" and breakers.is_available(n["node_id"]):
                 online_nodes.append(n)
         
         if not online_nodes:
@@ -107,14 +110,15 @@ async def download_file(file_id: str, preferred_node_id: Optional[str] = None):
 
     url = f"http://{node['ip_address']}:{node['port']}/files/{file_id}"
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.get(url)
+        with get_circuit_breakers().guard(node["node_id"]):
+            resp = await get_http_client_manager().get(url, timeout=60)
+            if resp.status_code != 200:
+                raise HTTPException(status_code=resp.status_code, detail="El nodo no pudo servir el archivo")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.RequestError as e:
         raise HTTPException(status_code=502, detail=f"Error al contactar nodo: {e}")
 
-    if resp.status_code != 200:
-        raise HTTPException(status_code=resp.status_code, detail="El nodo no pudo servir el archivo")
-
     headers = {}
     cd = resp.headers.get("content-disposition")
     if cd:
@@ -11,6 +11,7 @@ import mimetypes
 import hashlib
 import logging
 from services.dynamic_replication import get_replication_service 
+from services.content_service import get_content_store, release_blob
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +58,9 @@ async def delete_node(node_id: str, delete_files: bool = True, _: None = Depends
     db = client[os.getenv("MONGO_DBNAME", "distrisearch")]
     
     if delete_files:
+        # Liberar las referencias al almacén por contenido
+        for f in db.files.find({"node_id": node_id, "cas_blob": True}, {"content_hash": 1}):
+            release_blob(f["content_hash"])
         db.files.delete_many({"node_id": node_id})
         # Limpiar contenidos huérfanos
         file_ids = [f["file_id"] for f in db.files.find({}, {"file_id": 1})]
@@ -194,7 +198,11 @@ async def sync_node_folder(node_id: str, _: None = Depends(require_api_key)):
     stale = list(existing_ids - current_ids)
     
     if stale:
-        db.files.delete_many({"node_id": node_id, "file_id": {"$in": stale}})
+        # Liberar las referencias al almacén por contenido (como delete_node)
+        stale_filter = {"node_id": node_id, "file_id": {"$in": stale}}
+        for f in db.files.find(dict(stale_filter, cas_blob=True), {"content_hash": 1}):
+            release_blob(f["content_hash"])
+        db.files.delete_many(stale_filter)
         file_ids = [f["file_id"] for f in db.files.find({}, {"file_id": 1})]
         db.file_contents.delete_many({"file_id": {"$nin": file_ids}})
     
@@ -278,22 +286,23 @@ async def upload_file_to_system(
         if not node:
             raise HTTPException(status_code=404, detail=f"Nodo {node_id} no encontrado")
         
-        # Crear directorio del nodo si no existe
-        uploads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "uploads", node_id))
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        # Guardar archivo
-        file_path = os.path.join(uploads_dir, file.filename)
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Calcular hash
-        content_hash = hashlib.sha256(content).hexdigest()
+        # Guardar en el almacén por contenido: un upload idéntico a uno
+        # previo (en cualquier nodo) no vuelve a escribir los bytes
+        store = get_content_store()
+        content_hash, created = store.put_bytes(content)
+        file_path = store.blob_path(content_hash)
+        deduplicated = not created
         
         # Generar file_id único
         file_id = f"{node_id}_{content_hash[:16]}"
         
+        # Una referencia por (file_id, nodo): re-subir lo mismo no suma otra
+        already_registered = database._db.files.find_one(
+            {"file_id": file_id, "node_id": node_id}, {"_id": 1}
+        ) is not None
+        if not already_registered:
+            database.add_blob_reference(content_hash, len(content))
+        
         # Determinar tipo de archivo
         mime_type = file.content_type or "application/octet-stream"
         
@@ -323,8 +332,15 @@ async def upload_file_to_system(
         
         # Registrar en base de datos
         database.register_file(file_meta)
+        database._db.files.update_one(
+            {"file_id": file_id, "node_id": node_id},
+            {"$set": {"physical_path": file_path, "cas_blob": True}}
+        )
         
-        logger.info(f"✅ Archivo subido: {file_id} ({len(content)} bytes)")
+        logger.info(
+            f"✅ Archivo subido: {file_id} ({len(content)} bytes"
+            f"{', deduplicado' if deduplicated else ''})"
+        )
         
         # ✅ ARREGLO CRÍTICO: Siempre intentar replicar si está habilitado
         replication_result = None
@@ -368,6 +384,7 @@ async def upload_file_to_system(
             "node_id": node_id,
             "content_hash": content_hash,
             "path": file_path,
+            "deduplicated": deduplicated,
             "replicated": replication_result is not None,
             "replication_info": replication_result
         }
@@ -4,6 +4,7 @@ from typing import Optional
 from models import SearchQuery, SearchResult, FileType
 from services import index_service, node_service
 from auth import get_current_active_user
+from cluster import get_load_monitor
 import database
 
 router = APIRouter(
@@ -26,7 +27,9 @@ async def search_files(
 
     if include_score:
         file_type_str = file_type.value if file_type else None
-        rows = database.search_files(query=q, file_type=file_type_str, limit=max_results)
+        # Latencia y cola de búsquedas que viajan en los heartbeats
+        with get_load_monitor().track():
+            rows = database.search_files(query=q, file_type=file_type_str, limit=max_results)
         node_ids = {r["node_id"] for r in rows}
         nodes = []
         for nid in node_ids:
@@ -55,7 +58,8 @@ async def search_files(
             file_type=file_type,
             max_results=max_results
         )
-        return index_service.search_files(query)
+        with get_load_monitor().track():
+            return index_service.search_files(query)
 
 @router.get("/stats")
 async def search_stats():
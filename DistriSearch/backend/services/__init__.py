@@ -9,6 +9,7 @@ Módulos de servicios del backend:
 - cluster_init: Inicialización del cluster
 - checkpoint_service: Checkpoints y recuperación
 - reliability_metrics: Métricas de fiabilidad
+- content_service: Almacén por contenido (deduplicación)
 """
 
 from .node_service import (
@@ -10,6 +10,8 @@ from pymongo import MongoClient
 import json
 import hashlib
 
+from core.throttling import CHECKPOINT, get_bandwidth_throttle
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,13 +64,19 @@ class CheckpointService:
             # 2. Obtener lista de archivos
             files_snapshot = list(self.db.files.find(
                 {"node_id": node_id},
-                {"_id": 0, "file_id": 1, "content_hash": 1, "last_updated": 1}
+                {"_id": 0, "file_id": 1, "content_hash": 1, "last_updated": 1,
+                 "size": 1, "cas_blob": 1}
             ))
             
             # 3. Calcular hash del checkpoint (detección de corrupción)
             checkpoint_data = json.dumps(files_snapshot, sort_keys=True, default=str)
             checkpoint_hash = hashlib.sha256(checkpoint_data.encode()).hexdigest()
             
+            # Los checkpoints son tráfico de fondo: respetar su límite de ancho de banda
+            await get_bandwidth_throttle().throttle(
+                len(checkpoint_data), source=node_id, traffic=CHECKPOINT
+            )
+            
             # 4. Guardar en almacenamiento estable (MongoDB)
             checkpoint_doc = {
                 **node_state,
@@ -208,9 +216,25 @@ class CheckpointService:
         return True
     
     async def _restore_node_state(self, node_checkpoint: Dict):
-        """Restaura estado de un nodo desde su checkpoint"""
+        """
+        Restaura estado de un nodo desde su checkpoint.
+        
+        Los registros que usan un blob del almacén por contenido
+        (`cas_blob`) vuelven a tomar su referencia si el blob sigue
+        existiendo; las de los registros reemplazados se liberan
+        después, para no borrar un blob que el snapshot aún usa.
+        """
+        import database
+        from services.content_service import get_content_store, release_blob
+        
         node_id = node_checkpoint['node_id']
         files_snapshot = node_checkpoint.get('files_snapshot', [])
+        store = get_content_store()
+        
+        replaced_blobs = [
+            f['content_hash']
+            for f in self.db.files.find({"node_id": node_id, "cas_blob": True}, {"content_hash": 1})
+        ]
         
         # Eliminar archivos actuales del nodo
         self.db.files.delete_many({"node_id": node_id})
@@ -219,14 +243,26 @@ class CheckpointService:
         if files_snapshot:
             # Reconstruir documentos completos desde metadata
             for file_meta in files_snapshot:
-                self.db.files.insert_one({
+                doc = {
                     "file_id": file_meta['file_id'],
                     "node_id": node_id,
                     "content_hash": file_meta.get('content_hash'),
                     "last_updated": file_meta.get('last_updated'),
                     "restored_from_checkpoint": True,
-                    "checkpoint_timestamp": node_checkpoint['timestamp']
-                })
+                    "checkpoint_timestamp": node_checkpoint['timestamp'],
+                    "modified_at": datetime.utcnow()
+                }
+                content_hash = file_meta.get('content_hash')
+                if file_meta.get('cas_blob') and content_hash and store.has(content_hash):
+                    database.add_blob_reference(content_hash, file_meta.get('size') or 0)
+                    doc.update({
+                        "cas_blob": True,
+                        "physical_path": store.blob_path(content_hash)
+                    })
+                self.db.files.insert_one(doc)
+        
+        for content_hash in replaced_blobs:
+            release_blob(content_hash)
         
         logger.info(f"✅ Estado de {node_id} restaurado: {len(files_snapshot)} archivos")
 
@@ -8,10 +8,11 @@ Inicializa los servicios del cluster Master-Slave:
 """
 import asyncio
 import logging
+import os
 from typing import Optional, Dict
 
 # Importar desde el nuevo módulo cluster
-from cluster import HeartbeatService, BullyElection
+from cluster import HeartbeatService, BullyElection, get_load_monitor
 
 logger = logging.getLogger(__name__)
 
@@ -86,7 +87,9 @@ class ClusterInitializer:
             heartbeat_interval=heartbeat_interval,
             heartbeat_timeout=heartbeat_timeout,
             on_node_down=self._on_node_down,
-            on_master_down=self._on_master_down
+            on_master_down=self._on_master_down,
+            load_provider=get_load_monitor().snapshot,
+            on_load_report=self._on_load_report
         )
         
         # Crear servicio de elección
@@ -152,10 +155,15 @@ class ClusterInitializer:
         logger.warning(f"⚠️ Nodo caído detectado: {node_id}")
         
         cs = _get_cluster_state()
-        # Actualizar estado en cluster_state
-        if node_id in cs.peers:
-            # Marcar como offline
-            pass
+        # Re-replicar desde los supervivientes lo que guardaba el nodo
+        if cs.is_master and cs.replication_coordinator:
+            asyncio.create_task(cs.replication_coordinator.handle_node_failure(node_id))
+    
+    def _on_load_report(self, node_id: str, report: Dict) -> None:
+        """Callback con la carga reportada por un peer en su heartbeat"""
+        cs = _get_cluster_state()
+        if cs.is_master and cs.load_balancer:
+            cs.load_balancer.apply_load_report(node_id, report)
     
     def _on_master_down(self) -> None:
         """Callback cuando el master cae"""
@@ -197,6 +205,10 @@ class ClusterInitializer:
             from master.location_index import SemanticLocationIndex
             from master.load_balancer import LoadBalancer
             from master.embedding_service import get_embedding_service
+            from master.query_router import QueryRouter
+            from master.query_tracing import QueryTracer
+            from master.admission_control import AdmissionController
+            from master.replication_coordinator import ReplicationCoordinator
             
             cs = _get_cluster_state()
             
@@ -211,6 +223,34 @@ class ClusterInitializer:
             # Crear balanceador
             cs.load_balancer = LoadBalancer(strategy="weighted")
             
+            # Crear router de queries con trazas muestreadas
+            cs.query_router = QueryRouter(
+                location_index=cs.location_index,
+                load_balancer=cs.load_balancer,
+                embedding_service=embedding_service,
+                tracer=QueryTracer(
+                    sample_rate=float(os.getenv("QUERY_TRACE_SAMPLE_RATE", "0.1")),
+                    slow_threshold_ms=float(os.getenv("QUERY_SLOW_THRESHOLD_MS", "500"))
+                ),
+                # 0 (por defecto) = sin batching
+                batch_window_ms=float(os.getenv("QUERY_BATCH_WINDOW_MS", "0")) or None
+            )
+            
+            # Control de admisión delante del router
+            cs.admission_controller = AdmissionController(
+                rate_per_key=float(os.getenv("SEARCH_RATE_PER_KEY", "10")),
+                burst_per_key=float(os.getenv("SEARCH_BURST_PER_KEY", "20")),
+                max_concurrent=int(os.getenv("SEARCH_MAX_CONCURRENT", "32")),
+                max_queue=int(os.getenv("SEARCH_MAX_QUEUE", "64"))
+            )
+            
+            # Coordinador de replicación (recuperación ante caídas de nodos)
+            cs.replication_coordinator = ReplicationCoordinator(
+                replication_factor=int(os.getenv("REPLICATION_FACTOR", "2")),
+                location_index=cs.location_index
+            )
+            asyncio.create_task(cs.replication_coordinator.start())
+            
             logger.info("✅ Componentes de Master inicializados")
             
         except Exception as e:
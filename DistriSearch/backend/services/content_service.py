@@ -0,0 +1,51 @@
+"""
+Servicio de almacén por contenido (deduplicación de uploads y réplicas).
+
+Los bytes viven una vez en uploads/cas/<hash>; cada archivo registrado
+que los usa suma una referencia en la colección `blobs`.
+"""
+import logging
+import os
+from typing import Dict, Optional
+
+import database
+from core.content_store import ContentStore
+
+logger = logging.getLogger(__name__)
+
+_content_store: Optional[ContentStore] = None
+
+
+def get_content_store() -> ContentStore:
+    """Almacén por contenido compartido por los uploads de todos los nodos"""
+    global _content_store
+    if _content_store is None:
+        _content_store = ContentStore(os.path.abspath(os.path.join(
+            os.path.dirname(__file__), "..", "uploads", "cas"
+        )))
+    return _content_store
+
+
+def release_blob(content_hash: str) -> None:
+    """Resta una referencia y borra el blob cuando nadie lo usa"""
+    if database.release_blob_reference(content_hash) == 0:
+        if get_content_store().remove(content_hash):
+            logger.info(f"Blob sin referencias eliminado: {content_hash[:16]}")
+
+
+def rebind_blob_reference(previous: Optional[Dict], content_hash: Optional[str], size: int = 0) -> None:
+    """
+    Ajusta las referencias al re-registrar la copia de un archivo en un nodo.
+
+    Args:
+        previous: Registro anterior de esa copia (None si no existía)
+        content_hash: Blob que usa ahora la copia (None si tiene ruta propia)
+        size: Tamaño del blob (para crear su registro)
+    """
+    old_hash = previous.get("content_hash") if previous and previous.get("cas_blob") else None
+    if content_hash == old_hash:
+        return
+    if content_hash:
+        database.add_blob_reference(content_hash, size)
+    if old_hash:
+        release_blob(old_hash)
@@ -4,7 +4,9 @@ Implementa el protocolo de escritura local y consenso adaptativo
 """
 import logging
 import asyncio
+import functools
 import hashlib
+import time
 from typing import List, Dict, Optional, Set
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -13,8 +15,17 @@ import threading
 import httpx
 from pymongo import MongoClient
 
+from core.placement import RendezvousPlacement
+from core.chunked_transfer import copy_file_chunked
+from core.delta_sync import sync_file_delta
+from core.merkle import MerkleTree, MerkleDiff, Describe, http_describe, merkle_diff
+from core.throttling import get_bandwidth_throttle
+
 logger = logging.getLogger(__name__)
 
+SYNC_STATE_ID = "eventual_consistency"
+FULL_SWEEP_YIELD_EVERY = 200
+
 class DynamicReplicationService:
     """
     Implementa replicación dinámica con:
@@ -32,31 +43,58 @@ class DynamicReplicationService:
         
         # Configuración de consistencia
         self.sync_interval = int(os.getenv("SYNC_INTERVAL_SECONDS", "60"))
+        # Las pasadas periódicas solo miran lo modificado desde el último
+        # checkpoint; cada `full_sync_interval` s se revisa todo como red de seguridad
+        self.full_sync_interval = int(os.getenv("FULL_SYNC_INTERVAL_SECONDS", "3600"))
+        self.watermark_overlap = timedelta(seconds=int(os.getenv("SYNC_WATERMARK_OVERLAP_SECONDS", "5")))
         self.conflict_resolution = os.getenv("CONFLICT_RESOLUTION", "last_write_wins")
         
+        # Colocación en memoria: nodos online refrescados cada `placement_ttl` s
+        self.placement_ttl = float(os.getenv("PLACEMENT_REFRESH_SECONDS", "10"))
+        self._placement = RendezvousPlacement()
+        self._online_nodes: Dict[str, Dict] = {}
+        self._placement_refreshed_at = 0.0
+        
+        # Árboles de Merkle por (nodo, origen): se actualizan con lo
+        # modificado desde su construcción y se reconstruyen enteros
+        # cada `full_sync_interval` s (para reflejar borrados)
+        self._merkle_trees: Dict[tuple, tuple] = {}
+        # Los árboles de los pares se piden por POST /cluster/merkle
+        self.merkle_timeout = float(os.getenv("MERKLE_EXCHANGE_TIMEOUT_SECONDS", "10"))
+    
+    def refresh_placement(self, force: bool = False) -> None:
+        """
+        Recarga los nodos online y sus pesos (campo `capacity`, 1.0 por
+        defecto) a lo sumo una vez por `placement_ttl` segundos.
+        """
+        now = time.monotonic()
+        if not force and now - self._placement_refreshed_at < self.placement_ttl:
+            return
+        
+        nodes = list(self.db.nodes.find({"status": "online"}))
+        self._online_nodes = {n['node_id']: n for n in nodes}
+        self._placement.update({
+            n['node_id']: float(n.get('capacity') or 1.0) for n in nodes
+        })
+        self._placement_refreshed_at = now
+        
     def get_replication_nodes(self, file_id: str, exclude_nodes: Set[str] = None) -> List[Dict]:
         """
         Selecciona nodos para replicar según:
         1. Factor de replicación
         2. Nodos online
-        3. Distribución geográfica/de carga
+        3. Rendezvous hashing ponderado por capacidad: la misma
+           colocación en todos los procesos y tras reinicios
         """
         exclude_nodes = exclude_nodes or set()
+        self.refresh_placement()
         
-        # Obtener nodos online
-        online_nodes = list(self.db.nodes.find({
-            "status": "online",
-            "node_id": {"$nin": list(exclude_nodes)}
-        }))
-        
-        if len(online_nodes) < self.replication_factor:
-            logger.warning(f"Solo {len(online_nodes)} nodos disponibles, factor requerido: {self.replication_factor}")
-        
-        # Seleccionar usando hash consistente
-        file_hash = int(hashlib.md5(file_id.encode()).hexdigest(), 16)
-        sorted_nodes = sorted(online_nodes, key=lambda n: abs(hash(n['node_id']) - file_hash))
+        available = len(self._placement) - len(exclude_nodes & self._online_nodes.keys())
+        if available < self.replication_factor:
+            logger.warning(f"Solo {available} nodos disponibles, factor requerido: {self.replication_factor}")
         
-        return sorted_nodes[:self.replication_factor]
+        node_ids = self._placement.place(file_id, self.replication_factor, exclude=exclude_nodes)
+        return [self._online_nodes[node_id] for node_id in node_ids]
     
     async def replicate_file(self, file_meta: Dict, source_node_id: str) -> Dict:
         """
@@ -136,6 +174,26 @@ class DynamicReplicationService:
         ✅ ARREGLO CRÍTICO: Implementación real de replicación
         """
         try:
+            target_id = target_node['node_id']
+            content_hash = file_meta.get('content_hash') or ''
+            
+            # 0. Si el destino ya guarda ese contenido en el almacén por
+            #    contenido, enlazar el blob (con su propia referencia)
+            if content_hash:
+                from services.content_service import get_content_store
+                holder = self.db.files.find_one(
+                    {"node_id": target_id, "content_hash": content_hash},
+                    {"_id": 1}
+                )
+                store = get_content_store()
+                if holder is not None and store.has(content_hash):
+                    self._register_replica(
+                        file_meta, source_node_id, target_id,
+                        store.blob_path(content_hash), cas_blob=True
+                    )
+                    logger.info(f"♻️ {target_id} ya tiene el contenido de {file_meta['file_id']}: sin copia")
+                    return {"status": "success", "node_id": target_id, "deduplicated": True}
+            
             # 1. Leer archivo físico del nodo origen
             source_path = file_meta.get('physical_path')
             
@@ -149,31 +207,22 @@ class DynamicReplicationService:
             if not os.path.exists(source_path):
                 raise FileNotFoundError(f"Archivo origen no encontrado: {source_path}")
             
-            # 2. Leer contenido
-            with open(source_path, 'rb') as f:
-                content = f.read()
-            
-            # 3. Guardar réplica en directorio del nodo destino
-            target_uploads_dir = os.path.abspath(os.path.join(
-                os.path.dirname(__file__), "..", "uploads", target_node['node_id']
-            ))
-            os.makedirs(target_uploads_dir, exist_ok=True)
+            # 2. Copiar por chunks a la carpeta del nodo destino, sin cargar
+            #    el archivo en memoria y verificando el SHA-256 registrado
+            target_path = self._replica_path(file_meta, target_id)
             
-            target_path = os.path.join(target_uploads_dir, file_meta['name'])
-            
-            # Escribir archivo
-            with open(target_path, 'wb') as f:
-                f.write(content)
-            
-            # 4. Registrar en MongoDB
-            replica_meta = file_meta.copy()
-            replica_meta['node_id'] = target_node['node_id']
-            replica_meta['is_replica'] = True
-            replica_meta['replica_source'] = source_node_id
-            replica_meta['replicated_at'] = datetime.utcnow()
+            expected_sha256 = content_hash if len(content_hash) == 64 else None
+            await asyncio.to_thread(
+                copy_file_chunked, source_path, target_path,
+                expected_sha256=expected_sha256,
+                throttle=functools.partial(
+                    get_bandwidth_throttle().throttle_blocking,
+                    source=source_node_id, target=target_id
+                )
+            )
             
-            # Insertar en DB
-            self.db.files.insert_one(replica_meta)
+            # 3. Registrar en MongoDB
+            self._register_replica(file_meta, source_node_id, target_id, target_path)
             
             logger.info(f"✅ Réplica guardada: {target_node['node_id']}/{file_meta['name']}")
             
@@ -183,33 +232,105 @@ class DynamicReplicationService:
             logger.error(f"❌ Error replicando a {target_node['node_id']}: {e}")
             return {"status": "error", "error": str(e)}
     
-    async def synchronize_eventual_consistency(self):
+    def _register_replica(
+        self,
+        file_meta: Dict,
+        source_node_id: str,
+        target_node_id: str,
+        physical_path: Optional[str],
+        cas_blob: bool = False
+    ) -> None:
+        """
+        Registra (o actualiza) la réplica de un archivo en un nodo.
+        
+        Con `cas_blob` la réplica enlaza el blob del almacén por contenido
+        y toma su propia referencia (marcada con `cas_blob`), así el blob
+        no se borra mientras la réplica lo use. Al pasar a una copia
+        propia se libera la referencia anterior.
+        """
+        from services.content_service import rebind_blob_reference
+        
+        key = {"file_id": file_meta['file_id'], "node_id": target_node_id}
+        previous = self.db.files.find_one(key, {"cas_blob": 1, "content_hash": 1})
+        
+        replica_meta = {k: v for k, v in file_meta.items() if k not in ('_id', 'cas_blob')}
+        replica_meta['node_id'] = target_node_id
+        replica_meta['physical_path'] = physical_path
+        replica_meta['is_replica'] = True
+        replica_meta['replica_source'] = source_node_id
+        replica_meta['replicated_at'] = datetime.utcnow()
+        replica_meta['modified_at'] = replica_meta['replicated_at']
+        
+        update = {"$set": replica_meta}
+        if cas_blob:
+            replica_meta['cas_blob'] = True
+        else:
+            update["$unset"] = {"cas_blob": ""}
+        
+        self.db.files.update_one(key, update, upsert=True)
+        rebind_blob_reference(
+            previous,
+            file_meta.get('content_hash') if cas_blob else None,
+            file_meta.get('size', 0)
+        )
+    
+    async def synchronize_eventual_consistency(self, full: bool = False):
         """
         Sincronización periódica para garantizar consistencia eventual
         - Detecta archivos desactualizados
         - Resuelve conflictos
         - Propaga cambios
+        
+        Incremental: solo examina los file_id con `modified_at` posterior
+        al checkpoint persistido en `sync_state` (menos un margen de
+        solape). Hace una pasada completa si se pide, si no hay
+        checkpoint o si la última completa tiene más de
+        `full_sync_interval` segundos.
         """
-        logger.info("Iniciando sincronización de consistencia eventual")
+        started_at = datetime.utcnow()
+        state = self.db.sync_state.find_one({"_id": SYNC_STATE_ID}) or {}
+        watermark = state.get("watermark")
+        last_full = state.get("last_full_sweep")
         
-        # Obtener todos los archivos únicos
-        pipeline = [
+        full = full or watermark is None or last_full is None or \
+            (started_at - last_full).total_seconds() >= self.full_sync_interval
+        
+        if full:
+            logger.info("Iniciando sincronización de consistencia eventual (completa)")
+            match = None
+        else:
+            changed = self.db.files.distinct(
+                "file_id", {"modified_at": {"$gt": watermark - self.watermark_overlap}}
+            )
+            if not changed:
+                self._save_sync_checkpoint(started_at, last_full)
+                return {
+                    "mode": "incremental",
+                    "files_synced": 0,
+                    "conflicts_resolved": 0,
+                    "timestamp": started_at
+                }
+            logger.info(f"Iniciando sincronización incremental: {len(changed)} archivos modificados")
+            match = {"file_id": {"$in": changed}}
+        
+        pipeline = ([{"$match": match}] if match else []) + [
             {"$group": {
                 "_id": "$file_id",
                 "versions": {"$push": {
                     "node_id": "$node_id",
                     "last_updated": "$last_updated",
-                    "content_hash": "$content_hash"
+                    "content_hash": "$content_hash",
+                    "physical_path": "$physical_path",
+                    "cas_blob": "$cas_blob"
                 }}
             }}
         ]
         
-        files_versions = list(self.db.files.aggregate(pipeline))
-        
         conflicts_resolved = 0
         files_synced = 0
         
-        for file_group in files_versions:
+        # El cursor se recorre sin materializar todos los grupos
+        for file_group in self.db.files.aggregate(pipeline, allowDiskUse=True):
             file_id = file_group['_id']
             versions = file_group['versions']
             
@@ -223,15 +344,32 @@ class DynamicReplicationService:
                 conflicts_resolved += 1
             
             files_synced += 1
+            if full and files_synced % FULL_SWEEP_YIELD_EVERY == 0:
+                # Pasada completa de baja prioridad: ceder el event loop
+                await asyncio.sleep(0)
         
-        logger.info(f"Sincronización completada: {files_synced} archivos, {conflicts_resolved} conflictos resueltos")
+        self._save_sync_checkpoint(started_at, started_at if full else last_full)
+        
+        logger.info(
+            f"Sincronización {'completa' if full else 'incremental'} completada: "
+            f"{files_synced} archivos, {conflicts_resolved} conflictos resueltos"
+        )
         
         return {
+            "mode": "full" if full else "incremental",
             "files_synced": files_synced,
             "conflicts_resolved": conflicts_resolved,
             "timestamp": datetime.utcnow()
         }
     
+    def _save_sync_checkpoint(self, watermark: datetime, last_full_sweep: Optional[datetime]) -> None:
+        """Persiste el checkpoint: la próxima pasada empieza en `watermark`"""
+        self.db.sync_state.update_one(
+            {"_id": SYNC_STATE_ID},
+            {"$set": {"watermark": watermark, "last_full_sweep": last_full_sweep}},
+            upsert=True
+        )
+    
     def _resolve_conflict(self, file_id: str, versions: List[Dict]) -> Dict:
         """Resolución de conflictos con manejo de errores"""
         if self.conflict_resolution == "last_write_wins":
@@ -250,11 +388,20 @@ class DynamicReplicationService:
         return versions[0]
     
     async def _propagate_canonical_version(self, file_id: str, canonical: Dict, all_versions: List[Dict]):
-        """Propaga la versión canónica a todos los nodos"""
+        """
+        Propaga la versión canónica a los nodos con otra versión.
+        
+        Si el nodo conserva su versión anterior se actualiza por delta
+        (solo viajan los bloques cambiados); si no, copia completa.
+        """
         source_node_id = canonical['node_id']
+        canonical_hash = canonical.get('content_hash')
         
-        # Obtener nodos con versiones desactualizadas
-        outdated_nodes = [v['node_id'] for v in all_versions if v['node_id'] != source_node_id]
+        # Nodos con versiones desactualizadas (los que ya tienen el hash canónico no)
+        outdated = [
+            v for v in all_versions
+            if v['node_id'] != source_node_id and v.get('content_hash') != canonical_hash
+        ]
         
         # Obtener metadata completa
         file_meta = self.db.files.find_one({"file_id": file_id, "node_id": source_node_id})
@@ -263,14 +410,292 @@ class DynamicReplicationService:
             return
         
         # Replicar a nodos desactualizados
-        for node_id in outdated_nodes:
+        for version in outdated:
+            node_id = version['node_id']
             node = self.db.nodes.find_one({"node_id": node_id})
             if node and node.get('status') == 'online':
                 try:
-                    await self._replicate_to_node(file_meta, source_node_id, node)
+                    if not await self._sync_by_delta(file_meta, source_node_id, version):
+                        await self._replicate_to_node(file_meta, source_node_id, node)
                 except Exception as e:
                     logger.error(f"Error propagando a {node_id}: {e}")
     
+    async def _sync_by_delta(self, file_meta: Dict, source_node_id: str, outdated: Dict) -> bool:
+        """
+        Actualiza la copia de un nodo enviando solo los bloques cambiados.
+        
+        Returns:
+            False si no hay versión previa utilizable (hace falta copia completa)
+        """
+        source_path = self._local_path(file_meta, source_node_id)
+        basis_path = self._local_path(outdated, outdated['node_id'], name=file_meta.get('name'))
+        if not source_path or not basis_path:
+            return False
+        
+        # La base puede ser un blob compartido (inmutable) o la copia de
+        # otro archivo: se reconstruye siempre en la ruta propia de la réplica
+        output_path = self._replica_path(file_meta, outdated['node_id'])
+        
+        content_hash = file_meta.get('content_hash') or ''
+        stats = await asyncio.to_thread(
+            sync_file_delta, source_path, basis_path, output_path,
+            expected_sha256=content_hash if len(content_hash) == 64 else None
+        )
+        
+        self._register_replica(file_meta, source_node_id, outdated['node_id'], output_path)
+        if basis_path != output_path and not outdated.get('cas_blob') and \
+                self.db.files.count_documents({"physical_path": basis_path}, limit=1) == 0:
+            # Copia anterior que ya nadie referencia
+            try:
+                os.remove(basis_path)
+            except OSError as e:
+                logger.debug(f"No se pudo borrar la copia anterior {basis_path}: {e}")
+        
+        logger.info(
+            f"🔁 Delta aplicado en {outdated['node_id']}/{file_meta['name']}: "
+            f"{stats.transferred_bytes} de {stats.file_size} bytes enviados"
+        )
+        return True
+    
+    @staticmethod
+    def _replica_path(file_meta: Dict, node_id: str) -> str:
+        """Ruta propia de la copia de un archivo en un nodo (única por file_id)"""
+        uploads_dir = os.path.abspath(os.path.join(
+            os.path.dirname(__file__), "..", "uploads", node_id
+        ))
+        os.makedirs(uploads_dir, exist_ok=True)
+        name = hashlib.sha1(file_meta['file_id'].encode("utf-8")).hexdigest()
+        return os.path.join(uploads_dir, name + os.path.splitext(file_meta.get('name') or "")[1])
+    
+    @staticmethod
+    def _local_path(meta: Dict, node_id: str, name: Optional[str] = None) -> Optional[str]:
+        """Ruta física de la copia de un nodo, si existe"""
+        path = meta.get('physical_path')
+        if path and os.path.exists(path):
+            return path
+        name = name or meta.get('name')
+        if not name:
+            return None
+        path = os.path.abspath(os.path.join(
+            os.path.dirname(__file__), "..", "uploads", node_id, name
+        ))
+        return path if os.path.exists(path) else None
+    
+    def get_replica_map(self, file_ids: List[str]) -> Dict[str, Set[str]]:
+        """Mapa file_id -> nodos con copia, a partir de la colección files"""
+        replica_map: Dict[str, Set[str]] = defaultdict(set)
+        for doc in self.db.files.find({"file_id": {"$in": file_ids}}, {"file_id": 1, "node_id": 1}):
+            replica_map[doc['file_id']].add(doc['node_id'])
+        return replica_map
+    
+    def plan_recovery(self, file_ids: List[str], failed_nodes: Set[str]) -> Dict:
+        """
+        Calcula las copias que faltan para volver a `replication_factor`
+        copias online (el mismo umbral que get_replication_status).
+        
+        El origen de cada copia es el superviviente con menos copias
+        asignadas hasta el momento, para repartir la carga de lectura.
+        
+        Returns:
+            {"copies": [(file_id, origen, [destinos])], "lost": [file_ids]}
+        """
+        self.refresh_placement(force=True)
+        online = set(self._online_nodes) - failed_nodes
+        replica_map = self.get_replica_map(file_ids)
+        
+        # Primero los archivos con menos copias vivas
+        pending = sorted(
+            ((fid, sorted(holders & online), holders) for fid, holders in replica_map.items()),
+            key=lambda item: (len(item[1]), item[0])
+        )
+        
+        source_load: Dict[str, int] = defaultdict(int)
+        copies, lost = [], []
+        for file_id, survivors, holders in pending:
+            if not survivors:
+                lost.append(file_id)
+                continue
+            missing = self.replication_factor - len(survivors)
+            if missing <= 0:
+                continue
+            targets = self._placement.place(
+                file_id, missing, exclude=holders | failed_nodes
+            )
+            if not targets:
+                continue
+            source = min(survivors, key=lambda n: (source_load[n], n))
+            source_load[source] += 1
+            copies.append((file_id, source, targets))
+        
+        return {"copies": copies, "lost": lost}
+    
+    async def execute_recovery_plan(self, copies: List, max_concurrency: int = 8) -> Dict:
+        """Ejecuta las copias de un plan en paralelo, con concurrencia acotada"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        outcome = {"replicated": 0, "failed": 0}
+        
+        async def _copy(file_id: str, source: str, target: str) -> None:
+            async with semaphore:
+                file_meta = self.db.files.find_one({"file_id": file_id, "node_id": source})
+                node = self._online_nodes.get(target)
+                if not file_meta or not node:
+                    outcome["failed"] += 1
+                    return
+                result = await self._replicate_to_node(file_meta, source, node)
+                outcome["replicated" if result.get('status') == 'success' else "failed"] += 1
+        
+        await asyncio.gather(*(
+            _copy(file_id, source, target)
+            for file_id, source, targets in copies
+            for target in targets
+        ))
+        return outcome
+    
+    async def recover_from_node_failure(self, node_id: str) -> Dict:
+        """
+        Restaura el factor de replicación de los archivos que tenía un
+        nodo caído, copiando desde los supervivientes.
+        
+        Returns:
+            Resumen con archivos afectados, copias hechas, archivos sin
+            copias vivas y duración (para el MTTR)
+        """
+        started = time.monotonic()
+        file_ids = self.db.files.distinct("file_id", {"node_id": node_id})
+        
+        plan = self.plan_recovery(file_ids, failed_nodes={node_id})
+        outcome = await self.execute_recovery_plan(plan["copies"])
+        
+        if plan["lost"]:
+            logger.error(f"❌ {len(plan['lost'])} archivos sin copias online tras la caída de {node_id}")
+        result = {
+            "node_id": node_id,
+            "files_affected": len(file_ids),
+            "under_replicated": len(plan["copies"]),
+            "replicated": outcome["replicated"],
+            "failed": outcome["failed"],
+            "lost": len(plan["lost"]),
+            "duration_seconds": round(time.monotonic() - started, 3)
+        }
+        logger.info(f"🩹 Recuperación de {node_id}: {result}")
+        return result
+    
+    @staticmethod
+    def _merkle_filter(node_id: str, source_id: str) -> Dict:
+        """
+        Archivos que `node_id` guarda del origen `source_id`: los propios
+        si es el mismo nodo, sus réplicas de `source_id` si no.
+        """
+        if node_id == source_id:
+            return {"node_id": node_id, "is_replica": {"$ne": True}}
+        return {"node_id": node_id, "replica_source": source_id}
+    
+    def get_merkle_tree(self, node_id: str, source_id: str) -> MerkleTree:
+        """Árbol de Merkle (file_id, content_hash) de un nodo para un origen"""
+        key = (node_id, source_id)
+        now = datetime.utcnow()
+        cached = self._merkle_trees.get(key)
+        query = self._merkle_filter(node_id, source_id)
+        projection = {"file_id": 1, "content_hash": 1}
+        
+        if cached and (now - cached[2]).total_seconds() < self.full_sync_interval:
+            tree, built_at, full_at = cached
+            changed = dict(query, modified_at={"$gt": built_at - self.watermark_overlap})
+            for doc in self.db.files.find(changed, projection):
+                tree.set(doc['file_id'], doc.get('content_hash'))
+            self._merkle_trees[key] = (tree, now, full_at)
+            return tree
+        
+        tree = MerkleTree()
+        for doc in self.db.files.find(query, projection):
+            tree.set(doc['file_id'], doc.get('content_hash'))
+        self._merkle_trees[key] = (tree, now, now)
+        return tree
+    
+    async def anti_entropy(
+        self,
+        source_id: str,
+        peer_id: str,
+        remote: Optional[Describe] = None
+    ) -> Dict:
+        """
+        Reconcilia las réplicas que `peer_id` tiene de `source_id`
+        comparando árboles de Merkle: solo se bajan las ramas distintas.
+        
+        Las réplicas que faltan o difieren se vuelven a copiar desde el
+        origen; las que el origen ya no tiene solo se reportan.
+        
+        Args:
+            remote: Fuente del árbol del par; por defecto POST /cluster/merkle
+                    en el endpoint del par, que lo construye con su propia base
+        """
+        local = self.get_merkle_tree(source_id, source_id)
+        self.refresh_placement()
+        peer = self._online_nodes.get(peer_id)
+        
+        try:
+            if remote is not None:
+                diff: MerkleDiff = await merkle_diff(local, remote)
+            elif peer is None:
+                raise ConnectionError(f"{peer_id} no está online")
+            else:
+                async with httpx.AsyncClient(timeout=self.merkle_timeout) as http:
+                    diff = await merkle_diff(
+                        local, http_describe(http, self._node_url(peer), source=source_id)
+                    )
+        except (httpx.HTTPError, ConnectionError, KeyError, ValueError) as e:
+            logger.warning(f"Anti-entropía {source_id}->{peer_id} sin intercambio: {e}")
+            return {"source": source_id, "peer": peer_id, "in_sync": False, "error": str(e)}
+        
+        repaired = failed = 0
+        for file_id in sorted(diff.only_local | diff.different):
+            file_meta = self.db.files.find_one({"file_id": file_id, "node_id": source_id})
+            if not file_meta or not peer:
+                failed += 1
+                continue
+            result = await self._replicate_to_node(file_meta, source_id, peer)
+            if result.get('status') == 'success':
+                repaired += 1
+            else:
+                failed += 1
+        
+        if diff.only_remote:
+            logger.warning(
+                f"{len(diff.only_remote)} réplicas en {peer_id} sin original en {source_id}"
+            )
+        if not diff.in_sync:
+            logger.info(
+                f"🌳 Anti-entropía {source_id}->{peer_id}: {repaired} reparadas, "
+                f"{failed} fallidas, {diff.round_trips} round trips"
+            )
+        return {
+            "source": source_id,
+            "peer": peer_id,
+            "in_sync": diff.in_sync,
+            "missing": len(diff.only_local),
+            "outdated": len(diff.different),
+            "orphaned": len(diff.only_remote),
+            "repaired": repaired,
+            "failed": failed,
+            "round_trips": diff.round_trips
+        }
+    
+    @staticmethod
+    def _node_url(node: Dict) -> str:
+        """URL base de un nodo registrado en la colección `nodes`"""
+        return f"http://{node['ip_address']}:{node['port']}"
+    
+    async def reconcile_replica_holders(self) -> List[Dict]:
+        """Anti-entropía entre cada origen y cada nodo que guarda réplicas suyas"""
+        pairs = self.db.files.aggregate([
+            {"$match": {"is_replica": True, "replica_source": {"$ne": None}}},
+            {"$group": {"_id": {"source": "$replica_source", "peer": "$node_id"}}}
+        ])
+        results = []
+        for pair in pairs:
+            results.append(await self.anti_entropy(pair['_id']['source'], pair['_id']['peer']))
+        return results
+    
     def get_replication_status(self) -> Dict:
         """Obtiene estado de la replicación del sistema"""
         total_files = self.db.files.count_documents({})
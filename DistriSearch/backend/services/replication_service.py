@@ -47,18 +47,24 @@ def get_online_nodes_with_file(file_id: str) -> List[Dict]:
     
     return online_nodes
 
-def replicate_missing_files(batch: int = 25) -> Dict:
+async def replicate_missing_files(batch: int = 25) -> Dict:
     """Replica archivos de nodos OFFLINE a otros nodos online."""
+    from .dynamic_replication import get_replication_service
+
     offline_files = find_offline_files(limit=batch)
     if not offline_files:
         return {"checked": 0, "replicated": 0}
 
-    replicated = 0
-    for f in offline_files:
-        fid = f["file_id"]
-        candidates = get_online_nodes_with_file(fid)
-        if not candidates:
-            continue
-        replicated += 1
+    repl_service = get_replication_service()
+    offline_nodes = {f["node_id"] for f in offline_files}
+    plan = repl_service.plan_recovery(
+        list({f["file_id"] for f in offline_files}), failed_nodes=offline_nodes
+    )
+    outcome = await repl_service.execute_recovery_plan(plan["copies"])
 
-    return {"checked": len(offline_files), "replicated": replicated}
+    return {
+        "checked": len(offline_files),
+        "replicated": outcome["replicated"],
+        "failed": outcome["failed"],
+        "lost": len(plan["lost"])
+    }
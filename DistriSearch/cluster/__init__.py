@@ -6,9 +6,11 @@ Servicios de comunicación y coordinación del cluster distribuido:
 - Election: Algoritmo Bully para elección de líder
 - Discovery: Descubrimiento de nodos via Multicast UDP
 - Naming: Sistema de nombres jerárquico
+- Load report: Métricas de carga local para los heartbeats
 """
 
 from .heartbeat import HeartbeatService, HeartbeatState
+from .load_report import LocalLoadMonitor, get_load_monitor
 from .election import BullyElection, ElectionState, ElectionConfig
 from .discovery import MulticastDiscovery, get_multicast_service
 from .naming import HierarchicalNamespace, NamespaceNode, get_namespace, IPCache, get_ip_cache
@@ -18,6 +20,10 @@ __all__ = [
     "HeartbeatService",
     "HeartbeatState",
     
+    # Load report
+    "LocalLoadMonitor",
+    "get_load_monitor",
+    
     # Election
     "BullyElection",
     "ElectionState",
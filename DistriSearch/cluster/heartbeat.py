@@ -3,12 +3,14 @@ DistriSearch Cluster - Sistema de Heartbeat
 
 Monitoreo de nodos mediante heartbeats UDP.
 Detecta nodos caídos e inicia elección de líder si es necesario.
+Los PING/PONG transportan además un reporte de carga del emisor
+(CPU, memoria, cola, p50/p99) para el balanceador del Master.
 """
 import asyncio
 import socket
 import json
 import logging
-from typing import Dict, Callable, Optional, Set
+from typing import Any, Dict, Callable, Optional, Set
 from datetime import datetime
 from dataclasses import dataclass, field
 
@@ -51,6 +53,7 @@ class HeartbeatService:
     - Recibe PONGs y actualiza estado
     - Detecta nodos caídos
     - Notifica cuando el Master cae (para iniciar elección)
+    - Adjunta y entrega reportes de carga en cada PING/PONG
     """
     
     def __init__(
@@ -60,7 +63,9 @@ class HeartbeatService:
         heartbeat_interval: int = 5,
         heartbeat_timeout: int = 15,
         on_node_down: Optional[Callable[[str], None]] = None,
-        on_master_down: Optional[Callable[[], None]] = None
+        on_master_down: Optional[Callable[[], None]] = None,
+        load_provider: Optional[Callable[[], Dict[str, Any]]] = None,
+        on_load_report: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ):
         """
         Args:
@@ -70,6 +75,8 @@ class HeartbeatService:
             heartbeat_timeout: Segundos para considerar un nodo caído
             on_node_down: Callback cuando un nodo cae
             on_master_down: Callback cuando el master cae
+            load_provider: Devuelve el reporte de carga de este nodo
+            on_load_report: Callback (node_id, reporte) al recibir carga de un peer
         """
         self.node_id = node_id
         self.port = port
@@ -78,6 +85,8 @@ class HeartbeatService:
         
         self._on_node_down = on_node_down
         self._on_master_down = on_master_down
+        self._load_provider = load_provider
+        self._on_load_report = on_load_report
         
         # Estado de peers
         self._peers: Dict[str, HeartbeatState] = {}
@@ -154,7 +163,7 @@ class HeartbeatService:
                 message = ClusterMessage(
                     type=MessageType.PING,
                     sender_id=self.node_id,
-                    payload={"timestamp": datetime.utcnow().isoformat()}
+                    payload=self._with_load({"timestamp": datetime.utcnow().isoformat()})
                 )
                 data = json.dumps(message.to_dict()).encode('utf-8')
                 
@@ -178,7 +187,7 @@ class HeartbeatService:
         
         while self._running:
             try:
-                data, addr = await loop.sock_recvfrom(self._socket, 1024)
+                data, addr = await loop.sock_recvfrom(self._socket, 4096)
                 message = ClusterMessage.from_dict(json.loads(data.decode('utf-8')))
                 
                 await self._handle_message(message, addr)
@@ -193,12 +202,19 @@ class HeartbeatService:
         """Procesa un mensaje de heartbeat"""
         sender = message.sender_id
         
+        load = (message.payload or {}).get("load")
+        if load and self._on_load_report and message.type in (MessageType.PING, MessageType.PONG):
+            try:
+                self._on_load_report(sender, load)
+            except Exception as e:
+                logger.debug(f"Error procesando carga de {sender}: {e}")
+        
         if message.type == MessageType.PING:
             # Responder con PONG
             response = ClusterMessage(
                 type=MessageType.PONG,
                 sender_id=self.node_id,
-                payload={"in_reply_to": sender}
+                payload=self._with_load({"in_reply_to": sender})
             )
             data = json.dumps(response.to_dict()).encode('utf-8')
             self._socket.sendto(data, addr)
@@ -213,6 +229,15 @@ class HeartbeatService:
                 self._peers[sender].update()
                 logger.debug(f"PONG recibido de {sender}")
     
+    def _with_load(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Añade el reporte de carga local al payload del mensaje"""
+        if self._load_provider:
+            try:
+                payload["load"] = self._load_provider()
+            except Exception as e:
+                logger.debug(f"Error obteniendo reporte de carga: {e}")
+        return payload
+    
     async def _check_timeouts(self) -> None:
         """Verifica timeouts de peers periódicamente"""
         while self._running:
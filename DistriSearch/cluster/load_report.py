@@ -0,0 +1,105 @@
+"""
+DistriSearch Cluster - Reporte de carga local
+
+Métricas de carga de este nodo que viajan en el payload de los
+heartbeats UDP: CPU, memoria, profundidad de cola de búsquedas y
+percentiles p50/p99 de las últimas búsquedas atendidas. El Master
+las recibe y alimenta con ellas al LoadBalancer.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:  # Sin psutil se reportan solo las métricas de búsqueda
+    psutil = None
+
+
+class LocalLoadMonitor:
+    """
+    Acumulador de carga del nodo local.
+
+    Uso:
+        monitor = get_load_monitor()
+        with monitor.track():
+            results = await search(...)
+        payload = monitor.snapshot()
+    """
+
+    def __init__(self, window_size: int = 256):
+        """
+        Args:
+            window_size: Búsquedas recientes usadas para p50/p99
+        """
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        if psutil is not None:
+            # La primera lectura de cpu_percent(None) siempre es 0
+            psutil.cpu_percent(interval=None)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Cuenta una búsqueda en curso y registra su latencia al terminar"""
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self.record_query((time.perf_counter() - started) * 1000)
+
+    def record_query(self, latency_ms: float) -> None:
+        """Registra la latencia de una búsqueda local"""
+        with self._lock:
+            self._latencies.append(latency_ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Métricas actuales para el payload del heartbeat"""
+        with self._lock:
+            latencies = np.fromiter(self._latencies, dtype=float)
+            queue_depth = self._in_flight
+
+        report = {
+            "cpu_usage": 0.0,
+            "memory_usage": 0.0,
+            "queue_depth": queue_depth,
+            "p50_ms": 0.0,
+            "p99_ms": 0.0
+        }
+        if latencies.size:
+            p50, p99 = np.percentile(latencies, [50, 99])
+            report["p50_ms"] = round(float(p50), 2)
+            report["p99_ms"] = round(float(p99), 2)
+
+        if psutil is not None:
+            try:
+                report["cpu_usage"] = psutil.cpu_percent(interval=None)
+                report["memory_usage"] = psutil.virtual_memory().percent
+            except Exception as e:
+                logger.debug(f"Error leyendo métricas del sistema: {e}")
+
+        return report
+
+
+# Instancia global
+_load_monitor: Optional[LocalLoadMonitor] = None
+
+
+def get_load_monitor() -> LocalLoadMonitor:
+    """Obtiene el monitor de carga del proceso"""
+    global _load_monitor
+    if _load_monitor is None:
+        _load_monitor = LocalLoadMonitor()
+    return _load_monitor
@@ -0,0 +1,406 @@
+"""
+DistriSearch Core - Transferencia de archivos por chunks
+
+Replicación sin cargar el archivo completo en memoria:
+- El emisor lee el origen en streaming y envía chunks de tamaño
+  fijo al destino (PUT .../chunk?offset=N); la memoria por
+  transferencia queda acotada a un chunk.
+- SHA-256 incremental: el emisor lo calcula sobre los bytes en
+  orden y el receptor lo verifica al confirmar (commit).
+- Reanudación: ante un fallo se consulta el último offset
+  confirmado por el destino y se continúa desde ahí (Range en
+  el origen), sin reenviar lo ya recibido.
+
+Protocolo del receptor (ver ReplicaReceiver y routes/cluster.py):
+    GET  {target}/offset            -> {"offset": N}
+    PUT  {target}/chunk?offset=N    -> {"offset": N + len} | 409 {"offset": actual}
+    POST {target}/commit            -> {"sha256", "size", ...metadatos} | 422 si no coincide
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+class TransferError(Exception):
+    """Fallo de una transferencia tras agotar los reintentos"""
+
+    def __init__(self, message: str, side: str = "target"):
+        super().__init__(message)
+        self.side = side  # "source" o "target": nodo responsable del fallo
+
+
+class ChecksumMismatch(TransferError):
+    """El SHA-256 recibido no coincide con el esperado"""
+
+
+class OffsetConflict(Exception):
+    """El chunk no empieza en el offset confirmado por el receptor"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Offset esperado por el receptor: {offset}")
+        self.offset = offset
+
+
+@dataclass
+class TransferResult:
+    """Resultado de una transferencia"""
+    size: int
+    sha256: str
+    bytes_sent: int  # Bytes enviados al destino (incluye reenvíos)
+    resumed_from: int = 0  # Offset que el destino ya tenía al empezar
+    retries: int = 0
+
+
+class ChunkedTransfer:
+    """
+    Transferencia en streaming origen -> destino con reanudación.
+
+    Uso:
+        result = await ChunkedTransfer(
+            http, f"{source}/api/download/{file_id}",
+            f"{target}/cluster/replica/{file_id}",
+            metadata={"filename": name}
+        ).run()
+
+    `http` puede ser un HttpClientManager o un httpx.AsyncClient.
+    """
+
+    def __init__(
+        self,
+        http: Any,
+        source_url: str,
+        target_url: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        timeout: float = 30.0,
+        metadata: Optional[Dict[str, Any]] = None,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
+    ):
+        """
+        Args:
+            http: Cliente HTTP con stream/request/get/post
+            source_url: URL de descarga del archivo en el origen
+            target_url: URL base de la réplica en el destino
+            chunk_size: Bytes por chunk (memoria máxima por transferencia)
+            max_retries: Reintentos ante fallos de red del origen o destino
+            retry_backoff: Espera base entre reintentos (exponencial)
+            timeout: Timeout por request
+            metadata: Metadatos enviados en el commit
+            throttle: Espera antes de enviar N bytes (límite de ancho de banda)
+        """
+        self.http = http
+        self.source_url = source_url
+        self.target_url = target_url.rstrip("/")
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.metadata = dict(metadata or {})
+        self.throttle = throttle
+
+        self._hasher = hashlib.sha256()
+        self._hashed = 0  # Bytes [0, _hashed) incluidos en el hash
+        self._bytes_sent = 0
+        self._side = "target"
+
+    async def run(self) -> TransferResult:
+        """Ejecuta la transferencia completa y confirma en el destino"""
+        retries = 0
+        resumed_from: Optional[int] = None
+
+        while True:
+            try:
+                self._side = "target"
+                acked = await self._target_offset()
+                if resumed_from is None:
+                    resumed_from = acked
+                if acked < self._hashed:
+                    # El destino perdió bytes confirmados: rehacer el hash
+                    self._reset_hash()
+                await self._pump(acked)
+                break
+            except (OffsetConflict, OSError, asyncio.TimeoutError) as e:
+                error = e
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise TransferError(str(e), side=self._side) from e
+                error = e
+
+            retries += 1
+            if retries > self.max_retries:
+                raise TransferError(
+                    f"Transferencia abortada tras {self.max_retries} reintentos: {error}",
+                    side=self._side
+                ) from error
+            logger.warning(
+                f"Reintentando transferencia a {self.target_url} desde "
+                f"offset {self._hashed} ({error})"
+            )
+            await asyncio.sleep(self.retry_backoff * 2 ** (retries - 1))
+
+        sha256 = self._hasher.hexdigest()
+        await self._commit(sha256)
+        return TransferResult(
+            size=self._hashed,
+            sha256=sha256,
+            bytes_sent=self._bytes_sent,
+            resumed_from=resumed_from or 0,
+            retries=retries
+        )
+
+    async def _target_offset(self) -> int:
+        response = await self.http.get(f"{self.target_url}/offset", timeout=self.timeout)
+        response.raise_for_status()
+        return int(response.json().get("offset", 0))
+
+    async def _pump(self, acked: int) -> None:
+        """Lee el origen desde el último byte hasheado y envía lo no confirmado"""
+        start = self._hashed
+        headers = {"Range": f"bytes={start}-"} if start else {}
+
+        self._side = "source"
+        async with self.http.stream(
+            "GET", self.source_url, headers=headers, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            if "filename" not in self.metadata:
+                filename = _filename_from_disposition(
+                    response.headers.get("content-disposition", "")
+                )
+                if filename:
+                    self.metadata["filename"] = filename
+            if start and response.status_code != 206:
+                # El origen ignoró el Range: empezar el hash desde cero
+                self._reset_hash()
+            position = self._hashed
+
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                if position < acked:
+                    # Bytes que el destino ya tiene: solo se hashean
+                    skip = min(len(chunk), acked - position)
+                    self._update_hash(chunk[:skip])
+                    position += skip
+                    chunk = chunk[skip:]
+                    if not chunk:
+                        continue
+
+                if self.throttle is not None:
+                    await self.throttle(len(chunk))
+                self._side = "target"
+                acked = await self._send_chunk(position, chunk)
+                self._side = "source"
+                self._update_hash(chunk)
+                position += len(chunk)
+
+    async def _send_chunk(self, offset: int, chunk: bytes) -> int:
+        response = await self.http.request(
+            "PUT",
+            f"{self.target_url}/chunk",
+            params={"offset": offset},
+            content=chunk,
+            timeout=self.timeout
+        )
+        if response.status_code == 409:
+            raise OffsetConflict(int(response.json().get("offset", 0)))
+        response.raise_for_status()
+        self._bytes_sent += len(chunk)
+        return offset + len(chunk)
+
+    async def _commit(self, sha256: str) -> None:
+        self._side = "target"
+        response = await self.http.post(
+            f"{self.target_url}/commit",
+            json={**self.metadata, "sha256": sha256, "size": self._hashed},
+            timeout=self.timeout
+        )
+        if response.status_code == 422:
+            raise ChecksumMismatch(f"SHA-256 no coincide en {self.target_url}", side="target")
+        response.raise_for_status()
+
+    def _update_hash(self, data: bytes) -> None:
+        self._hasher.update(data)
+        self._hashed += len(data)
+
+    def _reset_hash(self) -> None:
+        self._hasher = hashlib.sha256()
+        self._hashed = 0
+
+
+def _filename_from_disposition(value: str) -> Optional[str]:
+    """Extrae filename de un header Content-Disposition"""
+    match = re.search(r'filename="?([^";]+)"?', value)
+    return match.group(1) if match else None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Errores de red y 5xx se reintentan; 4xx no"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500
+    # httpx.TransportError y similares (sin respuesta)
+    return type(error).__module__.startswith("httpx")
+
+
+class ReplicaReceiver:
+    """
+    Almacén de réplicas entrantes por chunks.
+
+    Los chunks se anexan a un archivo parcial en `{base_dir}/.partial`;
+    el commit verifica tamaño y SHA-256 leyendo el parcial por chunks
+    y lo mueve atómicamente a su ruta final.
+
+    Se puede llamar desde varios hilos (asyncio.to_thread): las
+    operaciones sobre un mismo file_id se serializan con un lock.
+    """
+
+    def __init__(self, base_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.base_dir = base_dir
+        self.partial_dir = os.path.join(base_dir, ".partial")
+        self.chunk_size = chunk_size
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, file_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(file_id, threading.Lock())
+
+    def partial_path(self, file_id: str) -> str:
+        name = hashlib.sha1(file_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.partial_dir, name)
+
+    def offset(self, file_id: str) -> int:
+        """Bytes ya recibidos y confirmados"""
+        try:
+            return os.path.getsize(self.partial_path(file_id))
+        except FileNotFoundError:
+            return 0
+
+    def write_chunk(self, file_id: str, offset: int, data: bytes) -> int:
+        """
+        Anexa un chunk en `offset`.
+
+        Returns:
+            Nuevo offset confirmado
+
+        Raises:
+            OffsetConflict: si offset no es el final del parcial
+        """
+        with self._lock(file_id):
+            current = self.offset(file_id)
+            if offset != current:
+                raise OffsetConflict(current)
+            with open(self.partial_path(file_id), "ab") as f:
+                f.write(data)
+            return current + len(data)
+
+    def commit(self, file_id: str, sha256: str, size: int, filename: str) -> str:
+        """
+        Verifica y publica la réplica.
+
+        Returns:
+            Ruta final del archivo
+
+        Raises:
+            ChecksumMismatch: si tamaño o hash no coinciden (el parcial se descarta)
+        """
+        with self._lock(file_id):
+            partial = self.partial_path(file_id)
+            digest = _sha256_file(partial, self.chunk_size) if os.path.exists(partial) else None
+            if digest != sha256 or self.offset(file_id) != size:
+                self.abort(file_id)
+                raise ChecksumMismatch(f"Réplica corrupta de {file_id}")
+
+            final_path = self.final_path(file_id, filename)
+            os.replace(partial, final_path)
+        with self._locks_guard:
+            self._locks.pop(file_id, None)
+        return final_path
+
+    def final_path(self, file_id: str, filename: Optional[str] = None) -> str:
+        """
+        Ruta publicada de una réplica: derivada del file_id (no del
+        nombre, que puede repetirse entre archivos distintos) y con
+        la extensión original.
+        """
+        name = hashlib.sha1(file_id.encode("utf-8")).hexdigest()
+        extension = os.path.splitext(os.path.basename(filename or ""))[1]
+        return os.path.join(self.base_dir, name + extension)
+
+    def abort(self, file_id: str) -> None:
+        try:
+            os.remove(self.partial_path(file_id))
+        except FileNotFoundError:
+            pass
+
+
+def _sha256_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def copy_file_chunked(
+    source_path: str,
+    target_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    expected_sha256: Optional[str] = None,
+    throttle: Optional[Callable[[int], None]] = None
+) -> TransferResult:
+    """
+    Copia local por chunks con SHA-256 incremental y reanudación.
+
+    Escribe en `{target_path}.part`; si ya existe (copia interrumpida)
+    continúa desde su tamaño tras hashear lo ya copiado. Publica con
+    os.replace solo si el hash coincide con `expected_sha256` (si se da).
+    `throttle(n)` se llama (bloqueando) antes de escribir cada chunk.
+    """
+    partial = f"{target_path}.part"
+    hasher = hashlib.sha256()
+    resumed_from = 0
+
+    if os.path.exists(partial):
+        resumed_from = os.path.getsize(partial)
+        if resumed_from > os.path.getsize(source_path):
+            os.remove(partial)
+            resumed_from = 0
+        else:
+            with open(partial, "rb") as f:
+                for block in iter(lambda: f.read(chunk_size), b""):
+                    hasher.update(block)
+
+    copied = 0
+    with open(source_path, "rb") as src, open(partial, "ab") as dst:
+        src.seek(resumed_from)
+        for block in iter(lambda: src.read(chunk_size), b""):
+            if throttle is not None:
+                throttle(len(block))
+            dst.write(block)
+            hasher.update(block)
+            copied += len(block)
+
+    sha256 = hasher.hexdigest()
+    if expected_sha256 and sha256 != expected_sha256:
+        os.remove(partial)
+        raise ChecksumMismatch(f"SHA-256 no coincide copiando {source_path}", side="source")
+
+    os.replace(partial, target_path)
+    return TransferResult(
+        size=resumed_from + copied,
+        sha256=sha256,
+        bytes_sent=copied,
+        resumed_from=resumed_from
+    )
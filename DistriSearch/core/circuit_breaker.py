@@ -0,0 +1,341 @@
+"""
+DistriSearch Core - Circuit breakers por nodo
+
+Un nodo que sigue ONLINE en los heartbeats pero falla o responde
+con timeouts se expulsa temporalmente de la selección:
+
+- CLOSED: tráfico normal; se observan errores y latencias
+- OPEN: nodo expulsado durante `open_duration` (con backoff
+  exponencial si vuelve a fallar)
+- HALF_OPEN: se deja pasar una sonda; si tiene éxito el circuito
+  se cierra, si falla vuelve a abrirse
+
+Se abre por tasa de errores en una ventana deslizante, por fallos
+consecutivos, o por latencia atípica frente al resto del cluster
+(outlier ejection), nunca expulsando más de `max_ejection_ratio`
+de los nodos observados.
+"""
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    """Estados del circuit breaker"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El nodo está expulsado por su circuit breaker"""
+
+    def __init__(self, node_id: str):
+        super().__init__(f"Circuito abierto para {node_id}")
+        self.node_id = node_id
+
+
+@dataclass
+class NodeCircuit:
+    """Estado del circuito de un nodo"""
+    node_id: str
+    state: CircuitState = CircuitState.CLOSED
+    outcomes: Deque[bool] = field(default_factory=lambda: deque(maxlen=20))
+    consecutive_failures: int = 0
+    latency_ms: Optional[float] = None  # EWMA de latencia de éxitos
+    opened_at: float = 0.0
+    open_duration: float = 0.0
+    trips: int = 0
+    probe_started_at: Optional[float] = None
+    last_reason: Optional[str] = None
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+def _is_node_failure(exc: BaseException) -> bool:
+    """Los errores HTTP 4xx son del request, no del nodo"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status is None or status >= 500
+
+
+class CircuitBreakerRegistry:
+    """
+    Circuit breakers de todos los nodos del proceso.
+
+    Uso:
+        with breakers.guard(node_id):
+            response = await http.get(url)
+            response.raise_for_status()
+
+    Los selectores consultan is_available(node_id), que no consume
+    la sonda de HALF_OPEN; guard()/allow() sí la reservan.
+    """
+
+    def __init__(
+        self,
+        window_size: int = 20,
+        min_requests: int = 5,
+        error_rate_threshold: float = 0.5,
+        consecutive_failures: int = 5,
+        open_duration: float = 30.0,
+        max_open_duration: float = 300.0,
+        outlier_factor: float = 3.0,
+        outlier_min_latency_ms: float = 200.0,
+        max_ejection_ratio: float = 0.5,
+        latency_alpha: float = 0.2
+    ):
+        """
+        Args:
+            window_size: Resultados recientes considerados por nodo
+            min_requests: Resultados mínimos antes de evaluar la tasa de error
+            error_rate_threshold: Tasa de error que abre el circuito
+            consecutive_failures: Fallos seguidos que abren el circuito
+            open_duration: Segundos de expulsión tras el primer disparo
+            max_open_duration: Tope del backoff exponencial de expulsión
+            outlier_factor: Latencia > factor * mediana del cluster es atípica
+            outlier_min_latency_ms: Latencia mínima para considerar atípico
+            max_ejection_ratio: Fracción máxima de nodos expulsados a la vez
+            latency_alpha: Peso de cada muestra en la EWMA de latencia
+        """
+        self.window_size = window_size
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.consecutive_failures = consecutive_failures
+        self.open_duration = open_duration
+        self.max_open_duration = max_open_duration
+        self.outlier_factor = outlier_factor
+        self.outlier_min_latency_ms = outlier_min_latency_ms
+        self.max_ejection_ratio = max_ejection_ratio
+        self.latency_alpha = latency_alpha
+
+        self._circuits: Dict[str, NodeCircuit] = {}
+
+        # Métricas
+        self._rejected = 0
+        self._trips_by_reason: Dict[str, int] = {}
+
+    def is_available(self, node_id: str) -> bool:
+        """True si el nodo puede recibir tráfico (sin consumir la sonda)"""
+        circuit = self._circuits.get(node_id)
+        if circuit is None or circuit.state == CircuitState.CLOSED:
+            return True
+        now = time.monotonic()
+        if circuit.state == CircuitState.OPEN:
+            return now - circuit.opened_at >= circuit.open_duration
+        return not self._probe_in_flight(circuit, now)
+
+    def allow(self, node_id: str) -> bool:
+        """
+        Decide si un request al nodo puede salir.
+
+        En OPEN con la expulsión cumplida pasa a HALF_OPEN y reserva
+        la sonda; mientras la sonda está en vuelo rechaza el resto.
+        """
+        circuit = self._circuits.get(node_id)
+        if circuit is None or circuit.state == CircuitState.CLOSED:
+            return True
+
+        now = time.monotonic()
+        if circuit.state == CircuitState.OPEN:
+            if now - circuit.opened_at < circuit.open_duration:
+                self._rejected += 1
+                return False
+            circuit.state = CircuitState.HALF_OPEN
+            logger.info(f"Circuito de {node_id} en half-open: enviando sonda")
+
+        if self._probe_in_flight(circuit, now):
+            self._rejected += 1
+            return False
+        circuit.probe_started_at = now
+        return True
+
+    @contextmanager
+    def guard(self, node_id: str) -> Iterator[None]:
+        """
+        Envuelve un request a un nodo: lanza CircuitOpenError si está
+        expulsado y registra el resultado y la latencia al salir.
+        """
+        if not self.allow(node_id):
+            raise CircuitOpenError(node_id)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            latency_ms = (time.perf_counter() - started) * 1000
+            if _is_node_failure(e):
+                self.record_failure(node_id, reason=type(e).__name__)
+            else:
+                self.record_success(node_id, latency_ms)
+            raise
+        except BaseException:
+            # Cancelado: no dice nada del nodo, pero libera la sonda
+            self.release(node_id)
+            raise
+        else:
+            self.record_success(node_id, (time.perf_counter() - started) * 1000)
+
+    def record_success(self, node_id: str, latency_ms: Optional[float] = None) -> None:
+        """Registra un request exitoso"""
+        circuit = self._circuit(node_id)
+        circuit.outcomes.append(True)
+        circuit.consecutive_failures = 0
+        if latency_ms is not None:
+            # La sonda de half-open reinicia la EWMA: refleja el nodo actual
+            if circuit.latency_ms is None or circuit.state == CircuitState.HALF_OPEN:
+                circuit.latency_ms = latency_ms
+            else:
+                circuit.latency_ms += self.latency_alpha * (latency_ms - circuit.latency_ms)
+
+        if circuit.state == CircuitState.HALF_OPEN:
+            if latency_ms is not None and self._is_latency_outlier(circuit):
+                self._trip(circuit, "latency_outlier")
+            else:
+                self._close(circuit)
+            return
+
+        if circuit.state == CircuitState.CLOSED and \
+                len(circuit.outcomes) >= self.min_requests and \
+                self._is_latency_outlier(circuit):
+            self._trip(circuit, "latency_outlier")
+
+    def record_failure(self, node_id: str, reason: str = "error") -> None:
+        """Registra un request fallido (error de transporte, timeout o 5xx)"""
+        circuit = self._circuit(node_id)
+        circuit.outcomes.append(False)
+        circuit.consecutive_failures += 1
+
+        if circuit.state == CircuitState.HALF_OPEN:
+            self._trip(circuit, f"probe_failed:{reason}")
+        elif circuit.state == CircuitState.CLOSED:
+            if circuit.consecutive_failures >= self.consecutive_failures:
+                self._trip(circuit, "consecutive_failures")
+            elif len(circuit.outcomes) >= self.min_requests and \
+                    circuit.error_rate >= self.error_rate_threshold:
+                self._trip(circuit, "error_rate")
+
+    def get_state(self, node_id: str) -> CircuitState:
+        circuit = self._circuits.get(node_id)
+        return circuit.state if circuit else CircuitState.CLOSED
+
+    def reset(self, node_id: str) -> None:
+        """Olvida el estado de un nodo (p.ej. al darlo de baja)"""
+        self._circuits.pop(node_id, None)
+
+    def _circuit(self, node_id: str) -> NodeCircuit:
+        circuit = self._circuits.get(node_id)
+        if circuit is None:
+            circuit = NodeCircuit(
+                node_id=node_id, outcomes=deque(maxlen=self.window_size)
+            )
+            self._circuits[node_id] = circuit
+        return circuit
+
+    def _probe_in_flight(self, circuit: NodeCircuit, now: float) -> bool:
+        # Una sonda que nunca reportó (tarea perdida) expira con la expulsión
+        return circuit.probe_started_at is not None and \
+            now - circuit.probe_started_at < max(circuit.open_duration, self.open_duration)
+
+    def release(self, node_id: str) -> None:
+        """Libera la sonda reservada por allow() sin registrar resultado"""
+        circuit = self._circuits.get(node_id)
+        if circuit is not None:
+            circuit.probe_started_at = None
+
+    def _is_latency_outlier(self, circuit: NodeCircuit) -> bool:
+        """Latencia > outlier_factor * mediana de los demás nodos"""
+        if circuit.latency_ms is None or circuit.latency_ms < self.outlier_min_latency_ms:
+            return False
+        others = [
+            c.latency_ms for c in self._circuits.values()
+            if c is not circuit and c.latency_ms is not None
+            and c.state == CircuitState.CLOSED
+        ]
+        if len(others) < 2:
+            return False
+        return circuit.latency_ms > self.outlier_factor * float(np.median(others))
+
+    def _trip(self, circuit: NodeCircuit, reason: str) -> None:
+        if circuit.state == CircuitState.CLOSED and not self._can_eject():
+            logger.warning(
+                f"No se expulsa {circuit.node_id} ({reason}): "
+                f"límite de expulsión del {self.max_ejection_ratio:.0%} alcanzado"
+            )
+            return
+
+        circuit.trips += 1
+        circuit.state = CircuitState.OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.open_duration = min(
+            self.max_open_duration,
+            self.open_duration * 2 ** (circuit.trips - 1)
+        )
+        circuit.probe_started_at = None
+        circuit.last_reason = reason
+        key = reason.split(":")[0]
+        self._trips_by_reason[key] = self._trips_by_reason.get(key, 0) + 1
+        logger.warning(
+            f"Circuito abierto para {circuit.node_id} ({reason}) "
+            f"durante {circuit.open_duration:.0f}s"
+        )
+
+    def _close(self, circuit: NodeCircuit) -> None:
+        circuit.state = CircuitState.CLOSED
+        circuit.trips = 0
+        circuit.probe_started_at = None
+        circuit.consecutive_failures = 0
+        circuit.outcomes.clear()
+        logger.info(f"Circuito cerrado para {circuit.node_id}: sonda exitosa")
+
+    def _can_eject(self) -> bool:
+        ejected = sum(1 for c in self._circuits.values() if c.state != CircuitState.CLOSED)
+        return ejected + 1 <= max(1, int(len(self._circuits) * self.max_ejection_ratio))
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas de los circuit breakers"""
+        return {
+            "tracked_nodes": len(self._circuits),
+            "open": sorted(
+                n for n, c in self._circuits.items() if c.state == CircuitState.OPEN
+            ),
+            "half_open": sorted(
+                n for n, c in self._circuits.items() if c.state == CircuitState.HALF_OPEN
+            ),
+            "rejected_requests": self._rejected,
+            "trips_by_reason": dict(self._trips_by_reason),
+            "nodes": {
+                node_id: {
+                    "state": c.state.value,
+                    "error_rate": round(c.error_rate, 3),
+                    "latency_ms": round(c.latency_ms, 1) if c.latency_ms is not None else None,
+                    "trips": c.trips,
+                    "last_reason": c.last_reason
+                }
+                for node_id, c in self._circuits.items()
+            }
+        }
+
+
+# Instancia global
+_circuit_breakers: Optional[CircuitBreakerRegistry] = None
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """Obtiene los circuit breakers del proceso"""
+    global _circuit_breakers
+    if _circuit_breakers is None:
+        _circuit_breakers = CircuitBreakerRegistry()
+    return _circuit_breakers
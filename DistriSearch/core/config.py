@@ -38,6 +38,13 @@ class NetworkConfig:
     multicast_group: str = field(default_factory=lambda: os.getenv("MULTICAST_GROUP", "239.255.0.1"))
     multicast_port: int = field(default_factory=lambda: int(os.getenv("MULTICAST_PORT", "5353")))
     discovery_interval: int = field(default_factory=lambda: int(os.getenv("DISCOVERY_INTERVAL", "30")))
+    
+    # Pool HTTP entre nodos
+    http_max_connections: int = field(default_factory=lambda: int(os.getenv("HTTP_MAX_CONNECTIONS", "200")))
+    http_max_keepalive: int = field(default_factory=lambda: int(os.getenv("HTTP_MAX_KEEPALIVE", "50")))
+    http_keepalive_expiry: float = field(default_factory=lambda: float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")))
+    http_max_per_host: int = field(default_factory=lambda: int(os.getenv("HTTP_MAX_PER_HOST", "20")))
+    http2_enabled: bool = field(default_factory=lambda: os.getenv("HTTP2_ENABLED", "true").lower() == "true")
 
 
 @dataclass
@@ -74,10 +81,19 @@ class ReplicationConfig:
         default_factory=lambda: ConsistencyModel(os.getenv("CONSISTENCY_MODEL", "eventual"))
     )
     sync_interval: int = field(default_factory=lambda: int(os.getenv("SYNC_INTERVAL_SECONDS", "60")))
+    full_sync_interval: int = field(default_factory=lambda: int(os.getenv("FULL_SYNC_INTERVAL_SECONDS", "3600")))
+    # Ancho de banda del tráfico de fondo en bytes/s (0 = sin límite)
+    node_bandwidth: int = field(default_factory=lambda: int(os.getenv("REPLICATION_NODE_BANDWIDTH", str(100 * 1024 * 1024))))
+    link_bandwidth: int = field(default_factory=lambda: int(os.getenv("REPLICATION_LINK_BANDWIDTH", str(50 * 1024 * 1024))))
+    checkpoint_bandwidth: int = field(default_factory=lambda: int(os.getenv("CHECKPOINT_BANDWIDTH", str(20 * 1024 * 1024))))
+    # p99 de búsquedas a proteger: por encima, las tasas se reducen (AIMD)
+    foreground_p99_target_ms: float = field(default_factory=lambda: float(os.getenv("FOREGROUND_P99_TARGET_MS", "500")))
+    throttle_min_fraction: float = field(default_factory=lambda: float(os.getenv("THROTTLE_MIN_FRACTION", "0.1")))
     
     def __post_init__(self):
         if self.factor < 1:
             self.factor = 1
+        self.throttle_min_fraction = min(1.0, max(0.01, self.throttle_min_fraction))
 
 
 @dataclass
@@ -0,0 +1,100 @@
+"""
+DistriSearch Core - Almacén direccionado por contenido
+
+Los bytes de cada archivo se guardan una sola vez, bajo su SHA-256:
+    {root}/ab/abcdef0123...
+
+Subidas idénticas (mismo contenido, distinto nombre o nodo) comparten
+el blob; el número de referencias lo lleva quien registra los
+metadatos (en el backend, la colección `blobs` de MongoDB).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def is_sha256(value: Optional[str]) -> bool:
+    """True si value es un SHA-256 hexadecimal"""
+    if not value or len(value) != 64:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+class ContentStore:
+    """
+    Blobs inmutables indexados por SHA-256.
+
+    Uso:
+        store = ContentStore("uploads/cas")
+        content_hash, created = store.put_bytes(data)
+        path = store.blob_path(content_hash)
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def has(self, content_hash: str) -> bool:
+        return is_sha256(content_hash) and os.path.exists(self.blob_path(content_hash))
+
+    def put_bytes(self, data: bytes) -> Tuple[str, bool]:
+        """
+        Guarda un contenido.
+
+        Returns:
+            (sha256, created): created=False si el blob ya existía
+        """
+        return self.put_chunks((data,))
+
+    def put_file(self, path: str) -> Tuple[str, bool]:
+        """Guarda el contenido de un archivo local leyéndolo por chunks"""
+        with open(path, "rb") as f:
+            return self.put_chunks(iter(lambda: f.read(_CHUNK_SIZE), b""))
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> Tuple[str, bool]:
+        """
+        Escribe a un temporal mientras hashea y lo publica con
+        os.replace; si el blob ya existía el temporal se descarta.
+        """
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+
+            content_hash = hasher.hexdigest()
+            final_path = self.blob_path(content_hash)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                return content_hash, False
+
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+            return content_hash, True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def remove(self, content_hash: str) -> bool:
+        """Borra un blob (llamar solo cuando ya no tiene referencias)"""
+        try:
+            os.remove(self.blob_path(content_hash))
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,313 @@
+"""
+DistriSearch Core - Sincronización por deltas (estilo rsync)
+
+Para actualizar una copia desactualizada sin reenviar el archivo:
+1. El destino calcula la firma de su versión: por bloque de tamaño
+   fijo, un checksum rodante (Adler-32) y uno fuerte (BLAKE2b-128).
+2. El origen recorre su versión con una ventana rodante; donde el
+   checksum débil coincide y el fuerte lo confirma emite una copia
+   de bloque, y el resto como literales.
+3. El destino reconstruye el archivo con sus propios bloques y los
+   literales, verifica el SHA-256 y lo publica atómicamente.
+
+Para una edición pequeña de un archivo grande viajan unos pocos
+bloques más la firma, en lugar del archivo completo.
+"""
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MIN_BLOCK_SIZE = 2 * 1024
+MAX_BLOCK_SIZE = 128 * 1024
+STRONG_DIGEST_SIZE = 16
+
+_MOD_ADLER = 65521
+
+
+class DeltaMismatch(Exception):
+    """El archivo reconstruido no coincide con el SHA-256 esperado"""
+
+
+def choose_block_size(file_size: int) -> int:
+    """Bloque ~ sqrt(tamaño) (como rsync), redondeado a KiB y acotado"""
+    size = int(math.sqrt(max(file_size, 1)))
+    size = (size + 1023) // 1024 * 1024
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, size))
+
+
+def strong_checksum(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=STRONG_DIGEST_SIZE).digest()
+
+
+def roll_checksum(checksum: int, out_byte: int, in_byte: int, block_len: int) -> int:
+    """
+    Desplaza un byte la ventana de un Adler-32:
+        a' = a - out + in
+        b' = b - L * out + a' - 1
+    """
+    a = checksum & 0xFFFF
+    b = checksum >> 16
+    a = (a - out_byte + in_byte) % _MOD_ADLER
+    b = (b - block_len * out_byte + a - 1) % _MOD_ADLER
+    return (b << 16) | a
+
+
+@dataclass
+class Signature:
+    """Firma de la versión del destino"""
+    block_size: int
+    file_size: int
+    weak: List[int] = field(default_factory=list)
+    strong: List[bytes] = field(default_factory=list)
+
+    _HEADER = struct.Struct(">IQI")
+    _BLOCK = struct.Struct(f">I{STRONG_DIGEST_SIZE}s")
+
+    def to_bytes(self) -> bytes:
+        """Formato binario compacto para enviarla por la red"""
+        parts = [self._HEADER.pack(self.block_size, self.file_size, len(self.weak))]
+        parts.extend(self._BLOCK.pack(w, s) for w, s in zip(self.weak, self.strong))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Signature":
+        block_size, file_size, count = cls._HEADER.unpack_from(data)
+        signature = cls(block_size=block_size, file_size=file_size)
+        offset = cls._HEADER.size
+        for _ in range(count):
+            weak, strong = cls._BLOCK.unpack_from(data, offset)
+            signature.weak.append(weak)
+            signature.strong.append(strong)
+            offset += cls._BLOCK.size
+        return signature
+
+
+# Operaciones del delta: (índice de bloque inicial, número de bloques) o literal
+CopyOp = Tuple[int, int]
+DeltaOp = Union[CopyOp, bytes]
+
+
+@dataclass
+class DeltaStats:
+    """Resumen de una sincronización por delta"""
+    file_size: int
+    literal_bytes: int  # Bytes nuevos enviados
+    copied_bytes: int  # Bytes reutilizados del destino
+    signature_bytes: int
+    sha256: str = ""
+
+    @property
+    def transferred_bytes(self) -> int:
+        """Bytes que cruzarían la red: firma + literales"""
+        return self.signature_bytes + self.literal_bytes
+
+
+def compute_signature(path: str, block_size: Optional[int] = None) -> Signature:
+    """Firma de un archivo, leído bloque a bloque"""
+    file_size = os.path.getsize(path)
+    signature = Signature(block_size=block_size or choose_block_size(file_size), file_size=file_size)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(signature.block_size), b""):
+            signature.weak.append(zlib.adler32(block))
+            signature.strong.append(strong_checksum(block))
+    return signature
+
+
+def compute_delta(source_path: str, signature: Signature) -> List[DeltaOp]:
+    """
+    Delta del archivo origen respecto a la firma del destino.
+
+    El origen se mapea en memoria (mmap), así que no se carga entero.
+    Las copias de bloques consecutivos se agrupan en una sola operación.
+    """
+    size = os.path.getsize(source_path)
+    if size == 0:
+        return []
+
+    block_size = signature.block_size
+    by_weak: Dict[int, List[int]] = {}
+    for index, weak in enumerate(signature.weak):
+        by_weak.setdefault(weak, []).append(index)
+    # El último bloque del destino puede ser más corto que block_size
+    tail_len = signature.file_size - block_size * (len(signature.weak) - 1) \
+        if signature.weak else 0
+
+    ops: List[DeltaOp] = []
+    with open(source_path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = 0
+        literal_start = 0
+        weak: Optional[int] = None
+
+        while pos + block_size <= size:
+            if weak is None:
+                weak = zlib.adler32(data[pos:pos + block_size])
+
+            match = _find_block(data, pos, block_size, weak, by_weak, signature, block_size, tail_len)
+            if match is not None:
+                if literal_start < pos:
+                    ops.append(bytes(data[literal_start:pos]))
+                _append_copy(ops, match)
+                pos += block_size
+                literal_start = pos
+                weak = None
+                continue
+
+            # Sin coincidencia: desplazar la ventana un byte
+            if pos + block_size < size:
+                weak = roll_checksum(weak, data[pos], data[pos + block_size], block_size)
+            pos += 1
+
+        # Cola: solo puede coincidir el último bloque (más corto) del destino
+        if 0 < tail_len < block_size and size - max(pos, literal_start) >= tail_len:
+            tail_pos = size - tail_len
+            tail = data[tail_pos:size]
+            match = _find_block(
+                data, tail_pos, tail_len, zlib.adler32(tail), by_weak, signature, block_size, tail_len
+            )
+            if match is not None:
+                if literal_start < tail_pos:
+                    ops.append(bytes(data[literal_start:tail_pos]))
+                _append_copy(ops, match)
+                literal_start = size
+
+        if literal_start < size:
+            ops.append(bytes(data[literal_start:size]))
+    return ops
+
+
+def _find_block(data, pos, length, weak, by_weak, signature, block_size, tail_len) -> Optional[int]:
+    candidates = by_weak.get(weak)
+    if not candidates:
+        return None
+    strong = None
+    for index in candidates:
+        expected_len = tail_len if index == len(signature.weak) - 1 else block_size
+        if expected_len != length:
+            continue
+        if strong is None:
+            strong = strong_checksum(data[pos:pos + length])
+        if strong == signature.strong[index]:
+            return index
+    return None
+
+
+def _append_copy(ops: List[DeltaOp], index: int) -> None:
+    last = ops[-1] if ops else None
+    if isinstance(last, tuple) and last[0] + last[1] == index:
+        ops[-1] = (last[0], last[1] + 1)
+    else:
+        ops.append((index, 1))
+
+
+def apply_delta(
+    basis_path: str,
+    ops: List[DeltaOp],
+    block_size: int,
+    output_path: str,
+    expected_sha256: Optional[str] = None
+) -> str:
+    """
+    Reconstruye el archivo nuevo a partir de la versión local y el delta.
+
+    Escribe en `{output_path}.delta` y lo publica con os.replace tras
+    verificar el SHA-256; basis_path y output_path pueden coincidir.
+
+    Returns:
+        SHA-256 del archivo reconstruido
+
+    Raises:
+        DeltaMismatch: si el hash no coincide (no se toca output_path)
+    """
+    hasher = hashlib.sha256()
+    partial = f"{output_path}.delta"
+    try:
+        with open(basis_path, "rb") as basis, open(partial, "wb") as out:
+            for op in ops:
+                if isinstance(op, tuple):
+                    start, count = op
+                    basis.seek(start * block_size)
+                    remaining = count * block_size
+                    while remaining > 0:
+                        chunk = basis.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        hasher.update(chunk)
+                        remaining -= len(chunk)
+                else:
+                    out.write(op)
+                    hasher.update(op)
+
+        sha256 = hasher.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256:
+            raise DeltaMismatch(f"SHA-256 reconstruido no coincide para {output_path}")
+        os.replace(partial, output_path)
+        return sha256
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def encode_delta(ops: List[DeltaOp]) -> bytes:
+    """Serializa el delta: b'C' + (inicio, n) | b'L' + longitud + datos"""
+    parts = []
+    for op in ops:
+        if isinstance(op, tuple):
+            parts.append(b"C" + struct.pack(">II", *op))
+        else:
+            parts.append(b"L" + struct.pack(">I", len(op)) + op)
+    return b"".join(parts)
+
+
+def decode_delta(data: bytes) -> Iterator[DeltaOp]:
+    offset = 0
+    while offset < len(data):
+        kind = data[offset:offset + 1]
+        offset += 1
+        if kind == b"C":
+            yield struct.unpack_from(">II", data, offset)
+            offset += 8
+        elif kind == b"L":
+            (length,) = struct.unpack_from(">I", data, offset)
+            offset += 4
+            yield data[offset:offset + length]
+            offset += length
+        else:
+            raise ValueError(f"Operación de delta desconocida: {kind!r}")
+
+
+def sync_file_delta(
+    source_path: str,
+    basis_path: str,
+    output_path: Optional[str] = None,
+    expected_sha256: Optional[str] = None,
+    block_size: Optional[int] = None
+) -> DeltaStats:
+    """
+    Actualiza la copia en `basis_path` (o escribe en `output_path`)
+    para que sea igual a `source_path`, enviando solo lo que cambió.
+    """
+    signature = compute_signature(basis_path, block_size)
+    ops = compute_delta(source_path, signature)
+    sha256 = apply_delta(
+        basis_path, ops, signature.block_size, output_path or basis_path, expected_sha256
+    )
+
+    literal = sum(len(op) for op in ops if isinstance(op, bytes))
+    file_size = os.path.getsize(output_path or basis_path)
+    return DeltaStats(
+        file_size=file_size,
+        literal_bytes=literal,
+        copied_bytes=file_size - literal,
+        signature_bytes=len(signature.to_bytes()),
+        sha256=sha256
+    )
@@ -0,0 +1,213 @@
+"""
+DistriSearch Core - Cliente HTTP compartido entre nodos
+
+Registro de clientes httpx.AsyncClient por proceso (uno por event
+loop) con connection pooling, keep-alive, HTTP/2 cuando `h2` está
+instalado, límite de conexiones por host y métricas de saturación
+del pool. Sustituye a los clientes efímeros por operación, que
+descartaban las conexiones keep-alive y sesiones TLS en cada uso.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (habilita HTTP/2 en httpx)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+class HttpClientManager:
+    """
+    Gestor del ciclo de vida de los clientes HTTP entre nodos.
+
+    Uso:
+        http = get_http_client_manager()
+        response = await http.get(url, timeout=5)
+        async with http.stream("GET", url) as response: ...
+
+    Los clientes se crean de forma perezosa por event loop, de modo
+    que el gestor es seguro entre loops (tests, workers) y se cierran
+    en close().
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        keepalive_expiry: float = 30.0,
+        max_connections_per_host: int = 20,
+        http2: Optional[bool] = None,
+        timeout: float = 10.0
+    ):
+        """
+        Args:
+            max_connections: Conexiones totales del pool
+            max_keepalive_connections: Conexiones ociosas conservadas
+            keepalive_expiry: Segundos que una conexión ociosa sigue abierta
+            max_connections_per_host: Requests simultáneos por host destino
+            http2: Usar HTTP/2 (None = si `h2` está instalado)
+            timeout: Timeout por defecto de los requests
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = _HTTP2_AVAILABLE if http2 is None else http2 and _HTTP2_AVAILABLE
+        self.timeout = timeout
+
+        self._clients: Dict[int, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+        self._host_slots: Dict[Tuple[int, str], asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+        # Métricas
+        self._requests = 0
+        self._errors = 0
+        self._clients_created = 0
+        self._saturated_waits = 0
+        self._total_wait_ms = 0.0
+        self._max_in_flight = 0
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Cliente del event loop actual (se crea si no existe)"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(id(loop))
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+
+        self._drop_closed_loops()
+        client = httpx.AsyncClient(
+            limits=self.limits,
+            http2=self.http2,
+            timeout=self.timeout
+        )
+        self._clients[id(loop)] = (loop, client)
+        self._clients_created += 1
+        return client
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Request con límite por host sobre el cliente compartido"""
+        async with self._host_slot(url):
+            return await self._call(self.get_client().request(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._host_slot(url):
+            return await self._call(self.get_client().get(url, **kwargs))
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._host_slot(url):
+            return await self._call(self.get_client().post(url, **kwargs))
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Respuesta en streaming; el slot del host se retiene hasta cerrarla"""
+        async with self._host_slot(url):
+            self._requests += 1
+            try:
+                async with self.get_client().stream(method, url, **kwargs) as response:
+                    yield response
+            except httpx.HTTPError:
+                self._errors += 1
+                raise
+
+    async def _call(self, coro) -> httpx.Response:
+        self._requests += 1
+        try:
+            return await coro
+        except httpx.HTTPError:
+            self._errors += 1
+            raise
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        """Reserva uno de los slots de conexión del host destino"""
+        host = urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        key = (id(loop), host)
+        semaphore = self._host_slots.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_slots[key] = semaphore
+
+        if semaphore.locked():
+            self._saturated_waits += 1
+        started = time.perf_counter()
+        async with semaphore:
+            self._total_wait_ms += (time.perf_counter() - started) * 1000
+            in_flight = self._in_flight.get(host, 0) + 1
+            self._in_flight[host] = in_flight
+            self._max_in_flight = max(self._max_in_flight, in_flight)
+            try:
+                yield
+            finally:
+                self._in_flight[host] -= 1
+
+    def _drop_closed_loops(self) -> None:
+        """Olvida los clientes y semáforos de event loops ya cerrados"""
+        closed = {key for key, (loop, _) in self._clients.items() if loop.is_closed()}
+        for key in closed:
+            del self._clients[key]
+        for key in [k for k in self._host_slots if k[0] in closed]:
+            del self._host_slots[key]
+
+    async def close(self) -> None:
+        """Cierra el cliente del loop actual y olvida los demás"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.pop(id(loop), None)
+        if entry is not None and hasattr(entry[1], "aclose"):
+            await entry[1].aclose()
+        self._drop_closed_loops()
+        self._host_slots = {k: v for k, v in self._host_slots.items() if k[0] != id(loop)}
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del pool"""
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "max_connections_per_host": self.max_connections_per_host,
+            "clients": len(self._clients),
+            "clients_created": self._clients_created,
+            "requests": self._requests,
+            "errors": self._errors,
+            "in_flight_by_host": {h: n for h, n in self._in_flight.items() if n},
+            "max_in_flight_per_host": self._max_in_flight,
+            "saturated_waits": self._saturated_waits,
+            "average_slot_wait_ms": self._total_wait_ms / self._requests if self._requests else 0
+        }
+
+
+# Instancia global
+_http_client_manager: Optional[HttpClientManager] = None
+
+
+def get_http_client_manager() -> HttpClientManager:
+    """Obtiene el gestor de clientes HTTP del proceso"""
+    global _http_client_manager
+    if _http_client_manager is None:
+        from .config import get_cluster_config
+        network = get_cluster_config().network
+        _http_client_manager = HttpClientManager(
+            max_connections=network.http_max_connections,
+            max_keepalive_connections=network.http_max_keepalive,
+            keepalive_expiry=network.http_keepalive_expiry,
+            max_connections_per_host=network.http_max_per_host,
+            http2=network.http2_enabled
+        )
+    return _http_client_manager
+
+
+async def close_http_clients() -> None:
+    """Cierra los clientes HTTP del proceso (shutdown)"""
+    if _http_client_manager is not None:
+        await _http_client_manager.close()
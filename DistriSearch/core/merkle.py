@@ -0,0 +1,218 @@
+"""
+DistriSearch Core - Árboles de Merkle para anti-entropía
+
+Cada nodo resume su conjunto (file_id, content_hash) en un árbol de
+Merkle de aridad fija: los file_id se reparten en hojas según el
+prefijo hexadecimal de un hash estable de su id, cada hoja hashea sus
+entradas ordenadas y cada nodo interno hashea los hashes de sus hijos.
+
+Dos nodos se reconcilian comparando primero la raíz y bajando solo
+por los subárboles distintos, un nivel por round trip: con `depth`
+niveles bastan depth + 1 intercambios, independientemente de cuántos
+archivos tengan.
+
+Direcciones: "" es la raíz, "a" su hijo a, "a3" el hijo 3 de "a"...
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from .placement import stable_hash
+
+HEX_DIGITS = "0123456789abcdef"
+EMPTY_HASH = hashlib.blake2b(b"", digest_size=16).hexdigest()
+
+# describe(paths) -> {path: {"hash": h, "children": {...}} | {"hash": h, "entries": {...}}}
+Describe = Callable[[List[str]], Awaitable[Dict[str, Dict]]]
+
+
+def _digest(parts: Iterable[str]) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class MerkleTree:
+    """
+    Árbol de Merkle sobre un mapa file_id -> content_hash.
+
+    Uso:
+        tree = MerkleTree({"f1": "abc...", "f2": "def..."})
+        tree.set("f3", "123...")
+        tree.root_hash
+
+    Las actualizaciones marcan su hoja como sucia y los hashes se
+    recalculan bajo demanda solo por la rama afectada.
+    """
+
+    def __init__(self, entries: Optional[Dict[str, str]] = None, depth: int = 3):
+        """
+        Args:
+            entries: file_id -> content_hash inicial
+            depth: Niveles bajo la raíz (16**depth hojas)
+        """
+        if depth < 1:
+            raise ValueError("depth debe ser >= 1")
+        self.depth = depth
+        self._leaves: Dict[str, Dict[str, str]] = {}
+        self._hashes: Dict[str, str] = {}  # Caché de hashes por dirección
+        for file_id, content_hash in (entries or {}).items():
+            self.set(file_id, content_hash)
+
+    def leaf_path(self, file_id: str) -> str:
+        """Hoja de un file_id: los primeros `depth` dígitos hex de su hash"""
+        return f"{stable_hash(file_id):016x}"[:self.depth]
+
+    def set(self, file_id: str, content_hash: Optional[str]) -> None:
+        leaf = self.leaf_path(file_id)
+        entries = self._leaves.setdefault(leaf, {})
+        if entries.get(file_id) != content_hash:
+            entries[file_id] = content_hash or ""
+            self._invalidate(leaf)
+
+    def remove(self, file_id: str) -> None:
+        leaf = self.leaf_path(file_id)
+        entries = self._leaves.get(leaf)
+        if entries and file_id in entries:
+            del entries[file_id]
+            if not entries:
+                del self._leaves[leaf]
+            self._invalidate(leaf)
+
+    def _invalidate(self, leaf: str) -> None:
+        for i in range(len(leaf) + 1):
+            self._hashes.pop(leaf[:i], None)
+
+    @property
+    def root_hash(self) -> str:
+        return self.node_hash("")
+
+    def node_hash(self, path: str) -> str:
+        cached = self._hashes.get(path)
+        if cached is not None:
+            return cached
+
+        if len(path) == self.depth:
+            entries = self._leaves.get(path)
+            value = _digest(
+                f"{fid}={h}" for fid, h in sorted(entries.items())
+            ) if entries else EMPTY_HASH
+        else:
+            children = [self.node_hash(path + d) for d in HEX_DIGITS]
+            value = EMPTY_HASH if all(c == EMPTY_HASH for c in children) else _digest(children)
+
+        self._hashes[path] = value
+        return value
+
+    def describe(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Descripción de varios nodos en una sola respuesta: los internos
+        con los hashes de sus hijos y las hojas con sus entradas.
+        """
+        result = {}
+        for path in paths:
+            if len(path) > self.depth or any(c not in HEX_DIGITS for c in path):
+                raise ValueError(f"Dirección inválida: {path!r}")
+            if len(path) == self.depth:
+                result[path] = {
+                    "hash": self.node_hash(path),
+                    "entries": dict(self._leaves.get(path, {}))
+                }
+            else:
+                result[path] = {
+                    "hash": self.node_hash(path),
+                    "children": {path + d: self.node_hash(path + d) for d in HEX_DIGITS}
+                }
+        return result
+
+    async def describe_async(self, paths: List[str]) -> Dict[str, Dict]:
+        """describe() con la firma de una fuente remota (para diff entre árboles locales)"""
+        return self.describe(paths)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._leaves.values())
+
+
+@dataclass
+class MerkleDiff:
+    """Diferencias entre el árbol local y el remoto"""
+    only_local: Set[str] = field(default_factory=set)
+    only_remote: Set[str] = field(default_factory=set)
+    different: Set[str] = field(default_factory=set)
+    round_trips: int = 0
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.only_local or self.only_remote or self.different)
+
+    def to_dict(self) -> Dict:
+        return {
+            "only_local": sorted(self.only_local),
+            "only_remote": sorted(self.only_remote),
+            "different": sorted(self.different),
+            "round_trips": self.round_trips
+        }
+
+
+async def merkle_diff(local: MerkleTree, remote: Describe) -> MerkleDiff:
+    """
+    Compara un árbol local con uno remoto bajando solo por las ramas
+    distintas; cada nivel es una única llamada a `remote`.
+
+    Args:
+        local: Árbol de este nodo
+        remote: Función async que describe direcciones del árbol remoto
+                (p.ej. un POST a /cluster/merkle del otro nodo)
+    """
+    diff = MerkleDiff()
+    frontier = [""]
+
+    while frontier:
+        described = await remote(frontier)
+        diff.round_trips += 1
+        next_frontier: List[str] = []
+
+        for path in frontier:
+            node = described.get(path) or {"hash": EMPTY_HASH}
+            if node["hash"] == local.node_hash(path):
+                continue
+            if "entries" in node or len(path) == local.depth:
+                _diff_entries(local.describe([path])[path]["entries"], node.get("entries", {}), diff)
+            else:
+                next_frontier.extend(
+                    child for child, child_hash in node["children"].items()
+                    if child_hash != local.node_hash(child)
+                )
+        frontier = next_frontier
+
+    return diff
+
+
+def _diff_entries(local: Dict[str, str], remote: Dict[str, str], diff: MerkleDiff) -> None:
+    for file_id, content_hash in local.items():
+        if file_id not in remote:
+            diff.only_local.add(file_id)
+        elif remote[file_id] != content_hash:
+            diff.different.add(file_id)
+    diff.only_remote.update(set(remote) - set(local))
+
+
+def http_describe(http: Any, base_url: str, source: Optional[str] = None) -> Describe:
+    """
+    Fuente remota sobre POST {base_url}/cluster/merkle.
+
+    Args:
+        http: Cliente con `post` async (HttpClientManager o httpx.AsyncClient)
+        source: Origen de los archivos cuyo árbol se pide
+    """
+    async def _describe(paths: List[str]) -> Dict[str, Dict]:
+        response = await http.post(
+            f"{base_url.rstrip('/')}/cluster/merkle",
+            json={"source": source, "paths": paths}
+        )
+        response.raise_for_status()
+        return response.json()["nodes"]
+
+    return _describe
@@ -0,0 +1,101 @@
+"""
+DistriSearch Core - Colocación determinista de réplicas
+
+Rendezvous hashing ponderado (Highest Random Weight): cada par
+(clave, nodo) recibe un score derivado de un hash estable
+(blake2b, igual en todos los procesos y reinicios) y la clave se
+coloca en los nodos de mayor score. Con pesos, un nodo de
+capacidad 2 recibe el doble de claves que uno de capacidad 1.
+
+Al añadir o quitar un nodo solo se mueven las claves que ganan o
+pierden ese nodo (~1/N), no toda la colocación.
+"""
+import hashlib
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional
+
+_HASH_SCALE = float(2 ** 64)
+
+
+def stable_hash(value: str) -> int:
+    """Hash de 64 bits estable entre procesos (a diferencia de hash())"""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def rendezvous_score(key: str, node_id: str, weight: float = 1.0) -> float:
+    """
+    Score HRW ponderado: -w / ln(u), con u uniforme en (0, 1).
+
+    El nodo con mayor score para una clave gana con probabilidad
+    proporcional a su peso.
+    """
+    u = (stable_hash(f"{node_id}\x00{key}") + 0.5) / _HASH_SCALE
+    return -weight / math.log(u)
+
+
+class RendezvousPlacement:
+    """
+    Conjunto de nodos con peso (capacidad) para colocar claves.
+
+    Uso:
+        placement = RendezvousPlacement({"node-a": 1.0, "node-b": 2.0})
+        placement.place("file-123", 2, exclude={"node-a"})
+
+    El cálculo es en memoria: O(N) por clave, sin consultar la BD.
+    """
+
+    def __init__(self, nodes: Optional[Dict[str, float]] = None):
+        self._weights: Dict[str, float] = {}
+        if nodes:
+            self.update(nodes)
+
+    def set_node(self, node_id: str, weight: float = 1.0) -> None:
+        """Añade un nodo o cambia su peso (los pesos <= 0 lo excluyen)"""
+        if weight <= 0:
+            self._weights.pop(node_id, None)
+        else:
+            self._weights[node_id] = float(weight)
+
+    def remove_node(self, node_id: str) -> None:
+        self._weights.pop(node_id, None)
+
+    def update(self, nodes: Dict[str, float]) -> None:
+        """Reemplaza el conjunto de nodos"""
+        self._weights = {}
+        for node_id, weight in nodes.items():
+            self.set_node(node_id, weight)
+
+    def place(
+        self,
+        key: str,
+        count: int,
+        exclude: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """
+        Nodos para una clave, de mayor a menor preferencia.
+
+        Args:
+            key: Clave a colocar (p.ej. file_id)
+            count: Número de nodos
+            exclude: Nodos a omitir (p.ej. el origen)
+        """
+        exclude = set(exclude or ())
+        candidates = (
+            (rendezvous_score(key, node_id, weight), node_id)
+            for node_id, weight in self._weights.items()
+            if node_id not in exclude
+        )
+        return [node_id for _, node_id in heapq.nlargest(count, candidates)]
+
+    @property
+    def nodes(self) -> Dict[str, float]:
+        return dict(self._weights)
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._weights
@@ -0,0 +1,313 @@
+"""
+DistriSearch Core - Limitación de ancho de banda de tráfico de fondo
+
+La re-replicación y los checkpoints no deben competir a toda
+velocidad con descargas y búsquedas:
+- Token buckets en bytes por nodo (lo que envía o recibe) y por
+  enlace origen -> destino, y uno propio para checkpoints.
+- Ajuste AIMD: si el p99 de las búsquedas del nodo supera el
+  objetivo, las tasas se reducen a la mitad; mientras se mantiene
+  por debajo, se recuperan poco a poco.
+- Límites modificables en caliente desde ReplicationConfig.
+
+Una tasa 0 significa sin límite.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .config import ReplicationConfig, get_config
+
+logger = logging.getLogger(__name__)
+
+REPLICATION = "replication"
+CHECKPOINT = "checkpoint"
+
+
+class ByteTokenBucket:
+    """
+    Token bucket en bytes: `rate` bytes/s con ráfaga `burst`.
+
+    Admite deuda: una petición mayor que la ráfaga se concede y deja
+    el bucket en negativo, así los chunks grandes se espacian igual.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        self._refill()
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, nbytes: int) -> float:
+        """
+        Consume `nbytes` y devuelve los segundos que hay que esperar
+        antes de usarlos (0 si había tokens suficientes).
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        self.tokens -= nbytes
+        return max(0.0, -self.tokens / self.rate)
+
+
+class AdaptiveRate:
+    """
+    Factor multiplicativo AIMD guiado por la latencia p99 de primer plano.
+
+    Uso:
+        adaptive = AdaptiveRate(target_p99_ms=500)
+        factor = adaptive.update(p99_ms)  # en [min_fraction, 1]
+    """
+
+    def __init__(
+        self,
+        target_p99_ms: float = 500.0,
+        min_fraction: float = 0.1,
+        decrease: float = 0.5,
+        increase: float = 0.1,
+        interval: float = 5.0
+    ):
+        """
+        Args:
+            target_p99_ms: p99 por encima del cual se frena el tráfico de fondo
+            min_fraction: Fracción mínima de la tasa configurada
+            decrease: Factor multiplicativo al superar el objetivo
+            increase: Incremento aditivo por intervalo bajo el objetivo
+            interval: Segundos mínimos entre ajustes
+        """
+        self.target_p99_ms = target_p99_ms
+        self.min_fraction = min_fraction
+        self.decrease = decrease
+        self.increase = increase
+        self.interval = interval
+        self.fraction = 1.0
+        self.last_p99_ms: Optional[float] = None
+        self._adjusted_at = 0.0
+
+    def due(self) -> bool:
+        return time.monotonic() - self._adjusted_at >= self.interval
+
+    def update(self, p99_ms: float) -> float:
+        """Aplica un paso AIMD con el p99 observado"""
+        self._adjusted_at = time.monotonic()
+        self.last_p99_ms = p99_ms
+        if self.target_p99_ms > 0 and p99_ms > self.target_p99_ms:
+            self.fraction = max(self.min_fraction, self.fraction * self.decrease)
+        else:
+            self.fraction = min(1.0, self.fraction + self.increase)
+        return self.fraction
+
+
+class BandwidthThrottle:
+    """
+    Limitador del tráfico de replicación y checkpoints.
+
+    Uso:
+        throttle = get_bandwidth_throttle()
+        for chunk in chunks:
+            await throttle.throttle(len(chunk), source="node_1", target="node_2")
+            await send(chunk)
+
+    Cada envío consume de los buckets del nodo origen, del nodo
+    destino y del enlace, y espera lo que pida el más restrictivo.
+    """
+
+    def __init__(
+        self,
+        node_rate: float = 0.0,
+        link_rate: float = 0.0,
+        checkpoint_rate: float = 0.0,
+        burst_seconds: float = 1.0,
+        target_p99_ms: float = 500.0,
+        min_fraction: float = 0.1,
+        adjust_interval: float = 5.0,
+        latency_provider: Optional[Callable[[], float]] = None
+    ):
+        """
+        Args:
+            node_rate: Bytes/s de replicación por nodo (envío + recepción)
+            link_rate: Bytes/s por enlace origen -> destino
+            checkpoint_rate: Bytes/s de checkpoints por nodo
+            burst_seconds: Ráfaga permitida, en segundos de tasa
+            target_p99_ms: p99 de primer plano a proteger (0 = sin ajuste)
+            min_fraction: Fracción mínima de las tasas al frenar
+            adjust_interval: Segundos entre ajustes AIMD
+            latency_provider: Devuelve el p99 actual de búsquedas (ms)
+        """
+        self.node_rate = node_rate
+        self.link_rate = link_rate
+        self.checkpoint_rate = checkpoint_rate
+        self.burst_seconds = burst_seconds
+        self.latency_provider = latency_provider
+        self.adaptive = AdaptiveRate(
+            target_p99_ms=target_p99_ms,
+            min_fraction=min_fraction,
+            interval=adjust_interval
+        )
+
+        self._nodes: Dict[str, ByteTokenBucket] = {}
+        self._links: Dict[Tuple[str, str], ByteTokenBucket] = {}
+        self._checkpoints: Dict[str, ByteTokenBucket] = {}
+        self._lock = threading.Lock()  # copy_file_chunked corre en hilos
+
+        # Métricas
+        self._bytes: Dict[str, int] = {REPLICATION: 0, CHECKPOINT: 0}
+        self._throttled_s = 0.0
+
+    @classmethod
+    def from_config(
+        cls,
+        config: ReplicationConfig,
+        latency_provider: Optional[Callable[[], float]] = None
+    ) -> "BandwidthThrottle":
+        """Crea el limitador desde un ReplicationConfig"""
+        throttle = cls(latency_provider=latency_provider)
+        throttle.configure(config)
+        return throttle
+
+    def configure(self, config: ReplicationConfig) -> None:
+        """Aplica en caliente los límites de un ReplicationConfig"""
+        with self._lock:
+            self.node_rate = config.node_bandwidth
+            self.link_rate = config.link_bandwidth
+            self.checkpoint_rate = config.checkpoint_bandwidth
+            self.adaptive.target_p99_ms = config.foreground_p99_target_ms
+            self.adaptive.min_fraction = config.throttle_min_fraction
+            self.adaptive.fraction = max(self.adaptive.fraction, self.adaptive.min_fraction)
+            self._apply_rates()
+        logger.info(
+            f"Límites de ancho de banda: nodo={self.node_rate:.0f} B/s, "
+            f"enlace={self.link_rate:.0f} B/s, checkpoints={self.checkpoint_rate:.0f} B/s"
+        )
+
+    def set_latency_provider(self, provider: Optional[Callable[[], float]]) -> None:
+        self.latency_provider = provider
+
+    def _rate(self, base: float) -> float:
+        return base * self.adaptive.fraction if base > 0 else 0.0
+
+    def _new_bucket(self, base: float) -> ByteTokenBucket:
+        rate = self._rate(base)
+        return ByteTokenBucket(rate, rate * self.burst_seconds)
+
+    def _apply_rates(self) -> None:
+        for buckets, base in (
+            (self._nodes, self.node_rate),
+            (self._links, self.link_rate),
+            (self._checkpoints, self.checkpoint_rate)
+        ):
+            rate = self._rate(base)
+            for bucket in buckets.values():
+                bucket.set_rate(rate, rate * self.burst_seconds)
+
+    def _adapt(self) -> None:
+        if self.latency_provider is None or not self.adaptive.due():
+            return
+        try:
+            p99_ms = float(self.latency_provider())
+        except Exception as e:
+            logger.debug(f"Error leyendo latencia de primer plano: {e}")
+            return
+        previous = self.adaptive.fraction
+        if self.adaptive.update(p99_ms) != previous:
+            self._apply_rates()
+            if self.adaptive.fraction < previous:
+                logger.info(
+                    f"p99 {p99_ms:.0f} ms > {self.adaptive.target_p99_ms:.0f} ms: "
+                    f"tráfico de fondo al {self.adaptive.fraction:.0%}"
+                )
+
+    def reserve(
+        self,
+        nbytes: int,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        traffic: str = REPLICATION
+    ) -> float:
+        """Consume `nbytes` de los buckets aplicables y devuelve la espera necesaria"""
+        with self._lock:
+            self._adapt()
+            self._bytes[traffic] = self._bytes.get(traffic, 0) + nbytes
+
+            if traffic == CHECKPOINT:
+                buckets = [self._bucket(self._checkpoints, node, self.checkpoint_rate)
+                           for node in (source, target) if node]
+            else:
+                buckets = [self._bucket(self._nodes, node, self.node_rate)
+                           for node in (source, target) if node]
+                if source and target:
+                    buckets.append(self._bucket(self._links, (source, target), self.link_rate))
+
+            wait = max((bucket.reserve(nbytes) for bucket in buckets), default=0.0)
+            self._throttled_s += wait
+            return wait
+
+    def _bucket(self, buckets: Dict, key, base: float) -> ByteTokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = self._new_bucket(base)
+        return bucket
+
+    async def throttle(
+        self,
+        nbytes: int,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        traffic: str = REPLICATION
+    ) -> None:
+        """Espera (sin bloquear el event loop) hasta poder enviar `nbytes`"""
+        wait = self.reserve(nbytes, source, target, traffic)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttle_blocking(
+        self,
+        nbytes: int,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        traffic: str = REPLICATION
+    ) -> None:
+        """Como throttle() pero bloqueando el hilo (copias en asyncio.to_thread)"""
+        wait = self.reserve(nbytes, source, target, traffic)
+        if wait > 0:
+            time.sleep(wait)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "node_rate": self.node_rate,
+                "link_rate": self.link_rate,
+                "checkpoint_rate": self.checkpoint_rate,
+                "adaptive_fraction": round(self.adaptive.fraction, 3),
+                "foreground_p99_ms": self.adaptive.last_p99_ms,
+                "target_p99_ms": self.adaptive.target_p99_ms,
+                "bytes": dict(self._bytes),
+                "throttled_seconds": round(self._throttled_s, 3),
+                "tracked_nodes": len(self._nodes),
+                "tracked_links": len(self._links)
+            }
+
+
+# Instancia global
+_bandwidth_throttle: Optional[BandwidthThrottle] = None
+
+
+def get_bandwidth_throttle() -> BandwidthThrottle:
+    """Limitador del proceso, configurado desde ReplicationConfig"""
+    global _bandwidth_throttle
+    if _bandwidth_throttle is None:
+        _bandwidth_throttle = BandwidthThrottle.from_config(get_config().replication)
+    return _bandwidth_throttle
@@ -0,0 +1,174 @@
+"""
+DistriSearch Core - Formato binario de intercambio entre nodos
+
+Codificación compacta para tráfico de búsqueda y registro:
+los vectores (np.ndarray) viajan como buffers float32 crudos
+en lugar de listas JSON, y se decodifican sin copia con
+np.frombuffer. Se negocia con las cabeceras Accept/Content-Type;
+JSON sigue siendo el formato por defecto.
+
+Trama:
+    magic "DSW" | versión (1B) | flags (1B) | len cabecera (u32 LE)
+    | cabecera (JSON o MessagePack) | padding a 4B | vectores float32
+"""
+import json
+import struct
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # MessagePack es opcional: la cabecera cae a JSON
+    msgpack = None
+
+BINARY_MEDIA_TYPE = "application/x-distrisearch-bin"
+JSON_MEDIA_TYPE = "application/json"
+
+_MAGIC = b"DSW"
+_VERSION = 1
+_FLAG_MSGPACK = 0x01
+_PREFIX = struct.Struct("<3sBBI")
+_VECTOR_KEY = "__f32__"
+_DTYPE = np.dtype("<f4")
+
+
+class WireFormatError(ValueError):
+    """Trama binaria inválida"""
+
+
+def encode(payload: Any, use_msgpack: Optional[bool] = None) -> bytes:
+    """
+    Codifica un payload en el formato binario.
+
+    Los np.ndarray se extraen a la sección de vectores y se
+    sustituyen en la cabecera por {"__f32__": [offset, shape]}.
+
+    Args:
+        payload: Estructura de dicts/listas/escalares con np.ndarray
+        use_msgpack: Cabecera en MessagePack (None = si está instalado)
+    """
+    if use_msgpack is None:
+        use_msgpack = msgpack is not None
+    elif use_msgpack and msgpack is None:
+        raise ImportError("msgpack no está instalado")
+
+    vectors: List[bytes] = []
+    offset = [0]
+
+    def _extract(value: Any) -> Any:
+        if isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value, dtype=_DTYPE).tobytes()
+            ref = {_VECTOR_KEY: [offset[0], list(value.shape)]}
+            vectors.append(data)
+            offset[0] += len(data)
+            return ref
+        if isinstance(value, dict):
+            return {k: _extract(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_extract(v) for v in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    header_obj = _extract(payload)
+    if use_msgpack:
+        header = msgpack.packb(header_obj, use_bin_type=True)
+    else:
+        header = json.dumps(header_obj, separators=(",", ":"), default=str).encode()
+
+    flags = _FLAG_MSGPACK if use_msgpack else 0
+    prefix = _PREFIX.pack(_MAGIC, _VERSION, flags, len(header))
+    padding = b"\0" * (-(len(prefix) + len(header)) % _DTYPE.itemsize)
+    return b"".join([prefix, header, padding, *vectors])
+
+
+def decode(data: bytes) -> Any:
+    """
+    Decodifica una trama binaria.
+
+    Los vectores se devuelven como vistas de solo lectura sobre
+    `data` (np.frombuffer, sin copia).
+    """
+    if len(data) < _PREFIX.size:
+        raise WireFormatError("Trama demasiado corta")
+
+    magic, version, flags, header_len = _PREFIX.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise WireFormatError("Magic o versión no soportados")
+
+    header_end = _PREFIX.size + header_len
+    header = bytes(data[_PREFIX.size:header_end])
+    if flags & _FLAG_MSGPACK:
+        if msgpack is None:
+            raise WireFormatError("Cabecera MessagePack pero msgpack no está instalado")
+        header_obj = msgpack.unpackb(header, raw=False)
+    else:
+        header_obj = json.loads(header)
+
+    blob_start = header_end + (-header_end % _DTYPE.itemsize)
+    buffer = memoryview(data)
+
+    def _restore(value: Any) -> Any:
+        if isinstance(value, dict):
+            ref = value.get(_VECTOR_KEY)
+            if ref is not None and len(value) == 1:
+                start, shape = ref
+                count = int(np.prod(shape)) if shape else 1
+                vector = np.frombuffer(
+                    buffer, dtype=_DTYPE, count=count, offset=blob_start + start
+                )
+                return vector.reshape(shape)
+            return {k: _restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [_restore(v) for v in value]
+        return value
+
+    return _restore(header_obj)
+
+
+def accepts_binary(accept: Optional[str]) -> bool:
+    """True si la cabecera Accept incluye el formato binario"""
+    if not accept:
+        return False
+    return any(
+        part.split(";")[0].strip() == BINARY_MEDIA_TYPE
+        for part in accept.split(",")
+    )
+
+
+def is_binary(content_type: Optional[str]) -> bool:
+    """True si el Content-Type es el formato binario"""
+    return bool(content_type) and content_type.split(";")[0].strip() == BINARY_MEDIA_TYPE
+
+
+def encode_for(payload: Any, accept: Optional[str]) -> Tuple[bytes, str]:
+    """
+    Codifica según lo que acepta el cliente.
+
+    Returns:
+        (cuerpo, media type)
+    """
+    if accepts_binary(accept):
+        return encode(payload), BINARY_MEDIA_TYPE
+    return json.dumps(_to_jsonable(payload), default=str).encode(), JSON_MEDIA_TYPE
+
+
+def decode_body(body: bytes, content_type: Optional[str]) -> Any:
+    """Decodifica un cuerpo binario o JSON según su Content-Type"""
+    if is_binary(content_type):
+        return decode(body)
+    return json.loads(body)
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convierte np.ndarray a listas para la respuesta JSON"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    return value
@@ -7,8 +7,16 @@ y balanceo de carga en arquitectura Master-Slave.
 from .location_index import SemanticLocationIndex, DocumentLocation
 from .embedding_service import EmbeddingService, get_embedding_service
 from .load_balancer import LoadBalancer, NodeLoad
-from .replication_coordinator import ReplicationCoordinator, ReplicationTask, ReplicationStatus
+from .replication_coordinator import (
+    ReplicationCoordinator, ReplicationTask, ReplicationStatus, ReplicationPriority
+)
+from .task_store import ReplicationTaskStore
 from .query_router import QueryRouter, QueryRequest, AggregatedResult
+from .query_cache import QueryResultCache
+from .fanout_planner import FanoutPlanner, FanoutPlan
+from .query_tracing import QueryTracer, QueryTrace
+from .query_batcher import NodeQueryBatcher
+from .admission_control import AdmissionController, AdmissionRejected, QueryPriority
 
 __all__ = [
     # Location Index
@@ -24,8 +32,24 @@ __all__ = [
     "ReplicationCoordinator",
     "ReplicationTask",
     "ReplicationStatus",
+    "ReplicationPriority",
+    "ReplicationTaskStore",
     # Query Router
     "QueryRouter",
     "QueryRequest",
-    "AggregatedResult"
+    "AggregatedResult",
+    # Query Cache
+    "QueryResultCache",
+    # Fan-out Planner
+    "FanoutPlanner",
+    "FanoutPlan",
+    # Query Tracing
+    "QueryTracer",
+    "QueryTrace",
+    # Query Batching
+    "NodeQueryBatcher",
+    # Admission Control
+    "AdmissionController",
+    "AdmissionRejected",
+    "QueryPriority"
 ]
@@ -0,0 +1,322 @@
+"""
+DistriSearch Master - Control de admisión de búsquedas
+
+Protege a los Slaves de la saturación limitando los fan-outs:
+- Token bucket por usuario/API key (tasa sostenida + ráfaga)
+- Límite de concurrencia global y por tenant
+- Cola de espera acotada con prioridades (interactive > batch)
+- Rechazo rápido con Retry-After cuando hay sobrecarga
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryPriority(Enum):
+    """Clases de prioridad de las queries"""
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+# Menor valor = se atiende antes
+_PRIORITY_ORDER = {QueryPriority.INTERACTIVE: 0, QueryPriority.BATCH: 1}
+
+
+class AdmissionRejected(Exception):
+    """Query rechazada por el control de admisión"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Query rechazada ({reason}), reintentar en {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Valor para la cabecera HTTP Retry-After (segundos enteros)"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens/s con capacidad `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Intenta consumir tokens.
+
+        Returns:
+            0 si se consumieron, o segundos hasta que haya suficientes
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (tokens - self.tokens) / self.rate
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Devuelve tokens consumidos por una petición que no se atendió"""
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+@dataclass(order=True)
+class _Waiter:
+    """Query encolada esperando un slot de concurrencia"""
+    order: int
+    seq: int
+    key: str = field(compare=False)
+    priority: QueryPriority = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class AdmissionController:
+    """
+    Controlador de admisión delante de QueryRouter.route_query.
+
+    Uso:
+        async with controller.admit(api_key, QueryPriority.INTERACTIVE):
+            result = await router.route_query(request)
+
+    Lanza AdmissionRejected si la query excede la tasa del tenant,
+    su concurrencia, o si la cola está llena / la espera expira.
+    """
+
+    def __init__(
+        self,
+        rate_per_key: float = 10.0,
+        burst_per_key: float = 20.0,
+        max_concurrent: int = 32,
+        max_concurrent_per_key: Optional[int] = 8,
+        max_queue: int = 64,
+        batch_queue_share: float = 0.5,
+        queue_timeout: float = 2.0,
+        max_tracked_keys: int = 10000
+    ):
+        """
+        Args:
+            rate_per_key: Queries/s sostenidas por usuario o API key
+            burst_per_key: Ráfaga máxima por usuario o API key
+            max_concurrent: Fan-outs simultáneos en todo el cluster
+            max_concurrent_per_key: Fan-outs simultáneos por tenant (None = sin límite)
+            max_queue: Queries que pueden esperar un slot
+            batch_queue_share: Fracción de la cola que pueden ocupar queries batch
+            queue_timeout: Espera máxima en cola (segundos)
+            max_tracked_keys: Buckets de tenants conservados (LRU)
+        """
+        self.rate_per_key = rate_per_key
+        self.burst_per_key = burst_per_key
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_key = max_concurrent_per_key
+        self.max_queue = max_queue
+        self.batch_queue_share = batch_queue_share
+        self.queue_timeout = queue_timeout
+        self.max_tracked_keys = max_tracked_keys
+
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._active = 0
+        self._active_by_key: Dict[str, int] = {}
+        self._queue: List[_Waiter] = []
+        self._queued_by_priority: Dict[QueryPriority, int] = {p: 0 for p in QueryPriority}
+        self._seq = itertools.count()
+
+        # Métricas
+        self._admitted = 0
+        self._queued_total = 0
+        self._rejections: Dict[str, int] = {}
+        self._total_wait_ms = 0.0
+        self._avg_service_s = 0.1  # EWMA del tiempo de servicio
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        key: str,
+        priority: QueryPriority = QueryPriority.INTERACTIVE
+    ) -> AsyncIterator[None]:
+        """Reserva un slot de ejecución para la query (context manager)"""
+        await self.acquire(key, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(key, time.monotonic() - started)
+
+    async def acquire(
+        self,
+        key: str,
+        priority: QueryPriority = QueryPriority.INTERACTIVE
+    ) -> None:
+        """
+        Admite la query o la encola; lanza AdmissionRejected si no cabe.
+        Cada acquire exitoso debe ir seguido de release(key).
+
+        Una query rechazada no consume presupuesto del tenant: la
+        concurrencia se comprueba antes de tomar el token y el token
+        se devuelve si la query no llega a ejecutarse.
+        """
+        if self._at_key_limit(key):
+            self._reject("tenant_concurrency", self._avg_service_s)
+
+        bucket = self._bucket(key)
+        wait = bucket.try_acquire()
+        if wait > 0:
+            self._reject("rate_limited", wait)
+
+        if self._active < self.max_concurrent and not self._queue:
+            self._grant(key)
+            return
+
+        if not self._has_queue_room(priority):
+            bucket.refund()
+            self._reject("overloaded", self._estimated_wait())
+
+        waiter = _Waiter(
+            order=_PRIORITY_ORDER[priority],
+            seq=next(self._seq),
+            key=key,
+            priority=priority,
+            future=asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._queue, waiter)
+        self._queued_by_priority[priority] += 1
+        self._queued_total += 1
+        # La cola puede tener solo waiters de tenants en su límite
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._cancel_waiter(waiter):
+                return  # El slot llegó justo al expirar
+            bucket.refund()
+            self._reject("queue_timeout", self._estimated_wait())
+        except asyncio.CancelledError:
+            if not self._cancel_waiter(waiter):
+                self.release(key)
+            raise
+
+        self._total_wait_ms += (time.monotonic() - waiter.enqueued_at) * 1000
+
+    def release(self, key: str, service_time_s: Optional[float] = None) -> None:
+        """Libera el slot de una query y lo cede al siguiente en cola"""
+        self._active = max(0, self._active - 1)
+        remaining = self._active_by_key.get(key, 0) - 1
+        if remaining > 0:
+            self._active_by_key[key] = remaining
+        else:
+            self._active_by_key.pop(key, None)
+
+        if service_time_s is not None:
+            self._avg_service_s = 0.9 * self._avg_service_s + 0.1 * service_time_s
+
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """
+        Cede los slots libres a los waiters en orden de prioridad,
+        saltando (sin sacarlos de la cola) los de tenants que ya están
+        en su límite de concurrencia.
+        """
+        deferred: List[_Waiter] = []
+        while self._queue and self._active < self.max_concurrent:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                self._queued_by_priority[waiter.priority] -= 1
+                continue
+            if self._at_key_limit(waiter.key):
+                deferred.append(waiter)
+                continue
+            self._queued_by_priority[waiter.priority] -= 1
+            self._grant(waiter.key)
+            waiter.future.set_result(None)
+        for waiter in deferred:
+            heapq.heappush(self._queue, waiter)
+
+    def _at_key_limit(self, key: str) -> bool:
+        return self.max_concurrent_per_key is not None and \
+            self._active_by_key.get(key, 0) >= self.max_concurrent_per_key
+
+    def _grant(self, key: str) -> None:
+        self._active += 1
+        self._active_by_key[key] = self._active_by_key.get(key, 0) + 1
+        self._admitted += 1
+
+    def _cancel_waiter(self, waiter: _Waiter) -> bool:
+        """
+        Saca un waiter de la cola.
+
+        Returns:
+            False si ya se le había concedido el slot
+        """
+        if waiter.future.done():
+            return False
+        waiter.future.cancel()
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+        self._queued_by_priority[waiter.priority] -= 1
+        return True
+
+    def _has_queue_room(self, priority: QueryPriority) -> bool:
+        if len(self._queue) >= self.max_queue:
+            return False
+        if priority == QueryPriority.BATCH:
+            return self._queued_by_priority[QueryPriority.BATCH] < \
+                self.max_queue * self.batch_queue_share
+        return True
+
+    def _estimated_wait(self) -> float:
+        """Estimación de la espera: cola por delante / throughput"""
+        return (len(self._queue) + 1) * self._avg_service_s / max(1, self.max_concurrent)
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_key, self.burst_per_key)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_tracked_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        self._rejections[reason] = self._rejections.get(reason, 0) + 1
+        logger.debug(f"Query rechazada: {reason} (retry_after={retry_after:.2f}s)")
+        raise AdmissionRejected(reason, retry_after)
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del control de admisión"""
+        waited = self._queued_total
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": len(self._queue),
+            "queue_depth_by_priority": {
+                p.value: n for p, n in self._queued_by_priority.items()
+            },
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "queued_total": waited,
+            "average_wait_ms": self._total_wait_ms / waited if waited else 0,
+            "rejections": dict(self._rejections),
+            "tracked_keys": len(self._buckets)
+        }
@@ -0,0 +1,173 @@
+"""
+DistriSearch Master - Planificador de fan-out adaptativo
+
+Decide cuántos Slaves consultar por query a partir de la
+distribución de scores de afinidad de sus perfiles semánticos:
+- Query enfocada (un nodo destaca): solo los nodos cerca del mejor
+- Query vaga (scores planos): cobertura completa
+El margen se ajusta con el feedback de qué nodos aportan al top-k.
+"""
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FanoutPlan:
+    """Plan de fan-out para una query"""
+    nodes: List[str]
+    scores: Dict[str, float] = field(default_factory=dict)
+    best_score: float = 0.0
+    margin: float = 0.0
+    flat: bool = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "nodes": self.nodes,
+            "scores": self.scores,
+            "best_score": self.best_score,
+            "margin": self.margin,
+            "flat": self.flat
+        }
+
+
+class FanoutPlanner:
+    """
+    Planificador de fan-out basado en gaps de afinidad.
+
+    Selecciona los nodos con score >= mejor - margen. Si la
+    distribución de scores es plana, amplía a todos los nodos.
+    El margen se adapta con record_feedback: el aporte de los nodos
+    del borde del margen al top-k final.
+    """
+
+    def __init__(
+        self,
+        margin: float = 0.1,
+        min_nodes: int = 1,
+        max_nodes: Optional[int] = 3,
+        flatness_threshold: float = 0.05,
+        min_margin: float = 0.02,
+        max_margin: float = 0.5,
+        adjust_step: float = 0.01,
+        boundary_share_threshold: float = 0.2,
+        history_size: int = 200
+    ):
+        """
+        Args:
+            margin: Margen inicial respecto al mejor score
+            min_nodes: Mínimo de nodos a consultar
+            max_nodes: Máximo de nodos para queries enfocadas (None = sin tope)
+            flatness_threshold: Rango de scores por debajo del cual la
+                                distribución se considera plana
+            min_margin: Margen mínimo permitido
+            max_margin: Margen máximo permitido
+            adjust_step: Paso de ajuste del margen por feedback
+            boundary_share_threshold: Fracción del top-k aportada por nodos
+                                      del borde a partir de la cual se amplía
+            history_size: Entradas de feedback a conservar
+        """
+        self.margin = margin
+        self.min_nodes = min_nodes
+        self.max_nodes = max_nodes
+        self.flatness_threshold = flatness_threshold
+        self.min_margin = min_margin
+        self.max_margin = max_margin
+        self.adjust_step = adjust_step
+        self.boundary_share_threshold = boundary_share_threshold
+
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+        self._plans = 0
+        self._flat_plans = 0
+        self._nodes_planned = 0
+
+    def plan(self, scores: List[Tuple[str, float]]) -> FanoutPlan:
+        """
+        Calcula el plan de fan-out.
+
+        Args:
+            scores: (node_id, score de afinidad) de todos los nodos candidatos
+
+        Returns:
+            Plan con los nodos a consultar, ordenados por score
+        """
+        if not scores:
+            return FanoutPlan(nodes=[], margin=self.margin)
+
+        ranked = sorted(scores, key=lambda x: x[1], reverse=True)
+        best = ranked[0][1]
+        spread = best - ranked[-1][1]
+        flat = len(ranked) > 1 and spread < self.flatness_threshold
+
+        if flat:
+            selected = [node_id for node_id, _ in ranked]
+        else:
+            selected = [
+                node_id for node_id, score in ranked
+                if score >= best - self.margin
+            ]
+            if len(selected) < self.min_nodes:
+                selected = [node_id for node_id, _ in ranked[:self.min_nodes]]
+            if self.max_nodes is not None:
+                selected = selected[:max(self.max_nodes, self.min_nodes)]
+
+        self._plans += 1
+        self._flat_plans += int(flat)
+        self._nodes_planned += len(selected)
+
+        return FanoutPlan(
+            nodes=selected,
+            scores={node_id: score for node_id, score in ranked},
+            best_score=best,
+            margin=self.margin,
+            flat=flat
+        )
+
+    def record_feedback(self, plan: FanoutPlan, result_nodes: List[str]) -> None:
+        """
+        Ajusta el margen según qué nodos aportaron al top-k.
+
+        Si los nodos del borde del margen aportan una fracción relevante
+        de los resultados, probablemente hay nodos justo fuera del margen
+        con resultados útiles: se amplía. Si solo aporta el mejor nodo
+        aunque se consultaron varios, se estrecha.
+
+        Args:
+            plan: Plan con el que se ejecutó la query
+            result_nodes: node_id de cada resultado del top-k final
+        """
+        if plan.flat or not plan.nodes or not result_nodes:
+            return
+
+        boundary = {
+            node_id for node_id in plan.nodes
+            if plan.scores.get(node_id, 0.0) < plan.best_score - plan.margin / 2
+        }
+        boundary_share = sum(1 for n in result_nodes if n in boundary) / len(result_nodes)
+
+        if boundary_share >= self.boundary_share_threshold:
+            self._adjust(+self.adjust_step)
+        elif len(plan.nodes) > 1 and set(result_nodes) == {plan.nodes[0]}:
+            self._adjust(-self.adjust_step)
+
+        self._history.append({
+            "nodes": len(plan.nodes),
+            "boundary_share": boundary_share,
+            "margin": self.margin
+        })
+
+    def _adjust(self, delta: float) -> None:
+        self.margin = min(self.max_margin, max(self.min_margin, self.margin + delta))
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del planificador"""
+        return {
+            "margin": self.margin,
+            "plans": self._plans,
+            "flat_plans": self._flat_plans,
+            "average_fanout": self._nodes_planned / self._plans if self._plans else 0,
+            "feedback_entries": len(self._history)
+        }
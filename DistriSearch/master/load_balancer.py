@@ -3,44 +3,93 @@ DistriSearch Master - Balanceador de carga
 
 Distribuye queries y asigna documentos a Slaves
 basándose en afinidad semántica y carga actual.
+
+La carga de cada nodo combina lo que reporta en sus heartbeats
+(CPU, memoria, cola, p99) con la latencia que observa el Master,
+suavizadas con EWMA y con decaimiento hacia carga media cuando
+los datos envejecen.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import Counter
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import datetime
+import heapq
 import logging
 import random
 
 from ..core.models import NodeInfo, NodeStatus
+from ..core.circuit_breaker import CircuitBreakerRegistry, get_circuit_breakers
 
 logger = logging.getLogger(__name__)
 
+# Carga supuesta para señales sin datos recientes
+NEUTRAL_LOAD = 0.5
+# Vida media de un reporte/observación: a los 30s pesa la mitad
+STALE_HALF_LIFE_S = 30.0
+# Latencias de referencia: a este valor la señal vale 0.5
+LATENCY_REFERENCE_MS = 100.0
+TAIL_REFERENCE_MS = 500.0
+
+
+def _freshness(updated: Optional[datetime], now: datetime) -> float:
+    """Peso de un dato según su edad (1 = recién llegado, 0 = sin datos)"""
+    if updated is None:
+        return 0.0
+    age = max(0.0, (now - updated).total_seconds())
+    return 0.5 ** (age / STALE_HALF_LIFE_S)
+
 
 @dataclass
 class NodeLoad:
-    """Estado de carga de un nodo"""
+    """Estado de carga de un nodo (métricas suavizadas con EWMA)"""
     node_id: str
     active_queries: int = 0
     cpu_usage: float = 0.0  # 0-100
     memory_usage: float = 0.0  # 0-100
     document_count: int = 0
+    queue_depth: float = 0.0  # Búsquedas en curso en el nodo
+    p50_ms: float = 0.0  # Reportados por el nodo
+    p99_ms: float = 0.0
+    latency_ms: float = 0.0  # Observada por el Master
     last_updated: datetime = field(default_factory=datetime.utcnow)
+    latency_updated: Optional[datetime] = None
+    reports: int = 0  # Reportes de carga recibidos
     
     @property
     def load_score(self) -> float:
         """Score de carga combinado (0.0 = libre, 1.0 = sobrecargado)"""
-        # Pesos para diferentes métricas
-        query_weight = 0.3
-        cpu_weight = 0.4
-        memory_weight = 0.3
+        return self.load_score_with()
+    
+    def load_score_with(self, extra_queries: int = 0, now: Optional[datetime] = None) -> float:
+        """
+        Score de carga si se le asignaran `extra_queries` queries más.
+        
+        Las señales reportadas y la latencia observada decaen hacia
+        NEUTRAL_LOAD a medida que envejecen; un nodo que deja de
+        reportar no sigue pareciendo libre.
+        """
+        now = now or datetime.utcnow()
         
         # Normalizar queries activas (asume max 10 queries simultáneas)
-        query_load = min(self.active_queries / 10.0, 1.0)
+        query_load = min((self.active_queries + extra_queries) / 10.0, 1.0)
         
-        return (
-            query_weight * query_load +
-            cpu_weight * (self.cpu_usage / 100.0) +
-            memory_weight * (self.memory_usage / 100.0)
+        resource_load = (
+            0.35 * (self.cpu_usage / 100.0) +
+            0.25 * (self.memory_usage / 100.0) +
+            0.2 * min(self.queue_depth / 10.0, 1.0) +
+            0.2 * self.p99_ms / (self.p99_ms + TAIL_REFERENCE_MS)
         )
+        fresh = _freshness(self.last_updated, now)
+        resource_load = fresh * resource_load + (1 - fresh) * NEUTRAL_LOAD
+        
+        # Sin observaciones todavía: no penalizar (permite explorar el nodo)
+        latency_load = 0.0
+        if self.latency_updated is not None:
+            fresh = _freshness(self.latency_updated, now)
+            observed = self.latency_ms / (self.latency_ms + LATENCY_REFERENCE_MS)
+            latency_load = fresh * observed + (1 - fresh) * NEUTRAL_LOAD
+        
+        return 0.25 * query_load + 0.5 * resource_load + 0.25 * latency_load
     
     def to_dict(self) -> Dict:
         return {
@@ -49,6 +98,10 @@ class NodeLoad:
             "cpu_usage": self.cpu_usage,
             "memory_usage": self.memory_usage,
             "document_count": self.document_count,
+            "queue_depth": self.queue_depth,
+            "p50_ms": self.p50_ms,
+            "p99_ms": self.p99_ms,
+            "latency_ms": self.latency_ms,
             "load_score": self.load_score,
             "last_updated": self.last_updated.isoformat()
         }
@@ -63,37 +116,69 @@ class LoadBalancer:
     2. Round-robin: Distribución equitativa
     3. Least-connections: Prioriza nodos con menos queries activas
     4. Weighted: Combina semántica + carga
+    5. P2C (power of two choices): Muestrea dos nodos al azar y elige
+       el mejor; O(1) por nodo elegido y evita el efecto manada
+    
+    Los nodos con el circuit breaker abierto se tratan como no sanos
+    en todas las estrategias hasta que una sonda tiene éxito.
+    
+    Las selecciones top-k usan heapq en lugar de ordenar todo el
+    cluster, y los agregados (máximo de documentos, queries activas
+    totales) se mantienen de forma incremental.
+    
+    Con grupos de réplica, cada shard (contenido de un nodo dueño)
+    se atiende en el holder sano menos cargado: el dueño o una réplica.
     """
     
-    def __init__(self, strategy: str = "weighted"):
+    def __init__(
+        self,
+        strategy: str = "weighted",
+        ewma_alpha: float = 0.3,
+        seed: Optional[int] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None
+    ):
         """
         Args:
             strategy: Estrategia de balanceo 
-                      ('semantic', 'round_robin', 'least_connections', 'weighted')
+                      ('semantic', 'round_robin', 'least_connections', 'weighted', 'p2c')
+            ewma_alpha: Peso de cada nueva muestra de carga/latencia
+            seed: Semilla del muestreo aleatorio de p2c
+            circuit_breakers: Circuit breakers por nodo (por defecto los del proceso)
         """
         self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self._rng = random.Random(seed)
+        self.circuit_breakers = circuit_breakers or get_circuit_breakers()
         
         # Estado de nodos
         self._nodes: Dict[str, NodeInfo] = {}
         self._loads: Dict[str, NodeLoad] = {}
         
+        # Agregados incrementales del cluster
+        self._doc_count_hist: Counter = Counter()  # document_count -> nº de nodos
+        self._max_docs: Optional[int] = 0  # None = recalcular desde el histograma
+        self._total_active_queries = 0
+        
         # Para round-robin
         self._rr_index = 0
         
-        # Config
-        self.stale_threshold = timedelta(seconds=30)  # Datos obsoletos
+        # Métricas
+        self._load_reports = 0
+        self._latency_samples = 0
     
     def register_node(self, node: NodeInfo) -> None:
         """Registra un nodo en el balanceador"""
         self._nodes[node.node_id] = node
-        if node.node_id not in self._loads:
-            self._loads[node.node_id] = NodeLoad(node_id=node.node_id)
+        self._ensure_load(node.node_id)
         logger.info(f"Nodo registrado en balanceador: {node.node_id}")
     
     def unregister_node(self, node_id: str) -> None:
         """Elimina un nodo del balanceador"""
         self._nodes.pop(node_id, None)
-        self._loads.pop(node_id, None)
+        load = self._loads.pop(node_id, None)
+        if load is not None:
+            self._total_active_queries -= load.active_queries
+            self._forget_document_count(load.document_count)
         logger.info(f"Nodo eliminado del balanceador: {node_id}")
     
     def update_load(
@@ -102,42 +187,119 @@ class LoadBalancer:
         active_queries: int = None,
         cpu_usage: float = None,
         memory_usage: float = None,
-        document_count: int = None
+        document_count: int = None,
+        queue_depth: float = None,
+        p50_ms: float = None,
+        p99_ms: float = None
     ) -> None:
-        """Actualiza métricas de carga de un nodo"""
-        if node_id not in self._loads:
-            self._loads[node_id] = NodeLoad(node_id=node_id)
+        """
+        Actualiza métricas de carga de un nodo.
         
-        load = self._loads[node_id]
+        CPU, memoria, cola y percentiles se suavizan con EWMA; el peso
+        del valor anterior se reduce según su antigüedad.
+        """
+        load = self._ensure_load(node_id)
+        now = datetime.utcnow()
+        alpha = self._effective_alpha(load.last_updated if load.reports else None, now)
         
         if active_queries is not None:
+            self._total_active_queries += active_queries - load.active_queries
             load.active_queries = active_queries
-        if cpu_usage is not None:
-            load.cpu_usage = cpu_usage
-        if memory_usage is not None:
-            load.memory_usage = memory_usage
         if document_count is not None:
+            self._forget_document_count(load.document_count)
             load.document_count = document_count
+            self._count_document_count(document_count)
+        for name, value in (
+            ("cpu_usage", cpu_usage),
+            ("memory_usage", memory_usage),
+            ("queue_depth", queue_depth),
+            ("p50_ms", p50_ms),
+            ("p99_ms", p99_ms),
+        ):
+            if value is not None:
+                old = getattr(load, name)
+                setattr(load, name, alpha * float(value) + (1 - alpha) * old)
         
-        load.last_updated = datetime.utcnow()
+        load.reports += 1
+        load.last_updated = now
+    
+    def apply_load_report(self, node_id: str, report: Dict[str, Any]) -> None:
+        """Aplica el reporte de carga recibido en un heartbeat"""
+        self._load_reports += 1
+        self.update_load(
+            node_id,
+            cpu_usage=report.get("cpu_usage"),
+            memory_usage=report.get("memory_usage"),
+            queue_depth=report.get("queue_depth"),
+            p50_ms=report.get("p50_ms"),
+            p99_ms=report.get("p99_ms")
+        )
+    
+    def record_latency(self, node_id: str, latency_ms: float) -> None:
+        """Registra el tiempo de respuesta observado de un nodo (EWMA)"""
+        load = self._loads.get(node_id)
+        if load is None:
+            return
+        
+        now = datetime.utcnow()
+        alpha = self._effective_alpha(load.latency_updated, now)
+        load.latency_ms = alpha * latency_ms + (1 - alpha) * load.latency_ms
+        load.latency_updated = now
+        self._latency_samples += 1
+    
+    def _effective_alpha(self, updated: Optional[datetime], now: datetime) -> float:
+        """
+        Alpha de la EWMA: la primera muestra (o tras datos muy viejos)
+        reemplaza al valor anterior en lugar de promediarse con él.
+        """
+        return 1 - (1 - self.ewma_alpha) * _freshness(updated, now)
     
     def increment_queries(self, node_id: str) -> None:
         """Incrementa contador de queries activas"""
         if node_id in self._loads:
             self._loads[node_id].active_queries += 1
+            self._total_active_queries += 1
     
     def decrement_queries(self, node_id: str) -> None:
         """Decrementa contador de queries activas"""
-        if node_id in self._loads:
-            self._loads[node_id].active_queries = max(
-                0, self._loads[node_id].active_queries - 1
-            )
+        load = self._loads.get(node_id)
+        if load is not None and load.active_queries > 0:
+            load.active_queries -= 1
+            self._total_active_queries -= 1
+    
+    def _ensure_load(self, node_id: str) -> NodeLoad:
+        load = self._loads.get(node_id)
+        if load is None:
+            load = NodeLoad(node_id=node_id)
+            self._loads[node_id] = load
+            self._count_document_count(load.document_count)
+        return load
+    
+    def _count_document_count(self, count: int) -> None:
+        self._doc_count_hist[count] += 1
+        if self._max_docs is not None and count > self._max_docs:
+            self._max_docs = count
+    
+    def _forget_document_count(self, count: int) -> None:
+        self._doc_count_hist[count] -= 1
+        if self._doc_count_hist[count] <= 0:
+            del self._doc_count_hist[count]
+            if count == self._max_docs:
+                self._max_docs = None  # El máximo se fue: recalcular al pedirlo
+    
+    @property
+    def max_document_count(self) -> int:
+        """Máximo de documentos por nodo (O(valores distintos) solo si cambió)"""
+        if self._max_docs is None:
+            self._max_docs = max(self._doc_count_hist, default=0)
+        return self._max_docs
     
     def select_nodes_for_query(
         self,
         semantic_scores: Optional[List[Tuple[str, float]]] = None,
         num_nodes: int = 3,
-        exclude: Optional[List[str]] = None
+        exclude: Optional[List[str]] = None,
+        replica_groups: Optional[Dict[str, List[str]]] = None
     ) -> List[str]:
         """
         Selecciona nodos para ejecutar una query.
@@ -146,16 +308,22 @@ class LoadBalancer:
             semantic_scores: Scores de afinidad semántica (node_id, score)
             num_nodes: Número de nodos a seleccionar
             exclude: Nodos a excluir
+            replica_groups: Dueño -> réplicas de su shard. Si se indica,
+                            un shard sigue disponible aunque su dueño esté
+                            caído mientras alguna réplica esté sana
             
         Returns:
-            Lista de node_ids seleccionados
+            Lista de node_ids seleccionados (shards; ver assign_shards)
         """
         exclude = set(exclude or [])
         
         # Filtrar nodos disponibles
         available = [
-            node_id for node_id, node in self._nodes.items()
-            if node.status == NodeStatus.ONLINE and node_id not in exclude
+            node_id for node_id in self._nodes
+            if node_id not in exclude and (
+                self._is_healthy(node_id) or
+                any(self._is_healthy(r) for r in (replica_groups or {}).get(node_id, ()))
+            )
         ]
         
         if not available:
@@ -173,10 +341,68 @@ class LoadBalancer:
             return self._select_semantic(semantic_scores, available, num_nodes)
         elif self.strategy == "weighted" and semantic_scores:
             return self._select_weighted(semantic_scores, available, num_nodes)
+        elif self.strategy == "p2c":
+            return self._select_p2c(semantic_scores, available, num_nodes)
         else:
             # Fallback a least_connections
             return self._select_least_connections(available, num_nodes)
     
+    def select_holder(
+        self,
+        holders: List[str],
+        pending: Optional[Dict[str, int]] = None
+    ) -> Optional[str]:
+        """
+        Elige el holder sano menos cargado de un contenido.
+        
+        Args:
+            holders: Nodos con copia del contenido (dueño primero)
+            pending: Queries ya asignadas en esta ronda y aún no contadas
+            
+        Returns:
+            node_id elegido, o None si ningún holder está sano
+        """
+        pending = pending or {}
+        candidates = [h for h in holders if self._is_healthy(h)]
+        if not candidates:
+            return None
+        
+        # En empate gana el primero (el dueño): evita mover carga sin motivo
+        return min(
+            candidates,
+            key=lambda h: self._loads.get(h, NodeLoad(node_id=h)).load_score_with(pending.get(h, 0))
+        )
+    
+    def assign_shards(
+        self,
+        shards: List[str],
+        replica_groups: Dict[str, List[str]]
+    ) -> Dict[str, str]:
+        """
+        Asigna cada shard al holder sano menos cargado de su grupo.
+        
+        Las asignaciones de la misma ronda cuentan como carga, de modo
+        que dos shards con réplicas comunes se reparten entre ellas.
+        
+        Returns:
+            shard -> holder (los shards sin holder sano se omiten)
+        """
+        pending: Dict[str, int] = {}
+        assignment: Dict[str, str] = {}
+        for shard in shards:
+            holder = self.select_holder([shard] + list(replica_groups.get(shard, ())), pending)
+            if holder is None:
+                continue
+            assignment[shard] = holder
+            pending[holder] = pending.get(holder, 0) + 1
+        return assignment
+    
+    def _is_healthy(self, node_id: str) -> bool:
+        """ONLINE según heartbeats y no expulsado por su circuit breaker"""
+        node = self._nodes.get(node_id)
+        return node is not None and node.status == NodeStatus.ONLINE and \
+            self.circuit_breakers.is_available(node_id)
+    
     def select_node_for_document(
         self,
         semantic_score: Optional[List[Tuple[str, float]]] = None,
@@ -193,8 +419,8 @@ class LoadBalancer:
         exclude = set(exclude or [])
         
         available = [
-            node_id for node_id, node in self._nodes.items()
-            if node.status == NodeStatus.ONLINE and node_id not in exclude
+            node_id for node_id in self._nodes
+            if node_id not in exclude and self._is_healthy(node_id)
         ]
         
         if not available:
@@ -203,34 +429,30 @@ class LoadBalancer:
         if len(available) == 1:
             return available[0]
         
-        # Calcular score combinado para cada nodo
-        node_scores = []
-        
         # Convertir semantic_scores a dict
         semantic_dict = {}
         if semantic_score:
             semantic_dict = {node_id: score for node_id, score in semantic_score}
         
-        for node_id in available:
-            load = self._loads.get(node_id, NodeLoad(node_id=node_id))
+        max_docs = self.max_document_count or 1
+        now = datetime.utcnow()
+        
+        def combined(node_id: str) -> float:
+            load = self._loads.get(node_id) or NodeLoad(node_id=node_id)
             
             # Score de carga (invertido: menor carga = mayor score)
-            load_score = 1.0 - load.load_score
+            load_score = 1.0 - load.load_score_with(now=now)
             
             # Score de documentos (invertido: menos docs = mayor score)
-            max_docs = max(l.document_count for l in self._loads.values()) or 1
             doc_score = 1.0 - (load.document_count / max_docs)
             
             # Score semántico
             sem_score = semantic_dict.get(node_id, 0.5)
             
-            # Score combinado
-            combined = (0.4 * sem_score + 0.4 * load_score + 0.2 * doc_score)
-            node_scores.append((node_id, combined))
+            return 0.4 * sem_score + 0.4 * load_score + 0.2 * doc_score
         
         # Seleccionar mejor nodo
-        node_scores.sort(key=lambda x: x[1], reverse=True)
-        return node_scores[0][0]
+        return max(available, key=combined)
     
     def _select_round_robin(self, available: List[str], num: int) -> List[str]:
         """Selección round-robin"""
@@ -245,12 +467,11 @@ class LoadBalancer:
     
     def _select_least_connections(self, available: List[str], num: int) -> List[str]:
         """Selección por menor número de conexiones activas"""
-        loads = [
-            (node_id, self._loads.get(node_id, NodeLoad(node_id=node_id)).active_queries)
-            for node_id in available
-        ]
-        loads.sort(key=lambda x: x[1])
-        return [node_id for node_id, _ in loads[:num]]
+        def active(node_id: str) -> int:
+            load = self._loads.get(node_id)
+            return load.active_queries if load else 0
+        
+        return heapq.nsmallest(num, available, key=active)
     
     def _select_semantic(
         self, 
@@ -265,8 +486,7 @@ class LoadBalancer:
             for node_id, score in semantic_scores 
             if node_id in available_set
         ]
-        filtered.sort(key=lambda x: x[1], reverse=True)
-        return [node_id for node_id, _ in filtered[:num]]
+        return [node_id for node_id, _ in heapq.nlargest(num, filtered, key=lambda x: x[1])]
     
     def _select_weighted(
         self, 
@@ -279,29 +499,54 @@ class LoadBalancer:
         
         Score = 0.6 * semantic + 0.4 * (1 - load_score)
         """
-        available_set = set(available)
-        semantic_dict = {
-            node_id: score 
-            for node_id, score in semantic_scores 
-            if node_id in available_set
-        }
+        return heapq.nlargest(num, available, key=self._weighted_scorer(semantic_scores))
+    
+    def _select_p2c(
+        self,
+        semantic_scores: Optional[List[Tuple[str, float]]],
+        available: List[str],
+        num: int
+    ) -> List[str]:
+        """
+        Power of two choices: para cada posición se muestrean dos
+        candidatos restantes y se queda el de mejor score (ponderado
+        si hay afinidad semántica). Coste O(num), no O(N log N).
+        """
+        score = self._weighted_scorer(semantic_scores)
+        remaining = list(available)
+        selected = []
+        
+        while remaining and len(selected) < num:
+            if len(remaining) == 1:
+                selected.append(remaining.pop())
+                break
+            i, j = self._rng.sample(range(len(remaining)), 2)
+            best = i if score(remaining[i]) >= score(remaining[j]) else j
+            
+            # Quitar el elegido en O(1): intercambiar con el último
+            remaining[best], remaining[-1] = remaining[-1], remaining[best]
+            selected.append(remaining.pop())
+        
+        return selected
+    
+    def _weighted_scorer(
+        self,
+        semantic_scores: Optional[List[Tuple[str, float]]]
+    ) -> Callable[[str], float]:
+        """Función de score 0.6 * semantic + 0.4 * (1 - load_score)"""
+        semantic_dict = dict(semantic_scores or [])
+        now = datetime.utcnow()
         
-        weighted_scores = []
-        for node_id in available:
+        def score(node_id: str) -> float:
             sem_score = semantic_dict.get(node_id, 0.5)
-            load = self._loads.get(node_id, NodeLoad(node_id=node_id))
+            load = self._loads.get(node_id)
             
-            # Penalizar por datos obsoletos
-            if datetime.utcnow() - load.last_updated > self.stale_threshold:
-                load_score = 0.5  # Asumir carga media si datos obsoletos
-            else:
-                load_score = 1.0 - load.load_score
+            # Los datos obsoletos ya decaen hacia carga media en load_score
+            load_score = 1.0 - (load.load_score_with(now=now) if load else 0.0)
             
-            weighted = 0.6 * sem_score + 0.4 * load_score
-            weighted_scores.append((node_id, weighted))
+            return 0.6 * sem_score + 0.4 * load_score
         
-        weighted_scores.sort(key=lambda x: x[1], reverse=True)
-        return [node_id for node_id, _ in weighted_scores[:num]]
+        return score
     
     def get_node_loads(self) -> Dict[str, NodeLoad]:
         """Retorna estado de carga de todos los nodos"""
@@ -309,7 +554,7 @@ class LoadBalancer:
     
     def get_stats(self) -> Dict:
         """Retorna estadísticas del balanceador"""
-        total_queries = sum(l.active_queries for l in self._loads.values())
+        total_queries = self._total_active_queries
         avg_load = sum(l.load_score for l in self._loads.values()) / len(self._loads) if self._loads else 0
         
         return {
@@ -317,6 +562,11 @@ class LoadBalancer:
             "registered_nodes": len(self._nodes),
             "total_active_queries": total_queries,
             "average_load": avg_load,
+            "max_document_count": self.max_document_count,
+            "circuit_breakers": self.circuit_breakers.get_stats(),
+            "ewma_alpha": self.ewma_alpha,
+            "load_reports": self._load_reports,
+            "latency_samples": self._latency_samples,
             "node_loads": {
                 node_id: load.to_dict() 
                 for node_id, load in self._loads.items()
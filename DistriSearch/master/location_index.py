@@ -5,7 +5,7 @@ Mantiene un índice semántico de los documentos de cada Slave.
 Permite ubicar recursos por similitud semántica en lugar de hash.
 """
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 import logging
@@ -46,6 +46,8 @@ class SemanticLocationIndex:
     - Buscar documentos por similitud semántica
     - Mantener perfiles agregados de cada Slave
     - Seleccionar nodos para replicación por afinidad semántica
+    - Rastrear réplicas y grupos de réplica por shard (nodo dueño)
+    - Saber qué nodos guardan ya un contenido (por content_hash)
     """
     
     def __init__(self, embedding_dim: int = 384):
@@ -64,9 +66,21 @@ class SemanticLocationIndex:
         # Matriz de embeddings para búsqueda rápida
         self._embedding_matrix: Optional[np.ndarray] = None
         self._file_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}  # file_id -> fila en la matriz
         
         self._needs_rebuild = False
         
+        # Época del índice por nodo: se incrementa cada vez que cambia
+        # el contenido registrado de ese nodo (invalidación de cachés)
+        self._node_epochs: Dict[str, int] = {}
+        
+        # Réplicas: file_id -> nodos (distintos del dueño) con copia
+        self._replicas: Dict[str, Set[str]] = {}
+        self._replica_groups: Optional[Dict[str, List[str]]] = None  # Caché
+        
+        # Contenido: content_hash (metadata) -> file_ids con esos bytes
+        self._by_content: Dict[str, Set[str]] = {}
+        
     def register_document(
         self, 
         file_id: str, 
@@ -91,6 +105,16 @@ class SemanticLocationIndex:
         # Normalizar embedding para similitud coseno
         embedding = embedding / (np.linalg.norm(embedding) + 1e-10)
         
+        # Si el documento cambia de nodo, el nodo anterior también cambia
+        previous = self._documents.get(file_id)
+        if previous is not None and previous.node_id != node_id:
+            self._bump_epoch(previous.node_id)
+        
+        # El nuevo dueño deja de contar como réplica
+        if file_id in self._replicas:
+            self._replicas[file_id].discard(node_id)
+        self._replica_groups = None
+            
         doc = DocumentLocation(
             file_id=file_id,
             filename=filename,
@@ -101,8 +125,16 @@ class SemanticLocationIndex:
         
         self._documents[file_id] = doc
         self._needs_rebuild = True
+        self._bump_epoch(node_id)
+        if previous is not None:
+            self._unindex_content(previous)
+        content_hash = doc.metadata.get("content_hash")
+        if content_hash:
+            self._by_content.setdefault(content_hash, set()).add(file_id)
         
         # Actualizar perfil del Slave
+        if previous is not None and previous.node_id != node_id:
+            self._update_slave_profile(previous.node_id)
         self._update_slave_profile(node_id)
         
         logger.info(f"Documento registrado: {filename} en {node_id}")
@@ -113,11 +145,117 @@ class SemanticLocationIndex:
             return False
         
         doc = self._documents.pop(file_id)
+        self._unindex_content(doc)
         self._needs_rebuild = True
+        self._bump_epoch(doc.node_id)
+        for node_id in self._replicas.pop(file_id, ()):
+            self._bump_epoch(node_id)
+        self._replica_groups = None
         self._update_slave_profile(doc.node_id)
         
         return True
     
+    def add_replica(self, file_id: str, node_id: str) -> bool:
+        """
+        Registra que un nodo guarda una copia de un documento.
+        
+        Returns:
+            False si el documento no está indexado
+        """
+        doc = self._documents.get(file_id)
+        if doc is None:
+            return False
+        if node_id == doc.node_id or node_id in self._replicas.get(file_id, ()):
+            return True
+        
+        self._replicas.setdefault(file_id, set()).add(node_id)
+        self._replica_groups = None
+        self._bump_epoch(node_id)
+        return True
+    
+    def remove_replica(self, file_id: str, node_id: str) -> bool:
+        """Elimina el registro de una copia de un documento"""
+        replicas = self._replicas.get(file_id)
+        if not replicas or node_id not in replicas:
+            return False
+        
+        replicas.discard(node_id)
+        if not replicas:
+            del self._replicas[file_id]
+        self._replica_groups = None
+        self._bump_epoch(node_id)
+        return True
+    
+    def get_holders(self, file_id: str) -> List[str]:
+        """Nodos con el documento: el dueño primero y luego las réplicas"""
+        doc = self._documents.get(file_id)
+        if doc is None:
+            return []
+        return [doc.node_id] + sorted(self._replicas.get(file_id, ()))
+    
+    def get_node_files(self, node_id: str) -> List[str]:
+        """Documentos con copia en un nodo (como dueño o como réplica)"""
+        return [
+            file_id for file_id, doc in self._documents.items()
+            if doc.node_id == node_id or node_id in self._replicas.get(file_id, ())
+        ]
+    
+    def get_content_holders(self, content_hash: str) -> Set[str]:
+        """Nodos (dueños o réplicas) que guardan ya un contenido"""
+        holders: Set[str] = set()
+        for file_id in self._by_content.get(content_hash, ()):
+            holders.update(self.get_holders(file_id))
+        return holders
+    
+    def _unindex_content(self, doc: DocumentLocation) -> None:
+        content_hash = doc.metadata.get("content_hash")
+        file_ids = self._by_content.get(content_hash) if content_hash else None
+        if file_ids is not None:
+            file_ids.discard(doc.file_id)
+            if not file_ids:
+                del self._by_content[content_hash]
+    
+    def get_replica_groups(self) -> Dict[str, List[str]]:
+        """
+        Grupos de réplica por shard.
+        
+        El shard de un nodo es el conjunto de documentos de los que es
+        dueño; su grupo son los nodos con copia de TODOS ellos, que por
+        tanto pueden atender una query dirigida a ese shard.
+        
+        Returns:
+            node_id dueño -> nodos réplica del shard completo
+        """
+        if self._replica_groups is not None:
+            return self._replica_groups
+        
+        covering: Dict[str, Set[str]] = {}
+        for file_id, doc in self._documents.items():
+            replicas = self._replicas.get(file_id, set())
+            if doc.node_id in covering:
+                covering[doc.node_id] &= replicas
+            else:
+                covering[doc.node_id] = set(replicas)
+        
+        self._replica_groups = {
+            node_id: sorted(nodes)
+            for node_id, nodes in covering.items()
+            if nodes
+        }
+        return self._replica_groups
+    
+    def get_node_epoch(self, node_id: str) -> int:
+        """Época actual del contenido de un nodo (0 si nunca cambió)"""
+        return self._node_epochs.get(node_id, 0)
+    
+    def get_node_epochs(self) -> Dict[str, int]:
+        """Copia de las épocas de todos los nodos"""
+        return dict(self._node_epochs)
+    
+    def _bump_epoch(self, node_id: str) -> None:
+        """Marca que el contenido de un nodo cambió"""
+        self._node_epochs[node_id] = self._node_epochs.get(node_id, 0) + 1
+    
     def search(
         self, 
         query_embedding: np.ndarray, 
@@ -197,6 +335,39 @@ class SemanticLocationIndex:
         node_scores.sort(key=lambda x: x[1], reverse=True)
         return node_scores[:top_k]
     
+    def node_score_bounds(
+        self,
+        query_embedding: np.ndarray
+    ) -> List[Tuple[str, float]]:
+        """
+        Cota superior de la similitud coseno que puede alcanzar
+        cualquier documento de cada nodo con la query.
+        
+        Cada perfil guarda su centroide c y el radio angular θr
+        (el documento más alejado del centroide). Por la desigualdad
+        triangular en la esfera, ningún documento supera
+        cos(max(0, θq - θr)), con θq el ángulo entre query y centroide.
+        
+        Returns:
+            Lista de (node_id, cota) ordenada de mayor a menor
+        """
+        if not self._slave_profiles:
+            return []
+        
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) + 1e-10)
+        
+        bounds = []
+        for node_id, profile in self._slave_profiles.items():
+            if profile["embedding"] is None:
+                continue
+            theta_q = np.arccos(np.clip(np.dot(profile["embedding"], query_embedding), -1.0, 1.0))
+            theta_r = np.arccos(np.clip(profile.get("min_similarity", -1.0), -1.0, 1.0))
+            bound = float(np.cos(max(0.0, theta_q - theta_r)))
+            bounds.append((node_id, bound))
+        
+        bounds.sort(key=lambda x: x[1], reverse=True)
+        return bounds
+    
     def select_replica_nodes(
         self, 
         source_node: str,
@@ -229,6 +400,33 @@ class SemanticLocationIndex:
         
         return replica_nodes[:replication_factor]
     
+    def get_embeddings(self, file_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Obtiene los embeddings normalizados de varios documentos.
+        
+        Usa la matriz del índice para extraer todas las filas
+        en una sola operación vectorizada.
+        
+        Returns:
+            (matriz len(file_ids) x embedding_dim, máscara de encontrados).
+            Las filas de documentos desconocidos quedan en cero.
+        """
+        embeddings = np.zeros((len(file_ids), self.embedding_dim))
+        found = np.zeros(len(file_ids), dtype=bool)
+        
+        if not file_ids or not self._documents:
+            return embeddings, found
+        
+        if self._needs_rebuild:
+            self._rebuild_index()
+        
+        rows = np.array([self._row_of.get(fid, -1) for fid in file_ids])
+        found = rows >= 0
+        if found.any():
+            embeddings[found] = self._embedding_matrix[rows[found]]
+        
+        return embeddings, found
+    
     def get_document_location(self, file_id: str) -> Optional[DocumentLocation]:
         """Obtiene la ubicación de un documento específico"""
         return self._documents.get(file_id)
@@ -249,9 +447,12 @@ class SemanticLocationIndex:
         if not self._documents:
             self._embedding_matrix = None
             self._file_ids = []
+            self._row_of = {}
+            self._needs_rebuild = False
             return
         
         self._file_ids = list(self._documents.keys())
+        self._row_of = {fid: row for row, fid in enumerate(self._file_ids)}
         embeddings = [self._documents[fid].embedding for fid in self._file_ids]
         self._embedding_matrix = np.vstack(embeddings)
         self._needs_rebuild = False
@@ -276,8 +477,12 @@ class SemanticLocationIndex:
         centroid = np.mean(embeddings, axis=0)
         centroid = centroid / (np.linalg.norm(centroid) + 1e-10)
         
+        # Radio del perfil: similitud mínima entre el centroide y sus documentos
+        min_similarity = float(np.min(embeddings @ centroid))
+        
         self._slave_profiles[node_id] = {
             "embedding": centroid,
+            "min_similarity": min_similarity,
             "document_count": len(docs),
             "last_updated": datetime.utcnow().isoformat()
         }
@@ -294,5 +499,8 @@ class SemanticLocationIndex:
             "total_documents": len(self._documents),
             "total_nodes": len(self._slave_profiles),
             "documents_per_node": docs_per_node,
+            "total_replicas": sum(len(r) for r in self._replicas.values()),
+            "distinct_contents": len(self._by_content),
+            "replica_groups": self.get_replica_groups(),
             "embedding_dim": self.embedding_dim
         }
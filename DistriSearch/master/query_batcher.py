@@ -0,0 +1,148 @@
+"""
+DistriSearch Master - Batching de queries por nodo
+
+Agrupa las queries pendientes hacia un mismo Slave dentro de una
+ventana de pocos milisegundos y las envía en un único request
+(`/cluster/query/batch`), reduciendo el número de requests HTTP
+Master→Slave en el factor de batch.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+# Envía un batch a un nodo: (node_id, payloads) -> una respuesta por payload
+BatchSender = Callable[[str, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+
+@dataclass
+class _PendingBatch:
+    """Queries acumuladas para un nodo"""
+    payloads: List[Dict[str, Any]] = field(default_factory=list)
+    futures: List[asyncio.Future] = field(default_factory=list)
+    flush_handle: Any = None
+
+
+class BatchItemError(Exception):
+    """Error reportado por el Slave para una query concreta del batch"""
+
+
+class NodeQueryBatcher:
+    """
+    Acumulador de queries por nodo destino.
+
+    La primera query hacia un nodo abre una ventana de `window_ms`;
+    las que lleguen durante la ventana viajan en el mismo batch.
+    Si se alcanza `max_batch` el batch se envía de inmediato.
+    """
+
+    def __init__(
+        self,
+        send_batch: BatchSender,
+        window_ms: float = 3.0,
+        max_batch: int = 32
+    ):
+        """
+        Args:
+            send_batch: Función que envía un batch a un nodo
+            window_ms: Ventana de agrupamiento en milisegundos
+            max_batch: Tamaño máximo de batch
+        """
+        self.send_batch = send_batch
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+
+        self._pending: Dict[str, _PendingBatch] = {}
+        # Envíos en curso: referencia fuerte hasta que terminan
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Métricas
+        self._queries = 0
+        self._batches = 0
+        self._failed_batches = 0
+
+    async def submit(self, node_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Encola una query para un nodo y espera su respuesta.
+
+        Returns:
+            Respuesta del nodo para esta query ({results, query_time_ms, ...})
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.get(node_id)
+        if batch is None:
+            batch = _PendingBatch()
+            self._pending[node_id] = batch
+            batch.flush_handle = loop.call_later(
+                self.window_ms / 1000, self._flush, node_id
+            )
+
+        batch.payloads.append(payload)
+        batch.futures.append(future)
+        self._queries += 1
+
+        if len(batch.payloads) >= self.max_batch:
+            self._flush(node_id)
+
+        return await future
+
+    def _flush(self, node_id: str) -> None:
+        """Cierra el batch pendiente de un nodo y lo envía"""
+        batch = self._pending.pop(node_id, None)
+        if batch is None:
+            return
+        batch.flush_handle.cancel()
+        self._batches += 1
+        task = asyncio.ensure_future(self._send(node_id, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_send_done)
+
+    def _on_send_done(self, task: asyncio.Task) -> None:
+        """Suelta la tarea de envío y registra fallos no capturados"""
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.error(f"Tarea de envío de batch fallida: {error!r}")
+
+    async def _send(self, node_id: str, batch: _PendingBatch) -> None:
+        try:
+            responses = await self.send_batch(node_id, batch.payloads)
+            if len(responses) != len(batch.futures):
+                raise ValueError(
+                    f"Batch de {node_id}: {len(responses)} respuestas "
+                    f"para {len(batch.futures)} queries"
+                )
+        except Exception as e:
+            self._failed_batches += 1
+            logger.error(f"Error enviando batch a {node_id}: {e}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, response in zip(batch.futures, responses):
+            if future.done():
+                continue
+            if response.get("error"):
+                future.set_exception(BatchItemError(response["error"]))
+            else:
+                future.set_result(response)
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del batcher"""
+        return {
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "queries": self._queries,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "in_flight": len(self._tasks),
+            "average_batch_size": self._queries / self._batches if self._batches else 0,
+            "requests_saved": max(0, self._queries - self._batches)
+        }
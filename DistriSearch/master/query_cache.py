@@ -0,0 +1,224 @@
+"""
+DistriSearch Master - Caché de resultados de búsqueda
+
+Caché LRU acotada por memoria para resultados agregados.
+Cada entrada guarda la época del índice de los nodos que
+aportaron resultados: si un nodo registra o elimina contenido,
+solo se invalidan las entradas que dependen de ese nodo. Además
+guarda la generación de membresía del cluster: la llegada de un
+nodo nuevo (que ninguna entrada conoce) invalida todas.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Overhead aproximado por entrada y por resultado (bytes)
+_ENTRY_OVERHEAD_BYTES = 512
+_RESULT_OVERHEAD_BYTES = 256
+
+
+@dataclass
+class CacheEntry:
+    """Entrada de la caché de resultados"""
+    key: Hashable
+    value: Any  # AggregatedResult
+    node_epochs: Dict[str, int]
+    size_bytes: int
+    generation: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class QueryResultCache:
+    """
+    Caché de resultados versionada por época de nodo.
+
+    - LRU con presupuesto de memoria (bytes estimados)
+    - TTL opcional
+    - Invalidación selectiva por nodo (épocas + índice inverso)
+    - Invalidación global por generación de membresía (nodos nuevos)
+    - Métricas de hit ratio
+    """
+
+    def __init__(
+        self,
+        epoch_provider: Callable[[str], int],
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            epoch_provider: Función node_id -> época actual del nodo
+                            (ej. SemanticLocationIndex.get_node_epoch)
+            max_bytes: Presupuesto de memoria de la caché
+            ttl_seconds: Tiempo de vida de las entradas (None = sin TTL)
+        """
+        self.epoch_provider = epoch_provider
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._keys_by_node: Dict[str, Set[Hashable]] = {}
+        self._current_bytes = 0
+        self._generation = 0
+
+        # Métricas
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Obtiene un resultado cacheado.
+
+        Devuelve None si no existe, expiró, cambió la membresía del
+        cluster o alguno de los nodos de los que depende cambió de
+        época desde que se guardó.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        if self.ttl_seconds is not None and \
+                time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            self._expirations += 1
+            self._misses += 1
+            return None
+
+        if entry.generation != self._generation or any(
+            self.epoch_provider(node_id) != epoch
+            for node_id, epoch in entry.node_epochs.items()
+        ):
+            self._remove(key)
+            self._invalidations += 1
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry.value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        node_epochs: Dict[str, int],
+        generation: Optional[int] = None
+    ) -> None:
+        """
+        Guarda un resultado etiquetado con las épocas de sus nodos.
+
+        Args:
+            key: Clave de la query
+            value: Resultado agregado
+            node_epochs: node_id -> época al momento de ejecutar la query
+            generation: Generación de membresía al ejecutar la query
+                        (None = la actual)
+        """
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        entry = CacheEntry(
+            key=key,
+            value=value,
+            node_epochs=dict(node_epochs),
+            size_bytes=size,
+            generation=self._generation if generation is None else generation
+        )
+        self._entries[key] = entry
+        self._current_bytes += size
+        for node_id in entry.node_epochs:
+            self._keys_by_node.setdefault(node_id, set()).add(key)
+
+        # Expulsar LRU hasta respetar el presupuesto
+        while self._current_bytes > self.max_bytes and self._entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._evictions += 1
+
+    def invalidate_node(self, node_id: str) -> int:
+        """
+        Invalida todas las entradas que dependen de un nodo.
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        keys = list(self._keys_by_node.get(node_id, ()))
+        for key in keys:
+            self._remove(key)
+        self._invalidations += len(keys)
+        return len(keys)
+
+    @property
+    def generation(self) -> int:
+        """Generación de membresía actual"""
+        return self._generation
+
+    def bump_generation(self) -> None:
+        """
+        Marca un cambio de membresía (p.ej. un nodo nuevo): las
+        entradas existentes no dependen de él y dejan de ser válidas.
+        """
+        self._generation += 1
+
+    def clear(self) -> None:
+        """Vacía la caché"""
+        self._entries.clear()
+        self._keys_by_node.clear()
+        self._current_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._current_bytes -= entry.size_bytes
+        for node_id in entry.node_epochs:
+            keys = self._keys_by_node.get(node_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_node[node_id]
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """Estimación del tamaño en memoria de un resultado agregado"""
+        size = _ENTRY_OVERHEAD_BYTES
+        for result in getattr(value, "results", ()):
+            size += _RESULT_OVERHEAD_BYTES
+            size += len(result.file_id or "") + len(result.filename or "")
+            size += len(result.snippet or "")
+            if result.metadata:
+                size += len(json.dumps(result.metadata, default=str))
+        return size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas de la caché"""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "generation": self._generation,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups > 0 else 0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "expirations": self._expirations
+        }
@@ -6,19 +6,36 @@ basándose en afinidad semántica.
 """
 import asyncio
 import httpx
+import json
 import logging
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, field
+import math
+import time
+from contextlib import nullcontext
+from typing import Awaitable, Dict, List, Optional, Any, Set, Tuple
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 import numpy as np
 
 from .embedding_service import EmbeddingService, get_embedding_service
 from .location_index import SemanticLocationIndex
 from .load_balancer import LoadBalancer
+from .query_cache import QueryResultCache
+from .fanout_planner import FanoutPlanner, FanoutPlan
+from .query_tracing import QueryTracer, QueryTrace
+from .query_batcher import NodeQueryBatcher
 from ..core.models import QueryResult
+from ..core import wire
+from ..core.http_client import HttpClientManager, get_http_client_manager
+from ..core.circuit_breaker import CircuitBreakerRegistry, get_circuit_breakers
 
 logger = logging.getLogger(__name__)
 
+# Constante de Reciprocal Rank Fusion (valor estándar de la literatura)
+RRF_K = 60
+
+# Preferimos el formato binario; JSON para nodos que no lo soporten
+_ACCEPT_HEADER = f"{wire.BINARY_MEDIA_TYPE}, {wire.JSON_MEDIA_TYPE};q=0.9"
+
 
 @dataclass
 class QueryRequest:
@@ -28,8 +45,11 @@ class QueryRequest:
     query_embedding: Optional[np.ndarray] = None
     limit: int = 10
     search_type: str = "semantic"  # semantic, filename, hybrid
+    mode: str = "scatter"  # scatter (búsqueda en Slaves), locate (índice del Master + fetch)
     node_filter: Optional[List[str]] = None
+    filters: Dict[str, Any] = field(default_factory=dict)  # file_type, etc.
     created_at: datetime = field(default_factory=datetime.utcnow)
+    trace: Optional[QueryTrace] = None  # Traza si la query fue muestreada
 
 
 @dataclass
@@ -41,6 +61,10 @@ class AggregatedResult:
     nodes_responded: List[str]
     total_time_ms: float
     errors: Dict[str, str] = field(default_factory=dict)
+    coalesced: bool = False  # True si se reutilizó un fan-out en curso
+    cache_hit: bool = False  # True si se sirvió desde la caché del Master
+    nodes_skipped: List[str] = field(default_factory=list)  # Podados por cota
+    shard_holders: Dict[str, str] = field(default_factory=dict)  # Shard -> nodo que lo atendió
 
 
 class QueryRouter:
@@ -52,6 +76,17 @@ class QueryRouter:
     - Identifica Slaves relevantes por afinidad semántica
     - Envía queries en paralelo
     - Agrega y rankea resultados
+    - Coalesce queries idénticas en curso (single-flight)
+    - Cachea resultados invalidados por época de nodo
+    - Calibra scores por nodo y re-rankea con los embeddings del Master
+    - Modo "locate": candidatos desde el índice del Master y fetch por file_id
+    - Fan-out adaptativo según los gaps de afinidad entre nodos
+    - Terminación temprana por cotas (threshold algorithm) en oleadas
+    - Trazas muestreadas con desglose de latencia por etapa y por nodo
+    - Batching opcional de queries concurrentes hacia un mismo nodo
+    - Formato binario negociado (core.wire) con fallback a JSON
+    - Reparto de cada shard entre su dueño y sus réplicas según carga
+    - Circuit breakers por nodo: los expulsados no reciben queries
     """
     
     def __init__(
@@ -60,57 +95,283 @@ class QueryRouter:
         load_balancer: LoadBalancer,
         embedding_service: Optional[EmbeddingService] = None,
         max_nodes_per_query: int = 3,
-        timeout: float = 10.0
+        timeout: float = 10.0,
+        coalesce_queries: bool = True,
+        result_cache: Optional[QueryResultCache] = None,
+        enable_cache: bool = True,
+        score_fusion: str = "rrf",
+        rerank_weight: float = 0.7,
+        node_fetch_factor: float = 1.0,
+        fanout_planner: Optional[FanoutPlanner] = None,
+        early_termination: bool = False,
+        wave_size: int = 2,
+        tracer: Optional[QueryTracer] = None,
+        batch_window_ms: Optional[float] = None,
+        max_batch_size: int = 32,
+        binary_wire: bool = True,
+        http_client: Optional[HttpClientManager] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None
     ):
         """
         Args:
             location_index: Índice de ubicación semántica
             load_balancer: Balanceador de carga
             embedding_service: Servicio de embeddings
-            max_nodes_per_query: Máximo de nodos a consultar por query
+            max_nodes_per_query: Máximo de nodos para queries enfocadas
+                (las queries con afinidad plana consultan todos los nodos)
             timeout: Timeout para requests HTTP
+            coalesce_queries: Compartir un único fan-out entre queries
+                idénticas que llegan mientras otra está en curso
+            result_cache: Caché de resultados (por defecto una LRU de 32 MB
+                versionada con las épocas del location_index)
+            enable_cache: Si False, no se cachean resultados
+            score_fusion: Normalización de scores por nodo
+                ('rrf', 'zscore' o 'none')
+            rerank_weight: Peso de la similitud coseno calculada en el
+                Master frente al score normalizado del nodo (0.0 - 1.0)
+            node_fetch_factor: Resultados pedidos a cada nodo = limit * factor
+            fanout_planner: Planificador de fan-out (por defecto uno con
+                max_nodes=max_nodes_per_query)
+            early_termination: Consultar nodos por oleadas en orden de cota
+                y descartar los que no pueden entrar en el top-k (requiere
+                scores normalizados: se ignora con score_fusion='none')
+            wave_size: Nodos consultados en paralelo por oleada
+            tracer: Recolector de trazas (por defecto muestrea el 10%)
+            batch_window_ms: Ventana para agrupar queries por nodo en un
+                único request a /cluster/query/batch (None = sin batching)
+            max_batch_size: Queries máximas por batch
+            binary_wire: Pedir respuestas en formato binario (Accept)
+            http_client: Pool HTTP compartido (por defecto el del proceso)
+            circuit_breakers: Circuit breakers por nodo (por defecto los del proceso)
         """
+        if score_fusion not in ("rrf", "zscore", "none"):
+            raise ValueError(f"score_fusion no soportado: {score_fusion}")
+        
         self.location_index = location_index
         self.load_balancer = load_balancer
         self.embedding_service = embedding_service or get_embedding_service()
         self.max_nodes_per_query = max_nodes_per_query
         self.timeout = timeout
+        self.coalesce_queries = coalesce_queries
+        self.score_fusion = score_fusion
+        self.rerank_weight = rerank_weight
+        self.node_fetch_factor = node_fetch_factor
+        self.fanout_planner = fanout_planner or FanoutPlanner(
+            max_nodes=max_nodes_per_query
+        )
+        if early_termination and score_fusion == "none":
+            # Con scores crudos (BM25...) no hay cota superior válida
+            logger.warning("early_termination requiere score_fusion 'rrf' o 'zscore': desactivada")
+            early_termination = False
+        self.early_termination = early_termination
+        self.wave_size = max(1, wave_size)
+        self.tracer = tracer or QueryTracer()
+        self.binary_wire = binary_wire
+        self.http = http_client or get_http_client_manager()
+        self.circuit_breakers = circuit_breakers or get_circuit_breakers()
+        self.query_batcher: Optional[NodeQueryBatcher] = None
+        if batch_window_ms is not None:
+            self.query_batcher = NodeQueryBatcher(
+                self._send_batch,
+                window_ms=batch_window_ms,
+                max_batch=max_batch_size
+            )
+        
+        if result_cache is None and enable_cache:
+            result_cache = QueryResultCache(
+                epoch_provider=location_index.get_node_epoch
+            )
+        self.result_cache = result_cache
         
         # Endpoints de nodos: node_id -> base_url
         self._node_endpoints: Dict[str, str] = {}
         
+        # Fan-outs en curso: clave de coalescing -> futuro compartido
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        
+        # Shards que han devuelto documentos ausentes del índice de ubicación
+        self._unindexed_shards: Set[str] = set()
+        
         # Métricas
         self._queries_processed = 0
         self._total_latency_ms = 0.0
+        self._coalesced_queries = 0
+        self._nodes_skipped = 0
+        self._replica_reroutes = 0
     
     def register_node(self, node_id: str, base_url: str) -> None:
         """Registra endpoint de un nodo"""
+        is_new = node_id not in self._node_endpoints
         self._node_endpoints[node_id] = base_url.rstrip('/')
+        # Ninguna entrada cacheada depende de un nodo nuevo: invalidarlas
+        if is_new and self.result_cache is not None:
+            self.result_cache.bump_generation()
     
     def unregister_node(self, node_id: str) -> None:
         """Elimina nodo del router"""
         self._node_endpoints.pop(node_id, None)
+        self._unindexed_shards.discard(node_id)
+        if self.result_cache is not None:
+            self.result_cache.invalidate_node(node_id)
     
     async def route_query(self, request: QueryRequest) -> AggregatedResult:
         """
         Enruta una query a los nodos apropiados y agrega resultados.
         
+        Primero consulta la caché de resultados. Si ya hay en curso una
+        query equivalente (misma clave), espera su resultado en lugar
+        de repetir el fan-out.
+        
         Args:
             request: Solicitud de búsqueda
             
         Returns:
             Resultados agregados de todos los nodos
         """
+        # Si el llamador aporta la traza (ej. explain), él la cierra
+        owns_trace = request.trace is None
+        if owns_trace:
+            request.trace = self.tracer.start(
+                request.query_id, request.query_text, request.mode
+            )
+        
+        try:
+            return await self._route_query(request)
+        finally:
+            if owns_trace and request.trace is not None:
+                self.tracer.finish(request.trace)
+    
+    async def _route_query(self, request: QueryRequest) -> AggregatedResult:
+        """Caché, coalescing y ejecución de la query"""
+        key = self._query_key(request)
+        
+        if self.result_cache is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                if request.trace is not None:
+                    request.trace.cache_hit = True
+                return self._share_result(cached, request, cache_hit=True)
+        
+        if not self.coalesce_queries:
+            return await self._execute_and_cache(key, request)
+        
+        inflight = self._inflight.get(key)
+        
+        if inflight is not None:
+            self._coalesced_queries += 1
+            try:
+                shared = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # El líder fue cancelado: ejecutar por cuenta propia
+                return await self._route_query(request)
+            if request.trace is not None:
+                request.trace.coalesced = True
+            return self._share_result(shared, request, coalesced=True)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        
+        try:
+            result = await self._execute_and_cache(key, request)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Evitar warning si no hay otros esperando
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _execute_and_cache(
+        self,
+        key: Tuple,
+        request: QueryRequest
+    ) -> AggregatedResult:
+        """Ejecuta la query y guarda el resultado si es completo"""
+        if self.result_cache is None:
+            return await self._execute_query(request)
+        
+        # Épocas antes del fan-out: cambios concurrentes invalidan la entrada
+        epochs = self.location_index.get_node_epochs()
+        generation = self.result_cache.generation
+        result = await self._execute_query(request)
+        
+        if result.nodes_queried and not result.errors:
+            # Depende de todos los nodos candidatos, no solo de los consultados:
+            # un documento nuevo en un nodo omitido (por el plan, por cota o
+            # por no tener candidatos en locate) puede cambiar el top-k
+            candidates = set(request.node_filter) if request.node_filter else \
+                set(epochs) | set(self._node_endpoints)
+            nodes = candidates | set(result.nodes_queried) | \
+                set(result.shard_holders) | set(result.nodes_skipped)
+            self.result_cache.put(
+                key,
+                result,
+                {node_id: epochs.get(node_id, 0) for node_id in nodes},
+                generation=generation
+            )
+        return result
+    
+    @staticmethod
+    def _query_key(request: QueryRequest) -> Tuple:
+        """
+        Clave de equivalencia entre queries (coalescing y caché):
+        (query normalizada, search_type, limit, filtros, nodos, modo).
+        """
+        normalized = " ".join(request.query_text.lower().split())
+        filters = json.dumps(request.filters or {}, sort_keys=True, default=str)
+        nodes = tuple(sorted(request.node_filter)) if request.node_filter else None
+        return (normalized, request.search_type, request.limit, filters, nodes, request.mode)
+    
+    @staticmethod
+    def _share_result(
+        shared: AggregatedResult,
+        request: QueryRequest,
+        coalesced: bool = False,
+        cache_hit: bool = False
+    ) -> AggregatedResult:
+        """Copia el resultado compartido con el query_id del solicitante"""
+        return AggregatedResult(
+            query_id=request.query_id,
+            results=list(shared.results),
+            nodes_queried=list(shared.nodes_queried),
+            nodes_responded=list(shared.nodes_responded),
+            total_time_ms=shared.total_time_ms,
+            errors=dict(shared.errors),
+            nodes_skipped=list(shared.nodes_skipped),
+            shard_holders=dict(shared.shard_holders),
+            coalesced=coalesced,
+            cache_hit=cache_hit
+        )
+    
+    async def _execute_query(self, request: QueryRequest) -> AggregatedResult:
+        """Ejecuta el fan-out de una query a los Slaves y agrega resultados"""
         start_time = datetime.utcnow()
         
         # Generar embedding si no existe
         if request.query_embedding is None:
-            request.query_embedding = self.embedding_service.encode_query(
-                request.query_text
-            )
+            with self._span(request, "embed"):
+                request.query_embedding = self.embedding_service.encode_query(
+                    request.query_text
+                )
+        
+        if request.mode == "locate":
+            return await self._execute_located_query(request, start_time)
+        
+        if self.early_termination and not request.node_filter:
+            return await self._execute_bounded_query(request, start_time)
         
         # Seleccionar nodos a consultar
-        target_nodes = self._select_nodes(request)
+        with self._span(request, "select") as span:
+            target_nodes, plan = self._select_nodes(request)
+            if span is not None:
+                span.attributes["nodes"] = len(target_nodes)
+        self._trace_plan(request, target_nodes, plan.scores if plan else None)
         
         if not target_nodes:
             logger.warning(f"No hay nodos disponibles para query {request.query_id}")
@@ -122,16 +383,21 @@ class QueryRouter:
                 total_time_ms=0.0
             )
         
+        # Cada shard al holder menos cargado (dueño o réplica)
+        holders = self._assign_holders(target_nodes)
+        shards = list(holders.keys())
+        queried = [holders[shard] for shard in shards]
+        
         # Notificar al balanceador
-        for node_id in target_nodes:
+        for node_id in queried:
             self.load_balancer.increment_queries(node_id)
         
         try:
             # Enviar queries en paralelo
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            with self._span(request, "fanout"):
                 tasks = [
-                    self._query_node(client, node_id, request)
-                    for node_id in target_nodes
+                    self._query_shard(shard, holders[shard], request)
+                    for shard in shards
                 ]
                 responses = await asyncio.gather(*tasks, return_exceptions=True)
             
@@ -140,7 +406,7 @@ class QueryRouter:
             nodes_responded: List[str] = []
             errors: Dict[str, str] = {}
             
-            for node_id, response in zip(target_nodes, responses):
+            for node_id, response in zip(queried, responses):
                 if isinstance(response, Exception):
                     errors[node_id] = str(response)
                     logger.error(f"Error consultando {node_id}: {response}")
@@ -149,11 +415,19 @@ class QueryRouter:
                     nodes_responded.append(node_id)
             
             # Agregar y rankear resultados
-            final_results = self._aggregate_results(
-                all_results, 
-                request.query_embedding,
-                request.limit
-            )
+            with self._span(request, "merge", candidates=len(all_results)):
+                final_results = self._aggregate_results(
+                    all_results, 
+                    request.query_embedding,
+                    request.limit
+                )
+            
+            # Feedback al planificador: qué shards aportaron al top-k
+            if plan is not None:
+                shard_of = {holder: shard for shard, holder in holders.items()}
+                self.fanout_planner.record_feedback(
+                    plan, [shard_of.get(r.node_id, r.node_id) for r in final_results]
+                )
             
             # Calcular tiempo total
             elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
@@ -165,64 +439,436 @@ class QueryRouter:
             return AggregatedResult(
                 query_id=request.query_id,
                 results=final_results,
-                nodes_queried=target_nodes,
+                nodes_queried=queried,
                 nodes_responded=nodes_responded,
                 total_time_ms=elapsed,
-                errors=errors
+                errors=errors,
+                shard_holders=holders
             )
             
         finally:
             # Liberar contador en balanceador
+            for node_id in queried:
+                self.load_balancer.decrement_queries(node_id)
+    
+    async def _execute_bounded_query(
+        self,
+        request: QueryRequest,
+        start_time: datetime
+    ) -> AggregatedResult:
+        """
+        Scatter-gather con terminación temprana (threshold algorithm).
+        
+        La cota de cada nodo es el score final máximo que puede aportar
+        cualquiera de sus documentos: rerank_weight * cota coseno del
+        perfil + (1 - rerank_weight) * 1 (score normalizado máximo).
+        Los nodos se consultan por oleadas en orden descendente de cota;
+        cuando el k-ésimo score actual supera la cota de un nodo, ese
+        nodo se omite (o se cancela si ya estaba en vuelo).
+        
+        Un documento ausente del índice de ubicación no recibe re-ranking
+        y puede puntuar hasta 1 por encima de esa cota: si un nodo devuelve
+        alguno, la query deja de podar y el shard pasa a acotarse por 1.
+        """
+        with self._span(request, "select"):
+            pending = self._node_bounds(request)
+        self._trace_plan(request, [node_id for node_id, _ in pending], dict(pending))
+        
+        if not pending:
+            logger.warning(f"No hay nodos disponibles para query {request.query_id}")
+            return AggregatedResult(
+                query_id=request.query_id,
+                results=[],
+                nodes_queried=[],
+                nodes_responded=[],
+                total_time_ms=0.0
+            )
+        
+        all_results: List[QueryResult] = []
+        nodes_queried: List[str] = []
+        nodes_responded: List[str] = []
+        nodes_skipped: List[str] = []
+        shard_holders: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        threshold = -np.inf
+        exact = True
+        
+        with self._span(request, "fanout"):
+            while pending:
+                wave, pending = pending[:self.wave_size], pending[self.wave_size:]
+                holders = self._assign_holders(
+                    [shard for shard, bound in wave if bound > threshold]
+                )
+                
+                in_flight: Dict[asyncio.Task, str] = {}
+                bounds: Dict[str, float] = {}
+                for shard, bound in wave:
+                    if shard not in holders:
+                        nodes_skipped.append(shard)
+                        continue
+                    node_id = holders[shard]
+                    self.load_balancer.increment_queries(node_id)
+                    nodes_queried.append(node_id)
+                    shard_holders[shard] = node_id
+                    bounds[node_id] = max(bound, bounds.get(node_id, -np.inf))
+                    task = asyncio.create_task(self._query_shard(shard, node_id, request))
+                    in_flight[task] = node_id
+                
+                try:
+                    while in_flight:
+                        done, _ = await asyncio.wait(
+                            in_flight.keys(), return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for task in done:
+                            node_id = in_flight.pop(task)
+                            self.load_balancer.decrement_queries(node_id)
+                            if task.exception() is not None:
+                                errors[node_id] = str(task.exception())
+                                logger.error(f"Error consultando {node_id}: {task.exception()}")
+                            elif task.result():
+                                all_results.extend(task.result())
+                                nodes_responded.append(node_id)
+                                if self._has_unindexed(task.result()):
+                                    self._unindexed_shards.update(
+                                        shard for shard, holder in shard_holders.items()
+                                        if holder == node_id
+                                    )
+                                    # Sin cotas válidas: no podar nada más
+                                    # (ni en vuelo ni pendiente) y esperar a todos
+                                    exact = False
+                                    threshold = -np.inf
+                    
+                        if exact:
+                            threshold = self._kth_score(all_results, request)
+                    
+                        # Cancelar nodos en vuelo que ya no pueden aportar
+                        for task, node_id in list(in_flight.items()):
+                            if bounds[node_id] <= threshold:
+                                task.cancel()
+                                in_flight.pop(task)
+                                self.load_balancer.decrement_queries(node_id)
+                                nodes_skipped.append(node_id)
+                finally:
+                    for task, node_id in in_flight.items():
+                        task.cancel()
+                        self.load_balancer.decrement_queries(node_id)
+            
+                # El resto está ordenado por cota: si el primero no entra, ninguno
+                if pending and pending[0][1] <= threshold:
+                    nodes_skipped.extend(node_id for node_id, _ in pending)
+                    pending = []
+        
+        with self._span(request, "merge", candidates=len(all_results)):
+            final_results = self._aggregate_results(
+                all_results,
+                request.query_embedding,
+                request.limit
+            )
+        
+        elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
+        self._queries_processed += 1
+        self._total_latency_ms += elapsed
+        self._nodes_skipped += len(nodes_skipped)
+        
+        return AggregatedResult(
+            query_id=request.query_id,
+            results=final_results,
+            nodes_queried=nodes_queried,
+            nodes_responded=nodes_responded,
+            total_time_ms=elapsed,
+            errors=errors,
+            nodes_skipped=nodes_skipped,
+            shard_holders=shard_holders
+        )
+    
+    def _node_bounds(self, request: QueryRequest) -> List[Tuple[str, float]]:
+        """Cotas de score final por nodo disponible, de mayor a menor"""
+        cosine_bounds = self.location_index.node_score_bounds(request.query_embedding)
+        cosine_bounds = [
+            (node_id, bound) for node_id, bound in cosine_bounds
+            if node_id in self._node_endpoints
+        ]
+        if not cosine_bounds:
+            return []
+        
+        available = set(self.load_balancer.select_nodes_for_query(
+            semantic_scores=cosine_bounds,
+            num_nodes=len(cosine_bounds),
+            replica_groups=self._replica_groups()
+        ))
+        
+        weight = self.rerank_weight
+        bounds = [
+            (node_id, 1.0 if node_id in self._unindexed_shards else weight * bound + (1 - weight))
+            for node_id, bound in cosine_bounds
+            if node_id in available
+        ]
+        bounds.sort(key=lambda item: item[1], reverse=True)
+        return bounds
+    
+    def _has_unindexed(self, results: List[QueryResult]) -> bool:
+        """True si algún resultado no está en el índice de ubicación"""
+        if self.rerank_weight <= 0:
+            return False  # Sin re-ranking todos puntúan igual que la cota
+        _, found = self.location_index.get_embeddings([r.file_id for r in results])
+        return not bool(found.all())
+    
+    def _kth_score(self, results: List[QueryResult], request: QueryRequest) -> float:
+        """Score del k-ésimo mejor resultado actual (-inf si hay menos de k)"""
+        ranked = self._aggregate_results(results, request.query_embedding, request.limit)
+        if len(ranked) < request.limit:
+            return -np.inf
+        return ranked[-1].score
+    
+    async def _execute_located_query(
+        self,
+        request: QueryRequest,
+        start_time: datetime
+    ) -> AggregatedResult:
+        """
+        Búsqueda en dos fases ("locate then fetch").
+        
+        1. Recupera candidatos del índice semántico del Master
+        2. Agrupa por node_id y pide a cada nodo solo snippets y
+           metadatos de sus file_ids (lookup por clave, no búsqueda)
+        """
+        node_filter = request.node_filter or list(self._node_endpoints.keys())
+        with self._span(request, "locate"):
+            hits = self.location_index.search(
+                request.query_embedding,
+                top_k=self._node_limit(request.limit),
+                node_filter=node_filter
+            )
+        
+        # Agrupar candidatos por nodo
+        by_node: Dict[str, List[str]] = {}
+        scores: Dict[str, float] = {}
+        for doc, score in hits:
+            if doc.node_id in self._node_endpoints:
+                by_node.setdefault(doc.node_id, []).append(doc.file_id)
+                scores[doc.file_id] = score
+        
+        # Los file_ids de cada dueño se piden al holder menos cargado
+        holders = self._assign_holders(list(by_node.keys()))
+        shards = list(holders.keys())
+        target_nodes = [holders[shard] for shard in shards]
+        self._trace_plan(request, target_nodes, None)
+        for node_id in target_nodes:
+            self.load_balancer.increment_queries(node_id)
+        
+        try:
+            with self._span(request, "fetch"):
+                tasks = [
+                    self._fetch_from_node(self.http, holders[shard], by_node[shard], request)
+                    for shard in shards
+                ]
+                responses = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            results: List[QueryResult] = []
+            nodes_responded: List[str] = []
+            errors: Dict[str, str] = {}
+            
+            for node_id, response in zip(target_nodes, responses):
+                if isinstance(response, Exception):
+                    errors[node_id] = str(response)
+                    logger.error(f"Error en fetch a {node_id}: {response}")
+                    continue
+                nodes_responded.append(node_id)
+                for result in response:
+                    if result.file_id in scores:
+                        results.append(replace(result, score=scores[result.file_id]))
+            
+            results.sort(key=lambda r: r.score, reverse=True)
+            elapsed = (datetime.utcnow() - start_time).total_seconds() * 1000
+            
+            self._queries_processed += 1
+            self._total_latency_ms += elapsed
+            
+            return AggregatedResult(
+                query_id=request.query_id,
+                results=results[:request.limit],
+                nodes_queried=target_nodes,
+                nodes_responded=nodes_responded,
+                total_time_ms=elapsed,
+                errors=errors,
+                shard_holders=holders
+            )
+        
+        finally:
             for node_id in target_nodes:
                 self.load_balancer.decrement_queries(node_id)
     
-    def _select_nodes(self, request: QueryRequest) -> List[str]:
-        """Selecciona nodos para la query"""
+    async def _fetch_from_node(
+        self,
+        client: HttpClientManager,
+        node_id: str,
+        file_ids: List[str],
+        request: QueryRequest
+    ) -> List[QueryResult]:
+        """Pide a un nodo snippets y metadatos de file_ids concretos"""
+        base_url = self._node_endpoints.get(node_id)
+        if not base_url:
+            return []
+        
+        payload = {
+            "file_ids": file_ids,
+            "query": request.query_text,
+            "filters": request.filters or {}
+        }
+        
+        started = time.perf_counter()
+        with self.circuit_breakers.guard(node_id):
+            response = await client.post(
+                f"{base_url}/cluster/query/fetch",
+                json=payload,
+                headers=self._wire_headers(),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        data = self._decode_response(response)
+        self._observe_latency(node_id, started)
+        self._trace_node(
+            request, node_id, started, data, len(data.get("results", [])), phase="fetch"
+        )
+        
+        return [
+            QueryResult(
+                file_id=item.get("file_id", ""),
+                filename=item.get("filename", ""),
+                score=0.0,
+                node_id=node_id,
+                snippet=item.get("snippet"),
+                metadata=item.get("metadata", {})
+            )
+            for item in data.get("results", [])
+        ]
+    
+    def _select_nodes(
+        self,
+        request: QueryRequest
+    ) -> Tuple[List[str], Optional[FanoutPlan]]:
+        """
+        Selecciona nodos para la query.
+        
+        El planificador de fan-out decide el conjunto candidato según
+        los scores de afinidad; el balanceador elige entre ellos.
+        
+        Returns:
+            (nodos seleccionados, plan de fan-out o None si no se usó)
+        """
         # Si hay filtro explícito, usarlo
         if request.node_filter:
             return [
                 node_id for node_id in request.node_filter
                 if node_id in self._node_endpoints
-            ]
+                and self.circuit_breakers.is_available(node_id)
+            ], None
         
-        # Obtener scores semánticos del índice
+        # Obtener scores semánticos de todos los nodos con perfil
         semantic_scores = None
         if request.query_embedding is not None:
             semantic_scores = self.location_index.find_nodes_for_query(
                 request.query_embedding,
-                top_k=self.max_nodes_per_query * 2  # Obtener más para filtrar
+                top_k=max(len(self._node_endpoints), self.max_nodes_per_query)
             )
         
-        # Usar balanceador para selección final
-        return self.load_balancer.select_nodes_for_query(
-            semantic_scores=semantic_scores,
-            num_nodes=self.max_nodes_per_query
+        if not semantic_scores:
+            # Sin perfiles: selección solo por carga
+            return self.load_balancer.select_nodes_for_query(
+                semantic_scores=semantic_scores,
+                num_nodes=self.max_nodes_per_query,
+                replica_groups=self._replica_groups()
+            ), None
+        
+        plan = self.fanout_planner.plan(semantic_scores)
+        planned = set(plan.nodes)
+        
+        # Usar balanceador para selección final dentro del plan
+        selected = self.load_balancer.select_nodes_for_query(
+            semantic_scores=[(n, s) for n, s in semantic_scores if n in planned],
+            num_nodes=len(plan.nodes),
+            exclude=[n for n, _ in semantic_scores if n not in planned],
+            replica_groups=self._replica_groups()
         )
+        return selected, plan
+    
+    def _replica_groups(self) -> Dict[str, List[str]]:
+        """Dueño -> réplicas completas de su shard con endpoint registrado"""
+        groups = {}
+        for owner, replicas in self.location_index.get_replica_groups().items():
+            reachable = [n for n in replicas if n in self._node_endpoints]
+            if reachable:
+                groups[owner] = reachable
+        return groups
+    
+    def _assign_holders(self, shards: List[str]) -> Dict[str, str]:
+        """
+        Asigna cada shard al holder (dueño o réplica) menos cargado.
+        
+        Returns:
+            shard -> nodo al que se envía su query
+        """
+        groups = self._replica_groups()
+        if not any(shard in groups for shard in shards):
+            return {shard: shard for shard in shards}
+        
+        holders = self.load_balancer.assign_shards(shards, groups)
+        self._replica_reroutes += sum(
+            1 for shard, holder in holders.items() if holder != shard
+        )
+        return holders
+    
+    def _query_shard(
+        self,
+        shard: str,
+        holder: str,
+        request: QueryRequest
+    ) -> Awaitable[List[QueryResult]]:
+        """Consulta el shard de `shard` en el nodo `holder`"""
+        if holder == shard:
+            return self._query_node(self.http, holder, request)
+        return self._query_node(self.http, holder, request, shard=shard)
     
     async def _query_node(
         self, 
-        client: httpx.AsyncClient,
+        client: HttpClientManager,
         node_id: str,
-        request: QueryRequest
+        request: QueryRequest,
+        shard: Optional[str] = None
     ) -> List[QueryResult]:
-        """Envía query a un nodo específico"""
+        """
+        Envía query a un nodo específico.
+        
+        Si `shard` se indica, el nodo es una réplica y la búsqueda se
+        limita a las copias del contenido de ese dueño.
+        """
         base_url = self._node_endpoints.get(node_id)
         if not base_url:
             return []
         
+        started = time.perf_counter()
         try:
             # Construir request
-            url = f"{base_url}/api/search"
+            url = f"{base_url}/cluster/query"
             payload = {
                 "query": request.query_text,
-                "limit": request.limit * 2,  # Pedir más para agregación
+                "limit": self._node_limit(request.limit),
                 "search_type": request.search_type
             }
+            if request.filters:
+                payload["filters"] = request.filters
+            if shard is not None:
+                payload["shard"] = shard
             
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
+            with self.circuit_breakers.guard(node_id):
+                if self.query_batcher is not None:
+                    data = await self.query_batcher.submit(node_id, payload)
+                else:
+                    response = await client.post(
+                        url, json=payload, headers=self._wire_headers(), timeout=self.timeout
+                    )
+                    response.raise_for_status()
+                    data = self._decode_response(response)
             
             # Convertir a QueryResult
             results = []
@@ -236,12 +882,97 @@ class QueryRouter:
                     metadata=item.get("metadata", {})
                 ))
             
+            self._observe_latency(node_id, started)
+            self._trace_node(request, node_id, started, data, len(results))
             return results
             
         except Exception as e:
             logger.error(f"Error consultando nodo {node_id}: {e}")
+            self._observe_latency(node_id, started)
+            self._trace_node(request, node_id, started, None, 0, error=str(e))
             raise
     
+    async def _send_batch(
+        self,
+        node_id: str,
+        payloads: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Envía un batch de queries a un nodo en un único request"""
+        base_url = self._node_endpoints.get(node_id)
+        if not base_url:
+            raise ValueError(f"Nodo sin endpoint registrado: {node_id}")
+        
+        response = await self.http.post(
+            f"{base_url}/cluster/query/batch",
+            json={"queries": payloads},
+            headers=self._wire_headers(),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return self._decode_response(response).get("responses", [])
+    
+    def _wire_headers(self) -> Dict[str, str]:
+        """Cabeceras de negociación del formato de respuesta"""
+        if not self.binary_wire:
+            return {}
+        return {"Accept": _ACCEPT_HEADER}
+    
+    @staticmethod
+    def _decode_response(response: httpx.Response) -> Dict[str, Any]:
+        """Decodifica una respuesta binaria o JSON según su Content-Type"""
+        return wire.decode_body(response.content, response.headers.get("content-type"))
+    
+    @staticmethod
+    def _span(request: QueryRequest, name: str, **attributes: Any):
+        """Span de la traza de la query (no-op si no se traza)"""
+        if request.trace is None:
+            return nullcontext()
+        return request.trace.span(name, **attributes)
+    
+    @staticmethod
+    def _trace_plan(
+        request: QueryRequest,
+        nodes: List[str],
+        scores: Optional[Dict[str, float]]
+    ) -> None:
+        """Registra en la traza los nodos elegidos y sus scores de afinidad"""
+        if request.trace is None:
+            return
+        request.trace.nodes_selected = list(nodes)
+        if scores:
+            request.trace.affinity_scores = {n: float(v) for n, v in scores.items()}
+    
+    def _observe_latency(self, node_id: str, started: float) -> None:
+        """Informa al balanceador del tiempo de respuesta observado"""
+        self.load_balancer.record_latency(node_id, (time.perf_counter() - started) * 1000)
+    
+    @staticmethod
+    def _trace_node(
+        request: QueryRequest,
+        node_id: str,
+        started: float,
+        data: Optional[Dict],
+        results: int,
+        error: Optional[str] = None,
+        phase: str = "query"
+    ) -> None:
+        """Registra en la traza el tiempo total y de servidor de una llamada a un nodo"""
+        if request.trace is None:
+            return
+        server_ms = (data or {}).get("query_time_ms")
+        request.trace.record_node(
+            node_id,
+            total_ms=(time.perf_counter() - started) * 1000,
+            server_ms=float(server_ms) if server_ms is not None else None,
+            results=results,
+            error=error,
+            phase=phase
+        )
+    
+    def _node_limit(self, limit: int) -> int:
+        """Número de resultados a pedir a cada nodo"""
+        return max(1, math.ceil(limit * self.node_fetch_factor))
+    
     def _aggregate_results(
         self,
         results: List[QueryResult],
@@ -251,29 +982,86 @@ class QueryRouter:
         """
         Agrega resultados de múltiples nodos.
         
-        Re-rankea usando similitud con el embedding de la query.
+        1. Normaliza los scores de cada nodo a [0, 1] (RRF o z-score),
+           ya que cada Slave puntúa en su propia escala (BM25, coseno...)
+        2. Elimina duplicados quedándose con el mejor score
+        3. Re-rankea en una sola pasada vectorizada usando los embeddings
+           almacenados en el índice de ubicación
         """
         if not results:
             return []
         
-        # Eliminar duplicados (mismo file_id)
-        seen = set()
-        unique_results = []
-        for result in results:
-            if result.file_id not in seen:
-                seen.add(result.file_id)
-                unique_results.append(result)
+        fused = self._normalize_node_scores(results)
+        
+        # Eliminar duplicados (mismo file_id), conservando el mejor score
+        best: Dict[str, int] = {}
+        for idx, result in enumerate(results):
+            current = best.get(result.file_id)
+            if current is None or fused[idx] > fused[current]:
+                best[result.file_id] = idx
         
-        # Ordenar por score y limitar
-        unique_results.sort(key=lambda r: r.score, reverse=True)
+        indices = np.fromiter(best.values(), dtype=int, count=len(best))
+        candidates = [results[i] for i in indices]
+        final_scores = fused[indices]
         
-        return unique_results[:limit]
+        # Re-ranking semántico con los embeddings del Master
+        if query_embedding is not None and self.rerank_weight > 0:
+            embeddings, found = self.location_index.get_embeddings(
+                [r.file_id for r in candidates]
+            )
+            if found.any():
+                query = query_embedding / (np.linalg.norm(query_embedding) + 1e-10)
+                cosine = embeddings @ query
+                final_scores = np.where(
+                    found,
+                    self.rerank_weight * cosine + (1 - self.rerank_weight) * final_scores,
+                    final_scores
+                )
+        
+        order = np.argsort(-final_scores, kind="stable")[:limit]
+        return [
+            replace(candidates[i], score=float(final_scores[i]))
+            for i in order
+        ]
+    
+    def _normalize_node_scores(self, results: List[QueryResult]) -> np.ndarray:
+        """
+        Normaliza los scores de cada nodo a (0, 1].
+        
+        - rrf: (k + 1) / (k + rank) según la posición dentro del nodo
+        - zscore: sigmoide del z-score dentro del nodo
+        - none: scores crudos
+        """
+        raw = np.array([r.score for r in results], dtype=float)
+        if self.score_fusion == "none":
+            return raw
+        
+        by_node: Dict[str, List[int]] = {}
+        for idx, result in enumerate(results):
+            by_node.setdefault(result.node_id, []).append(idx)
+        
+        normalized = np.empty_like(raw)
+        for indices in by_node.values():
+            idx = np.array(indices)
+            scores = raw[idx]
+            if self.score_fusion == "rrf":
+                ranks = np.empty(len(idx))
+                ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(idx) + 1)
+                normalized[idx] = (RRF_K + 1) / (RRF_K + ranks)
+            else:
+                std = scores.std()
+                z = (scores - scores.mean()) / std if std > 0 else np.zeros(len(idx))
+                normalized[idx] = 1.0 / (1.0 + np.exp(-z))
+        
+        return normalized
     
     async def search(
         self,
         query: str,
         limit: int = 10,
-        search_type: str = "semantic"
+        search_type: str = "semantic",
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "scatter"
     ) -> AggregatedResult:
         """
         Método de conveniencia para búsqueda simple.
@@ -282,6 +1070,8 @@ class QueryRouter:
             query: Texto de búsqueda
             limit: Número máximo de resultados
             search_type: Tipo de búsqueda
+            filters: Filtros adicionales (ej. file_type)
+            mode: 'scatter' o 'locate' (ver QueryRequest)
             
         Returns:
             Resultados agregados
@@ -292,11 +1082,67 @@ class QueryRouter:
             query_id=str(uuid.uuid4()),
             query_text=query,
             limit=limit,
-            search_type=search_type
+            search_type=search_type,
+            filters=filters or {},
+            mode=mode
         )
         
         return await self.route_query(request)
     
+    async def explain(
+        self,
+        query: str,
+        limit: int = 10,
+        search_type: str = "semantic",
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "scatter"
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta una query siempre trazada y devuelve su plan.
+        
+        Returns:
+            Dict con la traza (nodos elegidos, scores de afinidad,
+            spans, tiempos por nodo, cache hit) y los resultados
+        """
+        import uuid
+        
+        query_id = str(uuid.uuid4())
+        trace = self.tracer.start(query_id, query, mode, force=True)
+        request = QueryRequest(
+            query_id=query_id,
+            query_text=query,
+            limit=limit,
+            search_type=search_type,
+            filters=filters or {},
+            mode=mode,
+            trace=trace
+        )
+        
+        try:
+            result = await self.route_query(request)
+            with trace.span("serialize", results=len(result.results)):
+                results = [
+                    {
+                        "file_id": r.file_id,
+                        "filename": r.filename,
+                        "score": r.score,
+                        "node_id": r.node_id,
+                        "snippet": r.snippet
+                    }
+                    for r in result.results
+                ]
+        finally:
+            self.tracer.finish(trace)
+        
+        return {
+            "plan": trace.to_dict(),
+            "results": results,
+            "nodes_queried": result.nodes_queried,
+            "nodes_responded": result.nodes_responded,
+            "nodes_skipped": result.nodes_skipped,
+            "errors": result.errors
+        }
+    
     def get_stats(self) -> Dict:
         """Retorna estadísticas del router"""
         avg_latency = (
@@ -304,10 +1150,37 @@ class QueryRouter:
             if self._queries_processed > 0 else 0
         )
         
+        # Ratio de coalescing: fracción de queries servidas sin fan-out propio
+        total_requests = self._queries_processed + self._coalesced_queries
+        coalescing_ratio = (
+            self._coalesced_queries / total_requests
+            if total_requests > 0 else 0
+        )
+        
         return {
             "registered_nodes": len(self._node_endpoints),
             "max_nodes_per_query": self.max_nodes_per_query,
             "queries_processed": self._queries_processed,
             "average_latency_ms": avg_latency,
-            "timeout": self.timeout
+            "timeout": self.timeout,
+            "score_fusion": self.score_fusion,
+            "rerank_weight": self.rerank_weight,
+            "fanout": self.fanout_planner.get_stats(),
+            "tracing": self.tracer.get_stats(),
+            "batching": self.query_batcher.get_stats() if self.query_batcher else None,
+            "http_pool": self.http.get_stats(),
+            "circuit_breakers": self.circuit_breakers.get_stats(),
+            "replica_reroutes": self._replica_reroutes,
+            "early_termination": {
+                "enabled": self.early_termination,
+                "wave_size": self.wave_size,
+                "nodes_skipped": self._nodes_skipped
+            },
+            "coalescing": {
+                "enabled": self.coalesce_queries,
+                "coalesced_queries": self._coalesced_queries,
+                "in_flight": len(self._inflight),
+                "ratio": coalescing_ratio
+            },
+            "cache": self.result_cache.get_stats() if self.result_cache else None
         }
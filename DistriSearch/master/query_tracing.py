@@ -0,0 +1,252 @@
+"""
+DistriSearch Master - Trazas de queries
+
+Desglose de latencia por query en spans estructurados:
+embedding, selección de nodos, red + tiempo de servidor por nodo,
+merge y serialización. Todas las queries se cronometran: las
+muestreadas alimentan los percentiles y cualquier query lenta
+(muestreada o no) se conserva en un buffer circular para
+diagnóstico de p99 (muestreo por cola).
+"""
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """Etapa cronometrada de una query"""
+    name: str
+    start_ms: float  # Relativo al inicio de la traza
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start_ms, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes
+        }
+
+
+@dataclass
+class NodeTiming:
+    """Tiempos de una llamada a un nodo"""
+    node_id: str
+    total_ms: float
+    server_ms: Optional[float] = None  # query_time_ms reportado por el nodo
+    results: int = 0
+    error: Optional[str] = None
+    phase: str = "query"  # query (búsqueda/shard) o fetch (locate-then-fetch)
+
+    @property
+    def network_ms(self) -> Optional[float]:
+        """Tiempo fuera del servidor (red + (de)serialización)"""
+        if self.server_ms is None:
+            return None
+        return max(0.0, self.total_ms - self.server_ms)
+
+    def to_dict(self) -> Dict:
+        return {
+            "node_id": self.node_id,
+            "phase": self.phase,
+            "total_ms": round(self.total_ms, 3),
+            "server_ms": self.server_ms,
+            "network_ms": self.network_ms,
+            "results": self.results,
+            "error": self.error
+        }
+
+
+class QueryTrace:
+    """Traza de una query: spans, plan de nodos y tiempos por nodo"""
+
+    def __init__(
+        self,
+        query_id: str,
+        query_text: str = "",
+        mode: str = "scatter",
+        sampled: bool = True
+    ):
+        self.query_id = query_id
+        self.query_text = query_text
+        self.mode = mode
+        self.sampled = sampled  # Entra en los percentiles
+        self.started_at = datetime.utcnow()
+        self.spans: List[Span] = []
+        # Una entrada por llamada: un nodo puede recibir locate y fetch,
+        # o volver a consultarse tras un failover
+        self.node_timings: List[NodeTiming] = []
+        self.affinity_scores: Dict[str, float] = {}
+        self.nodes_selected: List[str] = []
+        self.cache_hit = False
+        self.coalesced = False
+        self.total_ms = 0.0
+        self._t0 = time.perf_counter()
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Cronometra un bloque como span de la traza"""
+        span = Span(name=name, start_ms=self._now_ms(), attributes=attributes)
+        try:
+            yield span
+        finally:
+            span.duration_ms = self._now_ms() - span.start_ms
+            self.spans.append(span)
+
+    def record_node(
+        self,
+        node_id: str,
+        total_ms: float,
+        server_ms: Optional[float] = None,
+        results: int = 0,
+        error: Optional[str] = None,
+        phase: str = "query"
+    ) -> None:
+        """Registra el tiempo de una llamada a un nodo"""
+        self.node_timings.append(NodeTiming(
+            node_id=node_id,
+            total_ms=total_ms,
+            server_ms=server_ms,
+            results=results,
+            error=error,
+            phase=phase
+        ))
+
+    def finish(self) -> None:
+        self.total_ms = self._now_ms()
+
+    def stage_durations(self) -> Dict[str, float]:
+        """Duración total por nombre de span"""
+        durations: Dict[str, float] = {}
+        for span in self.spans:
+            durations[span.name] = durations.get(span.name, 0.0) + span.duration_ms
+        return durations
+
+    def to_dict(self) -> Dict:
+        return {
+            "query_id": self.query_id,
+            "query": self.query_text,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "total_ms": round(self.total_ms, 3),
+            "cache_hit": self.cache_hit,
+            "coalesced": self.coalesced,
+            "nodes_selected": self.nodes_selected,
+            "affinity_scores": self.affinity_scores,
+            "spans": [s.to_dict() for s in self.spans],
+            "nodes": [t.to_dict() for t in self.node_timings]
+        }
+
+
+class QueryTracer:
+    """
+    Recolector de trazas del router.
+
+    - Muestreo probabilístico (sample_rate) para los percentiles
+    - Captura por cola: toda query lenta se archiva, muestreada o no
+    - Trazas forzadas (explain) fuera de los percentiles
+    - Percentiles por etapa sobre las trazas muestreadas recientes
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.1,
+        slow_threshold_ms: float = 500.0,
+        recent_size: int = 500,
+        slow_size: int = 50
+    ):
+        """
+        Args:
+            sample_rate: Fracción de queries que alimentan los percentiles (0-1)
+            slow_threshold_ms: Latencia a partir de la cual una query es lenta
+            recent_size: Trazas recientes conservadas para percentiles
+            slow_size: Queries lentas conservadas
+        """
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+
+        self._recent: Deque[QueryTrace] = deque(maxlen=recent_size)
+        self._slow: Deque[QueryTrace] = deque(maxlen=slow_size)
+        self._sampled = 0
+        self._slow_count = 0
+
+    def start(
+        self,
+        query_id: str,
+        query_text: str = "",
+        mode: str = "scatter",
+        force: bool = False
+    ) -> QueryTrace:
+        """
+        Inicia la traza de una query.
+
+        Todas las queries se trazan para poder capturar las lentas;
+        solo las muestreadas (y nunca las forzadas por explain) entran
+        en los percentiles.
+        """
+        sampled = not force and self.sample_rate > 0 and random.random() < self.sample_rate
+        return QueryTrace(query_id, query_text, mode, sampled=sampled)
+
+    def finish(self, trace: QueryTrace) -> None:
+        """Cierra la traza y la archiva"""
+        trace.finish()
+        if trace.sampled:
+            self._sampled += 1
+            self._recent.append(trace)
+
+        if trace.total_ms >= self.slow_threshold_ms:
+            self._slow_count += 1
+            self._slow.append(trace)
+            logger.info(
+                f"Query lenta {trace.query_id}: {trace.total_ms:.1f}ms "
+                f"{ {k: round(v, 1) for k, v in trace.stage_durations().items()} }"
+            )
+
+    def get_slow_queries(self, limit: int = 20) -> List[Dict]:
+        """Queries lentas más recientes primero"""
+        return [t.to_dict() for t in list(self._slow)[::-1][:limit]]
+
+    def get_recent(self, limit: int = 20) -> List[Dict]:
+        """Trazas más recientes primero"""
+        return [t.to_dict() for t in list(self._recent)[::-1][:limit]]
+
+    def stage_percentiles(self) -> Dict[str, Dict[str, float]]:
+        """p50/p99 por etapa (y total) sobre las trazas recientes"""
+        samples: Dict[str, List[float]] = {}
+        for trace in self._recent:
+            samples.setdefault("total", []).append(trace.total_ms)
+            for name, duration in trace.stage_durations().items():
+                samples.setdefault(name, []).append(duration)
+
+        return {
+            name: {
+                "p50": float(np.percentile(values, 50)),
+                "p99": float(np.percentile(values, 99)),
+                "count": len(values)
+            }
+            for name, values in samples.items()
+        }
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del trazador"""
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "sampled_queries": self._sampled,
+            "slow_queries": self._slow_count,
+            "stages": self.stage_percentiles()
+        }
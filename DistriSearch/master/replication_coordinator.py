@@ -3,14 +3,31 @@ DistriSearch Master - Coordinador de Replicación
 
 Gestiona la replicación de documentos entre Slaves
 basándose en afinidad semántica.
+
+Las tareas se persisten en un log local (ReplicationTaskStore): un
+reinicio del Master retoma las pendientes, los fallos se reintentan
+con backoff exponencial, las que agotan los intentos quedan como
+dead-letter (FAILED) y las terminadas se descartan tras un TTL.
 """
 import asyncio
-import httpx
+import functools
+import itertools
 import logging
-from typing import Dict, List, Optional, Set
+import os
+import time
+import uuid
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from dataclasses import dataclass, field
-from enum import Enum
+from enum import Enum, IntEnum
+
+from ..core.http_client import HttpClientManager, get_http_client_manager
+from ..core.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, get_circuit_breakers
+from ..core.placement import RendezvousPlacement
+from ..core.chunked_transfer import ChunkedTransfer, TransferError, DEFAULT_CHUNK_SIZE
+from ..core.throttling import BandwidthThrottle, get_bandwidth_throttle
+from .task_store import ReplicationTaskStore
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +37,14 @@ class ReplicationStatus(Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
-    FAILED = "failed"
+    FAILED = "failed"  # Agotó los reintentos: dead-letter
+
+
+class ReplicationPriority(IntEnum):
+    """Prioridad de una tarea (menor valor = se atiende antes)"""
+    UNDER_REPLICATED = 0  # Una sola copia viva: riesgo de pérdida
+    NEW_UPLOAD = 1
+    REBALANCE = 2
 
 
 @dataclass
@@ -29,12 +53,22 @@ class ReplicationTask:
     file_id: str
     source_node: str
     target_nodes: List[str]
+    priority: ReplicationPriority = ReplicationPriority.NEW_UPLOAD
     status: ReplicationStatus = ReplicationStatus.PENDING
     completed_nodes: Set[str] = field(default_factory=set)
     failed_nodes: Set[str] = field(default_factory=set)
     created_at: datetime = field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    idempotency_key: str = ""
+    attempts: int = 0
+    next_attempt_at: Optional[float] = None  # Epoch del próximo reintento
+    task_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    
+    @property
+    def pending_targets(self) -> List[str]:
+        """Destinos que aún no tienen la réplica"""
+        return [n for n in self.target_nodes if n not in self.completed_nodes]
     
     @property
     def progress(self) -> float:
@@ -45,17 +79,43 @@ class ReplicationTask:
     
     def to_dict(self) -> Dict:
         return {
+            "task_id": self.task_id,
             "file_id": self.file_id,
             "source_node": self.source_node,
             "target_nodes": self.target_nodes,
             "status": self.status.value,
+            "priority": self.priority.name.lower(),
             "completed_nodes": list(self.completed_nodes),
             "failed_nodes": list(self.failed_nodes),
             "progress": self.progress,
             "created_at": self.created_at.isoformat(),
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
-            "error_message": self.error_message
+            "error_message": self.error_message,
+            "idempotency_key": self.idempotency_key,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ReplicationTask":
+        """Reconstruye una tarea desde to_dict() (p.ej. al recargar el log)"""
+        completed_at = data.get("completed_at")
+        return cls(
+            file_id=data["file_id"],
+            source_node=data["source_node"],
+            target_nodes=list(data.get("target_nodes", [])),
+            priority=ReplicationPriority[data.get("priority", "new_upload").upper()],
+            status=ReplicationStatus(data.get("status", "pending")),
+            completed_nodes=set(data.get("completed_nodes", [])),
+            failed_nodes=set(data.get("failed_nodes", [])),
+            created_at=datetime.fromisoformat(data["created_at"]),
+            completed_at=datetime.fromisoformat(completed_at) if completed_at else None,
+            error_message=data.get("error_message"),
+            idempotency_key=data.get("idempotency_key", ""),
+            attempts=int(data.get("attempts", 0)),
+            next_attempt_at=data.get("next_attempt_at"),
+            task_id=data["task_id"]
+        )
 
 
 class ReplicationCoordinator:
@@ -67,87 +127,313 @@ class ReplicationCoordinator:
     - Coordinar transferencia de archivos entre Slaves
     - Mantener factor de replicación ante fallos
     - Verificar integridad de réplicas
+    
+    Las tareas se atienden por prioridad (datos con una sola copia,
+    luego subidas nuevas, luego rebalanceo) con un pool de workers y
+    un tope de transferencias simultáneas por nodo destino.
     """
     
     def __init__(
         self,
         replication_factor: int = 2,
         location_index = None,  # SemanticLocationIndex
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        http_client: Optional[HttpClientManager] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        num_workers: int = 4,
+        max_per_destination: int = 2,
+        throttle: Optional[BandwidthThrottle] = None,
+        task_store: Optional[ReplicationTaskStore] = None,
+        max_attempts: int = 5,
+        retry_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        finished_ttl: float = 3600.0,
+        dead_letter_ttl: float = 7 * 24 * 3600.0
     ):
         """
         Args:
             replication_factor: Número de réplicas a mantener
             location_index: Índice de ubicación semántica
             timeout: Timeout para operaciones HTTP
+            http_client: Pool HTTP compartido (por defecto el del proceso)
+            circuit_breakers: Circuit breakers por nodo (por defecto los del proceso)
+            chunk_size: Tamaño de chunk al transferir réplicas entre Slaves
+            num_workers: Tareas de replicación procesadas en paralelo
+            max_per_destination: Transferencias simultáneas máximas hacia un nodo
+            throttle: Límite de ancho de banda por nodo y enlace (por defecto el del proceso)
+            task_store: Log durable de tareas (por defecto REPLICATION_TASK_LOG, o solo memoria)
+            max_attempts: Intentos por tarea antes de pasarla a dead-letter
+            retry_backoff: Espera base entre reintentos (se dobla en cada uno)
+            max_backoff: Espera máxima entre reintentos
+            finished_ttl: Segundos que se conserva una tarea completada
+            dead_letter_ttl: Segundos que se conserva una tarea en dead-letter
         """
         self.replication_factor = replication_factor
         self.location_index = location_index
         self.timeout = timeout
+        self.http = http_client or get_http_client_manager()
+        self.circuit_breakers = circuit_breakers or get_circuit_breakers()
+        self.chunk_size = chunk_size
+        self.throttle = throttle or get_bandwidth_throttle()
+        self.num_workers = max(1, num_workers)
+        self.max_per_destination = max(1, max_per_destination)
+        self.task_store = task_store or ReplicationTaskStore(os.getenv("REPLICATION_TASK_LOG") or None)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.finished_ttl = finished_ttl
+        self.dead_letter_ttl = dead_letter_ttl
         
         # Endpoints de nodos: node_id -> base_url
         self._node_endpoints: Dict[str, str] = {}
         
-        # Tareas de replicación: file_id -> ReplicationTask
+        # Colocación determinista cuando no hay afinidad semántica
+        self._placement = RendezvousPlacement()
+        
+        # Tareas de replicación: task_id -> ReplicationTask
         self._tasks: Dict[str, ReplicationTask] = {}
+        # Idempotencia: clave de la petición -> task_id de su última tarea
+        self._task_by_key: Dict[str, str] = {}
+        
+        # Cola de replicación pendiente: (prioridad, orden de llegada, task_id)
+        self._pending_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._queued_by_priority: Counter = Counter()
         
-        # Cola de replicación pendiente
-        self._pending_queue: asyncio.Queue = asyncio.Queue()
+        # Slots por nodo destino: node_id -> semáforo
+        self._destination_slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Counter = Counter()
         
-        # Worker task
-        self._worker_task: Optional[asyncio.Task] = None
+        # Pool de workers
+        self._workers: List[asyncio.Task] = []
+        self._active_workers = 0
         self._running = False
+        
+        # Métricas de drenado: (instante, espera en cola en segundos)
+        self._completions: Deque[Tuple[float, float]] = deque(maxlen=1000)
+        self._enqueued_at: Dict[str, float] = {}
+        
+        # Réplicas resueltas sin transferir bytes (el destino ya tenía el contenido)
+        self._deduplicated = 0
+        
+        # Mapa autoritativo de copias: file_id -> nodos con el archivo (dueño incluido)
+        self._replica_map: Dict[str, Set[str]] = {}
+        
+        # Recuperaciones en curso: nodo caído -> (inicio, file_ids pendientes)
+        self._recoveries: Dict[str, Tuple[float, Set[str]]] = {}
+        self._last_recovery: Optional[Dict] = None
+        
+        # Durabilidad: recarga única del log y limpieza periódica por TTL
+        self._restored = False
+        self._evicted_at = time.monotonic()
+        self._retries_scheduled = 0
+        self._evicted = 0
     
-    def register_node(self, node_id: str, base_url: str) -> None:
-        """Registra endpoint de un nodo"""
+    def register_node(self, node_id: str, base_url: str, capacity: float = 1.0) -> None:
+        """Registra endpoint de un nodo y su capacidad relativa"""
         self._node_endpoints[node_id] = base_url.rstrip('/')
+        self._placement.set_node(node_id, capacity)
         logger.info(f"Nodo registrado para replicación: {node_id} -> {base_url}")
     
     def unregister_node(self, node_id: str) -> None:
         """Elimina nodo del coordinador"""
         self._node_endpoints.pop(node_id, None)
+        self._placement.remove_node(node_id)
+    
+    # ------------------------------------------------------------------
+    # Mapa de réplicas
+    # ------------------------------------------------------------------
+    
+    def track_file(self, file_id: str, holders: List[str]) -> None:
+        """Registra los nodos que guardan un archivo (p.ej. al subirlo o al arrancar)"""
+        self._replica_map[file_id] = set(holders)
+    
+    def get_holders(self, file_id: str) -> Set[str]:
+        """
+        Nodos con copia de un archivo.
+        
+        Si el archivo no está en el mapa se siembra desde el índice de
+        ubicación (dueño + réplicas conocidas).
+        """
+        holders = self._replica_map.get(file_id)
+        if holders is None and self.location_index and \
+                hasattr(self.location_index, "get_holders"):
+            known = self.location_index.get_holders(file_id)
+            if known:
+                holders = self._replica_map[file_id] = set(known)
+        return set(holders or ())
+    
+    def _seed_replica_map(self, node_id: str) -> None:
+        """
+        Siembra desde el índice de ubicación las copias de los archivos
+        que guarda un nodo, para que una recuperación no dependa de qué
+        archivos se consultaron antes.
+        """
+        if not self.location_index or not hasattr(self.location_index, "get_node_files"):
+            return
+        for file_id in self.location_index.get_node_files(node_id):
+            known = self.location_index.get_holders(file_id)
+            self._replica_map.setdefault(file_id, set()).update(known)
+    
+    def _live_holders(self, file_id: str, exclude: Set[str] = frozenset()) -> List[str]:
+        """Copias en nodos registrados, no expulsados y no excluidos"""
+        return sorted(
+            n for n in self.get_holders(file_id)
+            if n not in exclude and n in self._node_endpoints
+            and self.circuit_breakers.is_available(n)
+        )
+    
+    def plan_recovery(self, failed_node: str) -> List[Tuple[str, str, List[str]]]:
+        """
+        Calcula las copias necesarias tras la caída de un nodo.
+        
+        Solo entran los archivos que tenían copia en el nodo caído y
+        quedan por debajo de 1 + replication_factor copias vivas. El
+        origen de cada copia se reparte entre los supervivientes (el
+        que menos copias lleva asignadas en el plan), y los archivos
+        con menos supervivientes van primero.
+        
+        Returns:
+            Lista de (file_id, nodo origen, nodos destino)
+        """
+        self._seed_replica_map(failed_node)
+        desired = 1 + self.replication_factor
+        affected = [
+            (file_id, self._live_holders(file_id, exclude={failed_node}))
+            for file_id, holders in self._replica_map.items()
+            if failed_node in holders
+        ]
+        affected.sort(key=lambda item: (len(item[1]), item[0]))
+        
+        ejected = {
+            n for n in self._node_endpoints if not self.circuit_breakers.is_available(n)
+        }
+        source_load: Counter = Counter()
+        plan = []
+        for file_id, survivors in affected:
+            missing = desired - len(survivors)
+            if missing <= 0 or not survivors:
+                continue
+            targets = self._placement.place(
+                file_id, missing, exclude=set(survivors) | ejected | {failed_node}
+            )
+            if not targets:
+                continue
+            source = min(survivors, key=lambda n: (source_load[n], n))
+            source_load[source] += 1
+            plan.append((file_id, source, targets))
+        return plan
+    
+    async def handle_node_failure(self, node_id: str) -> Dict:
+        """
+        Re-replica los archivos que quedan sin suficientes copias al
+        caer un nodo, encolándolos como UNDER_REPLICATED.
+        
+        Returns:
+            Resumen: archivos afectados, encolados, perdidos y origen por nodo
+        """
+        plan = self.plan_recovery(node_id)
+        affected = [f for f, holders in self._replica_map.items() if node_id in holders]
+        
+        lost = []
+        for file_id in affected:
+            self._replica_map[file_id].discard(node_id)
+            if self.location_index and hasattr(self.location_index, "remove_replica"):
+                self.location_index.remove_replica(file_id, node_id)
+            if not self._live_holders(file_id):
+                lost.append(file_id)
+        
+        for file_id, source, targets in plan:
+            await self.replicate_document(
+                file_id,
+                source,
+                priority=ReplicationPriority.UNDER_REPLICATED,
+                target_nodes=targets
+            )
+        
+        if plan:
+            self._recoveries[node_id] = (time.monotonic(), {f for f, _, _ in plan})
+        if lost:
+            logger.error(f"{len(lost)} archivos sin copias vivas tras la caída de {node_id}")
+        logger.warning(
+            f"Caída de {node_id}: {len(affected)} archivos afectados, "
+            f"{len(plan)} re-replicaciones encoladas"
+        )
+        return {
+            "node_id": node_id,
+            "files_affected": len(affected),
+            "enqueued": len(plan),
+            "lost": lost,
+            "sources": dict(Counter(source for _, source, _ in plan))
+        }
     
     async def start(self) -> None:
-        """Inicia el worker de replicación"""
+        """Inicia el pool de workers de replicación"""
         if self._running:
             return
         
+        if not self._restored:
+            self._restore_tasks()
         self._running = True
-        self._worker_task = asyncio.create_task(self._replication_worker())
-        logger.info("Coordinador de replicación iniciado")
+        self._workers = [
+            asyncio.create_task(self._replication_worker())
+            for _ in range(self.num_workers)
+        ]
+        logger.info(f"Coordinador de replicación iniciado ({self.num_workers} workers)")
     
     async def stop(self) -> None:
         """Detiene el coordinador"""
         self._running = False
-        if self._worker_task:
-            self._worker_task.cancel()
-            try:
-                await self._worker_task
-            except asyncio.CancelledError:
-                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
     
     async def replicate_document(
         self,
         file_id: str,
         source_node: str,
-        document_embedding = None  # np.ndarray
+        document_embedding = None,  # np.ndarray
+        priority: ReplicationPriority = ReplicationPriority.NEW_UPLOAD,
+        target_nodes: Optional[List[str]] = None,
+        idempotency_key: Optional[str] = None
     ) -> ReplicationTask:
         """
         Inicia replicación de un documento.
         
+        Idempotente: si ya hay una tarea pendiente o en curso con la
+        misma clave (por defecto archivo + origen + destinos) se
+        devuelve esa en lugar de crear otra. Una tarea terminada no
+        bloquea una nueva replicación del mismo archivo.
+        
         Args:
             file_id: ID del documento a replicar
             source_node: Nodo origen
             document_embedding: Embedding del documento para selección semántica
+            priority: Prioridad en la cola de replicación
+            target_nodes: Destinos ya decididos (p.ej. por el plan de recuperación)
+            idempotency_key: Clave de deduplicación de la petición
             
         Returns:
             Tarea de replicación creada
         """
+        self._replica_map.setdefault(file_id, set()).add(source_node)
+        
         # Seleccionar nodos destino
-        target_nodes = self._select_target_nodes(
-            source_node, 
-            document_embedding
-        )
+        if target_nodes is None:
+            target_nodes = self._select_target_nodes(
+                source_node, 
+                document_embedding,
+                file_id=file_id
+            )
+        
+        key = idempotency_key or f"{file_id}:{source_node}:{','.join(sorted(target_nodes or []))}"
+        existing_id = self._task_by_key.get(key)
+        existing = self._tasks.get(existing_id) if existing_id else None
+        if existing and existing.status in (ReplicationStatus.PENDING, ReplicationStatus.IN_PROGRESS):
+            logger.debug(f"Replicación de {file_id} ya registrada ({existing.status.value})")
+            return existing
         
         if not target_nodes:
             logger.warning(f"No hay nodos disponibles para replicar {file_id}")
@@ -155,39 +441,49 @@ class ReplicationCoordinator:
                 file_id=file_id,
                 source_node=source_node,
                 target_nodes=[],
-                status=ReplicationStatus.COMPLETED
+                priority=priority,
+                status=ReplicationStatus.COMPLETED,
+                completed_at=datetime.utcnow(),
+                idempotency_key=key
             )
-            self._tasks[file_id] = task
+            self._add_task(task)
             return task
         
         # Crear tarea
         task = ReplicationTask(
             file_id=file_id,
             source_node=source_node,
-            target_nodes=target_nodes
+            target_nodes=target_nodes,
+            priority=priority,
+            idempotency_key=key
         )
-        self._tasks[file_id] = task
+        self._add_task(task)
         
         # Encolar para procesamiento
-        await self._pending_queue.put(file_id)
+        self._enqueue(task.task_id, priority)
         
-        logger.info(f"Replicación encolada: {file_id} -> {target_nodes}")
+        logger.info(
+            f"Replicación encolada: {file_id} -> {target_nodes} "
+            f"(prioridad {priority.name.lower()})"
+        )
         return task
     
     def _select_target_nodes(
         self, 
         source_node: str, 
-        document_embedding = None
+        document_embedding = None,
+        file_id: Optional[str] = None
     ) -> List[str]:
         """
         Selecciona nodos para replicación.
         
         Si hay índice semántico, usa afinidad.
-        Si no, selecciona nodos con menos documentos.
+        Si no, rendezvous hashing ponderado sobre el file_id.
+        Los nodos con el circuito abierto se omiten.
         """
         available = [
             node_id for node_id in self._node_endpoints.keys()
-            if node_id != source_node
+            if node_id != source_node and self.circuit_breakers.is_available(node_id)
         ]
         
         if not available:
@@ -198,33 +494,127 @@ class ReplicationCoordinator:
         
         # Si tenemos índice semántico y embedding, usar afinidad
         if self.location_index and document_embedding is not None:
-            return self.location_index.select_replica_nodes(
+            # Pedir de más para cubrir los expulsados que se filtran después
+            ejected = len(self._node_endpoints) - 1 - len(available)
+            allowed = set(available)
+            chosen = self.location_index.select_replica_nodes(
                 source_node,
                 document_embedding,
-                num_replicas
+                num_replicas + max(0, ejected)
             )
+            return [n for n in chosen if n in allowed][:num_replicas]
         
-        # Fallback: primeros N nodos disponibles
-        return available[:num_replicas]
+        # Fallback: rendezvous hashing (estable entre procesos y reinicios)
+        ejected = set(self._node_endpoints) - set(available)
+        return self._placement.place(
+            file_id or source_node, num_replicas, exclude=ejected | {source_node}
+        )
+    
+    def _add_task(self, task: ReplicationTask) -> None:
+        """Registra una tarea nueva y la persiste"""
+        self._tasks[task.task_id] = task
+        self._task_by_key[task.idempotency_key] = task.task_id
+        self._persist(task)
+    
+    def _enqueue(self, task_id: str, priority: ReplicationPriority) -> None:
+        self._pending_queue.put_nowait((int(priority), next(self._sequence), task_id))
+        self._queued_by_priority[priority] += 1
+        self._enqueued_at.setdefault(task_id, time.monotonic())
+    
+    def _enqueue_later(self, task_id: str, priority: ReplicationPriority, delay: float) -> None:
+        """Encola tras `delay` segundos (reintentos con backoff)"""
+        if delay <= 0:
+            self._enqueue(task_id, priority)
+        else:
+            asyncio.get_running_loop().call_later(delay, self._enqueue, task_id, priority)
+    
+    def _persist(self, task: ReplicationTask) -> None:
+        """Registra el estado actual de la tarea en el log durable"""
+        try:
+            self.task_store.save(task.to_dict())
+        except OSError as e:
+            logger.error(f"No se pudo persistir la tarea {task.task_id} ({task.file_id}): {e}")
+    
+    def _restore_tasks(self) -> None:
+        """
+        Recarga las tareas del log: las pendientes o interrumpidas a
+        mitad se vuelven a encolar (respetando su próximo reintento) y
+        las terminadas se conservan para la idempotencia hasta su TTL.
+        """
+        self._restored = True
+        now = time.time()
+        resumed = 0
+        for task_id, record in self.task_store.load().items():
+            if task_id in self._tasks:
+                continue
+            try:
+                task = ReplicationTask.from_dict(record)
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Tarea de replicación ilegible en el log ({task_id}): {e}")
+                continue
+            self._tasks[task_id] = task
+            self._task_by_key[task.idempotency_key] = task_id
+            if task.status in (ReplicationStatus.PENDING, ReplicationStatus.IN_PROGRESS):
+                task.status = ReplicationStatus.PENDING
+                self._enqueue_later(task_id, task.priority, (task.next_attempt_at or now) - now)
+                resumed += 1
+        
+        if resumed:
+            logger.info(f"{resumed} replicaciones pendientes retomadas tras el reinicio")
+        self._evict_finished(force=True)
+    
+    def _evict_finished(self, force: bool = False, interval: float = 60.0) -> None:
+        """Descarta tareas terminadas tras su TTL y compacta el log si hace falta"""
+        if not force and time.monotonic() - self._evicted_at < interval:
+            return
+        self._evicted_at = time.monotonic()
+        
+        now = datetime.utcnow()
+        for task_id, task in list(self._tasks.items()):
+            if task.completed_at is None:
+                continue
+            ttl = self.dead_letter_ttl if task.status == ReplicationStatus.FAILED \
+                else self.finished_ttl
+            if task.status in (ReplicationStatus.COMPLETED, ReplicationStatus.FAILED) and \
+                    (now - task.completed_at).total_seconds() >= ttl:
+                del self._tasks[task_id]
+                if self._task_by_key.get(task.idempotency_key) == task_id:
+                    del self._task_by_key[task.idempotency_key]
+                self.task_store.delete(task_id)
+                self._evicted += 1
+        
+        self.task_store.set_live(len(self._tasks))
+        self.task_store.maybe_compact(lambda: [t.to_dict() for t in self._tasks.values()])
     
     async def _replication_worker(self) -> None:
-        """Worker que procesa tareas de replicación"""
+        """Worker del pool: toma la tarea pendiente de mayor prioridad"""
         while self._running:
             try:
                 # Obtener siguiente tarea
-                file_id = await asyncio.wait_for(
+                priority, _, task_id = await asyncio.wait_for(
                     self._pending_queue.get(),
                     timeout=1.0
                 )
+                self._queued_by_priority[ReplicationPriority(priority)] -= 1
                 
-                task = self._tasks.get(file_id)
+                task = self._tasks.get(task_id)
                 if not task or task.status != ReplicationStatus.PENDING:
                     continue
                 
                 # Procesar tarea
-                await self._process_replication(task)
+                self._active_workers += 1
+                try:
+                    await self._process_replication(task)
+                finally:
+                    self._active_workers -= 1
+                    enqueued_at = self._enqueued_at.pop(task_id, None)
+                    now = time.monotonic()
+                    self._completions.append(
+                        (now, now - enqueued_at if enqueued_at is not None else 0.0)
+                    )
                 
             except asyncio.TimeoutError:
+                self._evict_finished()
                 continue
             except asyncio.CancelledError:
                 break
@@ -234,35 +624,84 @@ class ReplicationCoordinator:
     async def _process_replication(self, task: ReplicationTask) -> None:
         """Procesa una tarea de replicación"""
         task.status = ReplicationStatus.IN_PROGRESS
+        task.attempts += 1
+        task.next_attempt_at = None
+        task.failed_nodes.clear()
+        self._persist(task)
+        
+        # Replicar a cada destino aún sin copia en paralelo (respetando su tope)
+        tasks = [
+            self._replicate_with_slot(task, target_node)
+            for target_node in task.pending_targets
+        ]
+        await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Replicar a cada nodo destino en paralelo
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            tasks = [
-                self._replicate_to_node(client, task, target_node)
-                for target_node in task.target_nodes
-            ]
-            await asyncio.gather(*tasks, return_exceptions=True)
+        if task.pending_targets and task.attempts < self.max_attempts:
+            self._schedule_retry(task)
+            return
         
-        # Actualizar estado final
-        if task.completed_nodes:
+        # Actualizar estado final: sin ninguna copia nueva, a dead-letter
+        if task.completed_nodes or not task.target_nodes:
             task.status = ReplicationStatus.COMPLETED
-        elif task.failed_nodes:
+        else:
             task.status = ReplicationStatus.FAILED
+            logger.error(
+                f"Replicación de {task.file_id} a dead-letter tras {task.attempts} intentos: "
+                f"{task.error_message}"
+            )
         
         task.completed_at = datetime.utcnow()
+        self._persist(task)
+        self._finish_recovery_step(task.file_id)
+        self._evict_finished()
         
         logger.info(
             f"Replicación completada: {task.file_id} "
             f"({len(task.completed_nodes)}/{len(task.target_nodes)} exitosas)"
         )
     
+    def _schedule_retry(self, task: ReplicationTask) -> None:
+        """Vuelve a encolar los destinos fallidos con backoff exponencial"""
+        delay = min(self.max_backoff, self.retry_backoff * 2 ** (task.attempts - 1))
+        task.status = ReplicationStatus.PENDING
+        task.next_attempt_at = time.time() + delay
+        self._persist(task)
+        self._retries_scheduled += 1
+        self._enqueue_later(task.task_id, task.priority, delay)
+        logger.warning(
+            f"Reintento {task.attempts}/{self.max_attempts - 1} de {task.file_id} "
+            f"hacia {task.pending_targets} en {delay:.1f}s"
+        )
+    
+    async def _replicate_with_slot(self, task: ReplicationTask, target_node: str) -> None:
+        """Espera un slot libre del nodo destino antes de transferir"""
+        slot = self._destination_slots.get(target_node)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_per_destination)
+            self._destination_slots[target_node] = slot
+        async with slot:
+            self._in_flight[target_node] += 1
+            try:
+                await self._replicate_to_node(self.http, task, target_node)
+            finally:
+                self._in_flight[target_node] -= 1
+                if not self._in_flight[target_node]:
+                    del self._in_flight[target_node]
+    
     async def _replicate_to_node(
         self, 
-        client: httpx.AsyncClient, 
+        client: HttpClientManager, 
         task: ReplicationTask, 
         target_node: str
     ) -> None:
-        """Replica documento a un nodo específico"""
+        """
+        Replica documento a un nodo específico.
+        
+        El archivo fluye del origen al destino por chunks (sin cargarlo
+        entero en memoria), con SHA-256 verificado por el destino y
+        reanudación desde el último offset confirmado. Si el destino ya
+        guarda el mismo contenido solo se registran los metadatos.
+        """
         try:
             source_url = self._node_endpoints.get(task.source_node)
             target_url = self._node_endpoints.get(target_node)
@@ -270,63 +709,191 @@ class ReplicationCoordinator:
             if not source_url or not target_url:
                 raise ValueError(f"URL no encontrada para nodo")
             
-            # 1. Obtener archivo del nodo origen
-            download_url = f"{source_url}/api/download/{task.file_id}"
-            response = await client.get(download_url)
-            response.raise_for_status()
-            
-            file_content = response.content
-            filename = response.headers.get(
-                'content-disposition', 
-                f'file_{task.file_id}'
-            )
+            # Sin reservar la sonda de half-open: la reservan el enlace o la transferencia
+            for node_id in (task.source_node, target_node):
+                if not self.circuit_breakers.is_available(node_id):
+                    raise CircuitOpenError(node_id)
             
-            # 2. Subir al nodo destino
-            upload_url = f"{target_url}/api/upload"
-            files = {'file': (filename, file_content)}
-            data = {
-                'source_node': task.source_node,
-                'is_replica': 'true',
-                'original_file_id': task.file_id
-            }
+            if await self._link_existing_content(client, task, target_url, target_node):
+                self._deduplicated += 1
+                self._mark_replicated(task, target_node)
+                logger.debug(f"Réplica sin transferencia: {target_node} ya tenía {task.file_id}")
+                return
             
-            response = await client.post(upload_url, files=files, data=data)
-            response.raise_for_status()
+            transfer = ChunkedTransfer(
+                client,
+                f"{source_url}/api/download/{task.file_id}",
+                f"{target_url}/cluster/replica/{task.file_id}",
+                chunk_size=self.chunk_size,
+                timeout=self.timeout,
+                metadata={
+                    'source_node': task.source_node,
+                    'original_file_id': task.file_id
+                },
+                throttle=functools.partial(
+                    self.throttle.throttle, source=task.source_node, target=target_node
+                )
+            )
+            reserved: List[str] = []
+            settled: Set[str] = set()
+            try:
+                for node_id in (task.source_node, target_node):
+                    if not self.circuit_breakers.allow(node_id):
+                        raise CircuitOpenError(node_id)
+                    reserved.append(node_id)
+                result = await transfer.run()
+                for node_id in reserved:
+                    self.circuit_breakers.record_success(node_id)
+                settled.update(reserved)
+            except TransferError as e:
+                failed = task.source_node if e.side == "source" else target_node
+                self.circuit_breakers.record_failure(failed, reason=type(e).__name__)
+                settled.add(failed)
+                raise
+            finally:
+                # Sin veredicto sobre el nodo (fallo ajeno o cancelación): liberar su sonda
+                for node_id in reserved:
+                    if node_id not in settled:
+                        self.circuit_breakers.release(node_id)
             
-            task.completed_nodes.add(target_node)
-            logger.debug(f"Réplica exitosa: {task.file_id} -> {target_node}")
+            self._mark_replicated(task, target_node)
+            logger.debug(
+                f"Réplica exitosa: {task.file_id} -> {target_node} "
+                f"({result.size} bytes, reanudada desde {result.resumed_from})"
+            )
             
         except Exception as e:
             task.failed_nodes.add(target_node)
+            task.error_message = f"{target_node}: {e}"
             logger.error(f"Error replicando {task.file_id} a {target_node}: {e}")
     
+    def _mark_replicated(self, task: ReplicationTask, target_node: str) -> None:
+        task.completed_nodes.add(target_node)
+        self._replica_map.setdefault(task.file_id, set()).add(target_node)
+        if self.location_index:
+            # La réplica pasa a poder atender búsquedas de ese contenido
+            self.location_index.add_replica(task.file_id, target_node)
+    
+    async def _link_existing_content(
+        self,
+        client: HttpClientManager,
+        task: ReplicationTask,
+        target_url: str,
+        target_node: str
+    ) -> bool:
+        """
+        Si el índice dice que el destino ya guarda el contenido del
+        archivo, le pide registrar la réplica apuntando a esos bytes.
+        
+        Returns:
+            False si no hay contenido que reutilizar (hay que transferir)
+        """
+        if not self.location_index:
+            return False
+        doc = self.location_index.get_document_location(task.file_id)
+        content_hash = doc.metadata.get("content_hash") if doc else None
+        if not content_hash or \
+                target_node not in self.location_index.get_content_holders(content_hash):
+            return False
+        
+        with self.circuit_breakers.guard(target_node):
+            response = await client.post(
+                f"{target_url}/cluster/replica/{task.file_id}/link",
+                json={
+                    "sha256": content_hash,
+                    "filename": doc.filename,
+                    "source_node": task.source_node,
+                    "original_file_id": task.file_id
+                },
+                timeout=self.timeout
+            )
+            if response.status_code == 404:
+                # El índice estaba desactualizado: el destino ya no lo tiene
+                return False
+            response.raise_for_status()
+        return True
+    
     async def ensure_replication_factor(self, file_id: str) -> Optional[ReplicationTask]:
         """
         Verifica y restaura factor de replicación de un documento.
         
-        Útil cuando un nodo cae y hay que re-replicar.
+        Copia desde una réplica viva (no necesariamente el dueño original,
+        que puede ser el nodo caído) hacia nodos sin copia.
+        
+        Returns:
+            Tarea encolada, o None si ya tiene copias suficientes o no
+            queda ninguna copia viva
         """
-        if not self.location_index:
+        survivors = self._live_holders(file_id)
+        missing = 1 + self.replication_factor - len(survivors)
+        if missing <= 0 or not survivors:
             return None
         
-        doc = self.location_index.get_document_location(file_id)
-        if not doc:
+        ejected = {
+            n for n in self._node_endpoints if not self.circuit_breakers.is_available(n)
+        }
+        targets = self._placement.place(
+            file_id, missing, exclude=set(self.get_holders(file_id)) | ejected
+        )
+        if not targets:
             return None
         
-        # Contar réplicas actuales
-        # (Asumiendo que el location_index mantiene todas las ubicaciones)
-        # TODO: Implementar tracking de réplicas
-        
-        # Por ahora, re-replicar desde el nodo original
+        # Origen: la copia viva con menos transferencias en curso
+        source = min(survivors, key=lambda n: (self._in_flight[n], n))
         return await self.replicate_document(
             file_id,
-            doc.node_id,
-            doc.embedding
+            source,
+            priority=ReplicationPriority.UNDER_REPLICATED,
+            target_nodes=targets
         )
     
+    def _finish_recovery_step(self, file_id: str) -> None:
+        """Cierra la recuperación de un nodo al terminar su último archivo (MTTR)"""
+        for node_id, (started, pending) in list(self._recoveries.items()):
+            pending.discard(file_id)
+            if not pending:
+                del self._recoveries[node_id]
+                self._last_recovery = {
+                    "node_id": node_id,
+                    "duration_seconds": round(time.monotonic() - started, 3)
+                }
+                logger.info(
+                    f"Recuperación de {node_id} completada en "
+                    f"{self._last_recovery['duration_seconds']}s"
+                )
+    
+    def get_task(self, task_id: str) -> Optional[ReplicationTask]:
+        """Obtiene una tarea de replicación por su ID"""
+        return self._tasks.get(task_id)
+    
     def get_task_status(self, file_id: str) -> Optional[ReplicationTask]:
-        """Obtiene estado de una tarea de replicación"""
-        return self._tasks.get(file_id)
+        """Obtiene la tarea de replicación más reciente de un archivo"""
+        latest = None
+        for task in self._tasks.values():
+            if task.file_id == file_id:
+                latest = task
+        return latest
+    
+    def get_dead_letters(self) -> List[Dict]:
+        """Tareas que agotaron sus reintentos"""
+        return [
+            task.to_dict() for task in self._tasks.values()
+            if task.status == ReplicationStatus.FAILED
+        ]
+    
+    def requeue_dead_letter(self, task_id: str) -> Optional[ReplicationTask]:
+        """Vuelve a encolar una tarea en dead-letter con los intentos a cero"""
+        task = self._tasks.get(task_id)
+        if not task or task.status != ReplicationStatus.FAILED:
+            return None
+        task.status = ReplicationStatus.PENDING
+        task.attempts = 0
+        task.completed_at = None
+        task.error_message = None
+        self._task_by_key[task.idempotency_key] = task_id
+        self._persist(task)
+        self._enqueue(task_id, task.priority)
+        return task
     
     def get_stats(self) -> Dict:
         """Retorna estadísticas del coordinador"""
@@ -349,5 +916,37 @@ class ReplicationCoordinator:
                 "completed": status_counts[ReplicationStatus.COMPLETED],
                 "failed": status_counts[ReplicationStatus.FAILED]
             },
-            "queue_size": self._pending_queue.qsize()
+            "queue_size": self._pending_queue.qsize(),
+            "queue_by_priority": {
+                p.name.lower(): self._queued_by_priority[p] for p in ReplicationPriority
+            },
+            "workers": {
+                "total": len(self._workers),
+                "active": self._active_workers
+            },
+            "in_flight_by_destination": dict(self._in_flight),
+            "deduplicated_transfers": self._deduplicated,
+            "tracked_files": len(self._replica_map),
+            "recoveries": {
+                "in_progress": {n: len(p) for n, (_, p) in self._recoveries.items()},
+                "last": self._last_recovery
+            },
+            "bandwidth": self.throttle.get_stats(),
+            "retries_scheduled": self._retries_scheduled,
+            "dead_letters": status_counts[ReplicationStatus.FAILED],
+            "evicted_tasks": self._evicted,
+            "task_store": self.task_store.get_stats(),
+            **self._drain_stats()
+        }
+    
+    def _drain_stats(self, window: float = 60.0) -> Dict:
+        """Ritmo de drenado de la cola en la última ventana"""
+        now = time.monotonic()
+        recent = [wait for at, wait in self._completions if now - at <= window]
+        rate = len(recent) / window
+        queued = self._pending_queue.qsize()
+        return {
+            "drain_rate_per_s": round(rate, 3),
+            "avg_queue_wait_ms": round(sum(recent) / len(recent) * 1000, 1) if recent else 0.0,
+            "estimated_drain_s": round(queued / rate, 1) if rate > 0 else None
         }
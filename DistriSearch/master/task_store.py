@@ -0,0 +1,157 @@
+"""
+DistriSearch Master - Registro durable de tareas de replicación
+
+Log local append-only en JSON Lines: cada cambio de estado de una
+tarea añade una línea con su registro completo y, al arrancar, se
+reconstruye el estado con la última línea de cada task_id. Una línea
+`{"task_id": ..., "deleted": true}` elimina la tarea (eviction).
+
+El log se compacta (reescritura atómica con os.replace) cuando sus
+líneas superan `compact_threshold` y doblan a las tareas vivas, así
+que su tamaño queda acotado por las tareas retenidas.
+
+Sin `path` el registro es solo en memoria (sin persistencia).
+"""
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicationTaskStore:
+    """
+    Persistencia de tareas de replicación en un log JSONL.
+
+    Uso:
+        store = ReplicationTaskStore("/var/lib/distrisearch/replication.jsonl")
+        records = store.load()          # task_id -> último registro
+        store.save(task.to_dict())
+        store.delete(task.task_id)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        compact_threshold: int = 1000,
+        fsync: bool = False
+    ):
+        """
+        Args:
+            path: Fichero del log (None = sin persistencia)
+            compact_threshold: Líneas mínimas antes de considerar compactar
+            fsync: Forzar a disco cada escritura (más lento, sobrevive a cortes de luz)
+        """
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+
+        self._lines = 0
+        self._live = 0
+        self._compactions = 0
+        self._lock = threading.Lock()
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def durable(self) -> bool:
+        return self.path is not None
+
+    def load(self) -> Dict[str, Dict]:
+        """
+        Reproduce el log y devuelve el último registro de cada tarea.
+
+        Una última línea incompleta (escritura cortada por una caída)
+        se ignora.
+        """
+        records: Dict[str, Dict] = {}
+        if not self.path or not os.path.exists(self.path):
+            return records
+
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Línea {number} corrupta en {self.path}: ignorada")
+                    continue
+                lines += 1
+                if record.get("deleted"):
+                    records.pop(record["task_id"], None)
+                else:
+                    records[record["task_id"]] = record
+
+        self._lines = lines
+        self._live = len(records)
+        logger.info(f"Tareas de replicación recuperadas: {len(records)} ({lines} líneas en el log)")
+        return records
+
+    def save(self, record: Dict) -> None:
+        """Añade el estado actual de una tarea"""
+        self._append(record)
+
+    def delete(self, task_id: str) -> None:
+        """Marca una tarea como eliminada"""
+        self._append({"task_id": task_id, "deleted": True})
+
+    def _append(self, record: Dict) -> None:
+        if not self.path:
+            return
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._lines += 1
+
+    def maybe_compact(self, live_records: Callable[[], Iterable[Dict]]) -> bool:
+        """
+        Compacta si el log creció demasiado respecto a las tareas vivas.
+
+        Args:
+            live_records: Devuelve los registros actuales de las tareas retenidas
+        """
+        if not self.path or self._lines < self.compact_threshold or self._lines < 2 * self._live:
+            return False
+        self.compact(live_records())
+        return True
+
+    def compact(self, records: Iterable[Dict]) -> None:
+        """Reescribe el log con un registro por tarea viva"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.compact"
+        with self._lock:
+            count = 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._lines = self._live = count
+            self._compactions += 1
+        logger.debug(f"Log de replicación compactado: {count} tareas")
+
+    def set_live(self, count: int) -> None:
+        """Actualiza el número de tareas vivas (para decidir la compactación)"""
+        self._live = count
+
+    def get_stats(self) -> Dict:
+        return {
+            "durable": self.durable,
+            "path": self.path,
+            "log_lines": self._lines,
+            "live_tasks": self._live,
+            "compactions": self._compactions
+        }
@@ -12,7 +12,6 @@ import asyncio
 import logging
 import os
 import sys
-import httpx
 import socket
 from typing import Dict, Optional
 from datetime import datetime
@@ -36,6 +35,7 @@ from core.config import get_cluster_config
 
 # Imports desde cluster (servicios compartidos)
 from cluster import get_multicast_service, get_namespace, get_ip_cache
+from core.http_client import get_http_client_manager, close_http_clients
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -152,7 +152,7 @@ async def lifespan(app: FastAPI):
                             logger.error(f"Error recuperando {node['node_id']}: {e}")
                 
                 # Replicación preventiva
-                replication_service.replicate_missing_files(batch=50)
+                await replication_service.replicate_missing_files(batch=50)
                 
             except Exception as e:
                 logger.error(f"Error en mantenimiento: {e}")
@@ -184,14 +184,14 @@ async def lifespan(app: FastAPI):
         unknown_nodes = [n for n in database.get_all_nodes() 
                         if n.get("status") == "unknown"]
         
+        http = get_http_client_manager()
         for node in unknown_nodes:
             try:
-                async with httpx.AsyncClient(timeout=5) as client:
-                    url = f"http://{node['ip_address']}:{node['port']}/health"
-                    response = await client.get(url)
-                    if response.status_code == 200:
-                        node_service.update_node_heartbeat(node["node_id"])
-                        logger.info(f"Nodo {node['node_id']} descubierto como ONLINE")
+                url = f"http://{node['ip_address']}:{node['port']}/health"
+                response = await http.get(url, timeout=5)
+                if response.status_code == 200:
+                    node_service.update_node_heartbeat(node["node_id"])
+                    logger.info(f"Nodo {node['node_id']} descubierto como ONLINE")
             except Exception:
                 pass
 
@@ -257,6 +257,7 @@ async def lifespan(app: FastAPI):
             pass
     
     await shutdown_cluster()
+    await close_http_clients()
     multicast.stop()
     
     logger.info("✅ DistriSearch Slave detenido correctamente")
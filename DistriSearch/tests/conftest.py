@@ -20,3 +20,4 @@ def pytest_configure(config):
     config.addinivalue_line("markers", "e2e: tests end-to-end que requieren Docker")
     config.addinivalue_line("markers", "slow: tests que tardan más de 30 segundos")
     config.addinivalue_line("markers", "integration: tests de integración entre módulos")
+    config.addinivalue_line("markers", "performance: benchmarks de tamaño y tiempo")
@@ -0,0 +1,184 @@
+"""
+Tests de integración de los endpoints /cluster de un nodo.
+
+Montan el router de cluster en una app FastAPI con TestClient. Los
+que tocan la base necesitan un MongoDB accesible (MONGO_URI) y usan
+una base propia que vacían antes de cada test.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND = os.path.join(ROOT, "backend")
+for path in (ROOT, BACKEND):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.merkle import MerkleTree
+
+pytestmark = pytest.mark.integration
+
+
+def _mongo_available() -> bool:
+    try:
+        from pymongo import MongoClient
+        client = MongoClient(
+            os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+            serverSelectionTimeoutMS=500
+        )
+        client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+requires_mongo = pytest.mark.skipif(not _mongo_available(), reason="MongoDB no disponible")
+
+
+@pytest.fixture
+def cluster_routes():
+    from routes import cluster
+    state = cluster.cluster_state
+    previous = (state.node_id, state.is_master, state.query_router, state.admission_controller)
+    yield cluster
+    state.node_id, state.is_master, state.query_router, state.admission_controller = previous
+
+
+@pytest.fixture
+def client(cluster_routes):
+    app = FastAPI()
+    app.include_router(cluster_routes.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    os.environ["MONGO_DBNAME"] = "distrisearch_test"
+    import database
+    for name in ("files", "file_contents", "blobs"):
+        database._db[name].delete_many({})
+    return database
+
+
+class RecordingRouter:
+    """QueryRouter mínimo que registra los argumentos de search/explain"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def search(self, **kwargs):
+        self.calls.append(("search", kwargs))
+        return SimpleNamespace(
+            query_id="q1", results=[], nodes_queried=[], nodes_responded=[],
+            errors={}, cache_hit=False, total_time_ms=1.0
+        )
+
+    async def explain(self, **kwargs):
+        self.calls.append(("explain", kwargs))
+        return {"plan": {}}
+
+
+def test_distributed_search_and_explain_forward_mode_and_filters(client, cluster_routes):
+    state = cluster_routes.cluster_state
+    state.is_master = True
+    state.admission_controller = None
+    state.query_router = RecordingRouter()
+    body = {"query": "budget", "mode": "locate", "filters": {"file_type": "document"}}
+
+    assert client.post("/cluster/search/distributed", json=body).status_code == 200
+    assert client.post("/cluster/query/explain", json=body).status_code == 200
+
+    for _, kwargs in state.query_router.calls:
+        assert kwargs["mode"] == "locate"
+        assert kwargs["filters"] == {"file_type": "document"}
+
+    invalid = client.post("/cluster/search/distributed", json={"query": "x", "mode": "broadcast"})
+    assert invalid.status_code == 422
+
+
+@requires_mongo
+def test_replica_shard_query_returns_content_hits(db, client, cluster_routes, tmp_path):
+    cluster_routes.cluster_state.node_id = "node-r"
+
+    # Réplica recibida de node-a: su original no está en esta base
+    replica = tmp_path / "informe.txt"
+    replica.write_bytes(b"presupuesto trimestral de infraestructura")
+    cluster_routes._register_local_replica(
+        "node-a_informe", "informe.txt", str(replica), replica.stat().st_size,
+        hashlib.sha256(replica.read_bytes()).hexdigest(), "node-a"
+    )
+
+    # Documentos propios de node-r que también casan por contenido
+    for i in range(3):
+        db.register_file(db.FileMeta(
+            file_id=f"node-r_{i}", name=f"propio-{i}.txt", path=f"propio-{i}.txt",
+            size=10, mime_type="text/plain", type="document", node_id="node-r",
+            content="presupuesto presupuesto presupuesto"
+        ))
+
+    response = client.post(
+        "/cluster/query",
+        json={"query": "presupuesto", "limit": 1, "shard": "node-a"}
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["file_id"] for r in results] == ["node-a_informe"]
+    assert results[0]["score"] > 0
+    assert results[0]["metadata"]["replica_source"] == "node-a"
+
+
+def _serve_tree(tree, calls):
+    """Transporte httpx que atiende POST /cluster/merkle con un árbol propio"""
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append((str(request.url), body["source"]))
+        return httpx.Response(200, json={"nodes": tree.describe(body["paths"])})
+    return httpx.MockTransport(handler)
+
+
+def _entries(count):
+    return {f"file-{i}": hashlib.sha256(f"content-{i}".encode()).hexdigest() for i in range(count)}
+
+
+@requires_mongo
+def test_anti_entropy_asks_the_peer_for_its_tree(monkeypatch):
+    from services import dynamic_replication as replication
+    service = replication.DynamicReplicationService()
+
+    # Base del origen y base del par independientes: el par tiene un huérfano
+    local = MerkleTree(_entries(300))
+    peer = MerkleTree(dict(_entries(300), huerfano=hashlib.sha256(b"huerfano").hexdigest()))
+    calls = []
+    transport = _serve_tree(peer, calls)
+
+    monkeypatch.setattr(service, "get_merkle_tree", lambda node_id, source_id: local)
+    monkeypatch.setattr(service, "refresh_placement", lambda force=False: None)
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        replication.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=transport, **kwargs)
+    )
+    service._online_nodes = {"node-b": {"node_id": "node-b", "ip_address": "10.0.0.2", "port": 8000}}
+
+    result = asyncio.run(service.anti_entropy("node-a", "node-b"))
+
+    assert calls and calls[0] == ("http://10.0.0.2:8000/cluster/merkle", "node-a")
+    assert result["orphaned"] == 1 and result["missing"] == result["outdated"] == 0
+
+    # Sin endpoint del par no hay con qué comparar: no se da por sincronizado
+    offline = asyncio.run(service.anti_entropy("node-a", "node-c"))
+    assert not offline["in_sync"] and "error" in offline
@@ -20,6 +20,7 @@ if BACKEND not in sys.path:
     sys.path.insert(0, BACKEND)
 
 # Importar módulos directamente evitando __init__.py problemático
+import importlib
 import importlib.util
 
 def load_module(name, filepath):
@@ -31,7 +32,10 @@ def load_module(name, filepath):
 location_index_mod = load_module("location_index", os.path.join(ROOT, "master", "location_index.py"))
 SemanticLocationIndex = location_index_mod.SemanticLocationIndex
 
-repl_coord_mod = load_module("replication_coordinator", os.path.join(ROOT, "master", "replication_coordinator.py"))
+# El coordinador usa imports relativos (..core), así que se importa como paquete
+if os.path.dirname(ROOT) not in sys.path:
+    sys.path.insert(0, os.path.dirname(ROOT))
+repl_coord_mod = importlib.import_module(f"{os.path.basename(ROOT)}.master.replication_coordinator")
 ReplicationCoordinator = repl_coord_mod.ReplicationCoordinator
 
 
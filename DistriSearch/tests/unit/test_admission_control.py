@@ -0,0 +1,144 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import asyncio
+import importlib.util
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "admission_control",
+    os.path.join(ROOT, "master", "admission_control.py")
+)
+admission_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(admission_module)
+AdmissionController = admission_module.AdmissionController
+AdmissionRejected = admission_module.AdmissionRejected
+QueryPriority = admission_module.QueryPriority
+
+
+def test_token_bucket_rejects_bursts_with_retry_after():
+    controller = AdmissionController(rate_per_key=1.0, burst_per_key=2.0)
+
+    async def _run():
+        for _ in range(2):
+            async with controller.admit("tenant-a"):
+                pass
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.acquire("tenant-a")
+        # Otro tenant no se ve afectado
+        async with controller.admit("tenant-b"):
+            pass
+        return exc.value
+
+    rejected = asyncio.run(_run())
+
+    assert rejected.reason == "rate_limited"
+    assert 0 < rejected.retry_after <= 1.0
+    assert rejected.retry_after_header == "1"
+    assert controller.get_stats()["rejections"] == {"rate_limited": 1}
+
+
+def test_interactive_queries_jump_ahead_of_batch_in_queue():
+    controller = AdmissionController(max_concurrent=1, max_concurrent_per_key=None, queue_timeout=5)
+    order = []
+
+    async def query(key, priority, hold=0.0):
+        async with controller.admit(key, priority):
+            order.append(key)
+            await asyncio.sleep(hold)
+
+    async def _run():
+        first = asyncio.create_task(query("first", QueryPriority.BATCH, hold=0.05))
+        await asyncio.sleep(0.01)
+        batch = asyncio.create_task(query("batch", QueryPriority.BATCH))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(query("interactive", QueryPriority.INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert controller.get_stats()["queue_depth_by_priority"] == {"interactive": 1, "batch": 1}
+        await asyncio.gather(first, batch, interactive)
+
+    asyncio.run(_run())
+
+    assert order == ["first", "interactive", "batch"]
+    stats = controller.get_stats()
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["queued_total"] == 2
+
+
+def test_full_queue_and_queue_timeout_fail_fast():
+    controller = AdmissionController(
+        max_concurrent=1, max_concurrent_per_key=None, max_queue=1, queue_timeout=0.05
+    )
+
+    async def _run():
+        await controller.acquire("a")
+        waiting = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as overloaded:
+            await controller.acquire("c")
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiting
+        controller.release("a")
+        return overloaded.value, timed_out.value
+
+    overloaded, timed_out = asyncio.run(_run())
+
+    assert overloaded.reason == "overloaded"
+    assert timed_out.reason == "queue_timeout"
+    assert controller.get_stats()["active"] == 0
+
+
+def test_per_tenant_concurrency_limit():
+    controller = AdmissionController(max_concurrent_per_key=1)
+
+    async def _run():
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.acquire("a")
+        await controller.acquire("b")
+        return exc.value
+
+    assert asyncio.run(_run()).reason == "tenant_concurrency"
+
+
+def test_rejected_queries_do_not_consume_rate_budget():
+    controller = AdmissionController(rate_per_key=0.001, burst_per_key=2.0, max_concurrent_per_key=1)
+
+    async def _run():
+        await controller.acquire("a")
+        for _ in range(5):
+            with pytest.raises(AdmissionRejected):
+                await controller.acquire("a")
+        controller.release("a")
+        # Queda el segundo token de la ráfaga
+        await controller.acquire("a")
+
+    asyncio.run(_run())
+    assert controller.get_stats()["rejections"] == {"tenant_concurrency": 5}
+
+
+def test_queued_waiter_respects_per_tenant_limit_when_granted():
+    controller = AdmissionController(max_concurrent=2, max_concurrent_per_key=2, queue_timeout=1)
+
+    async def _run():
+        await controller.acquire("a")
+        await controller.acquire("b")
+        waiting_a = asyncio.create_task(controller.acquire("a"))
+        waiting_d = asyncio.create_task(controller.acquire("d"))
+        await asyncio.sleep(0.01)
+        # El límite por tenant baja mientras "a" espera en cola
+        controller.max_concurrent_per_key = 1
+        controller.release("b")
+        await asyncio.sleep(0.01)
+        granted = (waiting_a.done(), waiting_d.done())
+        controller.release("a")
+        await asyncio.gather(waiting_a, waiting_d)
+        return granted
+
+    # El slot liberado por "b" va a "d": "a" ya ejecuta su máximo
+    assert asyncio.run(_run()) == (False, True)
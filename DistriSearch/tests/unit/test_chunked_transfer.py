@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import os
+import re
+
+import httpx
+import pytest
+
+from core.chunked_transfer import (
+    ChecksumMismatch,
+    ChunkedTransfer,
+    OffsetConflict,
+    ReplicaReceiver,
+    TransferError,
+    copy_file_chunked,
+)
+
+
+PAYLOAD = os.urandom(10 * 1024 + 123)
+
+
+class FakeCluster:
+    """Origen con soporte de Range y destino respaldado por un ReplicaReceiver"""
+
+    def __init__(self, receiver, payload=PAYLOAD, fail_put_at=None, honor_range=True):
+        self.receiver = receiver
+        self.payload = payload
+        self.fail_put_at = set(fail_put_at or ())
+        self.honor_range = honor_range
+        self.put_offsets = []
+        self.range_headers = []
+
+    def handler(self, request):
+        path = request.url.path
+        if path.startswith("/api/download/"):
+            range_header = request.headers.get("range")
+            self.range_headers.append(range_header)
+            match = re.match(r"bytes=(\d+)-", range_header or "")
+            if match and self.honor_range:
+                return httpx.Response(206, content=self.payload[int(match.group(1)):])
+            return httpx.Response(200, content=self.payload)
+
+        file_id = path.split("/")[3]
+        if path.endswith("/offset"):
+            return httpx.Response(200, json={"offset": self.receiver.offset(file_id)})
+        if path.endswith("/chunk"):
+            offset = int(request.url.params["offset"])
+            self.put_offsets.append(offset)
+            if offset in self.fail_put_at:
+                self.fail_put_at.discard(offset)
+                return httpx.Response(503)
+            try:
+                new_offset = self.receiver.write_chunk(file_id, offset, request.content)
+            except OffsetConflict as e:
+                return httpx.Response(409, json={"offset": e.offset})
+            return httpx.Response(200, json={"offset": new_offset})
+        if path.endswith("/commit"):
+            body = httpx.Response(200, content=request.content).json()
+            try:
+                self.receiver.commit(file_id, body["sha256"], body["size"], body["filename"])
+            except ChecksumMismatch:
+                return httpx.Response(422)
+            return httpx.Response(200, json=body)
+        return httpx.Response(404)
+
+
+def _received(cluster, file_id="file-1"):
+    with open(cluster.receiver.final_path(file_id, "doc.bin"), "rb") as f:
+        return f.read()
+
+
+def _transfer(cluster, chunk_size=1024, **kwargs):
+    async def _run():
+        transport = httpx.MockTransport(cluster.handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await ChunkedTransfer(
+                client,
+                "http://source/api/download/file-1",
+                "http://target/cluster/replica/file-1",
+                chunk_size=chunk_size,
+                retry_backoff=0,
+                metadata={"filename": "doc.bin"},
+                **kwargs
+            ).run()
+    return asyncio.run(_run())
+
+
+def test_transfer_streams_chunks_and_verifies_sha(tmp_path):
+    cluster = FakeCluster(ReplicaReceiver(str(tmp_path)))
+
+    result = _transfer(cluster)
+
+    assert result.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+    assert result.size == len(PAYLOAD) == result.bytes_sent
+    assert _received(cluster) == PAYLOAD
+    # Ningún chunk supera el tamaño configurado
+    assert cluster.put_offsets == list(range(0, len(PAYLOAD), 1024))
+
+
+def test_transfer_resumes_from_acknowledged_offset(tmp_path):
+    cluster = FakeCluster(ReplicaReceiver(str(tmp_path)), fail_put_at={5 * 1024})
+
+    result = _transfer(cluster)
+
+    assert result.retries == 1
+    assert _received(cluster) == PAYLOAD
+    # Solo se reenvía el chunk fallido, el origen se relee desde ahí
+    assert result.bytes_sent == len(PAYLOAD)
+    assert cluster.range_headers == [None, "bytes=5120-"]
+
+
+def test_transfer_restarts_hash_when_source_ignores_range(tmp_path):
+    cluster = FakeCluster(
+        ReplicaReceiver(str(tmp_path)), fail_put_at={3 * 1024}, honor_range=False
+    )
+
+    result = _transfer(cluster)
+
+    assert result.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+    assert _received(cluster) == PAYLOAD
+
+
+def test_transfer_resumes_partial_left_by_previous_attempt(tmp_path):
+    receiver = ReplicaReceiver(str(tmp_path))
+    receiver.write_chunk("file-1", 0, PAYLOAD[:4000])
+    cluster = FakeCluster(receiver)
+
+    result = _transfer(cluster)
+
+    assert result.resumed_from == 4000
+    assert result.bytes_sent == len(PAYLOAD) - 4000
+    assert _received(cluster) == PAYLOAD
+
+
+def test_transfer_gives_up_after_max_retries(tmp_path):
+    cluster = FakeCluster(ReplicaReceiver(str(tmp_path)))
+    cluster.fail_put_at = set()
+
+    def always_fail(request):
+        if request.url.path.endswith("/chunk"):
+            return httpx.Response(503)
+        return FakeCluster.handler(cluster, request)
+
+    cluster.handler = always_fail
+
+    with pytest.raises(TransferError) as exc:
+        _transfer(cluster, max_retries=2)
+    assert exc.value.side == "target"
+
+
+def test_receiver_rejects_corrupt_commit(tmp_path):
+    receiver = ReplicaReceiver(str(tmp_path))
+    receiver.write_chunk("file-1", 0, b"abc")
+
+    with pytest.raises(OffsetConflict):
+        receiver.write_chunk("file-1", 0, b"abc")
+    with pytest.raises(ChecksumMismatch):
+        receiver.commit("file-1", hashlib.sha256(b"xyz").hexdigest(), 3, "doc.bin")
+    assert receiver.offset("file-1") == 0
+    assert not os.path.exists(receiver.final_path("file-1", "doc.bin"))
+
+
+def test_receiver_keeps_same_named_files_apart(tmp_path):
+    receiver = ReplicaReceiver(str(tmp_path))
+    paths = []
+    for file_id, content in (("file-1", b"uno"), ("file-2", b"dos")):
+        receiver.write_chunk(file_id, 0, content)
+        paths.append(receiver.commit(file_id, hashlib.sha256(content).hexdigest(), 3, "doc.bin"))
+
+    assert paths[0] != paths[1]
+    assert [open(p, "rb").read() for p in paths] == [b"uno", b"dos"]
+    assert all(p.endswith(".bin") for p in paths)
+
+
+def test_receiver_serializes_duplicate_chunks_from_threads(tmp_path):
+    # El endpoint escribe con asyncio.to_thread: un reintento del mismo
+    # chunk en paralelo no debe anexarse dos veces
+    receiver = ReplicaReceiver(str(tmp_path))
+    chunk = os.urandom(256 * 1024)
+
+    async def _run():
+        return await asyncio.gather(
+            *(asyncio.to_thread(receiver.write_chunk, "file-1", 0, chunk) for _ in range(8)),
+            return_exceptions=True
+        )
+
+    outcomes = asyncio.run(_run())
+
+    assert outcomes.count(len(chunk)) == 1
+    assert all(isinstance(o, OffsetConflict) for o in outcomes if o != len(chunk))
+    assert receiver.offset("file-1") == len(chunk)
+
+
+def test_copy_file_chunked_resumes_partial_copy(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(PAYLOAD)
+    target = tmp_path / "target.bin"
+    (tmp_path / "target.bin.part").write_bytes(PAYLOAD[:2048])
+
+    result = copy_file_chunked(
+        str(source), str(target), chunk_size=1000,
+        expected_sha256=hashlib.sha256(PAYLOAD).hexdigest()
+    )
+
+    assert result.resumed_from == 2048
+    assert result.bytes_sent == len(PAYLOAD) - 2048
+    assert target.read_bytes() == PAYLOAD
+    assert not (tmp_path / "target.bin.part").exists()
+
+
+def test_copy_file_chunked_rejects_hash_mismatch(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(PAYLOAD)
+    target = tmp_path / "target.bin"
+
+    with pytest.raises(ChecksumMismatch):
+        copy_file_chunked(str(source), str(target), expected_sha256="0" * 64)
+    assert not target.exists()
+    assert not (tmp_path / "target.bin.part").exists()
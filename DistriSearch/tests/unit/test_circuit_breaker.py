@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from core.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, CircuitState
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _fail(breakers, node_id, exc):
+    with pytest.raises(type(exc)):
+        with breakers.guard(node_id):
+            raise exc
+
+
+def test_consecutive_failures_open_then_probe_closes(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("core.circuit_breaker.time.monotonic", lambda: clock[0])
+    breakers = CircuitBreakerRegistry(consecutive_failures=3, open_duration=10)
+
+    for _ in range(3):
+        _fail(breakers, "node-a", TimeoutError())
+
+    assert breakers.get_state("node-a") == CircuitState.OPEN
+    assert not breakers.is_available("node-a")
+    with pytest.raises(CircuitOpenError):
+        with breakers.guard("node-a"):
+            pass
+
+    # Cumplida la expulsión se admite una única sonda
+    clock[0] += 10
+    assert breakers.is_available("node-a")
+    assert breakers.allow("node-a")
+    assert breakers.get_state("node-a") == CircuitState.HALF_OPEN
+    assert not breakers.allow("node-a")
+
+    breakers.record_success("node-a", latency_ms=20)
+    assert breakers.get_state("node-a") == CircuitState.CLOSED
+
+
+def test_failed_probe_reopens_with_backoff(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("core.circuit_breaker.time.monotonic", lambda: clock[0])
+    breakers = CircuitBreakerRegistry(consecutive_failures=1, open_duration=10)
+
+    _fail(breakers, "node-a", ConnectionError())
+    clock[0] += 10
+    _fail(breakers, "node-a", ConnectionError())
+
+    stats = breakers.get_stats()["nodes"]["node-a"]
+    assert stats["state"] == "open" and stats["trips"] == 2
+    clock[0] += 10
+    assert not breakers.is_available("node-a")  # 20s en el segundo disparo
+
+
+def test_client_errors_do_not_count_against_node():
+    breakers = CircuitBreakerRegistry(consecutive_failures=2)
+    for _ in range(5):
+        _fail(breakers, "node-a", StatusError(404))
+    assert breakers.get_state("node-a") == CircuitState.CLOSED
+
+    for _ in range(2):
+        _fail(breakers, "node-a", StatusError(503))
+    assert breakers.get_state("node-a") == CircuitState.OPEN
+
+
+def test_latency_outlier_is_ejected_within_ejection_cap():
+    breakers = CircuitBreakerRegistry(min_requests=3, max_ejection_ratio=0.5)
+    for _ in range(3):
+        for node_id in ("node-a", "node-b", "node-c"):
+            breakers.record_success(node_id, latency_ms=50)
+        breakers.record_success("node-slow", latency_ms=2000)
+
+    assert breakers.get_state("node-slow") == CircuitState.OPEN
+    assert breakers.get_stats()["trips_by_reason"] == {"latency_outlier": 1}
+
+    # Con la mitad expulsada no se expulsa a nadie más
+    for _ in range(5):
+        breakers.record_failure("node-b")
+    breakers.record_failure("node-a")
+    assert breakers.get_state("node-b") == CircuitState.OPEN
+    for _ in range(5):
+        breakers.record_failure("node-a")
+    assert breakers.get_state("node-a") == CircuitState.CLOSED
+
+
+def test_cancelled_probe_releases_slot(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("core.circuit_breaker.time.monotonic", lambda: clock[0])
+    breakers = CircuitBreakerRegistry(consecutive_failures=1, open_duration=5)
+    _fail(breakers, "node-a", TimeoutError())
+    clock[0] += 5
+
+    async def probe():
+        with breakers.guard("node-a"):
+            await asyncio.sleep(10)
+
+    async def _run():
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_run())
+    assert breakers.allow("node-a")
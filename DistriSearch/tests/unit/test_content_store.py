@@ -0,0 +1,37 @@
+import hashlib
+
+from core.content_store import ContentStore, is_sha256
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = ContentStore(str(tmp_path / "cas"))
+
+    first, created_first = store.put_bytes(b"hello world")
+    second, created_second = store.put_bytes(b"hello world")
+
+    assert first == second == hashlib.sha256(b"hello world").hexdigest()
+    assert created_first and not created_second
+    assert store.has(first)
+    blobs = [p for p in (tmp_path / "cas").rglob("*") if p.is_file()]
+    assert blobs == [tmp_path / "cas" / first[:2] / first]
+
+
+def test_put_file_streams_and_remove_deletes_blob(tmp_path):
+    source = tmp_path / "big.bin"
+    source.write_bytes(b"x" * (3 * 1024 * 1024 + 7))
+    store = ContentStore(str(tmp_path / "cas"))
+
+    content_hash, created = store.put_file(str(source))
+
+    assert created
+    assert open(store.blob_path(content_hash), "rb").read() == source.read_bytes()
+    assert store.remove(content_hash)
+    assert not store.has(content_hash)
+    assert not store.remove(content_hash)
+
+
+def test_is_sha256():
+    assert is_sha256("a" * 64)
+    assert not is_sha256("a" * 63)
+    assert not is_sha256("z" * 64)
+    assert not is_sha256(None)
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import random
+import zlib
+
+import pytest
+
+from core.delta_sync import (
+    DeltaMismatch,
+    Signature,
+    apply_delta,
+    compute_delta,
+    compute_signature,
+    decode_delta,
+    encode_delta,
+    roll_checksum,
+    sync_file_delta,
+)
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_roll_checksum_matches_fresh_adler32():
+    data = os.urandom(4096 + 64)
+    window = 1024
+    weak = zlib.adler32(data[:window])
+    for pos in range(64):
+        weak = roll_checksum(weak, data[pos], data[pos + window], window)
+        assert weak == zlib.adler32(data[pos + 1:pos + 1 + window])
+
+
+def test_small_edit_sends_a_tiny_fraction_of_the_file(tmp_path):
+    rng = random.Random(7)
+    old = bytes(rng.getrandbits(8) for _ in range(2 * 1024 * 1024))
+    # Inserción y modificación en medio: desplaza todos los bloques siguientes
+    new = old[:700_000] + b"insertado" + old[700_000:1_500_000] + b"X" * 10 + old[1_500_010:]
+    source = _write(tmp_path / "new.bin", new)
+    target = _write(tmp_path / "old.bin", old)
+
+    stats = sync_file_delta(source, target, expected_sha256=hashlib.sha256(new).hexdigest())
+
+    assert (tmp_path / "old.bin").read_bytes() == new
+    assert stats.sha256 == hashlib.sha256(new).hexdigest()
+    assert stats.transferred_bytes < len(new) / 50
+    assert stats.copied_bytes + stats.literal_bytes == len(new)
+
+
+@pytest.mark.parametrize("old_size,new_size", [(0, 5000), (5000, 0), (10_000, 10_000), (5000, 7000)])
+def test_delta_roundtrip_edge_sizes(tmp_path, old_size, new_size):
+    old = os.urandom(old_size)
+    new = old[:new_size] + os.urandom(max(0, new_size - old_size))
+    source = _write(tmp_path / "new.bin", new)
+    target = _write(tmp_path / "old.bin", old)
+
+    signature = Signature.from_bytes(compute_signature(target, block_size=2048).to_bytes())
+    ops = list(decode_delta(encode_delta(compute_delta(source, signature))))
+    apply_delta(target, ops, signature.block_size, str(tmp_path / "out.bin"))
+
+    assert (tmp_path / "out.bin").read_bytes() == new
+
+
+def test_unchanged_short_tail_block_is_copied(tmp_path):
+    old = os.urandom(2048 * 3 + 100)
+    new = b"prefix" + old
+    source = _write(tmp_path / "new.bin", new)
+    target = _write(tmp_path / "old.bin", old)
+
+    ops = compute_delta(source, compute_signature(target, block_size=2048))
+
+    assert ops == [b"prefix", (0, 4)]
+
+
+def test_apply_delta_rejects_wrong_hash_and_keeps_old_version(tmp_path):
+    old = os.urandom(8000)
+    source = _write(tmp_path / "new.bin", old[:4000] + b"changed" + old[4000:])
+    target = _write(tmp_path / "old.bin", old)
+    signature = compute_signature(target)
+
+    with pytest.raises(DeltaMismatch):
+        apply_delta(target, compute_delta(source, signature), signature.block_size,
+                    target, expected_sha256="0" * 64)
+    assert (tmp_path / "old.bin").read_bytes() == old
+    assert not (tmp_path / "old.bin.delta").exists()
@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import importlib.util
+
+spec = importlib.util.spec_from_file_location(
+    "fanout_planner",
+    os.path.join(ROOT, "master", "fanout_planner.py")
+)
+planner_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(planner_module)
+FanoutPlanner = planner_module.FanoutPlanner
+
+
+def test_focused_query_selects_nodes_within_margin():
+    planner = FanoutPlanner(margin=0.1, max_nodes=3)
+    plan = planner.plan([("n1", 0.82), ("n2", 0.9), ("n3", 0.4), ("n4", 0.3)])
+
+    assert plan.nodes == ["n2", "n1"]
+    assert not plan.flat
+
+
+def test_flat_scores_widen_to_full_coverage():
+    planner = FanoutPlanner(margin=0.01, max_nodes=2, flatness_threshold=0.05)
+    scores = [(f"n{i}", 0.50 + i * 0.005) for i in range(6)]
+
+    plan = planner.plan(scores)
+
+    assert plan.flat
+    assert len(plan.nodes) == 6
+
+
+def test_feedback_widens_and_narrows_margin():
+    planner = FanoutPlanner(margin=0.1, adjust_step=0.02)
+    plan = planner.plan([("n1", 0.9), ("n2", 0.82), ("n3", 0.5)])
+
+    # El nodo del borde (n2) aporta la mitad del top-k: ampliar
+    planner.record_feedback(plan, ["n1", "n2"])
+    assert planner.margin > 0.1
+
+    # Solo aporta el mejor nodo: estrechar
+    widened = planner.margin
+    planner.record_feedback(planner.plan([("n1", 0.9), ("n2", 0.82)]), ["n1", "n1"])
+    assert planner.margin < widened
+
+
+def test_feedback_margin_is_clamped():
+    planner = FanoutPlanner(margin=0.1, max_margin=0.15, adjust_step=0.05)
+    for _ in range(5):
+        plan = planner.plan([("n1", 0.9), ("n2", 0.82), ("n3", 0.5)])
+        planner.record_feedback(plan, ["n2", "n2"])
+
+    assert planner.margin == 0.15
+    assert planner.get_stats()["feedback_entries"] == 5
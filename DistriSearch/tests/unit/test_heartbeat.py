@@ -1,8 +1,10 @@
 import asyncio
+import json
 from datetime import datetime
 
 # Importar desde el nuevo módulo cluster
 from cluster.heartbeat import HeartbeatService, HeartbeatState
+from cluster.load_report import LocalLoadMonitor
 from core.models import MessageType, NodeStatus, ClusterMessage
 
 
@@ -53,3 +55,39 @@ def test_handle_pong_marks_peer_online():
     asyncio.run(_run())
 
     assert "node-b" in svc.get_online_peers()
+
+
+def test_ping_carries_load_report_both_ways():
+    reports = []
+    svc = HeartbeatService(
+        node_id="node-a", port=0, heartbeat_interval=1, heartbeat_timeout=1,
+        load_provider=lambda: {"cpu_usage": 12.0, "queue_depth": 1},
+        on_load_report=lambda node_id, load: reports.append((node_id, load))
+    )
+    svc._socket = DummySocket()
+    svc.add_peer("node-b", "127.0.0.1", 9999)
+
+    message = ClusterMessage(
+        type=MessageType.PING, sender_id="node-b",
+        payload={"load": {"cpu_usage": 80.0, "p99_ms": 250.0}}, timestamp=datetime.utcnow()
+    )
+
+    asyncio.run(svc._handle_message(message, ("127.0.0.1", 9999)))
+
+    assert reports == [("node-b", {"cpu_usage": 80.0, "p99_ms": 250.0})]
+    pong = ClusterMessage.from_dict(json.loads(svc._socket.sent[0][0]))
+    assert pong.payload["load"] == {"cpu_usage": 12.0, "queue_depth": 1}
+
+
+def test_load_monitor_reports_queue_depth_and_percentiles():
+    monitor = LocalLoadMonitor(window_size=100)
+    for latency in range(1, 101):
+        monitor.record_query(float(latency))
+
+    with monitor.track():
+        assert monitor.snapshot()["queue_depth"] == 1
+
+    report = monitor.snapshot()
+    assert report["queue_depth"] == 0
+    assert 49 <= report["p50_ms"] <= 52
+    assert report["p99_ms"] >= 98
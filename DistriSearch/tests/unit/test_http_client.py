@@ -0,0 +1,75 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import asyncio
+import importlib.util
+
+import httpx
+
+spec = importlib.util.spec_from_file_location(
+    "http_client",
+    os.path.join(ROOT, "core", "http_client.py")
+)
+http_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(http_module)
+HttpClientManager = http_module.HttpClientManager
+
+
+def mock_transport(monkeypatch, delay=0.0):
+    """Sustituye la red por un MockTransport que registra los requests"""
+    seen = []
+    real_client = httpx.AsyncClient
+
+    async def handler(request):
+        seen.append(str(request.url))
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"ok": True})
+
+    def factory(**kwargs):
+        kwargs.pop("http2", None)
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(http_module.httpx, "AsyncClient", factory)
+    return seen
+
+
+def test_client_is_reused_within_a_loop_and_recreated_per_loop(monkeypatch):
+    mock_transport(monkeypatch)
+    manager = HttpClientManager()
+
+    async def _run():
+        first = manager.get_client()
+        response = await manager.get("http://node-a/health")
+        assert manager.get_client() is first
+        await manager.close()
+        return response.json()
+
+    assert asyncio.run(_run()) == {"ok": True}
+    asyncio.run(_run())
+
+    stats = manager.get_stats()
+    assert stats["clients_created"] == 2
+    assert stats["requests"] == 2 and stats["clients"] == 0
+
+
+def test_per_host_limit_caps_concurrency_and_reports_saturation(monkeypatch):
+    mock_transport(monkeypatch, delay=0.02)
+    manager = HttpClientManager(max_connections_per_host=2)
+
+    async def _run():
+        await asyncio.gather(
+            *(manager.get("http://node-a/x") for _ in range(5)),
+            manager.post("http://node-b/y", json={})
+        )
+        await manager.close()
+
+    asyncio.run(_run())
+
+    stats = manager.get_stats()
+    assert stats["max_in_flight_per_host"] == 2
+    assert stats["saturated_waits"] == 3
+    assert stats["in_flight_by_host"] == {}
@@ -0,0 +1,138 @@
+import sys
+import os
+
+# El balanceador usa imports relativos (..core), así que se importa como paquete
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PARENT = os.path.dirname(ROOT)
+if PARENT not in sys.path:
+    sys.path.insert(0, PARENT)
+
+import importlib
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+PACKAGE = os.path.basename(ROOT)
+lb_module = importlib.import_module(f"{PACKAGE}.master.load_balancer")
+models_module = importlib.import_module(f"{PACKAGE}.core.models")
+breaker_module = importlib.import_module(f"{PACKAGE}.core.circuit_breaker")
+LoadBalancer = lb_module.LoadBalancer
+NodeInfo = models_module.NodeInfo
+NodeStatus = models_module.NodeStatus
+
+
+def make_balancer(*node_ids, **kwargs):
+    kwargs.setdefault("circuit_breakers", breaker_module.CircuitBreakerRegistry())
+    balancer = LoadBalancer(**kwargs)
+    for node_id in node_ids:
+        balancer.register_node(NodeInfo(
+            node_id=node_id, ip_address="127.0.0.1", port=8000, status=NodeStatus.ONLINE
+        ))
+    return balancer
+
+
+def test_load_reports_are_smoothed_with_ewma():
+    balancer = make_balancer("node-a", ewma_alpha=0.5)
+
+    balancer.apply_load_report("node-a", {"cpu_usage": 80.0, "p99_ms": 200.0})
+    balancer.apply_load_report("node-a", {"cpu_usage": 40.0, "p99_ms": 100.0})
+
+    load = balancer.get_node_loads()["node-a"]
+    # La primera muestra se toma tal cual; la segunda se promedia
+    assert abs(load.cpu_usage - 60.0) < 0.1
+    assert abs(load.p99_ms - 150.0) < 0.1
+    assert balancer.get_stats()["load_reports"] == 2
+
+
+def test_stale_load_decays_towards_neutral():
+    balancer = make_balancer("node-a")
+    balancer.apply_load_report("node-a", {"cpu_usage": 0.0, "memory_usage": 0.0})
+    load = balancer.get_node_loads()["node-a"]
+
+    fresh = load.load_score
+    stale = load.load_score_with(now=datetime.utcnow() + timedelta(minutes=10))
+
+    # Un nodo que dejó de reportar no sigue pareciendo libre
+    assert fresh < 0.05
+    assert abs(stale - 0.5 * lb_module.NEUTRAL_LOAD) < 0.01
+
+
+def test_observed_latency_steers_selection_to_faster_node():
+    balancer = make_balancer("node-a", "node-b")
+    for _ in range(5):
+        balancer.record_latency("node-a", 400.0)
+        balancer.record_latency("node-b", 20.0)
+
+    selected = balancer.select_nodes_for_query(
+        semantic_scores=[("node-a", 0.8), ("node-b", 0.78)],
+        num_nodes=1
+    )
+
+    assert selected == ["node-b"]
+    assert balancer.select_holder(["node-a", "node-b"]) == "node-b"
+
+
+def test_max_document_count_is_maintained_incrementally():
+    balancer = make_balancer("node-a", "node-b")
+    balancer.update_load("node-a", document_count=50)
+    balancer.update_load("node-b", document_count=20)
+    assert balancer.max_document_count == 50
+
+    balancer.update_load("node-a", document_count=10)
+    assert balancer.max_document_count == 20
+
+    balancer.unregister_node("node-b")
+    assert balancer.max_document_count == 10
+    assert balancer.select_node_for_document() == "node-a"
+
+
+def test_p2c_returns_distinct_nodes_and_prefers_the_less_loaded():
+    balancer = make_balancer("node-a", "node-b", strategy="p2c", seed=7)
+    balancer.update_load("node-a", cpu_usage=95.0, memory_usage=90.0)
+
+    picks = [balancer.select_nodes_for_query(num_nodes=1)[0] for _ in range(20)]
+    assert set(picks) == {"node-b"}
+
+    balancer.register_node(NodeInfo(
+        node_id="node-c", ip_address="127.0.0.1", port=8000, status=NodeStatus.ONLINE
+    ))
+    selected = balancer.select_nodes_for_query(num_nodes=2)
+    assert len(selected) == len(set(selected)) == 2
+
+
+@pytest.mark.performance
+def test_selection_scales_to_1000_nodes():
+    node_ids = [f"node-{i}" for i in range(1000)]
+    balancer = make_balancer(*node_ids, seed=1)
+    for i, node_id in enumerate(node_ids):
+        balancer.update_load(node_id, cpu_usage=i % 100, document_count=i)
+    semantic = [(node_id, (i * 37 % 1000) / 1000) for i, node_id in enumerate(node_ids)]
+
+    timings = {}
+    for strategy in ("weighted", "least_connections", "p2c"):
+        balancer.strategy = strategy
+        start = time.perf_counter()
+        for _ in range(200):
+            assert len(balancer.select_nodes_for_query(semantic, num_nodes=3)) == 3
+        timings[strategy] = (time.perf_counter() - start) / 200 * 1000
+
+    start = time.perf_counter()
+    for _ in range(200):
+        balancer.select_node_for_document(semantic)
+    timings["document"] = (time.perf_counter() - start) / 200 * 1000
+
+    # Antes select_node_for_document era O(N²): ~1000x más lento que una
+    # selección ponderada; ahora ambas recorren los nodos una vez
+    assert timings["document"] / timings["weighted"] < 10
+    assert timings["weighted"] / timings["p2c"] > 1.5
+
+
+def test_nodes_with_open_circuit_are_skipped_by_selectors():
+    balancer = make_balancer("node-a", "node-b", "node-c")
+    for _ in range(5):
+        balancer.circuit_breakers.record_failure("node-a")
+
+    assert "node-a" not in balancer.select_nodes_for_query(num_nodes=3)
+    assert balancer.select_holder(["node-a", "node-b"]) == "node-b"
+    assert balancer.select_node_for_document(exclude=["node-b", "node-c"]) is None
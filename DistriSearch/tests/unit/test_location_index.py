@@ -65,3 +65,59 @@ def test_select_replica_nodes_uses_affinity_and_excludes_source():
     assert "node-1" not in selected
     assert "node-2" in selected or "node-3" in selected
     assert len(selected) == 2
+
+
+def test_get_embeddings_returns_rows_and_mask():
+    index = SemanticLocationIndex(embedding_dim=4)
+    index.register_document("d1", "a.txt", "node-1", np.array([2, 0, 0, 0], dtype=float))
+    index.register_document("d2", "b.txt", "node-2", np.array([0, 3, 0, 0], dtype=float))
+
+    embeddings, found = index.get_embeddings(["d2", "missing", "d1"])
+
+    assert found.tolist() == [True, False, True]
+    assert np.allclose(embeddings[0], [0, 1, 0, 0])
+    assert np.allclose(embeddings[1], 0)
+    assert np.allclose(embeddings[2], [1, 0, 0, 0])
+
+
+def test_node_score_bounds_are_upper_bounds():
+    rng = np.random.default_rng(7)
+    index = SemanticLocationIndex(embedding_dim=8)
+    for i in range(60):
+        index.register_document(f"d{i}", f"{i}.txt", f"node-{i % 4}", rng.normal(size=8))
+
+    for _ in range(20):
+        query = rng.normal(size=8)
+        bounds = dict(index.node_score_bounds(query))
+        for doc, score in index.search(query, top_k=60):
+            assert score <= bounds[doc.node_id] + 1e-9
+
+
+def test_replica_groups_require_a_copy_of_the_whole_shard():
+    index = SemanticLocationIndex(embedding_dim=4)
+    index.register_document("d1", "a.txt", "node-1", np.array([1, 0, 0, 0], dtype=float))
+    index.register_document("d2", "b.txt", "node-1", np.array([0, 1, 0, 0], dtype=float))
+
+    index.add_replica("d1", "node-2")
+    index.add_replica("d1", "node-3")
+    index.add_replica("d2", "node-3")
+
+    assert index.get_holders("d1") == ["node-1", "node-2", "node-3"]
+    assert index.get_replica_groups() == {"node-1": ["node-3"]}
+
+    index.remove_replica("d2", "node-3")
+    assert index.get_replica_groups() == {}
+
+
+def test_content_holders_follow_owners_and_replicas():
+    index = SemanticLocationIndex(embedding_dim=4)
+    meta = {"content_hash": "h1"}
+    index.register_document("d1", "a.txt", "node-1", np.array([1, 0, 0, 0], dtype=float), meta)
+    index.register_document("d2", "copy.txt", "node-2", np.array([1, 0, 0, 0], dtype=float), meta)
+    index.add_replica("d1", "node-3")
+
+    assert index.get_content_holders("h1") == {"node-1", "node-2", "node-3"}
+    assert index.get_content_holders("unknown") == set()
+
+    index.remove_document("d1")
+    assert index.get_content_holders("h1") == {"node-2"}
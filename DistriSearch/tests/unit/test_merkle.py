@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+
+import httpx
+import pytest
+
+from core.merkle import MerkleTree, http_describe, merkle_diff
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _entries(count):
+    return {f"file-{i}": _hash(f"content-{i}") for i in range(count)}
+
+
+def test_root_hash_is_independent_of_insertion_order():
+    entries = _entries(500)
+    forward = MerkleTree(entries)
+    backward = MerkleTree(dict(reversed(list(entries.items()))))
+    assert forward.root_hash == backward.root_hash
+    assert len(forward) == 500
+
+
+def test_updates_only_change_the_affected_branch():
+    tree = MerkleTree(_entries(2000))
+    before = tree.describe([""])[""]["children"]
+    leaf = tree.leaf_path("file-7")
+
+    tree.set("file-7", _hash("nuevo"))
+
+    after = tree.describe([""])[""]["children"]
+    changed = [path for path in before if before[path] != after[path]]
+    assert changed == [leaf[0]]
+
+
+def test_remove_restores_previous_root():
+    tree = MerkleTree(_entries(100))
+    root = tree.root_hash
+    tree.set("extra", _hash("extra"))
+    assert tree.root_hash != root
+    tree.remove("extra")
+    assert tree.root_hash == root
+
+
+def test_identical_trees_need_one_round_trip():
+    local = MerkleTree(_entries(1000))
+    remote = MerkleTree(_entries(1000))
+
+    diff = asyncio.run(merkle_diff(local, remote.describe_async))
+
+    assert diff.in_sync
+    assert diff.round_trips == 1
+
+
+def test_few_differences_in_a_large_set_take_a_handful_of_round_trips():
+    entries = _entries(50_000)
+    local = MerkleTree(entries)
+    remote_entries = dict(entries)
+    for i in range(4):
+        remote_entries[f"file-{i * 1000}"] = _hash("desactualizado")
+    for i in range(4, 7):
+        del remote_entries[f"file-{i * 1000}"]
+    for i in range(3):
+        remote_entries[f"huerfano-{i}"] = _hash(f"huerfano-{i}")
+    remote = MerkleTree(remote_entries)
+
+    requested = []
+
+    async def describe(paths):
+        requested.extend(paths)
+        return remote.describe(paths)
+
+    diff = asyncio.run(merkle_diff(local, describe))
+
+    assert diff.different == {f"file-{i * 1000}" for i in range(4)}
+    assert diff.only_local == {f"file-{i * 1000}" for i in range(4, 7)}
+    assert diff.only_remote == {f"huerfano-{i}" for i in range(3)}
+    assert diff.round_trips == local.depth + 1
+    # Solo se piden las ramas distintas, no las 4096 hojas
+    assert len(requested) <= 1 + 3 * 10
+
+
+def test_describe_rejects_invalid_paths():
+    tree = MerkleTree(depth=2)
+    with pytest.raises(ValueError):
+        tree.describe(["xyz"])
+
+
+def _serve_tree(tree, calls):
+    """Transporte httpx que atiende POST /cluster/merkle con un árbol propio"""
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append((str(request.url), body["source"]))
+        return httpx.Response(200, json={"nodes": tree.describe(body["paths"])})
+    return httpx.MockTransport(handler)
+
+
+def test_http_exchange_between_independent_trees():
+    entries = _entries(2000)
+    local = MerkleTree(entries)
+    peer_entries = dict(entries)
+    peer_entries["file-3"] = _hash("desactualizado")
+    del peer_entries["file-9"]
+    peer = MerkleTree(peer_entries)
+    calls = []
+
+    async def _run():
+        async with httpx.AsyncClient(transport=_serve_tree(peer, calls)) as http:
+            return await merkle_diff(local, http_describe(http, "http://peer:8000/", source="node-a"))
+
+    diff = asyncio.run(_run())
+
+    assert diff.different == {"file-3"}
+    assert diff.only_local == {"file-9"}
+    assert len(calls) == diff.round_trips
+    assert set(calls) == {("http://peer:8000/cluster/merkle", "node-a")}
+
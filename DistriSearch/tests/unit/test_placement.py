@@ -0,0 +1,45 @@
+import subprocess
+import sys
+from collections import Counter
+
+from core.placement import RendezvousPlacement, stable_hash
+
+
+def test_placement_is_stable_across_processes():
+    code = (
+        "from core.placement import RendezvousPlacement;"
+        "p = RendezvousPlacement({'node-a': 1, 'node-b': 1, 'node-c': 1, 'node-d': 1});"
+        "print(','.join(p.place('file-42', 2)))"
+    )
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True,
+            env={"PYTHONHASHSEED": str(seed), "PYTHONPATH": ":".join(sys.path)}
+        ).stdout.strip()
+        for seed in (1, 2, 3)
+    }
+    placement = RendezvousPlacement({"node-a": 1, "node-b": 1, "node-c": 1, "node-d": 1})
+
+    assert outputs == {",".join(placement.place("file-42", 2))}
+    assert stable_hash("file-42") == stable_hash("file-42")
+
+
+def test_removing_a_node_only_moves_its_keys():
+    nodes = {f"node-{i}": 1.0 for i in range(10)}
+    before = RendezvousPlacement(nodes)
+    del nodes["node-3"]
+    after = RendezvousPlacement(nodes)
+
+    keys = [f"file-{i}" for i in range(2000)]
+    moved = [k for k in keys if before.place(k, 1) != after.place(k, 1)]
+
+    assert all(before.place(k, 1) == ["node-3"] for k in moved)
+    assert 100 < len(moved) < 300  # ~1/10 de las claves
+
+
+def test_weights_are_respected_and_exclude_is_honoured():
+    placement = RendezvousPlacement({"small": 1.0, "big": 3.0})
+    counts = Counter(placement.place(f"file-{i}", 1)[0] for i in range(4000))
+
+    assert 2.5 < counts["big"] / counts["small"] < 3.5
+    assert placement.place("file-1", 2, exclude={"big"}) == ["small"]
@@ -0,0 +1,116 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import asyncio
+import importlib.util
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "query_batcher",
+    os.path.join(ROOT, "master", "query_batcher.py")
+)
+batcher_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(batcher_module)
+NodeQueryBatcher = batcher_module.NodeQueryBatcher
+BatchItemError = batcher_module.BatchItemError
+
+
+def make_batcher(**kwargs):
+    sent = []
+
+    async def send_batch(node_id, payloads):
+        sent.append((node_id, [p["query"] for p in payloads]))
+        return [
+            {"error": "bad query"} if p["query"] == "fail" else {"results": [p["query"]]}
+            for p in payloads
+        ]
+
+    return NodeQueryBatcher(send_batch, **kwargs), sent
+
+
+def test_queries_within_window_share_one_request_per_node():
+    batcher, sent = make_batcher(window_ms=5)
+
+    async def _run():
+        return await asyncio.gather(*(
+            batcher.submit(node, {"query": f"{node}-q{i}"})
+            for i in range(4) for node in ("node-a", "node-b")
+        ))
+
+    responses = asyncio.run(_run())
+
+    assert sorted(n for n, _ in sent) == ["node-a", "node-b"]
+    assert dict(sent)["node-a"] == [f"node-a-q{i}" for i in range(4)]
+    assert responses[0] == {"results": ["node-a-q0"]}
+    stats = batcher.get_stats()
+    assert stats["average_batch_size"] == 4
+    assert stats["requests_saved"] == 6
+
+
+def test_max_batch_flushes_early_and_item_errors_are_isolated():
+    batcher, sent = make_batcher(window_ms=1000, max_batch=2)
+
+    async def _run():
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.submit("node-a", {"query": "ok"}),
+            batcher.submit("node-a", {"query": "fail"}),
+            return_exceptions=True
+        ), timeout=1)
+
+    ok, failed = asyncio.run(_run())
+
+    assert len(sent) == 1
+    assert ok == {"results": ["ok"]}
+    assert isinstance(failed, BatchItemError)
+
+
+def test_transport_error_fails_every_query_in_batch():
+    async def broken(node_id, payloads):
+        raise ConnectionError("down")
+
+    batcher = NodeQueryBatcher(broken, window_ms=1)
+
+    async def _run():
+        return await asyncio.gather(
+            batcher.submit("node-a", {"query": "x"}),
+            batcher.submit("node-a", {"query": "y"}),
+            return_exceptions=True
+        )
+
+    assert all(isinstance(r, ConnectionError) for r in asyncio.run(_run()))
+    assert batcher.get_stats()["failed_batches"] == 1
+
+
+def test_send_tasks_are_tracked_until_done_and_failures_logged(caplog):
+    batcher, _ = make_batcher(window_ms=1)
+
+    async def _run():
+        response = await batcher.submit("node-a", {"query": "x"})
+        await asyncio.sleep(0)
+        return response
+
+    assert asyncio.run(_run()) == {"results": ["x"]}
+    assert batcher.get_stats()["in_flight"] == 0
+
+    # Un fallo fuera del manejo de _send se registra en el callback
+    async def _broken_send(node_id, batch):
+        raise RuntimeError("boom")
+
+    batcher._send = _broken_send
+
+    async def _run_broken():
+        batcher._pending["node-b"] = batcher_module._PendingBatch(
+            flush_handle=asyncio.get_running_loop().call_later(1, lambda: None)
+        )
+        batcher._flush("node-b")
+        await asyncio.gather(*batcher._tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(_run_broken())
+    assert not batcher._tasks
+    assert "boom" in caplog.text
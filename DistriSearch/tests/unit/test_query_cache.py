@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import importlib.util
+from dataclasses import dataclass, field
+
+spec = importlib.util.spec_from_file_location(
+    "query_cache",
+    os.path.join(ROOT, "master", "query_cache.py")
+)
+query_cache_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(query_cache_module)
+QueryResultCache = query_cache_module.QueryResultCache
+
+
+@dataclass
+class FakeResult:
+    file_id: str
+    filename: str = "file.txt"
+    snippet: str = ""
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class FakeAggregated:
+    results: list
+
+
+def make_cache(epochs, **kwargs):
+    return QueryResultCache(epoch_provider=lambda node_id: epochs.get(node_id, 0), **kwargs)
+
+
+def test_epoch_bump_invalidates_only_dependent_entries():
+    epochs = {}
+    cache = make_cache(epochs)
+    cache.put("q-a", FakeAggregated([FakeResult("1")]), {"node-a": 0})
+    cache.put("q-b", FakeAggregated([FakeResult("2")]), {"node-b": 0})
+
+    epochs["node-a"] = 1
+
+    assert cache.get("q-a") is None
+    assert cache.get("q-b") is not None
+    stats = cache.get_stats()
+    assert stats["invalidations"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_lru_eviction_respects_memory_budget():
+    cache = make_cache({}, max_bytes=2500)
+    for i in range(5):
+        cache.put(f"q{i}", FakeAggregated([FakeResult(str(i), snippet="x" * 300)]), {"node-a": 0})
+        cache.get("q0")  # q0 se mantiene caliente
+
+    assert cache.get_stats()["size_bytes"] <= 2500
+    assert cache.get("q0") is not None
+    assert cache.get("q1") is None
+    assert cache.get_stats()["evictions"] > 0
+
+
+def test_ttl_expiration_and_invalidate_node():
+    cache = make_cache({}, ttl_seconds=0)
+    cache.put("q", FakeAggregated([]), {"node-a": 0})
+    assert cache.get("q") is None
+    assert cache.get_stats()["expirations"] == 1
+
+    cache = make_cache({})
+    cache.put("q1", FakeAggregated([]), {"node-a": 0, "node-b": 0})
+    cache.put("q2", FakeAggregated([]), {"node-b": 0})
+    assert cache.invalidate_node("node-a") == 1
+    assert len(cache) == 1
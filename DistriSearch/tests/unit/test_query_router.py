@@ -0,0 +1,506 @@
+import sys
+import os
+
+# El router usa imports relativos (..core), así que se importa como paquete
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PARENT = os.path.dirname(ROOT)
+if PARENT not in sys.path:
+    sys.path.insert(0, PARENT)
+
+import asyncio
+import importlib
+
+import numpy as np
+
+PACKAGE = os.path.basename(ROOT)
+router_module = importlib.import_module(f"{PACKAGE}.master.query_router")
+models_module = importlib.import_module(f"{PACKAGE}.core.models")
+breaker_module = importlib.import_module(f"{PACKAGE}.core.circuit_breaker")
+QueryRouter = router_module.QueryRouter
+QueryRequest = router_module.QueryRequest
+QueryResult = models_module.QueryResult
+
+
+class DummyEmbeddingService:
+    def encode_query(self, text):
+        return np.ones(4)
+
+
+class DummyLocationIndex:
+    def __init__(self):
+        self.epochs = {}
+        self.embeddings = {}
+
+    def find_nodes_for_query(self, query_embedding, top_k=3):
+        return [("node-a", 0.9), ("node-b", 0.85)]
+
+    def get_node_epoch(self, node_id):
+        return self.epochs.get(node_id, 0)
+
+    def get_node_epochs(self):
+        return dict(self.epochs)
+
+    def get_replica_groups(self):
+        return {}
+
+    def get_embeddings(self, file_ids):
+        matrix = np.zeros((len(file_ids), 4))
+        found = np.zeros(len(file_ids), dtype=bool)
+        for i, fid in enumerate(file_ids):
+            if fid in self.embeddings:
+                matrix[i] = self.embeddings[fid]
+                found[i] = True
+        return matrix, found
+
+
+class DummyLoadBalancer:
+    def select_nodes_for_query(self, semantic_scores=None, num_nodes=3, exclude=None, replica_groups=None):
+        exclude = set(exclude or [])
+        return [n for n, _ in (semantic_scores or []) if n not in exclude][:num_nodes]
+
+    def increment_queries(self, node_id):
+        pass
+
+    def decrement_queries(self, node_id):
+        pass
+
+    def record_latency(self, node_id, latency_ms):
+        pass
+
+
+def make_router(**kwargs):
+    router = QueryRouter(
+        location_index=DummyLocationIndex(),
+        load_balancer=DummyLoadBalancer(),
+        embedding_service=DummyEmbeddingService(),
+        circuit_breakers=breaker_module.CircuitBreakerRegistry(),
+        **kwargs
+    )
+    router.register_node("node-a", "http://a")
+    router.register_node("node-b", "http://b")
+    return router
+
+
+def install_fake_fanout(router, delay=0.05):
+    calls = []
+
+    async def fake_query_node(client, node_id, request):
+        calls.append((node_id, request.query_text))
+        await asyncio.sleep(delay)
+        return [QueryResult(file_id=f"{node_id}-doc", filename="f.txt", score=1.0, node_id=node_id)]
+
+    router._query_node = fake_query_node
+    return calls
+
+
+def test_identical_concurrent_queries_share_one_fanout():
+    router = make_router()
+    calls = install_fake_fanout(router)
+
+    async def _run():
+        requests = [
+            QueryRequest(query_id=f"q{i}", query_text="  Machine   LEARNING ")
+            for i in range(5)
+        ]
+        return await asyncio.gather(*(router.route_query(r) for r in requests))
+
+    results = asyncio.run(_run())
+
+    # Un único fan-out (2 nodos) para 5 queries equivalentes
+    assert len(calls) == 2
+    assert [r.query_id for r in results] == [f"q{i}" for i in range(5)]
+    assert sum(r.coalesced for r in results) == 4
+    assert all(len(r.results) == 2 for r in results)
+
+    stats = router.get_stats()["coalescing"]
+    assert stats["coalesced_queries"] == 4
+    assert stats["ratio"] == 4 / 5
+    assert stats["in_flight"] == 0
+
+
+def test_different_filters_are_not_coalesced():
+    router = make_router()
+    calls = install_fake_fanout(router)
+
+    async def _run():
+        return await asyncio.gather(
+            router.route_query(QueryRequest(query_id="q1", query_text="report", filters={"file_type": "document"})),
+            router.route_query(QueryRequest(query_id="q2", query_text="report", filters={"file_type": "image"})),
+            router.route_query(QueryRequest(query_id="q3", query_text="report", limit=5)),
+        )
+
+    results = asyncio.run(_run())
+
+    assert len(calls) == 6
+    assert not any(r.coalesced for r in results)
+
+
+def test_leader_error_propagates_to_waiters():
+    router = make_router()
+
+    async def failing_execute(request):
+        await asyncio.sleep(0.02)
+        raise RuntimeError("boom")
+
+    router._execute_query = failing_execute
+
+    async def _run():
+        return await asyncio.gather(
+            router.route_query(QueryRequest(query_id="q1", query_text="x")),
+            router.route_query(QueryRequest(query_id="q2", query_text="x")),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(_run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert router._inflight == {}
+
+
+def test_repeated_query_is_served_from_cache_until_epoch_changes():
+    router = make_router()
+    calls = install_fake_fanout(router, delay=0)
+
+    async def _query(query_id):
+        return await router.route_query(QueryRequest(query_id=query_id, query_text="budget"))
+
+    first = asyncio.run(_query("q1"))
+    second = asyncio.run(_query("q2"))
+
+    assert len(calls) == 2
+    assert not first.cache_hit
+    assert second.cache_hit and second.query_id == "q2"
+    assert len(second.results) == 2
+
+    # Cambia el contenido de node-b: la entrada depende de él
+    router.location_index.epochs["node-b"] = 1
+    third = asyncio.run(_query("q3"))
+
+    assert not third.cache_hit
+    assert len(calls) == 4
+    assert router.get_stats()["cache"]["hits"] == 1
+
+
+def test_cached_result_depends_on_nodes_left_out_of_the_fanout():
+    router = make_router()
+    router.register_node("node-c", "http://c")  # Registrado, pero el plan no lo elige
+    calls = install_fake_fanout(router, delay=0)
+
+    async def _query(query_id):
+        return await router.route_query(QueryRequest(query_id=query_id, query_text="budget"))
+
+    asyncio.run(_query("q1"))
+    assert {node_id for node_id, _ in calls} == {"node-a", "node-b"}
+
+    # node-c recibe documentos: podría entrar en el top-k
+    router.location_index.epochs["node-c"] = 1
+    assert not asyncio.run(_query("q2")).cache_hit
+
+
+def test_node_registered_after_caching_invalidates_the_entry():
+    router = make_router()
+    install_fake_fanout(router, delay=0)
+
+    async def _query(query_id):
+        return await router.route_query(QueryRequest(query_id=query_id, query_text="budget"))
+
+    asyncio.run(_query("q1"))
+    assert asyncio.run(_query("q2")).cache_hit
+
+    # node-c no existía al cachear: ninguna entrada depende de su época
+    router.register_node("node-c", "http://c")
+    router.location_index.epochs["node-c"] = 1
+    assert not asyncio.run(_query("q3")).cache_hit
+
+    # Re-registrar un nodo conocido (p.ej. cambio de puerto) no invalida
+    router.register_node("node-a", "http://a2")
+    assert asyncio.run(_query("q4")).cache_hit
+
+
+def test_partial_results_are_not_cached():
+    router = make_router()
+
+    async def flaky_query_node(client, node_id, request):
+        if node_id == "node-b":
+            raise RuntimeError("timeout")
+        return [QueryResult(file_id="doc", filename="f.txt", score=1.0, node_id=node_id)]
+
+    router._query_node = flaky_query_node
+
+    result = asyncio.run(router.route_query(QueryRequest(query_id="q1", query_text="x")))
+
+    assert "node-b" in result.errors
+    assert len(router.result_cache) == 0
+
+
+def _result(file_id, score, node_id):
+    return QueryResult(file_id=file_id, filename=f"{file_id}.txt", score=score, node_id=node_id)
+
+
+def test_rrf_fusion_ignores_node_score_scales():
+    router = make_router(rerank_weight=0.0)
+    results = [
+        # node-a devuelve scores BM25 grandes, node-b cosenos pequeños
+        _result("a1", 25.0, "node-a"), _result("a2", 12.0, "node-a"),
+        _result("b1", 0.9, "node-b"), _result("b2", 0.4, "node-b"),
+    ]
+
+    ranked = router._aggregate_results(results, None, limit=4)
+
+    # Los primeros de cada nodo empatan por encima de los segundos
+    assert {r.file_id for r in ranked[:2]} == {"a1", "b1"}
+    assert {r.file_id for r in ranked[2:]} == {"a2", "b2"}
+    assert ranked[0].score == 1.0
+
+
+def test_rerank_uses_master_embeddings_and_dedupes():
+    router = make_router(score_fusion="zscore", rerank_weight=1.0)
+    router.location_index.embeddings = {
+        "a1": np.array([0, 1, 0, 0.0]),
+        "b1": np.array([1, 0, 0, 0.0]),
+    }
+    results = [
+        _result("a1", 10.0, "node-a"), _result("a2", 1.0, "node-a"),
+        _result("b1", 0.2, "node-b"), _result("b1", 0.1, "node-b"),
+    ]
+
+    ranked = router._aggregate_results(results, np.array([1.0, 0, 0, 0]), limit=3)
+
+    assert [r.file_id for r in ranked][0] == "b1"
+    assert len({r.file_id for r in ranked}) == len(ranked) == 3
+
+
+def test_nodes_are_asked_for_limit_times_fetch_factor():
+    router = make_router(node_fetch_factor=1.5)
+    assert router._node_limit(10) == 15
+    assert make_router()._node_limit(10) == 10
+
+
+class DocLocation:
+    def __init__(self, file_id, node_id):
+        self.file_id = file_id
+        self.node_id = node_id
+
+
+def test_locate_mode_fetches_only_located_file_ids():
+    router = make_router()
+    router.register_node("node-c", "http://c")
+    searched = []
+
+    def fake_search(query_embedding, top_k=10, node_filter=None):
+        searched.append((top_k, sorted(node_filter)))
+        return [
+            (DocLocation("a1", "node-a"), 0.9),
+            (DocLocation("b1", "node-b"), 0.8),
+            (DocLocation("a2", "node-a"), 0.7),
+        ]
+
+    router.location_index.search = fake_search
+    fetched = {}
+
+    async def fake_fetch(client, node_id, file_ids, request):
+        fetched[node_id] = file_ids
+        return [
+            QueryResult(file_id=fid, filename=f"{fid}.txt", score=0.0, node_id=node_id, snippet="...")
+            for fid in file_ids
+        ]
+
+    async def unexpected_query_node(client, node_id, request):
+        raise AssertionError("locate mode must not broadcast the query")
+
+    router._fetch_from_node = fake_fetch
+    router._query_node = unexpected_query_node
+
+    result = asyncio.run(router.route_query(
+        QueryRequest(query_id="q1", query_text="x", limit=2, mode="locate")
+    ))
+
+    assert searched == [(2, ["node-a", "node-b", "node-c"])]
+    assert fetched == {"node-a": ["a1", "a2"], "node-b": ["b1"]}
+    assert sorted(result.nodes_queried) == ["node-a", "node-b"]
+    assert [r.file_id for r in result.results] == ["a1", "b1"]
+    assert result.results[0].score == 0.9
+
+
+def test_select_nodes_follows_fanout_plan():
+    router = make_router()
+    router.register_node("node-c", "http://c")
+    router.location_index.find_nodes_for_query = lambda emb, top_k=3: [
+        ("node-a", 0.9), ("node-b", 0.5), ("node-c", 0.3)
+    ]
+
+    nodes, plan = router._select_nodes(QueryRequest(query_id="q", query_text="x", query_embedding=np.ones(4)))
+
+    assert nodes == ["node-a"]
+    assert plan.nodes == ["node-a"] and not plan.flat
+
+
+def test_early_termination_skips_nodes_whose_bound_cannot_enter_top_k():
+    router = make_router(early_termination=True, wave_size=1, rerank_weight=1.0)
+    router.register_node("node-c", "http://c")
+    router.location_index.node_score_bounds = lambda emb: [
+        ("node-a", 0.95), ("node-b", 0.6), ("node-c", 0.4)
+    ]
+    router.location_index.embeddings = {
+        "a1": np.array([1, 1, 1, 1.0]),
+        "a2": np.array([1, 1, 1, 0.9]),
+    }
+    calls = []
+
+    async def fake_query_node(client, node_id, request):
+        calls.append(node_id)
+        return [_result("a1", 2.0, node_id), _result("a2", 1.0, node_id)]
+
+    router._query_node = fake_query_node
+
+    result = asyncio.run(router.route_query(
+        QueryRequest(query_id="q1", query_text="x", limit=2)
+    ))
+
+    # El 2º resultado de node-a (coseno ~0.99) supera las cotas de b y c
+    assert calls == ["node-a"]
+    assert result.nodes_skipped == ["node-b", "node-c"]
+    assert [r.file_id for r in result.results] == ["a1", "a2"]
+    assert router.get_stats()["early_termination"]["nodes_skipped"] == 2
+
+
+def test_early_termination_stops_pruning_on_documents_missing_from_index():
+    router = make_router(early_termination=True, wave_size=1, rerank_weight=1.0)
+    router.register_node("node-c", "http://c")
+    router.location_index.node_score_bounds = lambda emb: [
+        ("node-a", 0.95), ("node-b", 0.6), ("node-c", 0.4)
+    ]
+    router.location_index.embeddings = {"a1": np.array([1, 1, 1, 1.0])}
+    calls = []
+
+    async def fake_query_node(client, node_id, request):
+        calls.append(node_id)
+        return [_result(f"{node_id}-1", 2.0, node_id), _result("a1", 1.0, node_id)]
+
+    router._query_node = fake_query_node
+
+    result = asyncio.run(router.route_query(
+        QueryRequest(query_id="q1", query_text="x", limit=2)
+    ))
+
+    # node-a devolvió un documento sin embedding: su score no respeta la cota
+    assert calls == ["node-a", "node-b", "node-c"]
+    assert result.nodes_skipped == []
+    assert router._node_bounds(QueryRequest(query_id="q2", query_text="x", query_embedding=np.ones(4)))[0] == ("node-a", 1.0)
+
+
+def test_early_termination_does_not_prune_with_a_threshold_from_before_unindexed_results():
+    router = make_router(early_termination=True, wave_size=2, rerank_weight=1.0)
+    router.register_node("node-c", "http://c")
+    router.location_index.node_score_bounds = lambda emb: [
+        ("node-a", 0.95), ("node-b", 0.93), ("node-c", 0.45)
+    ]
+    router.location_index.embeddings = {
+        "a1": np.array([1, 1, 1, 1.0]),
+        "a2": np.array([1, 0, 0, 0.0]),  # coseno 0.5: umbral tras node-a
+    }
+    calls = []
+
+    async def fake_query_node(client, node_id, request):
+        calls.append(node_id)
+        if node_id == "node-a":
+            return [_result("a1", 2.0, node_id), _result("a2", 1.0, node_id)]
+        await asyncio.sleep(0.02)
+        # node-b devuelve un documento fuera del índice después de fijarse el umbral
+        return [_result(f"{node_id}-1", 2.0, node_id)]
+
+    router._query_node = fake_query_node
+
+    result = asyncio.run(router.route_query(
+        QueryRequest(query_id="q1", query_text="x", limit=2)
+    ))
+
+    # Sin el reinicio del umbral, node-c (cota 0.45 <= 0.5) se habría omitido
+    assert calls == ["node-a", "node-b", "node-c"]
+    assert result.nodes_skipped == []
+
+
+def test_early_termination_is_disabled_for_raw_scores():
+    router = make_router(early_termination=True, score_fusion="none")
+    assert not router.early_termination
+
+
+def test_explain_returns_plan_with_per_node_timings():
+    router = make_router()
+
+    async def fake_query_node(client, node_id, request):
+        started = router_module.time.perf_counter()
+        results = [_result(f"{node_id}-doc", 1.0, node_id)]
+        router._trace_node(request, node_id, started, {"query_time_ms": 0.0}, len(results))
+        return results
+
+    router._query_node = fake_query_node
+
+    explained = asyncio.run(router.explain("budget", limit=2))
+    plan = explained["plan"]
+
+    assert plan["nodes_selected"] == ["node-a", "node-b"]
+    assert plan["affinity_scores"] == {"node-a": 0.9, "node-b": 0.85}
+    assert {"embed", "select", "fanout", "merge", "serialize"} <= {s["name"] for s in plan["spans"]}
+    assert {n["node_id"] for n in plan["nodes"]} == {"node-a", "node-b"}
+    assert len(explained["results"]) == 2
+
+    # La segunda vez sale de caché y la traza lo refleja
+    assert asyncio.run(router.explain("budget", limit=2))["plan"]["cache_hit"]
+
+
+def test_concurrent_queries_are_batched_per_node():
+    router = make_router(batch_window_ms=5, enable_cache=False, coalesce_queries=False)
+    batches = []
+
+    async def fake_send_batch(node_id, payloads):
+        batches.append((node_id, len(payloads)))
+        return [
+            {"results": [{"file_id": f"{node_id}-{p['query']}", "score": 1.0}], "query_time_ms": 1.0}
+            for p in payloads
+        ]
+
+    router.query_batcher.send_batch = fake_send_batch
+
+    async def _run():
+        return await asyncio.gather(*(router.search(f"q{i}") for i in range(5)))
+
+    results = asyncio.run(_run())
+
+    # 5 queries x 2 nodos en 2 requests en lugar de 10
+    assert sorted(batches) == [("node-a", 5), ("node-b", 5)]
+    assert {r.file_id for r in results[3].results} == {"node-a-q3", "node-b-q3"}
+
+
+def test_shard_query_goes_to_least_loaded_replica():
+    lb_module = importlib.import_module(f"{PACKAGE}.master.load_balancer")
+    NodeInfo = models_module.NodeInfo
+    balancer = lb_module.LoadBalancer(circuit_breakers=breaker_module.CircuitBreakerRegistry())
+    for node_id in ("node-a", "node-b", "node-c"):
+        balancer.register_node(NodeInfo(
+            node_id=node_id, ip_address="127.0.0.1", port=8000, status=models_module.NodeStatus.ONLINE
+        ))
+    balancer.update_load("node-a", cpu_usage=90.0)
+
+    router = make_router(enable_cache=False)
+    router.load_balancer = balancer
+    router.register_node("node-c", "http://c")
+    router.location_index.get_replica_groups = lambda: {"node-a": ["node-c"]}
+    calls = []
+
+    async def fake_query_node(client, node_id, request, shard=None):
+        calls.append((node_id, shard))
+        return [_result(f"{shard or node_id}-doc", 1.0, node_id)]
+
+    router._query_node = fake_query_node
+
+    result = asyncio.run(router.route_query(
+        QueryRequest(query_id="q1", query_text="x", query_embedding=np.ones(4))
+    ))
+
+    # node-a está saturado: su shard lo atiende la réplica node-c
+    assert sorted(calls) == [("node-b", None), ("node-c", "node-a")]
+    assert result.shard_holders == {"node-a": "node-c", "node-b": "node-b"}
+    assert sorted(result.nodes_responded) == ["node-b", "node-c"]
+    assert all(load.active_queries == 0 for load in balancer._loads.values())
+    assert router.get_stats()["replica_reroutes"] == 1
@@ -0,0 +1,85 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import importlib.util
+
+spec = importlib.util.spec_from_file_location(
+    "query_tracing",
+    os.path.join(ROOT, "master", "query_tracing.py")
+)
+query_tracing = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(query_tracing)
+QueryTracer = query_tracing.QueryTracer
+
+
+def test_unsampled_and_forced_traces_stay_out_of_percentiles():
+    tracer = QueryTracer(sample_rate=1.0, slow_threshold_ms=1e9)
+
+    tracer.finish(tracer.start("q1"))
+    tracer.finish(tracer.start("q2", force=True))
+
+    assert tracer.stage_percentiles()["total"]["count"] == 1
+    assert [t["query_id"] for t in tracer.get_recent()] == ["q1"]
+
+
+def test_slow_queries_are_captured_even_when_not_sampled():
+    tracer = QueryTracer(sample_rate=0.0, slow_threshold_ms=0.0)
+
+    trace = tracer.start("q1")
+    tracer.finish(trace)
+
+    assert not trace.sampled
+    assert [t["query_id"] for t in tracer.get_slow_queries()] == ["q1"]
+    assert tracer.get_stats()["sampled_queries"] == 0
+
+
+def test_trace_records_spans_and_node_breakdown():
+    tracer = QueryTracer(sample_rate=1.0)
+    trace = tracer.start("q1", "budget report")
+
+    with trace.span("embed"):
+        pass
+    with trace.span("merge", candidates=4) as span:
+        span.attributes["kept"] = 2
+    trace.record_node("node-a", total_ms=30.0, server_ms=12.0, results=5)
+    trace.record_node("node-b", total_ms=50.0, error="timeout")
+    tracer.finish(trace)
+
+    data = trace.to_dict()
+    assert [s["name"] for s in data["spans"]] == ["embed", "merge"]
+    assert data["spans"][1]["attributes"] == {"candidates": 4, "kept": 2}
+    nodes = {n["node_id"]: n for n in data["nodes"]}
+    assert nodes["node-a"]["network_ms"] == 18.0
+    assert nodes["node-b"]["network_ms"] is None
+    assert tracer.get_stats()["sampled_queries"] == 1
+
+
+def test_repeated_calls_to_a_node_keep_one_timing_each():
+    trace = QueryTracer(sample_rate=1.0).start("q1", mode="locate")
+
+    # Locate y fetch al mismo nodo, y un reintento tras failover
+    trace.record_node("node-a", total_ms=10.0, results=3)
+    trace.record_node("node-a", total_ms=25.0, server_ms=5.0, results=3, phase="fetch")
+    trace.record_node("node-a", total_ms=40.0, error="timeout")
+
+    nodes = trace.to_dict()["nodes"]
+    assert [(n["phase"], n["total_ms"]) for n in nodes] == [
+        ("query", 10.0), ("fetch", 25.0), ("query", 40.0)
+    ]
+    assert sum(n["total_ms"] for n in nodes) == 75.0
+
+
+def test_slow_queries_ring_buffer_keeps_most_recent():
+    tracer = QueryTracer(sample_rate=1.0, slow_threshold_ms=0.0, slow_size=2)
+
+    for i in range(3):
+        tracer.finish(tracer.start(f"q{i}"))
+
+    slow = tracer.get_slow_queries()
+    assert [t["query_id"] for t in slow] == ["q2", "q1"]
+    assert tracer.get_stats()["slow_queries"] == 3
+    assert tracer.stage_percentiles()["total"]["count"] == 3
@@ -1,26 +1,27 @@
 import sys
 import os
 
-# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+# El coordinador usa imports relativos (..core), así que se importa como paquete
 ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-sys.path.insert(0, ROOT)
+PARENT = os.path.dirname(ROOT)
+if PARENT not in sys.path:
+    sys.path.insert(0, PARENT)
 
 import asyncio
+import importlib
+from types import SimpleNamespace
 
 import httpx
 import numpy as np
 import pytest
 
-# Importar directamente sin pasar por master/__init__.py
-import importlib.util
-spec = importlib.util.spec_from_file_location(
-    "replication_coordinator",
-    os.path.join(ROOT, "master", "replication_coordinator.py")
-)
-repl_module = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(repl_module)
+PACKAGE = os.path.basename(ROOT)
+repl_module = importlib.import_module(f"{PACKAGE}.master.replication_coordinator")
 ReplicationCoordinator = repl_module.ReplicationCoordinator
 ReplicationStatus = repl_module.ReplicationStatus
+ReplicationPriority = repl_module.ReplicationPriority
+chunked_transfer = importlib.import_module(f"{PACKAGE}.core.chunked_transfer")
+circuit_module = importlib.import_module(f"{PACKAGE}.core.circuit_breaker")
 
 
 class DummyLocationIndex:
@@ -31,38 +32,38 @@ class DummyLocationIndex:
         return [c for c in self.choices if c != source_node][:replication_factor]
 
 
-class DummyResponse:
-    def __init__(self, status_code=200, content=b"payload", headers=None):
-        self.status_code = status_code
-        self.content = content
-        self._headers = headers or {}
+_RealAsyncClient = httpx.AsyncClient
 
-    @property
-    def headers(self):
-        return self._headers
 
-    def raise_for_status(self):
-        if self.status_code >= 400:
-            raise httpx.HTTPStatusError("error", request=None, response=None)
+class FakeSlaves:
+    """Origen que sirve el archivo y destino con el protocolo de réplica por chunks"""
 
+    def __init__(self, receiver, payload=b"payload" * 100):
+        self.receiver = receiver
+        self.payload = payload
+        self.calls = []
 
-class DummyAsyncClient:
-    def __init__(self, *args, **kwargs):
-        self.calls = {"get": [], "post": []}
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc, tb):
-        return False
-
-    async def get(self, url):
-        self.calls["get"].append(url)
-        return DummyResponse(headers={"content-disposition": "file.txt"})
-
-    async def post(self, url, files=None, data=None):
-        self.calls["post"].append((url, files, data))
-        return DummyResponse()
+    def handler(self, request):
+        self.calls.append((request.method, request.url.host, request.url.path))
+        path = request.url.path
+        if path.startswith("/api/download/"):
+            return httpx.Response(
+                200, content=self.payload,
+                headers={"content-disposition": 'attachment; filename="doc.txt"'}
+            )
+        file_id = path.split("/")[3]
+        if path.endswith("/offset"):
+            return httpx.Response(200, json={"offset": self.receiver.offset(file_id)})
+        if path.endswith("/chunk"):
+            offset = int(request.url.params["offset"])
+            return httpx.Response(
+                200, json={"offset": self.receiver.write_chunk(file_id, offset, request.content)}
+            )
+        if path.endswith("/commit"):
+            body = httpx.Response(200, content=request.content).json()
+            self.receiver.commit(file_id, body["sha256"], body["size"], body["filename"])
+            return httpx.Response(200, json=body)
+        return httpx.Response(404)
 
 
 def test_select_target_nodes_uses_semantic_index(monkeypatch):
@@ -89,11 +90,14 @@ def test_replicate_document_without_targets_marks_completed():
     assert task.progress == 1.0
 
 
-def test_replication_worker_happy_path(monkeypatch):
-    dummy_client = DummyAsyncClient()
-    monkeypatch.setattr(httpx, "AsyncClient", lambda *args, **kwargs: dummy_client)
+def test_replication_worker_happy_path(monkeypatch, tmp_path):
+    slaves = FakeSlaves(chunked_transfer.ReplicaReceiver(str(tmp_path)))
+    monkeypatch.setattr(
+        httpx, "AsyncClient",
+        lambda *args, **kwargs: _RealAsyncClient(transport=httpx.MockTransport(slaves.handler))
+    )
 
-    coord = ReplicationCoordinator(replication_factor=1)
+    coord = ReplicationCoordinator(replication_factor=1, chunk_size=128)
     coord.register_node("node-a", "http://node-a")
     coord.register_node("node-b", "http://node-b")
 
@@ -107,4 +111,249 @@ def test_replication_worker_happy_path(monkeypatch):
     task = asyncio.run(_run())
     assert task.status == ReplicationStatus.COMPLETED
     assert task.completed_nodes == {"node-b"}
-    assert dummy_client.calls["get"] and dummy_client.calls["post"]
+    with open(slaves.receiver.final_path("file-42", "doc.txt"), "rb") as f:
+        assert f.read() == slaves.payload
+    assert ("GET", "node-a", "/api/download/file-42") in slaves.calls
+    assert ("POST", "node-b", "/cluster/replica/file-42/commit") in slaves.calls
+
+
+def test_workers_take_highest_priority_first():
+    coord = ReplicationCoordinator(replication_factor=1, num_workers=1)
+    coord.register_node("node-a", "http://node-a")
+    coord.register_node("node-b", "http://node-b")
+    order = []
+
+    async def fake_replicate(client, task, target_node):
+        order.append(task.file_id)
+        task.completed_nodes.add(target_node)
+
+    coord._replicate_to_node = fake_replicate
+
+    async def _run():
+        await coord.replicate_document("rebalance", "node-a", priority=ReplicationPriority.REBALANCE)
+        await coord.replicate_document("upload-1", "node-a")
+        await coord.replicate_document(
+            "at-risk", "node-a", priority=ReplicationPriority.UNDER_REPLICATED
+        )
+        await coord.replicate_document("upload-2", "node-a")
+        assert coord.get_stats()["queue_by_priority"] == {
+            "under_replicated": 1, "new_upload": 2, "rebalance": 1
+        }
+        await coord.start()
+        await asyncio.sleep(0.05)
+        await coord.stop()
+
+    asyncio.run(_run())
+    assert order == ["at-risk", "upload-1", "upload-2", "rebalance"]
+
+
+def test_worker_pool_caps_transfers_per_destination():
+    coord = ReplicationCoordinator(replication_factor=1, num_workers=4, max_per_destination=1)
+    coord.register_node("node-a", "http://node-a")
+    coord.register_node("node-b", "http://node-b")
+    active = {"now": 0, "max": 0}
+
+    async def fake_replicate(client, task, target_node):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        task.completed_nodes.add(target_node)
+
+    coord._replicate_to_node = fake_replicate
+
+    async def _run():
+        await coord.start()
+        for i in range(4):
+            await coord.replicate_document(f"file-{i}", "node-a")
+        await asyncio.sleep(0.02)
+        busy = coord.get_stats()
+        await asyncio.sleep(0.1)
+        await coord.stop()
+        return busy, coord.get_stats()
+
+    busy, stats = asyncio.run(_run())
+    assert active["max"] == 1
+    assert busy["in_flight_by_destination"] == {"node-b": 1}
+    assert stats["tasks"]["completed"] == 4
+    assert stats["queue_size"] == 0
+    assert stats["drain_rate_per_s"] > 0
+
+
+class ContentIndex:
+    def __init__(self, holders):
+        self.holders = holders
+        self.replicas = []
+
+    def get_document_location(self, file_id):
+        return SimpleNamespace(filename="doc.txt", metadata={"content_hash": "h" * 64})
+
+    def get_content_holders(self, content_hash):
+        return set(self.holders)
+
+    def add_replica(self, file_id, node_id):
+        self.replicas.append((file_id, node_id))
+
+
+def test_replication_skips_transfer_when_target_has_content(monkeypatch, tmp_path):
+    slaves = FakeSlaves(chunked_transfer.ReplicaReceiver(str(tmp_path)))
+
+    def handler(request):
+        if request.url.path.endswith("/link"):
+            slaves.calls.append((request.method, request.url.host, request.url.path))
+            return httpx.Response(200, json={"deduplicated": True})
+        return slaves.handler(request)
+
+    monkeypatch.setattr(
+        httpx, "AsyncClient",
+        lambda *args, **kwargs: _RealAsyncClient(transport=httpx.MockTransport(handler))
+    )
+    index = ContentIndex(holders={"node-a", "node-b"})
+    coord = ReplicationCoordinator(replication_factor=2, location_index=index)
+    for node_id in ("node-a", "node-b", "node-c"):
+        coord.register_node(node_id, f"http://{node_id}")
+
+    async def _run():
+        await coord.start()
+        await coord.replicate_document("file-7", source_node="node-a")
+        await asyncio.sleep(0.05)
+        await coord.stop()
+        return coord.get_task_status("file-7")
+
+    task = asyncio.run(_run())
+    assert task.completed_nodes == {"node-b", "node-c"}
+    # node-b solo registra metadatos; node-c recibe los bytes
+    assert ("POST", "node-b", "/cluster/replica/file-7/link") in slaves.calls
+    assert not any(host == "node-b" and path.endswith("/chunk") for _, host, path in slaves.calls)
+    assert any(host == "node-c" and path.endswith("/chunk") for _, host, path in slaves.calls)
+    assert coord.get_stats()["deduplicated_transfers"] == 1
+    assert sorted(index.replicas) == [("file-7", "node-b"), ("file-7", "node-c")]
+
+
+def test_half_open_target_accepts_a_single_probe_for_the_link(monkeypatch, tmp_path):
+    slaves = FakeSlaves(chunked_transfer.ReplicaReceiver(str(tmp_path)))
+
+    def handler(request):
+        slaves.calls.append((request.method, request.url.host, request.url.path))
+        return httpx.Response(200, json={"deduplicated": True})
+
+    monkeypatch.setattr(
+        httpx, "AsyncClient",
+        lambda *args, **kwargs: _RealAsyncClient(transport=httpx.MockTransport(handler))
+    )
+    breakers = repl_module.CircuitBreakerRegistry(consecutive_failures=1, open_duration=0.01)
+    breakers.record_failure("node-b")
+    coord = ReplicationCoordinator(
+        replication_factor=1,
+        location_index=ContentIndex(holders={"node-a", "node-b"}),
+        circuit_breakers=breakers
+    )
+    coord.register_node("node-a", "http://node-a")
+    coord.register_node("node-b", "http://node-b")
+
+    async def _run():
+        await asyncio.sleep(0.02)  # Expulsión cumplida: la sonda puede salir
+        await coord.start()
+        await coord.replicate_document("file-7", source_node="node-a")
+        await asyncio.sleep(0.05)
+        await coord.stop()
+        return coord.get_task_status("file-7")
+
+    task = asyncio.run(_run())
+    assert task.completed_nodes == {"node-b"}
+    assert breakers.get_state("node-b") == circuit_module.CircuitState.CLOSED
+
+
+def _cluster(nodes, replication_factor=1):
+    coord = ReplicationCoordinator(
+        replication_factor=replication_factor,
+        circuit_breakers=repl_module.CircuitBreakerRegistry()
+    )
+    for node_id in nodes:
+        coord.register_node(node_id, f"http://{node_id}")
+    return coord
+
+
+def test_recovery_plan_covers_exactly_the_under_replicated_files():
+    coord = _cluster(["n1", "n2", "n3", "n4", "n5"])
+    for i in range(40):
+        survivor = ["n2", "n3", "n4"][i % 3]
+        coord.track_file(f"lost-copy-{i}", ["n1", survivor])
+    coord.track_file("untouched", ["n2", "n3"])
+    coord.track_file("still-ok", ["n1", "n2", "n3"])
+
+    plan = coord.plan_recovery("n1")
+
+    assert sorted(f for f, _, _ in plan) == sorted(f"lost-copy-{i}" for i in range(40))
+    for file_id, source, targets in plan:
+        assert source in coord.get_holders(file_id) and source != "n1"
+        assert len(targets) == 1 and targets[0] not in coord.get_holders(file_id)
+    # Cada superviviente sirve sus propios archivos: la carga de origen se reparte
+    sources = [source for _, source, _ in plan]
+    assert {sources.count(n) for n in ("n2", "n3", "n4")} == {13, 14}
+
+
+def test_recovery_spreads_sources_across_survivors():
+    coord = _cluster(["n1", "n2", "n3", "n4", "n5"], replication_factor=2)
+    for i in range(30):
+        coord.track_file(f"f{i}", ["n1", "n2", "n3"])
+
+    plan = coord.plan_recovery("n1")
+
+    sources = [source for _, source, _ in plan]
+    assert len(plan) == 30
+    assert sources.count("n2") == sources.count("n3") == 15
+
+
+def test_handle_node_failure_enqueues_copies_from_survivors():
+    coord = _cluster(["n1", "n2", "n3"])
+    coord.track_file("a", ["n1", "n2"])
+    coord.track_file("b", ["n1"])
+
+    summary = asyncio.run(coord.handle_node_failure("n1"))
+
+    assert summary["files_affected"] == 2
+    assert summary["enqueued"] == 1
+    assert summary["lost"] == ["b"]
+    task = coord.get_task_status("a")
+    assert task.source_node == "n2"
+    assert task.priority == ReplicationPriority.UNDER_REPLICATED
+    assert task.target_nodes == ["n3"]
+    assert coord.get_stats()["recoveries"]["in_progress"] == {"n1": 1}
+
+
+class HolderIndex:
+    def __init__(self, holders):
+        self.holders = holders
+
+    def get_node_files(self, node_id):
+        return [f for f, nodes in self.holders.items() if node_id in nodes]
+
+    def get_holders(self, file_id):
+        return list(self.holders.get(file_id, ()))
+
+    def remove_replica(self, file_id, node_id):
+        return True
+
+
+def test_handle_node_failure_seeds_untracked_files_from_the_index():
+    coord = _cluster(["n1", "n2", "n3"])
+    coord.location_index = HolderIndex({"a": ["n1", "n2"], "b": ["n2", "n3"]})
+
+    summary = asyncio.run(coord.handle_node_failure("n1"))
+
+    assert summary["files_affected"] == 1
+    assert coord.get_task_status("a").target_nodes == ["n3"]
+    assert coord.get_task_status("b") is None
+
+
+def test_ensure_replication_factor_copies_from_a_live_replica():
+    coord = _cluster(["n1", "n2", "n3"])
+    coord.track_file("doc", ["n1", "n2"])
+    coord.unregister_node("n1")  # El dueño original ya no está
+
+    task = asyncio.run(coord.ensure_replication_factor("doc"))
+
+    assert task.source_node == "n2"
+    assert task.target_nodes == ["n3"]
+    assert asyncio.run(coord.ensure_replication_factor("unknown")) is None
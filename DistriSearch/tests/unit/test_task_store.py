@@ -0,0 +1,174 @@
+import sys
+import os
+
+# El coordinador usa imports relativos (..core), así que se importa como paquete
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PARENT = os.path.dirname(ROOT)
+if PARENT not in sys.path:
+    sys.path.insert(0, PARENT)
+
+import asyncio
+import importlib
+
+PACKAGE = os.path.basename(ROOT)
+repl_module = importlib.import_module(f"{PACKAGE}.master.replication_coordinator")
+store_module = importlib.import_module(f"{PACKAGE}.master.task_store")
+ReplicationCoordinator = repl_module.ReplicationCoordinator
+ReplicationStatus = repl_module.ReplicationStatus
+ReplicationTaskStore = store_module.ReplicationTaskStore
+
+
+def _coordinator(log_path, **kwargs):
+    coord = ReplicationCoordinator(
+        replication_factor=1,
+        task_store=ReplicationTaskStore(str(log_path)),
+        **kwargs
+    )
+    coord.register_node("node-a", "http://node-a")
+    coord.register_node("node-b", "http://node-b")
+    return coord
+
+
+def test_load_keeps_last_record_and_skips_torn_line(tmp_path):
+    log = tmp_path / "tasks.jsonl"
+    store = ReplicationTaskStore(str(log))
+    store.save({"task_id": "t1", "file_id": "f1", "status": "pending"})
+    store.save({"task_id": "t1", "file_id": "f1", "status": "completed"})
+    store.save({"task_id": "t2", "file_id": "f2", "status": "pending"})
+    store.delete("t2")
+    with open(log, "a") as f:
+        f.write('{"task_id": "t3", "sta')  # escritura cortada por una caída
+
+    records = ReplicationTaskStore(str(log)).load()
+
+    assert records == {"t1": {"task_id": "t1", "file_id": "f1", "status": "completed"}}
+
+
+def test_compaction_rewrites_one_line_per_live_task(tmp_path):
+    log = tmp_path / "tasks.jsonl"
+    store = ReplicationTaskStore(str(log), compact_threshold=10)
+    for i in range(20):
+        store.save({"task_id": "t1", "status": "pending", "attempts": i})
+    store.set_live(1)
+
+    assert store.maybe_compact(lambda: [{"task_id": "t1", "status": "pending", "attempts": 19}])
+    assert len(log.read_text().splitlines()) == 1
+    assert ReplicationTaskStore(str(log)).load()["t1"]["attempts"] == 19
+
+
+def test_pending_tasks_survive_a_restart(tmp_path):
+    log = tmp_path / "tasks.jsonl"
+    replicated = []
+
+    async def fake_replicate(client, task, target_node):
+        replicated.append((task.file_id, target_node))
+        task.completed_nodes.add(target_node)
+
+    async def _enqueue_then_crash():
+        coord = _coordinator(log)
+        await coord.replicate_document("file-1", "node-a")
+
+    async def _restart():
+        coord = _coordinator(log)
+        coord._replicate_to_node = fake_replicate
+        await coord.start()
+        await asyncio.sleep(0.05)
+        await coord.stop()
+        return coord
+
+    asyncio.run(_enqueue_then_crash())
+    coord = asyncio.run(_restart())
+
+    assert replicated == [("file-1", "node-b")]
+    assert coord.get_task_status("file-1").status == ReplicationStatus.COMPLETED
+
+
+def test_duplicate_requests_reuse_the_same_task(tmp_path):
+    async def _run():
+        coord = _coordinator(tmp_path / "tasks.jsonl")
+        first = await coord.replicate_document("file-1", "node-a")
+        second = await coord.replicate_document("file-1", "node-a")
+        return coord, first, second
+
+    coord, first, second = asyncio.run(_run())
+    assert first is second
+    assert coord.get_stats()["queue_size"] == 1
+
+
+def test_completed_task_does_not_block_re_replication(tmp_path):
+    async def fake_replicate(client, task, target_node):
+        task.completed_nodes.add(target_node)
+
+    async def _run():
+        coord = _coordinator(tmp_path / "tasks.jsonl")
+        coord._replicate_to_node = fake_replicate
+        await coord.start()
+        first = await coord.replicate_document("file-1", "node-a")
+        await asyncio.sleep(0.05)
+        # p.ej. la réplica se perdió y ensure_replication_factor vuelve a pedirla
+        second = await coord.replicate_document("file-1", "node-a")
+        await asyncio.sleep(0.05)
+        await coord.stop()
+        return coord, first, second
+
+    coord, first, second = asyncio.run(_run())
+
+    assert second is not first
+    assert first.status == second.status == ReplicationStatus.COMPLETED
+    assert coord.get_task(first.task_id) is first
+    assert coord.get_task_status("file-1") is second
+    assert set(ReplicationTaskStore(str(tmp_path / "tasks.jsonl")).load()) == {
+        first.task_id, second.task_id
+    }
+
+
+def test_failures_retry_with_backoff_then_dead_letter(tmp_path):
+    attempts = []
+
+    async def failing_replicate(client, task, target_node):
+        attempts.append(asyncio.get_running_loop().time())
+        task.failed_nodes.add(target_node)
+        task.error_message = "conexión rechazada"
+
+    async def _run():
+        coord = _coordinator(tmp_path / "tasks.jsonl", max_attempts=3, retry_backoff=0.02)
+        coord._replicate_to_node = failing_replicate
+        await coord.start()
+        await coord.replicate_document("file-1", "node-a")
+        await asyncio.sleep(0.3)
+        await coord.stop()
+        return coord
+
+    coord = asyncio.run(_run())
+    task = coord.get_task_status("file-1")
+
+    assert len(attempts) == 3
+    # Backoff exponencial: 0.02s y luego 0.04s
+    assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+    assert task.status == ReplicationStatus.FAILED
+    assert [t["task_id"] for t in coord.get_dead_letters()] == [task.task_id]
+
+    requeued = coord.requeue_dead_letter(task.task_id)
+    assert requeued.status == ReplicationStatus.PENDING and requeued.attempts == 0
+
+
+def test_finished_tasks_are_evicted_after_ttl(tmp_path):
+    log = tmp_path / "tasks.jsonl"
+
+    async def fake_replicate(client, task, target_node):
+        task.completed_nodes.add(target_node)
+
+    async def _run():
+        coord = _coordinator(log, finished_ttl=0)
+        coord._replicate_to_node = fake_replicate
+        await coord.start()
+        await coord.replicate_document("file-1", "node-a")
+        await asyncio.sleep(0.05)
+        await coord.stop()
+        coord._evict_finished(force=True)
+        return coord
+
+    coord = asyncio.run(_run())
+
+    assert coord.get_task_status("file-1") is None
+    assert ReplicationTaskStore(str(log)).load() == {}
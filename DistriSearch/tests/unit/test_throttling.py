@@ -0,0 +1,84 @@
+import pytest
+
+from core.chunked_transfer import copy_file_chunked
+from core.config import ReplicationConfig
+from core.throttling import CHECKPOINT, AdaptiveRate, BandwidthThrottle, ByteTokenBucket
+
+
+def test_bucket_allows_burst_then_paces_at_rate():
+    bucket = ByteTokenBucket(rate=1000, burst=1000)
+    assert bucket.reserve(1000) == 0
+    assert bucket.reserve(500) == pytest.approx(0.5, abs=0.01)
+    assert bucket.reserve(500) == pytest.approx(1.0, abs=0.01)
+
+
+def test_zero_rate_means_unlimited():
+    bucket = ByteTokenBucket(rate=0)
+    assert bucket.reserve(10 ** 9) == 0
+
+
+def test_aimd_halves_on_high_latency_and_recovers_additively():
+    adaptive = AdaptiveRate(target_p99_ms=100, min_fraction=0.2, interval=0)
+    assert adaptive.update(300) == 0.5
+    assert adaptive.update(300) == 0.25
+    assert adaptive.update(300) == 0.2
+    assert adaptive.update(50) == pytest.approx(0.3)
+
+
+def test_link_limit_applies_per_source_target_pair():
+    throttle = BandwidthThrottle(node_rate=0, link_rate=1000)
+    assert throttle.reserve(1000, "a", "b") == 0
+    assert throttle.reserve(1000, "a", "b") == pytest.approx(1.0, abs=0.01)
+    # Otro enlace tiene su propio bucket
+    assert throttle.reserve(1000, "a", "c") == 0
+
+
+def test_node_limit_is_shared_by_all_links_of_a_node():
+    throttle = BandwidthThrottle(node_rate=1000, link_rate=0)
+    assert throttle.reserve(1000, "a", "b") == 0
+    assert throttle.reserve(1000, "a", "c") == pytest.approx(1.0, abs=0.01)
+
+
+def test_checkpoint_traffic_has_its_own_budget():
+    throttle = BandwidthThrottle(node_rate=1000, checkpoint_rate=1000)
+    assert throttle.reserve(1000, "a", "b") == 0
+    assert throttle.reserve(1000, source="a", traffic=CHECKPOINT) == 0
+    assert throttle.get_stats()["bytes"] == {"replication": 1000, "checkpoint": 1000}
+
+
+def test_high_foreground_latency_slows_background_traffic():
+    p99 = {"value": 50.0}
+    throttle = BandwidthThrottle(
+        link_rate=1000, target_p99_ms=100, adjust_interval=0,
+        latency_provider=lambda: p99["value"]
+    )
+    throttle.reserve(1000, "a", "b")
+    p99["value"] = 400.0
+    wait = throttle.reserve(500, "a", "b")
+
+    assert throttle.get_stats()["adaptive_fraction"] == 0.5
+    # 500 bytes a 500 B/s
+    assert wait == pytest.approx(1.0, abs=0.05)
+
+
+def test_configure_applies_new_limits_at_runtime():
+    throttle = BandwidthThrottle(link_rate=1000)
+    throttle.reserve(1000, "a", "b")
+
+    config = ReplicationConfig()
+    config.node_bandwidth = 0
+    config.link_bandwidth = 0
+    throttle.configure(config)
+
+    assert throttle.reserve(10 ** 6, "a", "b") == 0
+
+
+def test_copy_file_chunked_paces_every_chunk(tmp_path):
+    source = tmp_path / "src.bin"
+    source.write_bytes(b"x" * 2500)
+    calls = []
+
+    copy_file_chunked(str(source), str(tmp_path / "dst.bin"), chunk_size=1000, throttle=calls.append)
+
+    assert calls == [1000, 1000, 500]
+    assert (tmp_path / "dst.bin").read_bytes() == source.read_bytes()
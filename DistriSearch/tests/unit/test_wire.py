@@ -0,0 +1,96 @@
+import sys
+import os
+
+# Setup path para imports directos (evitar __init__.py que tiene imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import importlib.util
+import json
+import time
+
+import numpy as np
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "wire",
+    os.path.join(ROOT, "core", "wire.py")
+)
+wire = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(wire)
+
+
+def registration(dim=384, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "file_id": "f1",
+        "filename": "report.pdf",
+        "node_id": "node-a",
+        "embedding": rng.standard_normal(dim).astype(np.float32),
+        "metadata": {"size": 1024, "tags": ["q3", "finance"]},
+    }
+
+
+@pytest.mark.parametrize("use_msgpack", [False, pytest.param(True, marks=pytest.mark.skipif(
+    wire.msgpack is None, reason="msgpack no instalado"))])
+def test_round_trip_preserves_payload_and_vectors(use_msgpack):
+    payload = registration()
+    payload["matrix"] = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+    decoded = wire.decode(wire.encode(payload, use_msgpack=use_msgpack))
+
+    assert decoded["metadata"] == payload["metadata"]
+    assert decoded["filename"] == "report.pdf"
+    np.testing.assert_array_equal(decoded["embedding"], payload["embedding"])
+    assert decoded["matrix"].shape == (2, 3)
+
+
+def test_vectors_are_zero_copy_views():
+    data = wire.encode(registration())
+
+    vector = wire.decode(data)["embedding"]
+
+    assert not vector.flags.owndata
+    assert not vector.flags.writeable
+    assert vector.dtype == np.float32
+
+
+def test_negotiation_and_fallback_to_json():
+    payload = {"results": [], "vector": np.ones(2, dtype=np.float32)}
+
+    body, media_type = wire.encode_for(payload, "application/json")
+    assert media_type == wire.JSON_MEDIA_TYPE
+    assert json.loads(body)["vector"] == [1.0, 1.0]
+
+    accept = f"{wire.BINARY_MEDIA_TYPE}, application/json;q=0.9"
+    body, media_type = wire.encode_for(payload, accept)
+    assert media_type == wire.BINARY_MEDIA_TYPE
+    np.testing.assert_array_equal(wire.decode_body(body, media_type)["vector"], [1.0, 1.0])
+
+
+def test_corrupt_frame_is_rejected():
+    with pytest.raises(wire.WireFormatError):
+        wire.decode(b"XXX" + wire.encode({"a": 1})[3:])
+
+
+@pytest.mark.performance
+def test_binary_registration_is_smaller_and_faster_than_json():
+    payloads = [registration(seed=i) for i in range(200)]
+    json_payloads = [{**p, "embedding": p["embedding"].tolist()} for p in payloads]
+
+    start = time.perf_counter()
+    json_bodies = [json.dumps(p).encode() for p in json_payloads]
+    json_decoded = [np.array(json.loads(b)["embedding"], dtype=np.float32) for b in json_bodies]
+    json_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bin_bodies = [wire.encode(p) for p in payloads]
+    bin_decoded = [wire.decode(b)["embedding"] for b in bin_bodies]
+    bin_time = time.perf_counter() - start
+
+    json_size = sum(map(len, json_bodies))
+    bin_size = sum(map(len, bin_bodies))
+    np.testing.assert_array_equal(json_decoded[0], bin_decoded[0])
+    # ~4.8x más pequeño y ~10x más rápido medidos; margen para máquinas ruidosas
+    assert json_size / bin_size > 3
+    assert json_time / bin_time > 2